@@ -2,7 +2,14 @@
 Database Connection - Supabase + AsyncPG
 """
 import os
-from typing import Optional, Any
+import re
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from typing import Optional, Any, Callable, Mapping, NamedTuple, Tuple
 from dotenv import load_dotenv
 import logging
 
@@ -59,6 +66,162 @@ except Exception as e:
     database_url = None
 
 
+# ============================================================================
+# QUERY COMPILER - PARAMETRI NOMINALI (:nome → $n)
+# ============================================================================
+
+# Statement preparati in cache per connessione AsyncPG (0 = disattivati,
+# necessario con pgbouncer in transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+# Righe per chunk nelle scritture bulk
+BULK_CHUNK_SIZE = int(os.getenv("DB_BULK_CHUNK_SIZE", "5000"))
+
+# Stringhe, identificatori quotati, commenti, dollar quoting e cast '::'
+# vengono consumati interi: solo ':nome' fuori da questi è un parametro
+_SQL_TOKEN = re.compile(r"""
+      '(?:[^']|'')*'
+    | "(?:[^"]|"")*"
+    | --[^\n]*
+    | /\*.*?\*/
+    | \$(?P<tag>[A-Za-z_]\w*)?\$.*?\$(?P=tag)?\$
+    | ::
+    | :(?P<name>[A-Za-z_]\w*)
+""", re.VERBOSE | re.DOTALL)
+
+
+class CompiledQuery(NamedTuple):
+    sql: str
+    names: Tuple[str, ...]
+
+
+class QueryCompiler:
+    """
+    Riscrive i parametri nominali (:nome) in posizionali ($1..$n)
+
+    La forma compilata è in cache (LRU) per testo SQL: lo stesso testo
+    produce sempre lo stesso SQL posizionale, quindi AsyncPG riusa lo
+    statement preparato della connessione.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE):
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, CompiledQuery]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _compile(sql: str) -> CompiledQuery:
+        names = []
+
+        def replace(match):
+            name = match.group('name')
+            if name is None:
+                return match.group(0)
+            if name not in names:
+                names.append(name)
+            return f"${names.index(name) + 1}"
+
+        return CompiledQuery(_SQL_TOKEN.sub(replace, sql), tuple(names))
+
+    def compile(self, sql: str) -> CompiledQuery:
+        compiled = self._cache.get(sql)
+        if compiled is not None:
+            self.hits += 1
+            self._cache.move_to_end(sql)
+            return compiled
+
+        self.misses += 1
+        compiled = self._compile(sql)
+        self._cache[sql] = compiled
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return compiled
+
+    def bind(self, sql: str, args: tuple) -> Tuple[str, tuple]:
+        """
+        Query e argomenti per AsyncPG
+
+        Con un solo argomento dict la query usa parametri nominali;
+        altrimenti gli argomenti sono già posizionali e passano invariati.
+        """
+        if len(args) != 1 or not isinstance(args[0], (dict, Mapping)):
+            return sql, args
+
+        params = args[0]
+        compiled = self.compile(sql)
+        try:
+            return compiled.sql, tuple([params[name] for name in compiled.names])
+        except KeyError as e:
+            raise ValueError(f"Parametro mancante nella query: :{e.args[0]}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'compiled': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# ============================================================================
+# TRANSAZIONI - UNA CONNESSIONE PER UNITÀ DI LAVORO
+# ============================================================================
+
+def rowcount(status: Optional[str]) -> int:
+    """Righe toccate da uno status AsyncPG ('DELETE 3', 'INSERT 0 1', 'UPDATE 2')"""
+    try:
+        return int(status.rsplit(' ', 1)[-1]) if status else 0
+    except ValueError:
+        return 0
+
+
+class Transaction:
+    """
+    Statement su una connessione fissa dentro una transazione aperta
+    
+    Stessa interfaccia di Database (parametri posizionali o nominali), ma
+    gli errori vengono propagati: un'eccezione annulla tutta l'unità di lavoro.
+    """
+    
+    __slots__ = ('conn', 'compiler', 'statements')
+    
+    def __init__(self, conn, compiler: QueryCompiler):
+        self.conn = conn
+        self.compiler = compiler
+        self.statements = 0
+    
+    async def fetch_one(self, query: str, *args):
+        query, args = self.compiler.bind(query, args)
+        self.statements += 1
+        return await self.conn.fetchrow(query, *args)
+    
+    async def fetch_all(self, query: str, *args):
+        query, args = self.compiler.bind(query, args)
+        self.statements += 1
+        return await self.conn.fetch(query, *args)
+    
+    async def execute(self, query: str, *args) -> str:
+        query, args = self.compiler.bind(query, args)
+        self.statements += 1
+        return await self.conn.execute(query, *args)
+    
+    async def fetch_val(self, query: str, *args):
+        query, args = self.compiler.bind(query, args)
+        self.statements += 1
+        return await self.conn.fetchval(query, *args)
+    
+    async def executemany(self, query: str, rows: list):
+        rows = list(rows)
+        if rows and isinstance(rows[0], (dict, Mapping)):
+            compiled = self.compiler.compile(query)
+            query = compiled.sql
+            rows = [tuple([row[name] for name in compiled.names]) for row in rows]
+        self.statements += 1
+        await self.conn.executemany(query, rows)
+
+
 class Database:
     """
     Database wrapper con supporto per:
@@ -70,6 +233,9 @@ class Database:
         self.pool: Optional[asyncpg.Pool] = None
         self.supabase = supabase
         self.database_url = database_url
+        self.compiler = QueryCompiler()
+        self._bulk_stats: dict = {}
+        self._tx_stats = {'committed': 0, 'rolled_back': 0, 'statements': 0, 'seconds': 0.0}
     
     async def connect(self):
         """Initialize connection pool (AsyncPG)"""
@@ -83,6 +249,7 @@ class Database:
                 min_size=2,
                 max_size=10,
                 command_timeout=60,
+                statement_cache_size=DB_STATEMENT_CACHE_SIZE,
                 server_settings={
                     'application_name': 'azienda-gestionale'
                 }
@@ -100,6 +267,7 @@ class Database:
     
     # ========================================================================
     # ASYNCPG METHODS (Optional)
+    # Accettano parametri posizionali ($1, *args) o nominali (:nome, dict)
     # ========================================================================
     
     async def fetch_one(self, query: str, *args):
@@ -108,6 +276,7 @@ class Database:
             return None
         
         try:
+            query, args = self.compiler.bind(query, args)
             async with self.pool.acquire() as conn:
                 return await conn.fetchrow(query, *args)
         except Exception as e:
@@ -120,6 +289,7 @@ class Database:
             return []
         
         try:
+            query, args = self.compiler.bind(query, args)
             async with self.pool.acquire() as conn:
                 return await conn.fetch(query, *args)
         except Exception as e:
@@ -132,6 +302,7 @@ class Database:
             return None
         
         try:
+            query, args = self.compiler.bind(query, args)
             async with self.pool.acquire() as conn:
                 return await conn.execute(query, *args)
         except Exception as e:
@@ -144,11 +315,208 @@ class Database:
             return None
         
         try:
+            query, args = self.compiler.bind(query, args)
             async with self.pool.acquire() as conn:
                 return await conn.fetchval(query, *args)
         except Exception as e:
             logger.error(f"Query error: {e}")
             return None
+    
+    # ========================================================================
+    # TRANSAZIONI
+    # ========================================================================
+    
+    @asynccontextmanager
+    async def transaction(self, isolation: str = 'read_committed'):
+        """
+        Unità di lavoro atomica su una sola connessione del pool
+        
+        Commit all'uscita dal blocco, rollback (e rilancio) su eccezione.
+        
+        Usage:
+            async with db.transaction() as tx:
+                row = await tx.fetch_one("SELECT ... FOR UPDATE", {...})
+                await tx.execute("UPDATE ...", {...})
+        """
+        if not self.pool:
+            raise RuntimeError("Database non disponibile")
+        
+        start = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            tx = Transaction(conn, self.compiler)
+            try:
+                async with conn.transaction(isolation=isolation):
+                    yield tx
+            except BaseException:
+                self._tx_stats['rolled_back'] += 1
+                raise
+            else:
+                self._tx_stats['committed'] += 1
+            finally:
+                self._tx_stats['statements'] += tx.statements
+                self._tx_stats['seconds'] += time.perf_counter() - start
+    
+    def transaction_stats(self) -> dict:
+        """Transazioni confermate/annullate, statement e tempo medio"""
+        totale = self._tx_stats['committed'] + self._tx_stats['rolled_back']
+        return {
+            **self._tx_stats,
+            'seconds': round(self._tx_stats['seconds'], 4),
+            'avg_ms': round(self._tx_stats['seconds'] / totale * 1000, 2) if totale else 0.0
+        }
+    
+    def query_stats(self) -> dict:
+        """Contatori cache query compilate e statement preparati"""
+        return {
+            **self.compiler.stats(),
+            'statement_cache_size': DB_STATEMENT_CACHE_SIZE
+        }
+    
+    # ========================================================================
+    # BULK WRITE (executemany, COPY, upsert)
+    # Righe divise in chunk, ogni chunk in una propria transazione: un chunk
+    # con errori viene annullato e riportato senza fermare gli altri
+    # ========================================================================
+    
+    async def _run_chunks(self, operation: str, rows: list, chunk_size: Optional[int], write) -> Optional[dict]:
+        """
+        Esegue write(conn, chunk) per ogni chunk
+        
+        Returns:
+            {'rows', 'chunks', 'failed_chunks', 'seconds', 'rows_per_sec'}
+        """
+        if not self.pool:
+            return None
+        
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        result = {'rows': 0, 'chunks': 0, 'failed_chunks': [], 'seconds': 0.0, 'rows_per_sec': 0.0}
+        start = time.perf_counter()
+        
+        async with self.pool.acquire() as conn:
+            for offset in range(0, len(rows), chunk_size):
+                chunk = rows[offset:offset + chunk_size]
+                result['chunks'] += 1
+                try:
+                    async with conn.transaction():
+                        await write(conn, chunk)
+                    result['rows'] += len(chunk)
+                except Exception as e:
+                    logger.error(f"{operation} chunk {offset}-{offset + len(chunk)} error: {e}")
+                    result['failed_chunks'].append({
+                        'offset': offset,
+                        'rows': len(chunk),
+                        'error': str(e)
+                    })
+        
+        elapsed = time.perf_counter() - start
+        result['seconds'] = round(elapsed, 4)
+        result['rows_per_sec'] = round(result['rows'] / elapsed, 1) if elapsed else 0.0
+        
+        stats = self._bulk_stats.setdefault(operation, {'rows': 0, 'chunks': 0, 'failed_chunks': 0, 'seconds': 0.0})
+        stats['rows'] += result['rows']
+        stats['chunks'] += result['chunks']
+        stats['failed_chunks'] += len(result['failed_chunks'])
+        stats['seconds'] += elapsed
+        
+        logger.info(f"{operation}: {result['rows']}/{len(rows)} righe in {result['seconds']}s ({result['rows_per_sec']} righe/s)")
+        return result
+    
+    async def executemany(self, query: str, rows: list, chunk_size: Optional[int] = None) -> Optional[dict]:
+        """
+        Stessa query per molte righe (tuple posizionali o dict nominali)
+        
+        Usage:
+            await db.executemany("INSERT INTO t (a, b) VALUES (:a, :b)", [{'a': 1, 'b': 2}, ...])
+        """
+        rows = list(rows)
+        if rows and isinstance(rows[0], (dict, Mapping)):
+            compiled = self.compiler.compile(query)
+            query = compiled.sql
+            rows = [tuple([row[name] for name in compiled.names]) for row in rows]
+        
+        async def write(conn, chunk):
+            await conn.executemany(query, chunk)
+        
+        return await self._run_chunks('executemany', rows, chunk_size, write)
+    
+    async def copy_records_to_table(
+        self,
+        table: str,
+        records: list,
+        columns: list,
+        chunk_size: Optional[int] = None
+    ) -> Optional[dict]:
+        """Bulk insert con COPY binario AsyncPG (record come tuple nell'ordine di columns)"""
+        _check_identifiers(table, *columns)
+        
+        async def write(conn, chunk):
+            await conn.copy_records_to_table(table, records=chunk, columns=columns)
+        
+        return await self._run_chunks(f'copy {table}', list(records), chunk_size, write)
+    
+    async def upsert_many(
+        self,
+        table: str,
+        rows: list,
+        conflict_keys: list,
+        update_columns: Optional[list] = None,
+        chunk_size: Optional[int] = None
+    ) -> Optional[dict]:
+        """
+        INSERT ... ON CONFLICT (conflict_keys) DO UPDATE per molte righe
+        
+        Args:
+            rows: dict con le stesse chiavi (colonne)
+            conflict_keys: colonne del vincolo UNIQUE
+            update_columns: colonne da aggiornare (default: tutte tranne le chiavi;
+                            lista vuota = DO NOTHING)
+        """
+        rows = list(rows)
+        if not rows:
+            return await self._run_chunks(f'upsert {table}', rows, chunk_size, None)
+        
+        columns = list(rows[0].keys())
+        if update_columns is None:
+            update_columns = [c for c in columns if c not in conflict_keys]
+        _check_identifiers(table, *columns, *conflict_keys, *update_columns)
+        
+        if update_columns:
+            action = "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+        else:
+            action = "DO NOTHING"
+        
+        query = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(f'${i + 1}' for i in range(len(columns)))}) "
+            f"ON CONFLICT ({', '.join(conflict_keys)}) {action}"
+        )
+        records = [tuple([row[c] for c in columns]) for row in rows]
+        
+        async def write(conn, chunk):
+            await conn.executemany(query, chunk)
+        
+        return await self._run_chunks(f'upsert {table}', records, chunk_size, write)
+    
+    def bulk_stats(self) -> dict:
+        """Righe, chunk, errori e throughput cumulati per operazione bulk"""
+        return {
+            operation: {
+                **stats,
+                'seconds': round(stats['seconds'], 4),
+                'rows_per_sec': round(stats['rows'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+            }
+            for operation, stats in self._bulk_stats.items()
+        }
+
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$')
+
+
+def _check_identifiers(*names: str):
+    """Tabelle e colonne entrano nel testo SQL: solo identificatori semplici"""
+    for name in names:
+        if not isinstance(name, str) or not _IDENTIFIER.match(name):
+            raise ValueError(f"Identificatore SQL non valido: {name!r}")
 
 
 # Global database instance
@@ -196,6 +564,98 @@ def get_table(table_name: str) -> Any:
     return supabase.table(table_name)
 
 
+# ============================================================================
+# SUPABASE ASYNC - QUERY NON BLOCCANTI
+# ============================================================================
+# supabase-py esegue le chiamate HTTP verso PostgREST in modo sincrono:
+# chiamare .execute() dentro un handler async blocca l'event loop di uvicorn
+# per tutti gli utenti. Le query vengono quindi eseguite in un thread pool
+# limitato, con timeout per singola richiesta.
+
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "10"))
+SUPABASE_QUERY_TIMEOUT = float(os.getenv("SUPABASE_QUERY_TIMEOUT", "30"))
+
+_supabase_executor = ThreadPoolExecutor(
+    max_workers=SUPABASE_MAX_WORKERS,
+    thread_name_prefix="supabase"
+)
+
+
+async def run_in_supabase_pool(func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Esegue una chiamata sincrona supabase-py nel thread pool dedicato
+    
+    Args:
+        func: Funzione sincrona da eseguire
+        timeout: Secondi massimi di attesa (default SUPABASE_QUERY_TIMEOUT)
+    
+    Raises:
+        TimeoutError: se la chiamata supera il timeout
+    """
+    timeout = timeout or SUPABASE_QUERY_TIMEOUT
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_supabase_executor, partial(func, *args, **kwargs))
+    
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Query Supabase oltre il timeout di {timeout}s")
+        raise TimeoutError(f"Query Supabase oltre il timeout di {timeout}s")
+
+
+class AsyncQuery:
+    """
+    Wrapper non bloccante per i query builder di supabase-py
+    
+    Inoltra select/eq/order/... al builder originale e rende
+    awaitable solo execute(), eseguita in run_in_supabase_pool.
+    """
+    
+    def __init__(self, builder: Any, timeout: Optional[float] = None):
+        self._builder = builder
+        self._timeout = timeout
+    
+    def _wrap(self, value: Any) -> Any:
+        if hasattr(value, 'execute'):
+            return AsyncQuery(value, self._timeout)
+        return value
+    
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._builder, name)
+        
+        if callable(attr) and not hasattr(attr, 'execute'):
+            @wraps(attr)
+            def call(*args, **kwargs):
+                return self._wrap(attr(*args, **kwargs))
+            return call
+        
+        return self._wrap(attr)
+    
+    async def execute(self) -> Any:
+        """Esegue la query senza bloccare l'event loop"""
+        return await run_in_supabase_pool(self._builder.execute, timeout=self._timeout)
+
+
+def get_async_table(table_name: str, timeout: Optional[float] = None) -> AsyncQuery:
+    """
+    Get reference to a Supabase table con execute() non bloccante
+    
+    Usage:
+        from app.database import get_async_table
+        
+        users = get_async_table('users')
+        response = await users.select('*').eq('id', 1).execute()
+    
+    Args:
+        table_name: Name of the table (e.g., 'users', 'employees')
+        timeout: Timeout in secondi per la singola query
+    
+    Returns:
+        AsyncQuery sulla tabella
+    """
+    return AsyncQuery(get_table(table_name), timeout)
+
+
 async def get_db() -> 'Database':
     """
     Dependency for FastAPI routes
@@ -232,8 +692,9 @@ async def supabase_upload_file(bucket: str, path: str, file_data: bytes) -> str:
         raise Exception("Supabase not initialized")
     
     try:
-        supabase.storage.from_(bucket).upload(path, file_data)
-        url = supabase.storage.from_(bucket).get_public_url(path)
+        storage = supabase.storage.from_(bucket)
+        await run_in_supabase_pool(storage.upload, path, file_data)
+        url = storage.get_public_url(path)
         return url
     except Exception as e:
         logger.error(f"Upload error: {e}")
@@ -274,6 +735,7 @@ async def shutdown():
     """Run on application shutdown"""
     print("🔌 Disconnecting from database...")
     await db.disconnect()
+    _supabase_executor.shutdown(wait=False)
 
 
 # ============================================================================
@@ -281,8 +743,6 @@ async def shutdown():
 # ============================================================================
 
 if __name__ == "__main__":
-    import asyncio
-    
     async def test():
         print("=" * 60)
         print("🧪 TEST DATABASE CONNECTION")
@@ -7,10 +7,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from datetime import datetime
 import os
+import asyncio
 from dotenv import load_dotenv
 
 # Import database
 from app.database import db, startup as db_startup, shutdown as db_shutdown
+from app.parsers.fatturapa_pool import shutdown_parser_pool
+from app.services.payslip_pool import shutdown_payslip_pool
+from app.services.cash_ledger import CASH_LEDGER_CHECK_INTERVAL, cash_ledger_check_loop
 
 # Load environment
 load_dotenv()
@@ -109,6 +113,9 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "database": "connected" if db.pool else "disconnected",
+        "query_cache": db.query_stats(),
+        "bulk_writes": db.bulk_stats(),
+        "transactions": db.transaction_stats(),
         "services": {
             "hr": "online",
             "contabilità": "online",
@@ -145,6 +152,8 @@ async def startup_event():
     print("🚀 Sistema Gestionale Aziendale - Starting...")
     print("📊 Connecting to database...")
     await db_startup()
+    if CASH_LEDGER_CHECK_INTERVAL > 0 and db.pool:
+        app.state.cash_ledger_task = asyncio.create_task(cash_ledger_check_loop())
     print("✅ Server ready!")
 
 
@@ -152,7 +161,12 @@ async def startup_event():
 async def shutdown_event():
     """Run on shutdown"""
     print("👋 Shutting down...")
+    task = getattr(app.state, 'cash_ledger_task', None)
+    if task:
+        task.cancel()
     await db_shutdown()
+    shutdown_parser_pool()
+    shutdown_payslip_pool()
 
 
 # ============================================================================
@@ -3,13 +3,18 @@ Parser PDF Buste Paga Zucchetti
 Estrae: nome, cognome, netto, acconto, saldo, mansione, mese/anno
 """
 
-import pdfplumber
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
 import re
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 from datetime import datetime
 from decimal import Decimal
 import logging
 
+from app.services.pdf_text import estrai_testo
+
 logger = logging.getLogger(__name__)
 
 class BustaPagaParser:
@@ -40,6 +45,11 @@ class BustaPagaParser:
         Returns:
             Dict con dati estratti
         """
+        if not pdfplumber:
+            # Senza pdfplumber: testo PyPDF2 (cache per contenuto)
+            with open(pdf_path, 'rb') as f:
+                return self.parse_bytes(f.read())
+
         try:
             with pdfplumber.open(pdf_path) as pdf:
                 # Estrae testo da tutte le pagine
@@ -53,6 +63,19 @@ class BustaPagaParser:
             logger.error(f"Errore parsing PDF busta paga: {str(e)}")
             raise ValueError(f"Impossibile leggere il PDF: {str(e)}")
     
+    def parse_bytes(self, pdf_data: bytes) -> Dict:
+        """
+        Parse PDF busta paga dal contenuto (senza file temporaneo)
+        
+        Il testo arriva dalla cache per contenuto: se il registro formati
+        ha già letto il PDF non viene riaperto.
+        """
+        try:
+            return self._extract_data(estrai_testo(pdf_data, separatore='\n'))
+        except Exception as e:
+            logger.error(f"Errore parsing PDF busta paga: {str(e)}")
+            raise ValueError(f"Impossibile leggere il PDF: {str(e)}")
+    
     def _extract_data(self, text: str) -> Dict:
         """Estrae dati strutturati dal testo"""
         
@@ -176,18 +199,18 @@ class BustaPagaParser:
         return all(data.get(field) for field in required_fields)
 
 
-def parse_busta_paga(pdf_path: str) -> Dict:
+def parse_busta_paga(pdf: Union[str, bytes]) -> Dict:
     """
     Funzione helper per parsing PDF busta paga
     
     Args:
-        pdf_path: Path del file PDF
+        pdf: Path del file PDF o contenuto
         
     Returns:
         Dict con dati estratti
     """
     parser = BustaPagaParser()
-    data = parser.parse_pdf(pdf_path)
+    data = parser.parse_bytes(pdf) if isinstance(pdf, bytes) else parser.parse_pdf(pdf)
     
     if not parser.validate_data(data):
         raise ValueError("Dati estratti non validi o incompleti")
@@ -0,0 +1,209 @@
+"""
+Estrazione FatturaPA da upload: XML, firmati CAdES (.p7m) e archivi ZIP
+- ZIP letti membro per membro dal file di upload (nessuna copia su disco),
+  con limite di membri e di byte decompressi
+- .p7m: estrazione del contenuto firmato (eContent) dalla busta PKCS#7
+- Encoding letto dal prologo XML, con fallback per file dichiarati male
+"""
+import base64
+import os
+import re
+import zipfile
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+XML_DECLARATION = re.compile(rb'^<\?xml[^>]*encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+PEM_ARMOUR = re.compile(rb'-----BEGIN [A-Z0-9 ]+-----(.*?)-----END [A-Z0-9 ]+-----', re.DOTALL)
+
+# Limiti archivi ZIP caricati (membri e byte decompressi in totale)
+FATTURAPA_ZIP_MAX_MEMBERS = int(os.getenv("FATTURAPA_ZIP_MAX_MEMBERS", "20000"))
+FATTURAPA_ZIP_MAX_BYTES = int(os.getenv("FATTURAPA_ZIP_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# ============================================================================
+# ENCODING
+# ============================================================================
+
+def detect_xml_encoding(content: bytes) -> str:
+    """Encoding da BOM o prologo XML (default utf-8)"""
+    if content.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    if content.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return 'utf-16'
+
+    match = XML_DECLARATION.match(content[:200].lstrip())
+    if match:
+        return match.group(1).decode('ascii').lower()
+    return 'utf-8'
+
+
+def decode_xml(content: bytes) -> str:
+    """
+    Decodifica XML secondo il prologo
+
+    Alcuni gestionali dichiarano UTF-8 ma salvano in Windows-1252:
+    in quel caso si ripiega su cp1252.
+    """
+    encoding = detect_xml_encoding(content)
+    try:
+        return content.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        return content.decode('cp1252', errors='replace')
+
+
+# ============================================================================
+# P7M (CAdES / PKCS#7 SignedData)
+# ============================================================================
+
+def _read_tlv(data: bytes, pos: int) -> Tuple[int, bool, int, int, int]:
+    """
+    Legge un elemento BER/DER
+
+    Returns:
+        (tag, costruito, inizio contenuto, fine contenuto, posizione successiva)
+    """
+    tag = data[pos]
+    pos += 1
+    if tag & 0x1f == 0x1f:
+        while data[pos] & 0x80:
+            pos += 1
+        pos += 1
+
+    first = data[pos]
+    pos += 1
+    constructed = bool(tag & 0x20)
+
+    if first < 0x80:
+        return tag, constructed, pos, pos + first, pos + first
+
+    if first > 0x80:
+        n = first & 0x7f
+        length = int.from_bytes(data[pos:pos + n], 'big')
+        pos += n
+        return tag, constructed, pos, pos + length, pos + length
+
+    # Lunghezza indefinita (BER): figli fino a 00 00
+    child = pos
+    while data[child:child + 2] != b'\x00\x00':
+        child = _read_tlv(data, child)[4]
+    return tag, constructed, pos, child, child + 2
+
+
+def _children(data: bytes, tlv) -> Iterator[Tuple[int, bool, int, int, int]]:
+    _, _, pos, end, _ = tlv
+    while pos < end:
+        child = _read_tlv(data, pos)
+        yield child
+        pos = child[4]
+
+
+def _octet_string(data: bytes, tlv) -> bytes:
+    """OCTET STRING primitivo o costruito (a blocchi)"""
+    _, constructed, start, end, _ = tlv
+    if not constructed:
+        return data[start:end]
+    return b''.join(_octet_string(data, child) for child in _children(data, tlv))
+
+
+def _first(data: bytes, tlv, tag: int):
+    for child in _children(data, tlv):
+        if child[0] == tag:
+            return child
+    raise ValueError("File p7m non valido: struttura PKCS#7 inattesa")
+
+
+def extract_p7m(content: bytes) -> bytes:
+    """
+    Estrae il documento firmato da una busta CAdES (.p7m)
+
+    ContentInfo -> [0] SignedData -> encapContentInfo -> [0] eContent
+    Supporta DER, BER a lunghezza indefinita e p7m codificati in base64,
+    anche con armatura PEM (-----BEGIN PKCS7-----).
+    """
+    data = content
+    if data[:1] != b'\x30':
+        pem = PEM_ARMOUR.search(content)
+        if pem:
+            content = pem.group(1)
+        try:
+            data = base64.b64decode(b''.join(content.split()), validate=False)
+        except ValueError:
+            raise ValueError("File p7m non valido: né DER né base64")
+        if data[:1] != b'\x30':
+            raise ValueError("File p7m non valido: né DER né base64")
+
+    try:
+        content_info = _read_tlv(data, 0)
+        signed_data = _first(data, _first(data, content_info, 0xa0), 0x30)
+        encap = [child for child in _children(data, signed_data) if child[0] == 0x30][0]
+        econtent = _first(data, encap, 0xa0)
+        octets = next(child for child in _children(data, econtent) if child[0] in (0x04, 0x24))
+        return _octet_string(data, octets)
+    except (IndexError, StopIteration):
+        raise ValueError("File p7m non valido: contenuto firmato assente")
+
+
+# ============================================================================
+# UPLOAD -> PAYLOAD XML
+# ============================================================================
+
+def _payload(name: str, content: bytes) -> Tuple[str, Optional[bytes], Optional[str]]:
+    # Busta firmata solo per estensione: il contenuto non basta a riconoscerla
+    if name.lower().endswith('.p7m'):
+        try:
+            return name, extract_p7m(content), None
+        except ValueError as e:
+            return name, None, str(e)
+    return name, content, None
+
+
+def iter_upload_payloads(filename: str, fileobj: BinaryIO) -> Iterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    """
+    XML FatturaPA contenuti in un file caricato
+
+    Args:
+        filename: nome originale (.xml, .xml.p7m, .zip)
+        fileobj: file binario seekable (es. UploadFile.file)
+
+    Yields:
+        (nome, XML in bytes o None, errore o None), un membro alla volta;
+        oltre FATTURAPA_ZIP_MAX_MEMBERS membri o FATTURAPA_ZIP_MAX_BYTES
+        decompressi l'archivio è interrotto con un errore
+    """
+    if not filename.lower().endswith('.zip'):
+        yield _payload(filename, fileobj.read())
+        return
+
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        yield filename, None, f"Archivio ZIP non valido: {e}"
+        return
+
+    membri = 0
+    residui = FATTURAPA_ZIP_MAX_BYTES
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                continue
+
+            membri += 1
+            if membri > FATTURAPA_ZIP_MAX_MEMBERS:
+                yield filename, None, f"Archivio ZIP oltre {FATTURAPA_ZIP_MAX_MEMBERS} file: import interrotto"
+                return
+
+            name = f"{filename}/{info.filename}"
+            # Dimensione dichiarata e byte letti: l'intestazione può mentire
+            if info.file_size > residui:
+                yield name, None, f"Archivio ZIP oltre {FATTURAPA_ZIP_MAX_BYTES} byte decompressi: import interrotto"
+                return
+            try:
+                with archive.open(info) as member:
+                    content = member.read(residui + 1)
+            except Exception as e:
+                yield name, None, str(e)
+                continue
+            if len(content) > residui:
+                yield name, None, f"Archivio ZIP oltre {FATTURAPA_ZIP_MAX_BYTES} byte decompressi: import interrotto"
+                return
+
+            residui -= len(content)
+            yield _payload(name, content)
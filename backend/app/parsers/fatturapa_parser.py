@@ -1,118 +1,275 @@
 """
 Parser XML FatturaPA Ottimizzato per File Reali
 Analizzato da fatture reali: Google Cloud, TIM, ecc.
+
+Il namespace viene rilevato una sola volta per documento (nelle fatture
+reali di solito solo la root è qualificata, i figli no) e i campi sono
+letti con percorsi diretti precompilati, senza ricerche './/' ripetute.
+
+Per lotti molto grandi (molti FatturaElettronicaBody, decine di migliaia
+di DettaglioLinee) usare iter_fatture_xml: iterparse a memoria limitata.
 """
 import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+
+# Namespace FatturaPA standard
+FATTURAPA_NS = 'http://ivaservizi.agenziaentrate.gov.it/docs/xsd/fatture/v1.2'
+
+
+@lru_cache(maxsize=None)
+def _compile_path(prefix: str, path: str) -> str:
+    """'A/B' -> '{ns}A/{ns}B' (cache per coppia prefisso/percorso)"""
+    if not prefix:
+        return path
+    return '/'.join(prefix + part for part in path.split('/'))
+
+
+def _local(tag) -> str:
+    """Nome locale del tag, senza namespace"""
+    if isinstance(tag, str) and tag[:1] == '{':
+        return tag[tag.index('}') + 1:]
+    return tag
+
+
+def detect_prefix(root) -> str:
+    """Prefisso '{namespace}' usato dagli elementi figli della root ('' se assente)"""
+    for child in root:
+        tag = child.tag
+        if isinstance(tag, str) and tag[:1] == '{':
+            return tag[:tag.index('}') + 1]
+        return ''
+    return ''
+
+
+def _text(elem, prefix: str, path: str, default: str = '') -> str:
+    if elem is None:
+        return default
+    found = elem.find(_compile_path(prefix, path))
+    if found is not None and found.text:
+        return found.text.strip()
+    return default
+
+
+def _children_text(elem) -> Dict[str, str]:
+    """Testo dei figli diretti per nome locale (vince la prima occorrenza)"""
+    values = {}
+    for child in elem:
+        name = _local(child.tag)
+        if name not in values and child.text:
+            values[name] = child.text.strip()
+    return values
+
+
+def _to_float(value: Optional[str], default: float) -> float:
+    return float(value) if value else default
+
+
+def parse_header(header, prefix: str) -> Dict:
+    """Dati fornitore da FatturaElettronicaHeader"""
+    cedente = header.find(_compile_path(prefix, 'CedentePrestatore')) if header is not None else None
+
+    if cedente is None:
+        return {
+            'partita_iva_fornitore': None,
+            'ragione_sociale_fornitore': None
+        }
+
+    ragione = _text(cedente, prefix, 'DatiAnagrafici/Anagrafica/Denominazione')
+    if not ragione:
+        # Persona fisica: Nome + Cognome
+        ragione = ' '.join(filter(None, [
+            _text(cedente, prefix, 'DatiAnagrafici/Anagrafica/Nome'),
+            _text(cedente, prefix, 'DatiAnagrafici/Anagrafica/Cognome')
+        ]))
+
+    return {
+        'partita_iva_fornitore': _text(cedente, prefix, 'DatiAnagrafici/IdFiscaleIVA/IdCodice'),
+        'ragione_sociale_fornitore': ragione,
+        'indirizzo_fornitore': _text(cedente, prefix, 'Sede/Indirizzo') or None,
+        'cap_fornitore': _text(cedente, prefix, 'Sede/CAP') or None,
+        'comune_fornitore': _text(cedente, prefix, 'Sede/Comune') or None,
+        'provincia_fornitore': _text(cedente, prefix, 'Sede/Provincia') or None
+    }
+
+
+def parse_linea(det) -> Dict:
+    """Riga da DettaglioLinee (una sola scansione dei figli)"""
+    values = _children_text(det)
+    return {
+        'descrizione': values.get('Descrizione') or 'N/D',
+        'quantita': _to_float(values.get('Quantita'), 1.0),
+        'prezzo_unitario': _to_float(values.get('PrezzoUnitario'), 0.0),
+        'totale_riga': _to_float(values.get('PrezzoTotale'), 0.0),
+        'aliquota_iva': _to_float(values.get('AliquotaIVA'), 22.0)
+    }
+
+
+def parse_riepilogo(riepilogo) -> Dict:
+    """Blocco DatiRiepilogo (una sola scansione dei figli)"""
+    values = _children_text(riepilogo)
+    return {
+        'aliquota_iva': _to_float(values.get('AliquotaIVA'), 0.0),
+        'natura': values.get('Natura'),
+        'esigibilita_iva': values.get('EsigibilitaIVA'),
+        'imponibile': _to_float(values.get('ImponibileImporto'), 0.0),
+        'imposta': _to_float(values.get('Imposta'), 0.0)
+    }
+
+
+def parse_body(body, prefix: str) -> Dict:
+    """Dati documento, righe e totali da FatturaElettronicaBody"""
+    data = {
+        'numero_fattura': _text(body, prefix, 'DatiGenerali/DatiGeneraliDocumento/Numero'),
+        'data_fattura': _text(body, prefix, 'DatiGenerali/DatiGeneraliDocumento/Data'),
+        'data_scadenza': _text(body, prefix, 'DatiPagamento/DettaglioPagamento/DataScadenzaPagamento') or None,
+        'imponibile': 0.0,
+        'iva': 0.0,
+        'totale': 0.0,
+        'righe': [],
+        'riepilogo': []
+    }
+
+    beni_servizi = body.find(_compile_path(prefix, 'DatiBeniServizi'))
+    if beni_servizi is None:
+        return data
+
+    # Righe e riepiloghi sono figli diretti di DatiBeniServizi: un solo giro
+    for child in beni_servizi:
+        name = _local(child.tag)
+        if name == 'DettaglioLinee':
+            data['righe'].append(parse_linea(child))
+        elif name == 'DatiRiepilogo':
+            data['riepilogo'].append(parse_riepilogo(child))
+
+    _apply_totali(data)
+
+    return data
+
+
+def _apply_totali(data: Dict):
+    """Totali: somma di TUTTI i blocchi di riepilogo (uno per aliquota)"""
+    data['imponibile'] = round(sum(r['imponibile'] for r in data['riepilogo']), 2)
+    data['iva'] = round(sum(r['imposta'] for r in data['riepilogo']), 2)
+    data['totale'] = round(data['imponibile'] + data['iva'], 2)
+
 
 def parse_fattura_xml(xml_content):
     """
     Parse XML FatturaPA con gestione namespace automatica
-    
+
+    Args:
+        xml_content: str o bytes (con bytes l'encoding è letto dal prologo XML)
+
     Returns:
         dict con chiavi:
         - numero_fattura: str
         - data_fattura: str (YYYY-MM-DD)
+        - data_scadenza: str | None
         - partita_iva_fornitore: str
         - ragione_sociale_fornitore: str
-        - imponibile: float
-        - iva: float
+        - indirizzo_fornitore, cap_fornitore, comune_fornitore, provincia_fornitore
+        - imponibile: float (somma di tutti i DatiRiepilogo)
+        - iva: float (somma di tutti i DatiRiepilogo)
         - totale: float
         - righe: list[dict]
+        - riepilogo: list[dict] (uno per aliquota/natura)
     """
-    
+
     root = ET.fromstring(xml_content)
-    
-    # Namespace FatturaPA standard
-    ns = {'p': 'http://ivaservizi.agenziaentrate.gov.it/docs/xsd/fatture/v1.2'}
-    
-    def get_text(elem, path, default=''):
-        """Helper: cerca con e senza namespace"""
-        # Con namespace
-        result = elem.find(path, ns)
-        if result is not None and result.text:
-            return result.text.strip()
-        
-        # Senza namespace (fallback)
-        path_clean = path.replace('p:', '').replace('.//p:', './/')
-        result = elem.find(path_clean)
-        if result is not None and result.text:
-            return result.text.strip()
-        
-        return default
-    
-    # Inizializza risultato
+    prefix = detect_prefix(root)
+
     data = {
         'numero_fattura': None,
         'data_fattura': None,
-        'partita_iva_fornitore': None,
-        'ragione_sociale_fornitore': None,
+        'data_scadenza': None,
         'imponibile': 0.0,
         'iva': 0.0,
         'totale': 0.0,
-        'righe': []
+        'righe': [],
+        'riepilogo': []
     }
-    
+
     # ========== HEADER - FORNITORE ==========
-    cedente = root.find('.//p:CedentePrestatore', ns)
-    if cedente is None:
-        cedente = root.find('.//CedentePrestatore')
-    
-    if cedente is not None:
-        # P.IVA Fornitore
-        piva = get_text(cedente, './/p:IdFiscaleIVA/p:IdCodice')
-        if not piva:
-            piva = get_text(cedente, './/IdFiscaleIVA/IdCodice')
-        data['partita_iva_fornitore'] = piva
-        
-        # Ragione Sociale
-        ragione = get_text(cedente, './/p:Anagrafica/p:Denominazione')
-        if not ragione:
-            ragione = get_text(cedente, './/Anagrafica/Denominazione')
-        data['ragione_sociale_fornitore'] = ragione
-    
+    data.update(parse_header(root.find(_compile_path(prefix, 'FatturaElettronicaHeader')), prefix))
+
     # ========== BODY - FATTURA ==========
-    body = root.find('.//p:FatturaElettronicaBody', ns)
-    if body is None:
-        body = root.find('.//FatturaElettronicaBody')
-    
+    body = root.find(_compile_path(prefix, 'FatturaElettronicaBody'))
     if body is not None:
-        # Numero e Data Fattura
-        numero = get_text(body, './/p:DatiGeneraliDocumento/p:Numero')
-        if not numero:
-            numero = get_text(body, './/DatiGeneraliDocumento/Numero')
-        data['numero_fattura'] = numero
-        
-        data_fattura = get_text(body, './/p:DatiGeneraliDocumento/p:Data')
-        if not data_fattura:
-            data_fattura = get_text(body, './/DatiGeneraliDocumento/Data')
-        data['data_fattura'] = data_fattura
-        
-        # Righe Fattura
-        dettagli = body.findall('.//p:DettaglioLinee', ns)
-        if not dettagli:
-            dettagli = body.findall('.//DettaglioLinee')
-        
-        for det in dettagli:
-            riga = {
-                'descrizione': get_text(det, './/p:Descrizione') or get_text(det, './/Descrizione') or 'N/D',
-                'quantita': float(get_text(det, './/p:Quantita') or get_text(det, './/Quantita') or '1.0'),
-                'prezzo_unitario': float(get_text(det, './/p:PrezzoUnitario') or get_text(det, './/PrezzoUnitario') or '0.0'),
-                'totale_riga': float(get_text(det, './/p:PrezzoTotale') or get_text(det, './/PrezzoTotale') or '0.0'),
-                'aliquota_iva': float(get_text(det, './/p:AliquotaIVA') or get_text(det, './/AliquotaIVA') or '22.0')
-            }
-            data['righe'].append(riga)
-        
-        # Totali
-        riepilogo = body.find('.//p:DatiRiepilogo', ns)
-        if riepilogo is None:
-            riepilogo = body.find('.//DatiRiepilogo')
-        
-        if riepilogo is not None:
-            imponibile = get_text(riepilogo, './/p:ImponibileImporto') or get_text(riepilogo, './/ImponibileImporto')
-            imposta = get_text(riepilogo, './/p:Imposta') or get_text(riepilogo, './/Imposta')
-            
-            data['imponibile'] = float(imponibile) if imponibile else 0.0
-            data['iva'] = float(imposta) if imposta else 0.0
-            data['totale'] = data['imponibile'] + data['iva']
-    
+        data.update(parse_body(body, prefix))
+
     return data
+
+
+def parse_fattura_lotto(xml_content) -> List[Dict]:
+    """
+    Parse di un file FatturaPA con tutti i suoi corpi (lotto di fatture)
+
+    Returns:
+        lista di dict come parse_fattura_xml, uno per FatturaElettronicaBody
+    """
+    root = ET.fromstring(xml_content)
+    prefix = detect_prefix(root)
+
+    fornitore = parse_header(root.find(_compile_path(prefix, 'FatturaElettronicaHeader')), prefix)
+
+    return [
+        {**fornitore, **parse_body(body, prefix)}
+        for body in root.findall(_compile_path(prefix, 'FatturaElettronicaBody'))
+    ]
+
+
+def iter_fatture_xml(source) -> Iterator[Dict]:
+    """
+    Parse in streaming di un file FatturaPA (iterparse)
+
+    Restituisce un dict per ogni FatturaElettronicaBody appena chiuso.
+    Righe e riepiloghi vengono convertiti e rimossi dal DOM man mano,
+    così la memoria resta limitata anche con decine di migliaia di righe.
+
+    Args:
+        source: path o file binario (es. BytesIO, UploadFile.file)
+
+    Usage:
+        for fattura in iter_fatture_xml(BytesIO(content)):
+            ...
+    """
+    stack = []
+    prefix = None
+    fornitore = {'partita_iva_fornitore': None, 'ragione_sociale_fornitore': None}
+    righe = []
+    riepilogo = []
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if prefix is None and len(stack) == 1:
+                prefix = detect_prefix(stack[0])
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if not stack:
+            break
+
+        name = _local(elem.tag)
+        parent = stack[-1]
+
+        if name == 'DettaglioLinee':
+            righe.append(parse_linea(elem))
+        elif name == 'DatiRiepilogo':
+            riepilogo.append(parse_riepilogo(elem))
+        elif name == 'FatturaElettronicaHeader' and len(stack) == 1:
+            fornitore = parse_header(elem, prefix)
+        elif name == 'FatturaElettronicaBody' and len(stack) == 1:
+            data = parse_body(elem, prefix)
+            data['righe'] = righe
+            data['riepilogo'] = riepilogo
+            _apply_totali(data)
+            yield {**fornitore, **data}
+            righe = []
+            riepilogo = []
+        else:
+            continue
+
+        # L'elemento appena chiuso è l'ultimo figlio del padre: rimozione O(1)
+        del parent[-1]
@@ -0,0 +1,80 @@
+"""
+Parsing FatturaPA in parallelo su ProcessPoolExecutor
+Il parsing XML è lavoro CPU puro: lo si sposta fuori dall'event loop
+e lo si distribuisce sui core disponibili.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.parsers.fatturapa_archive import decode_xml
+from app.parsers.fatturapa_parser import parse_fattura_lotto
+
+# Numero processi (default: tutti i core)
+FATTURAPA_PARSER_WORKERS = int(os.getenv("FATTURAPA_PARSER_WORKERS", str(os.cpu_count() or 1)))
+# File per task inviato al pool (ammortizza il costo IPC su file piccoli)
+FATTURAPA_PARSER_CHUNK = int(os.getenv("FATTURAPA_PARSER_CHUNK", "16"))
+
+_parser_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parser_pool() -> ProcessPoolExecutor:
+    """Pool di processi condiviso, creato al primo utilizzo"""
+    global _parser_pool
+    if _parser_pool is None:
+        _parser_pool = ProcessPoolExecutor(max_workers=FATTURAPA_PARSER_WORKERS)
+    return _parser_pool
+
+
+def shutdown_parser_pool():
+    """Chiude il pool (da chiamare allo shutdown dell'app)"""
+    global _parser_pool
+    if _parser_pool is not None:
+        _parser_pool.shutdown(wait=False, cancel_futures=True)
+        _parser_pool = None
+
+
+def parse_file(filename: str, content: bytes) -> Tuple[str, Optional[List[dict]], Optional[str]]:
+    """
+    Parse di un singolo file (eseguito nel processo worker)
+    
+    Returns:
+        (filename, fatture del file o None, errore o None)
+        Un file può contenere un lotto di più fatture.
+    """
+    try:
+        return filename, parse_fattura_lotto(decode_xml(content)), None
+    except Exception as e:
+        return filename, None, str(e)
+
+
+def _parse_chunk(files: List[Tuple[str, bytes]]) -> List[Tuple[str, Optional[List[dict]], Optional[str]]]:
+    return [parse_file(filename, content) for filename, content in files]
+
+
+async def parse_files_parallel(
+    files: List[Tuple[str, bytes]],
+    pool: Optional[ProcessPoolExecutor] = None,
+    chunk_size: Optional[int] = None
+) -> AsyncIterator[Tuple[str, Optional[List[dict]], Optional[str]]]:
+    """
+    Distribuisce il parsing sul pool e restituisce i risultati man mano
+    che i worker li completano (ordine non garantito)
+    
+    Usage:
+        async for filename, fatture, errore in parse_files_parallel(files):
+            ...
+    """
+    pool = pool or get_parser_pool()
+    chunk_size = chunk_size or FATTURAPA_PARSER_CHUNK
+    loop = asyncio.get_running_loop()
+    
+    futures = [
+        loop.run_in_executor(pool, _parse_chunk, files[start:start + chunk_size])
+        for start in range(0, len(files), chunk_size)
+    ]
+    
+    for future in asyncio.as_completed(futures):
+        for result in await future:
+            yield result
@@ -1,94 +1,37 @@
 """Router Contabilità Completa"""
-from fastapi import APIRouter, HTTPException, Query, Form
-from typing import Optional
+from fastapi import APIRouter, Body, HTTPException, Query, Form
+from typing import List, Optional
 from datetime import datetime, date
 from decimal import Decimal
 import logging
-from app.database import get_table
+from app.database import db, get_async_table
+from app.services.balance_engine import BalanceEngine
+from app.services.tenant_provisioning import TenantProvisioning
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.post("/popola-piano-conti")
 async def popola_piano_conti(id_utente: int = Form(...)):
-    """Popola piano dei conti con struttura base per HORECA"""
+    """
+    Popola piano dei conti con struttura base per HORECA
+    
+    Idempotente: su un piano parziale crea solo i conti mancanti.
+    """
     try:
-        piano_table = get_table('piano_dei_conti')
+        if db.pool:
+            risultato = await TenantProvisioning.provisiona([id_utente])
+            conti_creati = risultato[0]['conti_creati']
+        else:
+            conti_creati = await TenantProvisioning.provisiona_supabase(id_utente)
         
-        # Verifica se già popolato
-        existing = piano_table.select('id').eq('id_utente', id_utente).execute()
-        if existing.data and len(existing.data) > 0:
+        if conti_creati == 0:
             raise HTTPException(status_code=400, detail="Piano dei conti già popolato")
         
-        # Conti da inserire
-        conti = [
-            # ATTIVO - IMMOBILIZZAZIONI
-            ('1001', 'Immobili', 'attivo', 'immobilizzazioni'),
-            ('1002', 'Impianti e macchinari', 'attivo', 'immobilizzazioni'),
-            ('1003', 'Attrezzature', 'attivo', 'immobilizzazioni'),
-            ('1004', 'Mobili e arredi', 'attivo', 'immobilizzazioni'),
-            ('1005', 'Automezzi', 'attivo', 'immobilizzazioni'),
-            # ATTIVO - CIRCOLANTE
-            ('2001', 'Cassa contanti', 'attivo', 'liquidita'),
-            ('2002', 'Banca c/c', 'attivo', 'liquidita'),
-            ('2003', 'POS da incassare', 'attivo', 'liquidita'),
-            ('2010', 'Crediti clienti', 'attivo', 'crediti'),
-            ('2020', 'Rimanenze materie prime', 'attivo', 'rimanenze'),
-            ('2021', 'Rimanenze prodotti finiti', 'attivo', 'rimanenze'),
-            ('2030', 'IVA a credito', 'attivo', 'crediti_tributari'),
-            # PASSIVO
-            ('3001', 'Capitale sociale', 'passivo', 'patrimonio_netto'),
-            ('3002', 'Utili esercizi precedenti', 'passivo', 'patrimonio_netto'),
-            ('3003', 'Utile/Perdita esercizio', 'passivo', 'patrimonio_netto'),
-            ('4001', 'Debiti fornitori', 'passivo', 'debiti'),
-            ('4002', 'Debiti banche', 'passivo', 'debiti'),
-            ('4010', 'Debiti dipendenti', 'passivo', 'debiti'),
-            ('4020', 'Debiti tributari', 'passivo', 'debiti_tributari'),
-            ('4021', 'IVA a debito', 'passivo', 'debiti_tributari'),
-            ('4030', 'TFR', 'passivo', 'debiti'),
-            # COSTI
-            ('5001', 'Materie prime', 'costo', 'costi_acquisti'),
-            ('5002', 'Ingredienti freschi', 'costo', 'costi_acquisti'),
-            ('5003', 'Packaging', 'costo', 'costi_acquisti'),
-            ('5101', 'Energia elettrica', 'costo', 'costi_servizi'),
-            ('5102', 'Gas', 'costo', 'costi_servizi'),
-            ('5103', 'Acqua', 'costo', 'costi_servizi'),
-            ('5105', 'Manutenzioni', 'costo', 'costi_servizi'),
-            ('5106', 'Consulenze', 'costo', 'costi_servizi'),
-            ('5107', 'Pubblicità', 'costo', 'costi_servizi'),
-            ('5108', 'Spese bancarie', 'costo', 'costi_servizi'),
-            ('5109', 'Affitto', 'costo', 'costi_servizi'),
-            ('5110', 'Assicurazioni', 'costo', 'costi_servizi'),
-            ('5111', 'Telefono internet', 'costo', 'costi_servizi'),
-            ('5201', 'Stipendi salari', 'costo', 'costi_personale'),
-            ('5202', 'INPS', 'costo', 'costi_personale'),
-            ('5203', 'INAIL', 'costo', 'costi_personale'),
-            ('5204', 'TFR maturato', 'costo', 'costi_personale'),
-            ('5301', 'Ammortamenti', 'costo', 'ammortamenti'),
-            ('5401', 'Imposte tasse', 'costo', 'altri_costi'),
-            ('5404', 'Interessi passivi', 'costo', 'altri_costi'),
-            # RICAVI
-            ('7001', 'Vendite pasticceria', 'ricavo', 'ricavi_vendite'),
-            ('7002', 'Vendite torte', 'ricavo', 'ricavi_vendite'),
-            ('7003', 'Vendite caffetteria', 'ricavo', 'ricavi_vendite'),
-        ]
-        
-        for codice, descrizione, tipo, categoria in conti:
-            piano_table.insert({
-                'id_utente': id_utente,
-                'codice_conto': codice,
-                'descrizione': descrizione,
-                'tipo': tipo,
-                'categoria': categoria,
-                'saldo': 0,
-                'attivo': True,
-                'created_at': datetime.now().isoformat()
-            }).execute()
-        
         return {
             "success": True,
-            "message": f"Piano dei conti popolato con {len(conti)} conti",
-            "conti_creati": len(conti)
+            "message": f"Piano dei conti popolato con {conti_creati} conti",
+            "conti_creati": conti_creati
         }
     except HTTPException:
         raise
@@ -96,15 +39,30 @@ async def popola_piano_conti(id_utente: int = Form(...)):
         logger.error(f"Errore popola_piano_conti: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/provisioning")
+async def provisioning_tenant(id_utenti: Optional[List[int]] = Body(None, embed=True)):
+    """
+    Provisioning massivo dati di default (piano dei conti, aggregati dashboard)
+    
+    id_utenti omesso = tutti gli utenti senza piano dei conti.
+    """
+    try:
+        return {"success": True, **await TenantProvisioning.provisiona_batch(id_utenti)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Errore provisioning_tenant: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/piano-conti")
 async def get_piano_conti(id_utente: int = Query(...), tipo: Optional[str] = None):
     """Ottieni piano dei conti"""
     try:
-        piano_table = get_table('piano_dei_conti')
+        piano_table = get_async_table('piano_dei_conti')
         query = piano_table.select('*').eq('id_utente', id_utente).eq('attivo', True)
         if tipo:
             query = query.eq('tipo', tipo)
-        result = query.order('codice_conto').execute()
+        result = await query.order('codice_conto').execute()
         return {"success": True, "data": result.data if result.data else []}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -121,16 +79,33 @@ async def registra_movimento(
 ):
     """Registra movimento contabile"""
     try:
-        mov_table = get_table('movimenti_contabili')
-        piano_table = get_table('piano_dei_conti')
+        if tipo_movimento not in ('dare', 'avere'):
+            raise HTTPException(status_code=400, detail="tipo_movimento deve essere 'dare' o 'avere'")
+        
+        if db.pool:
+            try:
+                data_mov = date.fromisoformat(data_movimento)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="data_movimento non valida (YYYY-MM-DD)")
+            try:
+                movimento = await BalanceEngine.registra_movimento(
+                    id_utente, data_mov, codice_conto,
+                    descrizione, tipo_movimento, importo, documento_riferimento
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            return {"success": True, "message": "Movimento registrato", "data": movimento}
+        
+        mov_table = get_async_table('movimenti_contabili')
+        piano_table = get_async_table('piano_dei_conti')
         
         # Verifica conto esiste
-        conto = piano_table.select('*').eq('id_utente', id_utente).eq('codice_conto', codice_conto).execute()
+        conto = await piano_table.select('saldo').eq('id_utente', id_utente).eq('codice_conto', codice_conto).execute()
         if not conto.data:
             raise HTTPException(status_code=404, detail="Conto non trovato")
         
         # Registra movimento
-        result = mov_table.insert({
+        result = await mov_table.insert({
             'id_utente': id_utente,
             'data_movimento': data_movimento,
             'codice_conto': codice_conto,
@@ -142,74 +117,143 @@ async def registra_movimento(
         }).execute()
         
         # Aggiorna saldo conto
-        saldo_attuale = float(conto.data[0].get('saldo', 0))
+        saldo_attuale = float(conto.data[0].get('saldo') or 0)
         nuovo_saldo = saldo_attuale + importo if tipo_movimento == 'dare' else saldo_attuale - importo
-        piano_table.update({'saldo': nuovo_saldo}).eq('id_utente', id_utente).eq('codice_conto', codice_conto).execute()
+        await piano_table.update({'saldo': nuovo_saldo}).eq('id_utente', id_utente).eq('codice_conto', codice_conto).execute()
         
         return {"success": True, "message": "Movimento registrato", "data": result.data[0] if result.data else None}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/bilancio/stato-patrimoniale")
-async def stato_patrimoniale(id_utente: int = Query(...), data_riferimento: Optional[str] = None):
-    """Genera stato patrimoniale"""
+async def stato_patrimoniale(
+    id_utente: int = Query(...),
+    data_riferimento: Optional[str] = None,
+    anni_confronto: int = Query(default=0, ge=0, le=10)
+):
+    """
+    Genera stato patrimoniale a una data
+    
+    Saldi da saldi_conti_mensili + movimenti del mese della data;
+    anni_confronto aggiunge la stessa data degli anni precedenti.
+    """
     try:
-        piano_table = get_table('piano_dei_conti')
-        data_rif = data_riferimento or datetime.now().date().isoformat()
+        data_rif = date.fromisoformat(data_riferimento) if data_riferimento else date.today()
         
-        conti = piano_table.select('*').eq('id_utente', id_utente).eq('attivo', True).execute()
-        if not conti.data:
+        if db.pool:
+            bilancio = await BalanceEngine.stato_patrimoniale(id_utente, data_rif, anni_confronto)
+        else:
+            bilancio = await _stato_patrimoniale_piano(id_utente, data_rif)
+        if bilancio is None:
             raise HTTPException(status_code=404, detail="Piano dei conti non trovato")
         
-        attivo_totale = sum(float(c.get('saldo', 0)) for c in conti.data if c['tipo'] == 'attivo')
-        passivo_totale = sum(float(c.get('saldo', 0)) for c in conti.data if c['tipo'] == 'passivo')
-        
-        return {
-            "success": True,
-            "data": {
-                "data_riferimento": data_rif,
-                "attivo": {
-                    "totale": round(attivo_totale, 2),
-                    "dettaglio": [c for c in conti.data if c['tipo'] == 'attivo']
-                },
-                "passivo": {
-                    "totale": round(passivo_totale, 2),
-                    "dettaglio": [c for c in conti.data if c['tipo'] == 'passivo']
-                },
-                "pareggio": round(attivo_totale - passivo_totale, 2)
-            }
-        }
+        return {"success": True, "data": bilancio}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/bilancio/conto-economico")
-async def conto_economico(id_utente: int = Query(...), anno: int = Query(...)):
-    """Genera conto economico annuale"""
+async def conto_economico(
+    id_utente: int = Query(...),
+    anno: int = Query(...),
+    anni_confronto: int = Query(default=0, ge=0, le=10),
+    periodicita: str = Query(default='mensile')
+):
+    """
+    Genera conto economico annuale
+    
+    Totali per periodo (mensile/trimestrale/annuale) e, con anni_confronto,
+    gli esercizi precedenti nella stessa risposta.
+    """
     try:
-        piano_table = get_table('piano_dei_conti')
-        
-        conti = piano_table.select('*').eq('id_utente', id_utente).eq('attivo', True).execute()
-        if not conti.data:
-            raise HTTPException(status_code=404, detail="Piano dei conti non trovato")
-        
-        ricavi_totali = sum(float(c.get('saldo', 0)) for c in conti.data if c['tipo'] == 'ricavo')
-        costi_totali = sum(float(c.get('saldo', 0)) for c in conti.data if c['tipo'] == 'costo')
-        utile = ricavi_totali - costi_totali
+        if db.pool:
+            conto = await BalanceEngine.conto_economico(id_utente, anno, anni_confronto, periodicita)
+        else:
+            conto = await _conto_economico_movimenti(id_utente, anno)
         
-        return {
-            "success": True,
-            "data": {
-                "anno": anno,
-                "ricavi": {
-                    "totale": round(ricavi_totali, 2),
-                    "dettaglio": [c for c in conti.data if c['tipo'] == 'ricavo']
-                },
-                "costi": {
-                    "totale": round(costi_totali, 2),
-                    "dettaglio": [c for c in conti.data if c['tipo'] == 'costo']
-                },
-                "utile_perdita": round(utile, 2)
-            }
-        }
+        return {"success": True, "data": conto}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bilancio/ricostruisci")
+async def ricostruisci_saldi(id_utente: Optional[int] = Query(None)):
+    """Ricalcola i saldi mensili dai movimenti e riallinea il piano dei conti"""
+    try:
+        return {"success": True, **await BalanceEngine.ricostruisci(id_utente)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
+        logger.error(f"Errore ricostruisci_saldi: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+# Saldi nel segno naturale: avere - dare per passivo e ricavi
+SEGNO_NATURALE = {'attivo': 1, 'costo': 1, 'passivo': -1, 'ricavo': -1}
+
+async def _stato_patrimoniale_piano(id_utente: int, data_rif: date) -> Optional[dict]:
+    """Fallback via Supabase: saldi correnti del piano dei conti (data ignorata)"""
+    piano_table = get_async_table('piano_dei_conti')
+    conti = await piano_table.select('codice_conto, descrizione, tipo, categoria, saldo')\
+        .eq('id_utente', id_utente).eq('attivo', True).order('codice_conto').execute()
+    if not conti.data:
+        return None
+    
+    sezioni = {'attivo': [], 'passivo': [], 'costo': [], 'ricavo': []}
+    for c in conti.data:
+        if c['tipo'] in sezioni:
+            sezioni[c['tipo']].append({**c, 'saldo': round(SEGNO_NATURALE[c['tipo']] * float(c.get('saldo') or 0), 2)})
+    
+    totali = {tipo: round(sum(c['saldo'] for c in voci), 2) for tipo, voci in sezioni.items()}
+    risultato = round(totali['ricavo'] - totali['costo'], 2)
+    return {
+        "data_riferimento": data_rif.isoformat(),
+        "attivo": {"totale": totali['attivo'], "dettaglio": sezioni['attivo']},
+        "passivo": {"totale": totali['passivo'], "dettaglio": sezioni['passivo']},
+        "risultato_esercizio": risultato,
+        "pareggio": round(totali['attivo'] - totali['passivo'] - risultato, 2),
+        "confronto": []
+    }
+
+async def _conto_economico_movimenti(id_utente: int, anno: int) -> dict:
+    """Fallback via Supabase: movimenti dell'anno aggregati per conto"""
+    piano_table = get_async_table('piano_dei_conti')
+    mov_table = get_async_table('movimenti_contabili')
+    
+    conti = await piano_table.select('codice_conto, descrizione, tipo, categoria')\
+        .eq('id_utente', id_utente).in_('tipo', ['costo', 'ricavo']).execute()
+    movimenti = await mov_table.select('codice_conto, tipo_movimento, importo')\
+        .eq('id_utente', id_utente)\
+        .gte('data_movimento', f"{anno}-01-01")\
+        .lt('data_movimento', f"{anno + 1}-01-01")\
+        .execute()
+    
+    saldi = {c['codice_conto']: {**c, 'saldo': 0.0} for c in (conti.data or [])}
+    for m in movimenti.data or []:
+        conto = saldi.get(m['codice_conto'])
+        if conto:
+            importo = float(m.get('importo') or 0)
+            conto['saldo'] += SEGNO_NATURALE[conto['tipo']] * (importo if m['tipo_movimento'] == 'dare' else -importo)
+    
+    dettaglio = {'ricavo': [], 'costo': []}
+    for conto in saldi.values():
+        if conto['saldo']:
+            dettaglio[conto['tipo']].append({**conto, 'saldo': round(conto['saldo'], 2)})
+    
+    ricavi = round(sum(c['saldo'] for c in dettaglio['ricavo']), 2)
+    costi = round(sum(c['saldo'] for c in dettaglio['costo']), 2)
+    return {
+        "anno": anno,
+        "ricavi": {"totale": ricavi, "dettaglio": dettaglio['ricavo']},
+        "costi": {"totale": costi, "dettaglio": dettaglio['costo']},
+        "utile_perdita": round(ricavi - costi, 2),
+        "periodi": [],
+        "confronto": []
+    }
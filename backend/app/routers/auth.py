@@ -9,6 +9,8 @@ import os
 from datetime import datetime, timedelta
 from supabase import create_client
 
+from app.database import run_in_supabase_pool
+
 router = APIRouter(tags=["Authentication"])
 
 # Inizializza Supabase
@@ -25,7 +27,9 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             raise HTTPException(status_code=500, detail="Database not configured")
         
         # Cerca utente
-        result = supabase.table('users').select('*').eq('email', form_data.username).execute()
+        result = await run_in_supabase_pool(
+            supabase.table('users').select('*').eq('email', form_data.username).execute
+        )
         
         if not result.data:
             raise HTTPException(status_code=401, detail="Credenziali non valide")
@@ -71,7 +75,9 @@ async def login_json(email: str, password: str):
         if not supabase:
             raise HTTPException(status_code=500, detail="Database not configured")
         
-        result = supabase.table('users').select('*').eq('email', email).execute()
+        result = await run_in_supabase_pool(
+            supabase.table('users').select('*').eq('email', email).execute
+        )
         
         if not result.data:
             raise HTTPException(status_code=401, detail="Credenziali non valide")
@@ -7,7 +7,7 @@ from typing import Optional
 from datetime import datetime
 import logging
 
-from app.database import get_table
+from app.database import get_async_table
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -20,7 +20,7 @@ async def get_transfers(
 ):
     """Ottieni lista bonifici"""
     try:
-        bonifici_table = get_table('bonifici')
+        bonifici_table = get_async_table('bonifici')
         query = bonifici_table.select('*').eq('id_utente', id_utente)
         
         if collegato is not None:
@@ -30,7 +30,7 @@ async def get_transfers(
             query = query.gte('data_bonifico', f'{anno}-01-01')\
                         .lte('data_bonifico', f'{anno}-12-31')
         
-        result = query.order('data_bonifico', desc=True).execute()
+        result = await query.order('data_bonifico', desc=True).execute()
         
         return {
             "success": True,
@@ -54,7 +54,7 @@ async def create_transfer(
 ):
     """Crea nuovo bonifico"""
     try:
-        bonifici_table = get_table('bonifici')
+        bonifici_table = get_async_table('bonifici')
         
         bonifico_data = {
             'id_utente': id_utente,
@@ -68,11 +68,11 @@ async def create_transfer(
             'created_at': datetime.now().isoformat()
         }
         
-        result = bonifici_table.insert(bonifico_data).execute()
+        result = await bonifici_table.insert(bonifico_data).execute()
         
         if id_fattura:
-            fatture_table = get_table('fatture')
-            fatture_table.update({
+            fatture_table = get_async_table('fatture')
+            await fatture_table.update({
                 'metodo_pagamento': 'banca_bonifico',
                 'pagata': True,
                 'data_pagamento': datetime.now().isoformat()
@@ -105,7 +105,7 @@ async def import_transfers_excel(
         if not all(col in df.columns for col in required_cols):
             raise HTTPException(status_code=400, detail=f"Colonne richieste: {required_cols}")
         
-        bonifici_table = get_table('bonifici')
+        bonifici_table = get_async_table('bonifici')
         imported = 0
         
         for _, row in df.iterrows():
@@ -115,7 +115,7 @@ async def import_transfers_excel(
             if importo > 0:
                 continue
             
-            bonifici_table.insert({
+            await bonifici_table.insert({
                 'id_utente': id_utente,
                 'data_bonifico': data,
                 'importo': abs(importo),
@@ -157,8 +157,8 @@ async def delete_transfer(id_bonifico: int, id_utente: int = Query(...)):
         if not can_delete:
             raise HTTPException(status_code=400, detail=message)
         
-        bonifici_table = get_table('bonifici')
-        bonifici_table.delete().eq('id', id_bonifico).eq('id_utente', id_utente).execute()
+        bonifici_table = get_async_table('bonifici')
+        await bonifici_table.delete().eq('id', id_bonifico).eq('id_utente', id_utente).execute()
         
         return {
             "success": True,
@@ -9,9 +9,14 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from typing import Optional, List
 from datetime import date, datetime
 from decimal import Decimal
+from io import BytesIO
 from pydantic import BaseModel
 import pandas as pd
 import openpyxl
+import os
+
+from app.services.bonifici_import_service import BonificiImportService
+from app.services.bonifici_reconciliation_service import BonificiReconciliationService
 
 router = APIRouter(prefix="/api/bonifici", tags=["Bonifici"])
 
@@ -102,132 +107,15 @@ async def import_bonifici_xls(
     
     # Parse Excel
     try:
-        df = pd.read_excel(file_path)
+        df = pd.read_excel(BytesIO(content))
     except Exception as e:
         raise HTTPException(400, f"Errore lettura Excel: {str(e)}")
     
-    # Identifica colonne
-    col_data = None
-    col_beneficiario = None
-    col_iban = None
-    col_importo = None
-    col_causale = None
-    
-    for col in df.columns:
-        col_lower = col.lower()
-        
-        if 'data' in col_lower and not col_data:
-            col_data = col
-        elif 'beneficiario' in col_lower or 'destinatario' in col_lower:
-            col_beneficiario = col
-        elif 'iban' in col_lower or 'conto' in col_lower:
-            col_iban = col
-        elif 'importo' in col_lower or 'dare' in col_lower or 'avere' in col_lower:
-            col_importo = col
-        elif 'causale' in col_lower or 'descrizione' in col_lower:
-            col_causale = col
-    
-    if not all([col_data, col_beneficiario, col_importo]):
-        raise HTTPException(400, "Colonne obbligatorie non trovate (Data, Beneficiario, Importo)")
-    
-    # Import bonifici
-    imported = 0
-    skipped = 0
-    errors = []
-    
-    for idx, row in df.iterrows():
-        try:
-            data_bonifico = pd.to_datetime(row[col_data]).date()
-            beneficiario = str(row[col_beneficiario])
-            importo = Decimal(str(row[col_importo]).replace(',', '.'))
-            
-            # Solo uscite (bonifici)
-            if importo >= 0:
-                skipped += 1
-                continue
-            
-            importo = abs(importo)
-            
-            iban = str(row[col_iban]) if col_iban and pd.notna(row[col_iban]) else None
-            causale = str(row[col_causale]) if col_causale and pd.notna(row[col_causale]) else ''
-            
-            # Verifica se esiste già
-            existing = await db.fetch_one("""
-                SELECT id FROM bonifici
-                WHERE data_bonifico = :data
-                AND beneficiario = :benef
-                AND importo = :importo
-            """, {
-                'data': data_bonifico,
-                'benef': beneficiario,
-                'importo': importo
-            })
-            
-            if existing:
-                skipped += 1
-                continue
-            
-            # Identifica tipo (dipendente o fornitore)
-            tipo = 'altro'
-            riferimento_id = None
-            
-            # Cerca dipendente per nome
-            dipendente = await db.fetch_one("""
-                SELECT id FROM employees
-                WHERE LOWER(CONCAT(nome, ' ', cognome)) = LOWER(:nome)
-                OR LOWER(CONCAT(cognome, ' ', nome)) = LOWER(:nome)
-                LIMIT 1
-            """, {'nome': beneficiario.strip()})
-            
-            if dipendente:
-                tipo = 'dipendente'
-                riferimento_id = dipendente['id']
-            else:
-                # Cerca fornitore
-                fornitore = await db.fetch_one("""
-                    SELECT id FROM fornitori
-                    WHERE LOWER(ragione_sociale) = LOWER(:nome)
-                    LIMIT 1
-                """, {'nome': beneficiario.strip()})
-                
-                if fornitore:
-                    tipo = 'fornitore'
-                    riferimento_id = fornitore['id']
-            
-            # Inserisci bonifico
-            await db.execute("""
-                INSERT INTO bonifici (
-                    data_bonifico, beneficiario, iban_beneficiario,
-                    importo, causale, tipo, riferimento_id,
-                    file_import_path, riconciliato
-                ) VALUES (
-                    :data, :benef, :iban,
-                    :importo, :causale, :tipo, :rif,
-                    :file, false
-                )
-            """, {
-                'data': data_bonifico,
-                'benef': beneficiario,
-                'iban': iban,
-                'importo': importo,
-                'causale': causale,
-                'tipo': tipo,
-                'rif': riferimento_id,
-                'file': file_path
-            })
-            
-            imported += 1
-            
-        except Exception as e:
-            errors.append(f"Riga {idx + 2}: {str(e)}")
-            skipped += 1
-    
-    return {
-        'success': True,
-        'imported': imported,
-        'skipped': skipped,
-        'errors': errors
-    }
+    # Import vettoriale: normalizzazione in blocco, match in memoria, COPY
+    try:
+        return await BonificiImportService.import_estratto(db, df, file_path)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 
 @router.get("/")
@@ -377,58 +265,19 @@ async def riconcilia_bonifico(
 
 @router.get("/da-riconciliare")
 async def bonifici_da_riconciliare(
+    giorni_massimi: Optional[int] = None,
     current_user = Depends(get_current_user),
     db = Depends(get_db)
 ):
-    """Lista bonifici da riconciliare"""
-    
-    bonifici = await db.fetch_all("""
-        SELECT * FROM bonifici
-        WHERE riconciliato = false
-        ORDER BY data_bonifico DESC
-    """)
-    
-    # Per ogni bonifico, cerca possibili match
-    risultati = []
+    """
+    Lista bonifici da riconciliare con possibili match
     
-    for bonifico in bonifici:
-        matches = []
-        
-        # Se tipo dipendente, cerca buste paga
-        if bonifico['tipo'] == 'dipendente' and bonifico['riferimento_id']:
-            payslips = await db.fetch_all("""
-                SELECT p.*, e.nome, e.cognome
-                FROM payslips p
-                JOIN employees e ON p.employee_id = e.id
-                WHERE e.id = :emp_id
-                AND p.stato_pagamento = 'da_pagare'
-                AND ABS(p.netto_in_busta - :importo) < 10
-                ORDER BY p.periodo DESC
-                LIMIT 3
-            """, {
-                'emp_id': bonifico['riferimento_id'],
-                'importo': bonifico['importo']
-            })
-            
-            for ps in payslips:
-                matches.append({
-                    'tipo': 'payslip',
-                    'id': ps['id'],
-                    'descrizione': f"Busta paga {ps['periodo']} - {ps['nome']} {ps['cognome']}",
-                    'importo': float(ps['netto_in_busta']),
-                    'differenza': float(abs(ps['netto_in_busta'] - bonifico['importo']))
-                })
-        
-        risultati.append({
-            'bonifico': dict(bonifico),
-            'possibili_match': matches
-        })
+    Bonifici e documenti aperti (buste paga, fatture) caricati in due query,
+    match in memoria per soggetto, importo ± tolleranza e vicinanza date.
+    giorni_massimi (opzionale) esclude i documenti più distanti dal bonifico.
+    """
     
-    return {
-        'success': True,
-        'bonifici_da_riconciliare': len(bonifici),
-        'risultati': risultati
-    }
+    return await BonificiReconciliationService.suggerisci(db, giorni_massimi=giorni_massimi)
 
 
 @router.get("/statistiche")
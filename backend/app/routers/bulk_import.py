@@ -8,7 +8,8 @@ import logging
 from io import BytesIO
 from datetime import datetime
 
-from app.database import get_table
+from app.database import get_async_table
+from app.services.name_index import name_index
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -37,7 +38,7 @@ async def bulk_import_fornitori(
         else:
             raise HTTPException(status_code=400, detail="Formato file non supportato. Usa .xlsx o .xls")
         
-        fornitori_table = get_table('fornitori')
+        fornitori_table = get_async_table('fornitori')
         
         imported = 0
         errors = []
@@ -53,7 +54,7 @@ async def bulk_import_fornitori(
                     continue
                 
                 # Verifica se esiste già
-                existing = fornitori_table.select('*')\
+                existing = await fornitori_table.select('*')\
                     .eq('id_utente', id_utente)\
                     .eq('partita_iva', piva)\
                     .execute()
@@ -82,7 +83,9 @@ async def bulk_import_fornitori(
                 }
                 
                 # Insert
-                fornitori_table.insert(data).execute()
+                result = await fornitori_table.insert(data).execute()
+                if result.data:
+                    name_index.add_fornitore(result.data[0])
                 imported += 1
                 
             except Exception as e:
@@ -117,7 +120,7 @@ async def bulk_import_corrispettivi(
         contents = await file.read()
         df = pd.read_excel(BytesIO(contents), engine='openpyxl')
         
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         
         imported = 0
         errors = []
@@ -144,7 +147,7 @@ async def bulk_import_corrispettivi(
                     'created_at': datetime.now().isoformat()
                 }
                 
-                cassa_table.insert(movimento_data).execute()
+                await cassa_table.insert(movimento_data).execute()
                 imported += 1
                 
             except Exception as e:
@@ -172,7 +175,7 @@ async def bulk_import_pos(
         contents = await file.read()
         df = pd.read_excel(BytesIO(contents), engine='openpyxl')
         
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         imported = 0
         errors = []
         skipped = 0
@@ -195,7 +198,7 @@ async def bulk_import_pos(
                     'created_at': datetime.now().isoformat()
                 }
                 
-                cassa_table.insert(movimento_data).execute()
+                await cassa_table.insert(movimento_data).execute()
                 imported += 1
                 
             except Exception as e:
@@ -223,7 +226,7 @@ async def bulk_import_versamenti(
         contents = await file.read()
         df = pd.read_excel(BytesIO(contents), engine='openpyxl')
         
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         imported = 0
         errors = []
         skipped = 0
@@ -246,7 +249,7 @@ async def bulk_import_versamenti(
                     'created_at': datetime.now().isoformat()
                 }
                 
-                cassa_table.insert(movimento_data).execute()
+                await cassa_table.insert(movimento_data).execute()
                 imported += 1
                 
             except Exception as e:
@@ -8,7 +8,8 @@ from datetime import datetime, date
 from decimal import Decimal
 import logging
 
-from app.database import get_table
+from app.database import get_async_table
+from app.services.cash_ledger import CashLedger
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -31,7 +32,7 @@ async def get_cash_movements(
     - entrata/uscita: Altro
     """
     try:
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         query = cassa_table.select('*').eq('id_utente', id_utente)
         
         if data_inizio:
@@ -41,7 +42,7 @@ async def get_cash_movements(
         if tipo:
             query = query.eq('tipo', tipo)
         
-        result = query.order('data_operazione', desc=True).execute()
+        result = await query.order('data_operazione', desc=True).execute()
         
         return {
             "success": True,
@@ -66,9 +67,9 @@ async def create_cash_movement(
 ):
     """Crea movimento cassa manuale"""
     try:
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         
-        result = cassa_table.insert({
+        result = await cassa_table.insert({
             'id_utente': id_utente,
             'data_operazione': data_operazione,
             'tipo': tipo,
@@ -107,11 +108,11 @@ async def create_daily_closure(
     try:
         saldo = corrispettivi - pos - versamento
         
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         
         # Corrispettivi
         if corrispettivi > 0:
-            cassa_table.insert({
+            await cassa_table.insert({
                 'id_utente': id_utente,
                 'data_operazione': data,
                 'tipo': 'corrispettivi',
@@ -124,7 +125,7 @@ async def create_daily_closure(
         
         # POS
         if pos > 0:
-            cassa_table.insert({
+            await cassa_table.insert({
                 'id_utente': id_utente,
                 'data_operazione': data,
                 'tipo': 'pos',
@@ -137,7 +138,7 @@ async def create_daily_closure(
         
         # Versamento
         if versamento > 0:
-            cassa_table.insert({
+            await cassa_table.insert({
                 'id_utente': id_utente,
                 'data_operazione': data,
                 'tipo': 'versamento',
@@ -148,10 +149,14 @@ async def create_daily_closure(
                 'created_at': datetime.now().isoformat()
             }).execute()
         
+        # Snapshot saldo di chiusura (saldo progressivo della cassa)
+        saldo_progressivo = await CashLedger.chiudi_giornata(id_utente, date.fromisoformat(data))
+        
         return {
             "success": True,
             "message": "Chiusura giornaliera registrata",
-            "saldo_cassa": round(saldo, 2)
+            "saldo_cassa": round(saldo, 2),
+            "saldo_progressivo": saldo_progressivo
         }
         
     except Exception as e:
@@ -169,15 +174,30 @@ async def get_cash_balance(
     Somma tutti i movimenti:
     + Entrate (corrispettivi, entrate)
     - Uscite (pos, versamenti, pagamento_fattura, uscite)
+    
+    Ultimo snapshot di chiusura <= data + movimenti successivi
+    (senza pool AsyncPG somma di tutti i movimenti).
     """
     try:
-        cassa_table = get_table('movimenti_cassa')
-        query = cassa_table.select('*').eq('id_utente', id_utente)
+        data_calcolo = date.fromisoformat(data_fino_a) if data_fino_a else datetime.now().date()
+        
+        ledger = await CashLedger.saldo(id_utente, data_calcolo)
+        if ledger is not None:
+            return {
+                "success": True,
+                "saldo": ledger['saldo'],
+                "data_calcolo": data_calcolo.isoformat(),
+                "data_snapshot": ledger['data_snapshot'],
+                "movimenti_successivi": ledger['movimenti_successivi']
+            }
+        
+        cassa_table = get_async_table('movimenti_cassa')
+        query = cassa_table.select('importo').eq('id_utente', id_utente)
         
         if data_fino_a:
             query = query.lte('data_operazione', data_fino_a)
         
-        result = query.execute()
+        result = await query.execute()
         
         saldo = 0
         if result.data:
@@ -187,13 +207,37 @@ async def get_cash_balance(
         return {
             "success": True,
             "saldo": round(saldo, 2),
-            "data_calcolo": data_fino_a or datetime.now().date().isoformat()
+            "data_calcolo": data_calcolo.isoformat()
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Errore get_cash_balance: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/saldo/verifica")
+async def check_cash_balance_snapshots(
+    id_utente: Optional[int] = Query(None),
+    correggi: bool = Query(default=False)
+):
+    """
+    Verifica coerenza snapshot saldi giornalieri
+    
+    Ricalcola ogni snapshot dai movimenti e riporta le differenze;
+    con correggi=true riallinea gli snapshot disallineati.
+    """
+    try:
+        return {
+            "success": True,
+            **await CashLedger.verifica(id_utente, correggi)
+        }
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Errore check_cash_balance_snapshots: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/import-corrispettivi")
 async def import_corrispettivi(
     file: UploadFile = File(...),
@@ -218,7 +262,7 @@ async def import_corrispettivi(
         if not all(col in df.columns for col in required_cols):
             raise HTTPException(status_code=400, detail=f"Colonne richieste: {required_cols}")
         
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         imported = 0
         
         for _, row in df.iterrows():
@@ -226,7 +270,7 @@ async def import_corrispettivi(
             importo = float(row['Importo'])
             descrizione = row.get('Descrizione', f"Corrispettivi {data}")
             
-            cassa_table.insert({
+            await cassa_table.insert({
                 'id_utente': id_utente,
                 'data_operazione': data,
                 'tipo': 'corrispettivi',
@@ -266,14 +310,14 @@ async def import_pos(
         if not all(col in df.columns for col in required_cols):
             raise HTTPException(status_code=400, detail=f"Colonne richieste: {required_cols}")
         
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         imported = 0
         
         for _, row in df.iterrows():
             data = pd.to_datetime(row['Data']).date().isoformat()
             importo = float(row['Importo'])
             
-            cassa_table.insert({
+            await cassa_table.insert({
                 'id_utente': id_utente,
                 'data_operazione': data,
                 'tipo': 'pos',
@@ -300,9 +344,9 @@ async def import_pos(
 async def delete_cash_movement(id_movimento: int, id_utente: int = Query(...)):
     """Elimina movimento cassa"""
     try:
-        cassa_table = get_table('movimenti_cassa')
+        cassa_table = get_async_table('movimenti_cassa')
         
-        cassa_table.delete()\
+        await cassa_table.delete()\
             .eq('id', id_movimento)\
             .eq('id_utente', id_utente)\
             .execute()
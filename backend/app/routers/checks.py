@@ -8,7 +8,7 @@ from datetime import datetime, date
 from decimal import Decimal
 import logging
 
-from app.database import get_table
+from app.database import get_async_table
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -28,13 +28,13 @@ async def get_checks(
     - annullato: Assegni annullati
     """
     try:
-        assegni_table = get_table('assegni')
+        assegni_table = get_async_table('assegni')
         query = assegni_table.select('*').eq('id_utente', id_utente)
         
         if stato:
             query = query.eq('stato', stato)
         
-        result = query.order('numero').execute()
+        result = await query.order('numero').execute()
         
         return {
             "success": True,
@@ -58,10 +58,10 @@ async def create_check(
     Stato iniziale: disponibile
     """
     try:
-        assegni_table = get_table('assegni')
+        assegni_table = get_async_table('assegni')
         
         # Verifica duplicati
-        existing = assegni_table.select('*')\
+        existing = await assegni_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('numero', numero)\
             .execute()
@@ -69,7 +69,7 @@ async def create_check(
         if existing.data:
             raise HTTPException(status_code=400, detail="Numero assegno già esistente")
         
-        result = assegni_table.insert({
+        result = await assegni_table.insert({
             'id_utente': id_utente,
             'numero': numero,
             'banca': banca,
@@ -105,13 +105,13 @@ async def batch_create_checks(
         if quantita > 100:
             raise HTTPException(status_code=400, detail="Massimo 100 assegni per volta")
         
-        assegni_table = get_table('assegni')
+        assegni_table = get_async_table('assegni')
         created = []
         
         for i in range(quantita):
             numero = str(numero_inizio + i)
             
-            assegni_table.insert({
+            await assegni_table.insert({
                 'id_utente': id_utente,
                 'numero': numero,
                 'banca': banca,
@@ -146,7 +146,7 @@ async def update_check(
 ):
     """Aggiorna assegno"""
     try:
-        assegni_table = get_table('assegni')
+        assegni_table = get_async_table('assegni')
         
         update_data = {}
         if stato: update_data['stato'] = stato
@@ -159,7 +159,7 @@ async def update_check(
         if not update_data:
             raise HTTPException(status_code=400, detail="Nessun campo da aggiornare")
         
-        result = assegni_table.update(update_data)\
+        result = await assegni_table.update(update_data)\
             .eq('id', id_assegno)\
             .eq('id_utente', id_utente)\
             .execute()
@@ -187,9 +187,9 @@ async def mark_check_cashed(
 ):
     """Segna assegno come incassato"""
     try:
-        assegni_table = get_table('assegni')
+        assegni_table = get_async_table('assegni')
         
-        result = assegni_table.update({
+        result = await assegni_table.update({
             'stato': 'incassato',
             'data_incasso': data_incasso or datetime.now().date().isoformat()
         })\
@@ -239,8 +239,8 @@ async def delete_check(id_assegno: int, id_utente: int = Query(...)):
 async def get_checks_stats(id_utente: int = Query(...)):
     """Statistiche assegni"""
     try:
-        assegni_table = get_table('assegni')
-        result = assegni_table.select('*').eq('id_utente', id_utente).execute()
+        assegni_table = get_async_table('assegni')
+        result = await assegni_table.select('*').eq('id_utente', id_utente).execute()
         
         if not result.data:
             return {
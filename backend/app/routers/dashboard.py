@@ -8,7 +8,8 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 import logging
 
-from app.database import get_table
+from app.database import get_async_table
+from app.services.dashboard_aggregates import DashboardAggregates
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -23,82 +24,111 @@ async def get_dashboard_stats(id_utente: int = Query(...)):
         - Numero fornitori
         - Fatture da pagare
         - Saldo cassa
+    
+    Letti dagli aggregati mantenuti dai trigger (una riga per utente);
+    senza pool AsyncPG ricalcolo dalle tabelle.
     """
     try:
-        current_month = datetime.now().strftime('%Y-%m')
-        
-        # Totale fatture mese corrente
-        fatture_table = get_table('fatture')
-        fatture_mese = fatture_table.select('*')\
-            .eq('id_utente', id_utente)\
-            .gte('data_fattura', f'{current_month}-01')\
-            .execute()
-        
-        totale_fatture_mese = sum(
-            float(f.get('totale', 0)) 
-            for f in fatture_mese.data
-        ) if fatture_mese.data else 0
-        
-        # Numero fornitori attivi
-        fornitori_table = get_table('fornitori')
-        fornitori = fornitori_table.select('id')\
-            .eq('id_utente', id_utente)\
-            .eq('attivo', True)\
-            .execute()
-        
-        num_fornitori = len(fornitori.data) if fornitori.data else 0
-        
-        # Fatture da pagare (non pagate)
-        fatture_da_pagare = fatture_table.select('*')\
-            .eq('id_utente', id_utente)\
-            .eq('pagata', False)\
-            .execute()
-        
-        totale_da_pagare = sum(
-            float(f.get('totale', 0)) 
-            for f in fatture_da_pagare.data
-        ) if fatture_da_pagare.data else 0
-        
-        num_fatture_da_pagare = len(fatture_da_pagare.data) if fatture_da_pagare.data else 0
-        
-        # Saldo cassa (somma movimenti cassa)
-        cassa_table = get_table('movimenti_cassa')
-        movimenti_cassa = cassa_table.select('*')\
-            .eq('id_utente', id_utente)\
-            .execute()
-        
-        saldo_cassa = 0
-        if movimenti_cassa.data:
-            for mov in movimenti_cassa.data:
-                tipo = mov.get('tipo', '')
-                importo = float(mov.get('importo', 0))
-                if tipo in ['corrispettivi', 'entrata']:
-                    saldo_cassa += importo
-                elif tipo in ['pos', 'versamento', 'uscita']:
-                    saldo_cassa -= importo
+        stats = await DashboardAggregates.get_stats(id_utente)
+        if stats is None:
+            stats = await _calcola_stats(id_utente)
         
         return {
             "success": True,
-            "data": {
-                "fatture_mese": {
-                    "totale": round(totale_fatture_mese, 2),
-                    "mese": current_month
-                },
-                "fornitori": {
-                    "totale": num_fornitori
-                },
-                "fatture_da_pagare": {
-                    "numero": num_fatture_da_pagare,
-                    "importo": round(totale_da_pagare, 2)
-                },
-                "saldo_cassa": round(saldo_cassa, 2)
-            }
+            "data": stats
         }
         
     except Exception as e:
         logger.error(f"Errore get_dashboard_stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/stats/rebuild")
+async def rebuild_dashboard_stats(id_utente: Optional[int] = Query(None)):
+    """
+    Ricostruzione completa aggregati (utente o tutti)
+    
+    Riporta gli utenti i cui contatori erano disallineati.
+    """
+    try:
+        result = await DashboardAggregates.ricostruisci(id_utente)
+        return {
+            "success": True,
+            **result
+        }
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Errore rebuild_dashboard_stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _calcola_stats(id_utente: int) -> dict:
+    """Ricalcolo completo via Supabase (fallback senza aggregati)"""
+    oggi = datetime.now()
+    current_month = oggi.strftime('%Y-%m')
+    next_month = f"{oggi.year + oggi.month // 12}-{oggi.month % 12 + 1:02d}"
+    
+    # Totale fatture mese corrente
+    fatture_table = get_async_table('fatture')
+    fatture_mese = await fatture_table.select('totale')\
+        .eq('id_utente', id_utente)\
+        .gte('data_fattura', f'{current_month}-01')\
+        .lt('data_fattura', f'{next_month}-01')\
+        .execute()
+    
+    totale_fatture_mese = sum(
+        float(f.get('totale', 0)) 
+        for f in fatture_mese.data
+    ) if fatture_mese.data else 0
+    
+    # Numero fornitori attivi
+    fornitori_table = get_async_table('fornitori')
+    fornitori = await fornitori_table.select('id')\
+        .eq('id_utente', id_utente)\
+        .eq('attivo', True)\
+        .execute()
+    
+    num_fornitori = len(fornitori.data) if fornitori.data else 0
+    
+    # Fatture da pagare (non pagate)
+    fatture_da_pagare = await fatture_table.select('totale')\
+        .eq('id_utente', id_utente)\
+        .eq('pagata', False)\
+        .execute()
+    
+    totale_da_pagare = sum(
+        float(f.get('totale', 0)) 
+        for f in fatture_da_pagare.data
+    ) if fatture_da_pagare.data else 0
+    
+    num_fatture_da_pagare = len(fatture_da_pagare.data) if fatture_da_pagare.data else 0
+    
+    # Saldo cassa (somma movimenti cassa, importi con segno come /cash-register/saldo)
+    cassa_table = get_async_table('movimenti_cassa')
+    movimenti_cassa = await cassa_table.select('importo')\
+        .eq('id_utente', id_utente)\
+        .execute()
+    
+    saldo_cassa = sum(
+        float(mov.get('importo') or 0)
+        for mov in movimenti_cassa.data
+    ) if movimenti_cassa.data else 0
+    
+    return {
+        "fatture_mese": {
+            "totale": round(totale_fatture_mese, 2),
+            "numero": len(fatture_mese.data) if fatture_mese.data else 0,
+            "mese": current_month
+        },
+        "fornitori": {
+            "totale": num_fornitori
+        },
+        "fatture_da_pagare": {
+            "numero": num_fatture_da_pagare,
+            "importo": round(totale_da_pagare, 2)
+        },
+        "saldo_cassa": round(saldo_cassa, 2)
+    }
+
 @router.get("/quick-actions")
 async def get_quick_actions(id_utente: int = Query(...)):
     """Azioni rapide suggerite"""
@@ -106,10 +136,10 @@ async def get_quick_actions(id_utente: int = Query(...)):
         actions = []
         
         # Check fatture scadute
-        fatture_table = get_table('fatture')
+        fatture_table = get_async_table('fatture')
         today = datetime.now().date()
         
-        fatture_scadute = fatture_table.select('*')\
+        fatture_scadute = await fatture_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('pagata', False)\
             .lt('data_scadenza', today.isoformat())\
@@ -125,10 +155,10 @@ async def get_quick_actions(id_utente: int = Query(...)):
             })
         
         # Check libretti sanitari in scadenza (30 giorni)
-        libretti_table = get_table('libretti_sanitari')
+        libretti_table = get_async_table('libretti_sanitari')
         data_limite = (today + timedelta(days=30)).isoformat()
         
-        libretti_scadenza = libretti_table.select('*')\
+        libretti_scadenza = await libretti_table.select('*')\
             .eq('id_utente', id_utente)\
             .lte('data_scadenza', data_limite)\
             .execute()
@@ -143,8 +173,8 @@ async def get_quick_actions(id_utente: int = Query(...)):
             })
         
         # Check magazzino scorte basse
-        magazzino_table = get_table('inventario')
-        scorte_basse = magazzino_table.select('*')\
+        magazzino_table = get_async_table('inventario')
+        scorte_basse = await magazzino_table.select('*')\
             .eq('id_utente', id_utente)\
             .lt('quantita', 10)\
             .execute()
@@ -174,8 +204,8 @@ async def get_recent_activity(id_utente: int = Query(...), limit: int = 10):
         activities = []
         
         # Ultime fatture caricate
-        fatture_table = get_table('fatture')
-        recent_fatture = fatture_table.select('*')\
+        fatture_table = get_async_table('fatture')
+        recent_fatture = await fatture_table.select('*')\
             .eq('id_utente', id_utente)\
             .order('created_at', desc=True)\
             .limit(limit)\
@@ -9,6 +9,8 @@ from decimal import Decimal
 from pydantic import BaseModel, EmailStr
 import os
 
+from app.services.name_index import name_index
+
 router = APIRouter(prefix="/api/dipendenti", tags=["Dipendenti"])
 
 
@@ -254,6 +256,14 @@ async def create_dipendente(
         'banca': dipendente.banca
     })
     
+    if dipendente_id:
+        name_index.add_employee({
+            'id': dipendente_id,
+            'nome': dipendente.nome,
+            'cognome': dipendente.cognome,
+            'iban': dipendente.iban
+        })
+    
     return await get_dipendente(dipendente_id, current_user, db)
 
 
@@ -7,7 +7,7 @@ from typing import Optional
 from datetime import datetime
 import logging
 
-from app.database import get_table
+from app.database import get_async_table
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -19,13 +19,13 @@ async def get_employees(
 ):
     """Ottieni lista dipendenti"""
     try:
-        dipendenti_table = get_table('dipendenti')
+        dipendenti_table = get_async_table('dipendenti')
         query = dipendenti_table.select('*').eq('id_utente', id_utente)
         
         if attivo is not None:
             query = query.eq('attivo', attivo)
         
-        result = query.order('cognome', 'nome').execute()
+        result = await query.order('cognome', 'nome').execute()
         
         return {
             "success": True,
@@ -52,9 +52,9 @@ async def create_employee(
 ):
     """Crea nuovo dipendente"""
     try:
-        dipendenti_table = get_table('dipendenti')
+        dipendenti_table = get_async_table('dipendenti')
         
-        existing = dipendenti_table.select('*')\
+        existing = await dipendenti_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('codice_fiscale', codice_fiscale)\
             .execute()
@@ -62,7 +62,7 @@ async def create_employee(
         if existing.data:
             raise HTTPException(status_code=400, detail="Dipendente già esistente")
         
-        result = dipendenti_table.insert({
+        result = await dipendenti_table.insert({
             'id_utente': id_utente,
             'nome': nome,
             'cognome': cognome,
@@ -111,16 +111,16 @@ async def upload_payslip(
         try:
             data = parse_busta_paga(tmp_path)
             
-            dipendenti_table = get_table('dipendenti')
-            paghe_table = get_table('paghe_dipendenti')
+            dipendenti_table = get_async_table('dipendenti')
+            paghe_table = get_async_table('paghe_dipendenti')
             
-            dipendente = dipendenti_table.select('*')\
+            dipendente = await dipendenti_table.select('*')\
                 .eq('id_utente', id_utente)\
                 .eq('codice_fiscale', data['codice_fiscale'])\
                 .execute()
             
             if not dipendente.data:
-                dipendente_result = dipendenti_table.insert({
+                dipendente_result = await dipendenti_table.insert({
                     'id_utente': id_utente,
                     'nome': data['nome'],
                     'cognome': data['cognome'],
@@ -133,7 +133,7 @@ async def upload_payslip(
             else:
                 id_dipendente = dipendente.data[0]['id']
             
-            paghe_table.insert({
+            await paghe_table.insert({
                 'id_utente': id_utente,
                 'id_dipendente': id_dipendente,
                 'mese': data['mese'],
@@ -171,7 +171,7 @@ async def get_employee_payslips(
 ):
     """Ottieni buste paga dipendente"""
     try:
-        paghe_table = get_table('paghe_dipendenti')
+        paghe_table = get_async_table('paghe_dipendenti')
         query = paghe_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('id_dipendente', id_dipendente)
@@ -179,7 +179,7 @@ async def get_employee_payslips(
         if anno:
             query = query.eq('anno', anno)
         
-        result = query.order('anno', desc=True).order('mese', desc=True).execute()
+        result = await query.order('anno', desc=True).order('mese', desc=True).execute()
         
         return {
             "success": True,
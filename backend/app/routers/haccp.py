@@ -3,7 +3,7 @@ from fastapi import APIRouter, HTTPException, Query, Form
 from typing import Optional
 from datetime import datetime
 import logging
-from app.database import get_table
+from app.database import get_async_table
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -12,11 +12,11 @@ router = APIRouter()
 async def get_temperatures(id_utente: int = Query(...), tipo: Optional[str] = None):
     """Ottieni temperature (frigoriferi/congelatori)"""
     try:
-        temp_table = get_table('temperature')
+        temp_table = get_async_table('temperature')
         query = temp_table.select('*').eq('id_utente', id_utente)
         if tipo:
             query = query.eq('tipo', tipo)
-        result = query.order('data_rilevazione', desc=True).limit(100).execute()
+        result = await query.order('data_rilevazione', desc=True).limit(100).execute()
         return {"success": True, "data": result.data if result.data else []}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -32,8 +32,8 @@ async def create_temperature(
 ):
     """Registra temperatura"""
     try:
-        temp_table = get_table('temperature')
-        result = temp_table.insert({
+        temp_table = get_async_table('temperature')
+        result = await temp_table.insert({
             'id_utente': id_utente,
             'tipo': tipo,
             'data_rilevazione': data_rilevazione,
@@ -50,8 +50,8 @@ async def create_temperature(
 async def get_sanificazioni(id_utente: int = Query(...)):
     """Ottieni sanificazioni"""
     try:
-        san_table = get_table('sanificazioni')
-        result = san_table.select('*').eq('id_utente', id_utente).order('data_sanificazione', desc=True).limit(100).execute()
+        san_table = get_async_table('sanificazioni')
+        result = await san_table.select('*').eq('id_utente', id_utente).order('data_sanificazione', desc=True).limit(100).execute()
         return {"success": True, "data": result.data if result.data else []}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -66,8 +66,8 @@ async def create_sanificazione(
 ):
     """Registra sanificazione"""
     try:
-        san_table = get_table('sanificazioni')
-        result = san_table.insert({
+        san_table = get_async_table('sanificazioni')
+        result = await san_table.insert({
             'id_utente': id_utente,
             'data_sanificazione': data_sanificazione,
             'area': area,
@@ -83,8 +83,8 @@ async def create_sanificazione(
 async def get_libretti(id_utente: int = Query(...)):
     """Ottieni libretti sanitari"""
     try:
-        libretti_table = get_table('libretti_sanitari')
-        result = libretti_table.select('*, dipendenti(nome, cognome)')\
+        libretti_table = get_async_table('libretti_sanitari')
+        result = await libretti_table.select('*, dipendenti(nome, cognome)')\
             .eq('id_utente', id_utente)\
             .order('data_scadenza')\
             .execute()
@@ -16,6 +16,8 @@ from app.models.hr_models import (
     HRStatistics
 )
 from app.services.hr_service import HRService
+from app.services.pdf_store import pdf_store
+from app.services.name_index import name_index
 
 router = APIRouter(prefix="/api/hr", tags=["HR Administration"])
 
@@ -127,6 +129,8 @@ async def update_employee(
     if not updated:
         raise HTTPException(404, "Dipendente non trovato")
     
+    name_index.add_employee(dict(updated))
+    
     return EmployeeResponse(**updated)
 
 
@@ -151,26 +155,74 @@ async def terminate_employee(
 
 @router.post("/payslips/import")
 async def import_payslip(
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    files: Optional[List[UploadFile]] = File(None),
     data_disponibilita: Optional[date] = None,
     current_user = Depends(get_current_admin_user),
     db = Depends(get_db)
 ):
     """
-    Import manuale busta paga da PDF
+    Import manuale buste paga da PDF
     
     Upload PDF → Parse → Salva
+    
+    - file: singola busta paga (errore 400 se l'import fallisce)
+    - files: batch di PDF importati in parallelo, con esito per file
     """
     
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(400, "Solo file PDF accettati")
+    uploads = ([file] if file else []) + (files or [])
+    if not uploads:
+        raise HTTPException(400, "Nessun file caricato")
     
-    pdf_data = await file.read()
+    for upload in uploads:
+        if not upload.filename.endswith('.pdf'):
+            raise HTTPException(400, f"Solo file PDF accettati: {upload.filename}")
     
     hr_service = HRService(db)
     
-    result = await hr_service.import_payslip_from_pdf(
-        pdf_data,
+    if file and not files:
+        pdf_data = await file.read()
+        
+        result = await hr_service.import_payslip_from_pdf(
+            pdf_data,
+            file.filename,
+            data_disponibilita or date.today()
+        )
+        
+        if not result['success']:
+            raise HTTPException(400, result['error'])
+        
+        return result
+    
+    pdf_files = [(upload.filename, await upload.read()) for upload in uploads]
+    
+    return await hr_service.import_payslips_batch(
+        pdf_files,
+        data_disponibilita or date.today()
+    )
+
+
+@router.post("/payslips/import-multiplo")
+async def import_payslips_multi(
+    file: UploadFile = File(...),
+    data_disponibilita: Optional[date] = None,
+    current_user = Depends(get_current_admin_user),
+    db = Depends(get_db)
+):
+    """
+    Import PDF con le buste paga di più dipendenti (file mensile del consulente)
+    
+    Il PDF è diviso per codice fiscale e le parti importate in parallelo,
+    con esito per dipendente
+    """
+    
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(400, "Solo PDF accettati")
+    
+    hr_service = HRService(db)
+    
+    result = await hr_service.import_payslips_from_multi_pdf(
+        await file.read(),
         file.filename,
         data_disponibilita or date.today()
     )
@@ -181,6 +233,19 @@ async def import_payslip(
     return result
 
 
+@router.get("/payslips/dedup-stats")
+async def payslip_dedup_stats(
+    current_user = Depends(get_current_admin_user),
+    db = Depends(get_db)
+):
+    """Deduplica PDF per contenuto: hit rate del processo e totali archivio"""
+    
+    return {
+        'processo': pdf_store.stats(),
+        'archivio': await pdf_store.stats_archivio(db)
+    }
+
+
 @router.get("/payslips", response_model=List[PayslipResponse])
 async def list_payslips(
     employee_id: Optional[int] = None,
@@ -2,14 +2,14 @@
 Router Fatture - Gestione completa fatture passive
 """
 
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Form
+from fastapi import APIRouter, Body, HTTPException, Query, UploadFile, File, Form
 from typing import List, Optional
 from datetime import datetime, date
 import logging
+from decimal import Decimal
 import io
 
-from app.database import get_table
-from app.parsers.fatturapa_parser import parse_fattura_xml
+from app.database import get_async_table
 from app.models.invoices import Fattura, FatturaCreate, FatturaUpdate
 
 logger = logging.getLogger(__name__)
@@ -33,7 +33,7 @@ async def get_invoices(
         - pagata: true/false
     """
     try:
-        fatture_table = get_table('fatture')
+        fatture_table = get_async_table('fatture')
         query = fatture_table.select('*').eq('id_utente', id_utente)
         
         if status:
@@ -43,7 +43,7 @@ async def get_invoices(
         if pagata is not None:
             query = query.eq('pagata', pagata)
         
-        result = query.order('data_fattura', desc=True).range(offset, offset + limit - 1).execute()
+        result = await query.order('data_fattura', desc=True).range(offset, offset + limit - 1).execute()
         
         return {
             "success": True,
@@ -68,7 +68,7 @@ async def get_invoices_by_state(state: str, id_utente: int = Query(...)):
         - unmanaged: Senza metodo pagamento
     """
     try:
-        fatture_table = get_table('fatture')
+        fatture_table = get_async_table('fatture')
         
         if state == "pending":
             query = fatture_table.select('*')\
@@ -96,7 +96,7 @@ async def get_invoices_by_state(state: str, id_utente: int = Query(...)):
         else:
             raise HTTPException(status_code=400, detail=f"Stato non valido: {state}")
         
-        result = query.order('data_fattura', desc=True).execute()
+        result = await query.order('data_fattura', desc=True).execute()
         
         return {
             "success": True,
@@ -121,117 +121,31 @@ async def upload_bulk_invoices(
     Supporta:
         - Formato FatturaPA con namespace
         - Formato XML semplificato
+        - File firmati .xml.p7m (CAdES)
+        - Archivi ZIP di XML/p7m (letti membro per membro)
+    
+    Parse di tutti i file, poi insert set-based per batch
+    (fornitori, fatture, righe) con esito per singolo file.
     """
-    results = []
-    errors = []
+    from app.parsers.fatturapa_archive import iter_upload_payloads
+    from app.services.invoice_import_service import InvoiceImportService
     
-    for file in files:
-        try:
-            # Leggi contenuto XML
-            content = await file.read()
-            xml_string = content.decode('utf-8')
-            
-            # Parse XML
-            fattura_data = parse_fattura_xml(xml_string)
-            
-            # Crea/aggiorna fornitore
-            fornitori_table = get_table('fornitori')
-            partita_iva = fattura_data['fornitore'].get('partita_iva')
-            ragione_sociale = fattura_data['fornitore'].get('ragione_sociale')
-            
-            if partita_iva and ragione_sociale:
-                # Verifica se fornitore esiste
-                existing = fornitori_table.select('*')\
-                    .eq('id_utente', id_utente)\
-                    .eq('partita_iva', partita_iva)\
-                    .execute()
-                
-                if not existing.data:
-                    # Crea nuovo fornitore
-                    fornitori_table.insert({
-                        'id_utente': id_utente,
-                        'partita_iva': partita_iva,
-                        'ragione_sociale': ragione_sociale,
-                        'indirizzo': fattura_data['fornitore'].get('indirizzo'),
-                        'cap': fattura_data['fornitore'].get('cap'),
-                        'citta': fattura_data['fornitore'].get('comune'),
-                        'provincia': fattura_data['fornitore'].get('provincia'),
-                    }).execute()
-            
-            # Crea fattura
-            fatture_table = get_table('fatture')
-            
-            imponibile = float(fattura_data['totali'].get('imponibile', 0))
-            iva = float(fattura_data['totali'].get('iva', 0))
-            totale = float(fattura_data['totali'].get('totale', 0))
-            
-            fattura_insert = {
-                'id_utente': id_utente,
-                'numero_fattura': fattura_data['dati_generali'].get('numero', ''),
-                'data_fattura': fattura_data['dati_generali'].get('data', datetime.now().date().isoformat()),
-                'partita_iva_fornitore': partita_iva or '',
-                'ragione_sociale_fornitore': ragione_sociale or '',
-                'imponibile': imponibile,
-                'iva': iva,
-                'totale': totale,
-                'stato': 'active',
-                'pagata': False,
-                'file_path': file.filename
-            }
-            
-            # Data scadenza da pagamento se presente
-            if 'pagamento' in fattura_data and fattura_data['pagamento'].get('data_scadenza'):
-                fattura_insert['data_scadenza'] = fattura_data['pagamento']['data_scadenza']
-            
-            fattura_result = fatture_table.insert(fattura_insert).execute()
-            
-            # Crea righe fattura
-            if fattura_result.data and len(fattura_result.data) > 0:
-                id_fattura = fattura_result.data[0]['id']
-                righe_table = get_table('righe_fattura')
-                
-                for riga in fattura_data.get('righe', []):
-                    righe_table.insert({
-                        'id_fattura': id_fattura,
-                        'descrizione': riga.get('descrizione', ''),
-                        'quantita': float(riga.get('quantita', 1)),
-                        'prezzo_unitario': float(riga.get('prezzo_unitario', 0)),
-                        'importo': float(riga.get('prezzo_totale', 0)),
-                        'aliquota_iva': float(riga.get('aliquota_iva', 22))
-                    }).execute()
-            
-            results.append({
-                "filename": file.filename,
-                "success": True,
-                "numero_fattura": fattura_data['dati_generali'].get('numero'),
-                "fornitore": ragione_sociale
-            })
-            
-        except Exception as e:
-            logger.error(f"Errore upload {file.filename}: {str(e)}")
-            errors.append({
-                "filename": file.filename,
-                "error": str(e)
-            })
+    def payloads():
+        for file in files:
+            yield from iter_upload_payloads(file.filename, file.file)
     
-    return {
-        "success": len(errors) == 0,
-        "uploaded": len(results),
-        "errors": len(errors),
-        "results": results,
-        "error_details": errors
-    }
+    return await InvoiceImportService.import_fatture(id_utente, payloads())
 
 @router.put("/{id_fattura}")
 async def update_invoice(id_fattura: int, update: FatturaUpdate, id_utente: int = Query(...)):
     """Aggiorna fattura"""
     try:
-        fatture_table = get_table('fatture')
+        fatture_table = get_async_table('fatture')
         
         update_data = update.model_dump(exclude_none=True)
         update_data['updated_at'] = datetime.now().isoformat()
         
-        result = fatture_table.update(update_data)\
+        result = await fatture_table.update(update_data)\
             .eq('id', id_fattura)\
             .eq('id_utente', id_utente)\
             .execute()
@@ -250,6 +164,31 @@ async def update_invoice(id_fattura: int, update: FatturaUpdate, id_utente: int
         logger.error(f"Errore update_invoice: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/delete-batch")
+async def delete_invoices_batch(
+    id_fatture: List[int] = Body(..., embed=True),
+    id_utente: int = Query(...)
+):
+    """
+    Elimina più fatture con cascata completa (es. pulizia di fine anno)
+    
+    Stessa cascata di DELETE /{id_fattura}, eseguita lato database in un
+    solo statement per tutto il lotto (max 1000 fatture).
+    """
+    try:
+        from app.services.relationship_service import RelationshipService
+        
+        return await RelationshipService.delete_fatture_batch(
+            id_utente=id_utente,
+            id_fatture=id_fatture
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Errore delete_invoices_batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/{id_fattura}")
 async def delete_invoice(id_fattura: int, id_utente: int = Query(...)):
     """
@@ -284,8 +223,8 @@ async def delete_invoice(id_fattura: int, id_utente: int = Query(...)):
 async def get_invoice_lines(id_fattura: int, id_utente: int = Query(...)):
     """Ottieni righe dettaglio fattura"""
     try:
-        righe_table = get_table('righe_fattura')
-        result = righe_table.select('*').eq('id_fattura', id_fattura).execute()
+        righe_table = get_async_table('righe_fattura')
+        result = await righe_table.select('*').eq('id_fattura', id_fattura).execute()
         
         return {
             "success": True,
@@ -326,8 +265,8 @@ async def mark_invoice_paid(
         from app.services.payment_service import PaymentService
         
         # Get fattura per importo
-        fatture_table = get_table('fatture')
-        fattura = fatture_table.select('*').eq('id', id_fattura).eq('id_utente', id_utente).execute()
+        fatture_table = get_async_table('fatture')
+        fattura = await fatture_table.select('*').eq('id', id_fattura).eq('id_utente', id_utente).execute()
         
         if not fattura.data:
             raise HTTPException(status_code=404, detail="Fattura non trovata")
@@ -435,3 +374,17 @@ async def suggest_payment_match(
     except Exception as e:
         logger.error(f"Errore suggest_payment_match: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/suggest-payment-matches")
+async def suggest_payment_matches(id_utente: int = Query(...)):
+    """
+    Abbinamento massivo bonifici ↔ fatture non pagate
+    Assegnazione globale uno-a-uno, con pagamenti cumulativi
+    """
+    try:
+        from app.services.payment_service import PaymentService
+        
+        return await PaymentService.suggerisci_collegamenti_bonifici(id_utente)
+    except Exception as e:
+        logger.error(f"Errore suggest_payment_matches: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,10 @@
 """Router IVA"""
 from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime
+from typing import Optional
 import logging
-from app.database import get_table
+from app.database import db, get_async_table
+from app.services.iva_engine import IvaEngine
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -10,37 +12,20 @@ router = APIRouter()
 @router.get("/liquidazione")
 async def calcola_liquidazione(
     id_utente: int = Query(...),
-    mese: int = Query(...),
+    mese: int = Query(..., ge=1, le=12),
     anno: int = Query(...)
 ):
     """Calcola liquidazione IVA mensile"""
     try:
-        fatture_table = get_table('fatture')
-        fatture_emesse_table = get_table('fatture_emesse')
-        
-        data_inizio = f"{anno}-{mese:02d}-01"
-        if mese == 12:
-            data_fine = f"{anno+1}-01-01"
+        if db.pool:
+            liquidazione = await IvaEngine.liquida(id_utente, anno, 'mensile')
+            periodo = liquidazione['periodi'][mese - 1]
+            iva_vendite = periodo['iva_vendite']
+            iva_acquisti = periodo['iva_acquisti']
+            dettaglio = periodo['dettaglio']
         else:
-            data_fine = f"{anno}-{mese+1:02d}-01"
-        
-        # IVA Acquisti (detraibile)
-        fatture_acq = fatture_table.select('*')\
-            .eq('id_utente', id_utente)\
-            .gte('data_fattura', data_inizio)\
-            .lt('data_fattura', data_fine)\
-            .execute()
-        
-        iva_acquisti = sum(float(f['iva']) for f in (fatture_acq.data or []))
-        
-        # IVA Vendite (da versare)
-        fatture_ven = fatture_emesse_table.select('*')\
-            .eq('id_utente', id_utente)\
-            .gte('data_fattura', data_inizio)\
-            .lt('data_fattura', data_fine)\
-            .execute()
-        
-        iva_vendite = sum(float(f['iva']) for f in (fatture_ven.data or []))
+            iva_vendite, iva_acquisti = await _somma_iva_mese(id_utente, mese, anno)
+            dettaglio = []
         
         # Calcolo
         iva_da_versare = iva_vendite - iva_acquisti
@@ -53,8 +38,68 @@ async def calcola_liquidazione(
                 "iva_vendite": round(iva_vendite, 2),
                 "iva_acquisti": round(iva_acquisti, 2),
                 "iva_da_versare": round(iva_da_versare, 2),
-                "tipo": "credito" if iva_da_versare < 0 else "debito"
+                "tipo": "credito" if iva_da_versare < 0 else "debito",
+                "dettaglio": dettaglio
             }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/liquidazioni")
+async def calcola_liquidazioni(
+    id_utente: int = Query(...),
+    anno: int = Query(...),
+    periodicita: str = Query(default='mensile'),
+    credito_iniziale: Optional[float] = Query(None, ge=0),
+    ricalcola: bool = Query(default=False)
+):
+    """
+    Liquidazioni IVA dell'anno (mensili, trimestrali o annuale)
+    
+    Aggregati per aliquota, natura ed esigibilità; il credito (e il debito
+    sotto la soglia di versamento) passa da un periodo al successivo.
+    I periodi chiusi sono letti dalla cache, ricalcola=true la riscrive.
+    """
+    try:
+        liquidazione = await IvaEngine.liquida(
+            id_utente, anno, periodicita, credito_iniziale, usa_cache=not ricalcola
+        )
+        return {"success": True, "data": liquidazione}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Errore calcola_liquidazioni: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _somma_iva_mese(id_utente: int, mese: int, anno: int):
+    """Fallback senza connessione diretta: somma IVA del mese via Supabase"""
+    fatture_table = get_async_table('fatture')
+    fatture_emesse_table = get_async_table('fatture_emesse')
+    
+    data_inizio = f"{anno}-{mese:02d}-01"
+    if mese == 12:
+        data_fine = f"{anno+1}-01-01"
+    else:
+        data_fine = f"{anno}-{mese+1:02d}-01"
+    
+    # IVA Acquisti (detraibile)
+    fatture_acq = await fatture_table.select('iva')\
+        .eq('id_utente', id_utente)\
+        .gte('data_fattura', data_inizio)\
+        .lt('data_fattura', data_fine)\
+        .execute()
+    
+    iva_acquisti = sum(float(f['iva'] or 0) for f in (fatture_acq.data or []))
+    
+    # IVA Vendite (da versare)
+    fatture_ven = await fatture_emesse_table.select('iva')\
+        .eq('id_utente', id_utente)\
+        .gte('data_fattura', data_inizio)\
+        .lt('data_fattura', data_fine)\
+        .execute()
+    
+    iva_vendite = sum(float(f['iva'] or 0) for f in (fatture_ven.data or []))
+    
+    return iva_vendite, iva_acquisti
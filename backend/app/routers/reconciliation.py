@@ -1,7 +1,7 @@
 """Router Riconciliazione Bancaria"""
 from fastapi import APIRouter, HTTPException, Query
 import logging
-from app.database import get_table
+from app.database import get_async_table
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -10,8 +10,8 @@ router = APIRouter()
 async def get_unreconciled(id_utente: int = Query(...)):
     """Ottieni movimenti non riconciliati"""
     try:
-        banca_table = get_table('prima_nota_banca')
-        result = banca_table.select('*')\
+        banca_table = get_async_table('prima_nota_banca')
+        result = await banca_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('riconciliato', False)\
             .order('data_operazione', desc=True)\
@@ -28,15 +28,15 @@ async def match_transaction(
 ):
     """Riconcilia movimento con fattura"""
     try:
-        banca_table = get_table('prima_nota_banca')
-        fatture_table = get_table('fatture')
+        banca_table = get_async_table('prima_nota_banca')
+        fatture_table = get_async_table('fatture')
         
-        banca_table.update({'riconciliato': True})\
+        await banca_table.update({'riconciliato': True})\
             .eq('id', id_movimento)\
             .eq('id_utente', id_utente)\
             .execute()
         
-        fatture_table.update({'riconciliata': True})\
+        await fatture_table.update({'riconciliata': True})\
             .eq('id', id_fattura)\
             .eq('id_utente', id_utente)\
             .execute()
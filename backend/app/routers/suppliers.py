@@ -3,15 +3,27 @@ Router Fornitori - CRUD Completo
 """
 
 from fastapi import APIRouter, HTTPException, Query, Form
-from typing import Optional
+from pydantic import BaseModel
+from typing import List, Optional
 from datetime import datetime
 import logging
 
-from app.database import get_table
+from app.database import get_async_table
+from app.services.name_index import name_index
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+
+class RinominaFornitore(BaseModel):
+    partita_iva: str
+    ragione_sociale: str
+
+
+class GruppoDuplicati(BaseModel):
+    partita_iva: str  # Fornitore principale
+    duplicati: List[str]
+
 @router.get("/")
 async def get_suppliers(
     id_utente: int = Query(...),
@@ -26,7 +38,7 @@ async def get_suppliers(
     - metodo_pagamento: banca, cassa, assegno, misto
     """
     try:
-        fornitori_table = get_table('fornitori')
+        fornitori_table = get_async_table('fornitori')
         query = fornitori_table.select('*').eq('id_utente', id_utente)
         
         if attivo is not None:
@@ -34,7 +46,7 @@ async def get_suppliers(
         if metodo_pagamento:
             query = query.eq('metodo_pagamento', metodo_pagamento)
         
-        result = query.order('ragione_sociale').execute()
+        result = await query.order('ragione_sociale').execute()
         
         return {
             "success": True,
@@ -46,13 +58,99 @@ async def get_suppliers(
         logger.error(f"Errore get_suppliers: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/duplicates")
+async def get_duplicate_suppliers(id_utente: int = Query(...)):
+    """Gruppi di fornitori con la stessa P.IVA (normalizzata)"""
+    try:
+        from app.services.relationship_service import RelationshipService
+        
+        gruppi = await RelationshipService.trova_fornitori_duplicati(id_utente)
+        
+        return {
+            "success": True,
+            "data": gruppi,
+            "total": len(gruppi)
+        }
+        
+    except Exception as e:
+        logger.error(f"Errore get_duplicate_suppliers: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/merge")
+async def merge_suppliers(
+    id_utente: int = Query(...),
+    gruppi: Optional[List[GruppoDuplicati]] = None
+):
+    """
+    Unisce fornitori duplicati
+    
+    Senza body unisce tutti i gruppi di /duplicates. Fatture, bonifici e
+    ordini passano al fornitore principale, i duplicati vengono eliminati.
+    """
+    try:
+        from app.services.relationship_service import RelationshipService
+        
+        return await RelationshipService.unisci_fornitori(
+            id_utente=id_utente,
+            gruppi=[g.model_dump() for g in gruppi] if gruppi is not None else None
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Errore merge_suppliers: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk-rename")
+async def bulk_rename_suppliers(rinomine: List[RinominaFornitore], id_utente: int = Query(...)):
+    """Rinomina massiva fornitori con propagazione alle fatture"""
+    try:
+        from app.services.relationship_service import RelationshipService
+        
+        return await RelationshipService.rinomina_fornitori(
+            id_utente=id_utente,
+            rinomine=[r.model_dump() for r in rinomine]
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Errore bulk_rename_suppliers: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/changes")
+async def get_supplier_changes(
+    id_utente: int = Query(...),
+    dopo_id: int = Query(default=0),
+    limit: int = Query(default=500, le=5000)
+):
+    """
+    Giornale rinomine/unioni fornitori successive a dopo_id
+    
+    Per invalidare cache lato client: conservare l'ultimo id ricevuto.
+    """
+    try:
+        from app.services.relationship_service import RelationshipService
+        
+        modifiche = await RelationshipService.get_modifiche_fornitori(id_utente, dopo_id, limit)
+        
+        return {
+            "success": True,
+            "data": modifiche,
+            "ultimo_id": modifiche[-1]['id'] if modifiche else dopo_id
+        }
+        
+    except Exception as e:
+        logger.error(f"Errore get_supplier_changes: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/{partita_iva}")
 async def get_supplier(partita_iva: str, id_utente: int = Query(...)):
     """Ottieni fornitore per P.IVA"""
     try:
-        fornitori_table = get_table('fornitori')
+        fornitori_table = get_async_table('fornitori')
         
-        result = fornitori_table.select('*')\
+        result = await fornitori_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('partita_iva', partita_iva)\
             .execute()
@@ -97,8 +195,8 @@ async def create_supplier(
     """
     try:
         # Verifica duplicati
-        fornitori_table = get_table('fornitori')
-        existing = fornitori_table.select('*')\
+        fornitori_table = get_async_table('fornitori')
+        existing = await fornitori_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('partita_iva', partita_iva)\
             .execute()
@@ -131,7 +229,10 @@ async def create_supplier(
             'created_at': datetime.now().isoformat()
         }
         
-        result = fornitori_table.insert(fornitore_data).execute()
+        result = await fornitori_table.insert(fornitore_data).execute()
+        
+        if result.data:
+            name_index.add_fornitore(result.data[0])
         
         return {
             "success": True,
@@ -207,6 +308,8 @@ async def update_supplier(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Errore update_supplier: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -254,9 +357,9 @@ async def get_supplier_stats(partita_iva: str, id_utente: int = Query(...)):
     - Ultima fattura
     """
     try:
-        fatture_table = get_table('fatture')
+        fatture_table = get_async_table('fatture')
         
-        result = fatture_table.select('*')\
+        result = await fatture_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('partita_iva_fornitore', partita_iva)\
             .execute()
@@ -298,7 +401,7 @@ async def get_supplier_invoices(
 ):
     """Ottieni tutte le fatture di un fornitore"""
     try:
-        fatture_table = get_table('fatture')
+        fatture_table = get_async_table('fatture')
         query = fatture_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('partita_iva_fornitore', partita_iva)
@@ -307,7 +410,7 @@ async def get_supplier_invoices(
             query = query.gte('data_fattura', f'{anno}-01-01')\
                         .lte('data_fattura', f'{anno}-12-31')
         
-        result = query.order('data_fattura', desc=True).execute()
+        result = await query.order('data_fattura', desc=True).execute()
         
         return {
             "success": True,
@@ -327,9 +430,9 @@ async def get_suppliers_by_payment(metodo: str, id_utente: int = Query(...)):
     Metodi: banca, cassa, assegno, misto
     """
     try:
-        fornitori_table = get_table('fornitori')
+        fornitori_table = get_async_table('fornitori')
         
-        result = fornitori_table.select('*')\
+        result = await fornitori_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('metodo_pagamento', metodo)\
             .eq('attivo', True)\
@@ -3,7 +3,7 @@ from fastapi import APIRouter, HTTPException, Query, Form
 from typing import Optional
 from datetime import datetime
 import logging
-from app.database import get_table
+from app.database import get_async_table
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -12,11 +12,11 @@ router = APIRouter()
 async def get_inventory(id_utente: int = Query(...), categoria: Optional[str] = None):
     """Ottieni inventario"""
     try:
-        inv_table = get_table('inventario')
+        inv_table = get_async_table('inventario')
         query = inv_table.select('*').eq('id_utente', id_utente)
         if categoria:
             query = query.eq('categoria', categoria)
-        result = query.order('descrizione').execute()
+        result = await query.order('descrizione').execute()
         return {"success": True, "data": result.data if result.data else []}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -33,8 +33,8 @@ async def create_product(
 ):
     """Crea prodotto inventario"""
     try:
-        inv_table = get_table('inventario')
-        result = inv_table.insert({
+        inv_table = get_async_table('inventario')
+        result = await inv_table.insert({
             'id_utente': id_utente,
             'codice_prodotto': codice_prodotto,
             'descrizione': descrizione,
@@ -52,10 +52,10 @@ async def create_product(
 async def populate_from_invoices(id_utente: int = Form(...)):
     """Popola magazzino da righe fatture"""
     try:
-        righe_table = get_table('righe_fattura')
-        inv_table = get_table('inventario')
+        righe_table = get_async_table('righe_fattura')
+        inv_table = get_async_table('inventario')
         
-        righe = righe_table.select('*, fatture!inner(id_utente)')\
+        righe = await righe_table.select('*, fatture!inner(id_utente)')\
             .eq('fatture.id_utente', id_utente)\
             .execute()
         
@@ -64,13 +64,13 @@ async def populate_from_invoices(id_utente: int = Form(...)):
         
         imported = 0
         for riga in righe.data:
-            existing = inv_table.select('*')\
+            existing = await inv_table.select('*')\
                 .eq('id_utente', id_utente)\
                 .eq('descrizione', riga['descrizione'])\
                 .execute()
             
             if not existing.data:
-                inv_table.insert({
+                await inv_table.insert({
                     'id_utente': id_utente,
                     'descrizione': riga['descrizione'],
                     'prezzo_acquisto': float(riga['prezzo_unitario']),
@@ -9,7 +9,7 @@ import bcrypt
 import logging
 import os
 
-from app.database import get_table, get_supabase
+from app.database import get_async_table, get_supabase
 
 logger = logging.getLogger(__name__)
 
@@ -79,10 +79,10 @@ class AuthService:
     ) -> Dict:
         """Registra nuovo utente"""
         try:
-            users_table = get_table('users')
+            users_table = get_async_table('users')
             
             # Verifica email già esistente
-            existing = users_table.select('id').eq('email', email).execute()
+            existing = await users_table.select('id').eq('email', email).execute()
             if existing.data and len(existing.data) > 0:
                 raise ValueError("Email già registrata")
             
@@ -98,7 +98,7 @@ class AuthService:
                 'created_at': datetime.now().isoformat()
             }
             
-            result = users_table.insert(user_data).execute()
+            result = await users_table.insert(user_data).execute()
             
             if not result.data or len(result.data) == 0:
                 raise Exception("Errore creazione utente")
@@ -138,10 +138,10 @@ class AuthService:
         try:
             logger.info(f"Tentativo login: {email}")
             
-            users_table = get_table('users')
+            users_table = get_async_table('users')
             
             # Trova utente
-            result = users_table.select('*').eq('email', email).execute()
+            result = await users_table.select('*').eq('email', email).execute()
             
             if not result.data or len(result.data) == 0:
                 logger.warning(f"Utente non trovato: {email}")
@@ -188,8 +188,8 @@ class AuthService:
             if not payload:
                 return None
             
-            users_table = get_table('users')
-            result = users_table.select('*').eq('id', payload['user_id']).execute()
+            users_table = get_async_table('users')
+            result = await users_table.select('*').eq('id', payload['user_id']).execute()
             
             if not result.data or len(result.data) == 0:
                 return None
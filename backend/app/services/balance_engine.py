@@ -0,0 +1,361 @@
+"""
+Motore Bilanci - Stato patrimoniale e conto economico da saldi mensili
+1. Dare/avere per conto e mese in saldi_conti_mensili (migration 012),
+   aggiornati dai trigger su movimenti_contabili
+2. Stato patrimoniale a qualunque data: mesi chiusi dai mensili, mese
+   corrente dai movimenti (range scan sull'indice utente/data)
+3. Conto economico per anno con raggruppamento per mese/trimestre e
+   confronto tra più anni in una sola query
+4. Saldi espressi nel segno naturale del conto: dare - avere per attivo e
+   costi, avere - dare per passivo e ricavi
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+import logging
+import time
+
+from app.database import db, rowcount
+from app.services.iva_engine import PERIODICITA
+
+logger = logging.getLogger(__name__)
+
+# Saldo nel segno naturale del conto
+SEGNO_NATURALE = "CASE WHEN c.tipo IN ('passivo', 'ricavo') THEN -1 ELSE 1 END"
+
+# Per ogni data: conti patrimoniali dall'origine, conti economici dall'inizio
+# dell'esercizio (il risultato di periodo chiude il pareggio)
+QUERY_STATO_PATRIMONIALE = f"""
+    WITH date_rif AS (
+        SELECT unnest(:date::date[]) AS data
+    ),
+    conti AS (
+        SELECT codice_conto, descrizione, tipo, categoria
+        FROM piano_dei_conti
+        WHERE id_utente = :id_utente AND attivo = TRUE
+    ),
+    mensili AS (
+        SELECT d.data, s.codice_conto,
+               sum(s.dare - s.avere) AS saldo,
+               sum(s.dare - s.avere) FILTER (WHERE s.mese >= date_trunc('year', d.data)) AS saldo_esercizio
+        FROM date_rif d
+        JOIN saldi_conti_mensili s
+          ON s.id_utente = :id_utente AND s.mese < date_trunc('month', d.data)
+        GROUP BY 1, 2
+    ),
+    correnti AS (
+        SELECT d.data, m.codice_conto,
+               sum(CASE WHEN m.tipo_movimento = 'dare' THEN m.importo ELSE -m.importo END) AS saldo
+        FROM date_rif d
+        JOIN movimenti_contabili m
+          ON m.id_utente = :id_utente
+         AND m.data_movimento >= date_trunc('month', d.data)
+         AND m.data_movimento <= d.data
+        GROUP BY 1, 2
+    )
+    SELECT d.data, c.codice_conto, c.descrizione, c.tipo, c.categoria,
+           {SEGNO_NATURALE} * (
+               CASE WHEN c.tipo IN ('costo', 'ricavo') THEN COALESCE(mn.saldo_esercizio, 0)
+                    ELSE COALESCE(mn.saldo, 0)
+               END + COALESCE(cr.saldo, 0)
+           ) AS saldo
+    FROM date_rif d
+    CROSS JOIN conti c
+    LEFT JOIN mensili mn ON mn.data = d.data AND mn.codice_conto = c.codice_conto
+    LEFT JOIN correnti cr ON cr.data = d.data AND cr.codice_conto = c.codice_conto
+    ORDER BY d.data DESC, c.codice_conto
+"""
+
+QUERY_CONTO_ECONOMICO = f"""
+    SELECT extract(year FROM s.mese)::int AS anno,
+           (extract(month FROM s.mese)::int - 1) / :mesi::int + 1 AS periodo,
+           c.codice_conto, c.descrizione, c.tipo, c.categoria,
+           sum({SEGNO_NATURALE} * (s.dare - s.avere)) AS saldo
+    FROM saldi_conti_mensili s
+    JOIN piano_dei_conti c ON c.id_utente = s.id_utente AND c.codice_conto = s.codice_conto
+    WHERE s.id_utente = :id_utente
+      AND s.mese >= make_date(:anno_inizio::int, 1, 1)
+      AND s.mese < make_date(:anno_fine::int + 1, 1, 1)
+      AND extract(year FROM s.mese)::int = ANY(:anni::int[])
+      AND c.tipo IN ('costo', 'ricavo')
+    GROUP BY 1, 2, 3, 4, 5, 6
+    ORDER BY 1 DESC, 2, 3
+"""
+
+QUERY_REGISTRA = """
+    WITH conto AS (
+        UPDATE piano_dei_conti SET saldo = COALESCE(saldo, 0) + :delta
+        WHERE id_utente = :id_utente AND codice_conto = :codice_conto
+        RETURNING codice_conto
+    )
+    INSERT INTO movimenti_contabili (
+        id_utente, data_movimento, codice_conto, descrizione,
+        tipo_movimento, importo, documento_riferimento, created_at
+    )
+    SELECT :id_utente, :data_movimento::date, codice_conto, :descrizione::text,
+           :tipo_movimento::text, :importo::numeric, :documento_riferimento::text, NOW()
+    FROM conto
+    RETURNING *
+"""
+
+QUERY_CANCELLA_MENSILI = """
+    DELETE FROM saldi_conti_mensili
+    WHERE :id_utente::int IS NULL OR id_utente = :id_utente::int
+"""
+
+QUERY_RICOSTRUISCI = """
+    INSERT INTO saldi_conti_mensili (id_utente, codice_conto, mese, dare, avere, movimenti)
+    SELECT id_utente, codice_conto, date_trunc('month', data_movimento)::date,
+           COALESCE(sum(importo) FILTER (WHERE tipo_movimento = 'dare'), 0),
+           COALESCE(sum(importo) FILTER (WHERE tipo_movimento IS DISTINCT FROM 'dare'), 0),
+           count(*)
+    FROM movimenti_contabili
+    WHERE (:id_utente::int IS NULL OR id_utente = :id_utente::int)
+      AND codice_conto IS NOT NULL AND data_movimento IS NOT NULL
+    GROUP BY 1, 2, 3
+"""
+
+# Saldo progressivo del piano dei conti (dare - avere) riallineato ai movimenti
+QUERY_RIALLINEA_PIANO = """
+    UPDATE piano_dei_conti c SET saldo = t.saldo
+    FROM (
+        SELECT c2.id_utente, c2.codice_conto, COALESCE(sum(s.dare - s.avere), 0) AS saldo
+        FROM piano_dei_conti c2
+        LEFT JOIN saldi_conti_mensili s
+          ON s.id_utente = c2.id_utente AND s.codice_conto = c2.codice_conto
+        WHERE :id_utente::int IS NULL OR c2.id_utente = :id_utente::int
+        GROUP BY 1, 2
+    ) t
+    WHERE c.id_utente = t.id_utente AND c.codice_conto = t.codice_conto
+      AND c.saldo IS DISTINCT FROM t.saldo
+"""
+
+
+def _stesso_giorno(data: date, anno: int) -> date:
+    """Stessa data in un altro anno (29 febbraio -> 28)"""
+    try:
+        return data.replace(year=anno)
+    except ValueError:
+        return data.replace(year=anno, day=28)
+
+
+def _sezione(conti: List[Dict]) -> Dict:
+    return {
+        'totale': round(sum(c['saldo'] for c in conti), 2),
+        'dettaglio': conti
+    }
+
+
+class BalanceEngine:
+    """Bilanci da saldi mensili per conto"""
+
+    @staticmethod
+    async def registra_movimento(
+        id_utente: int,
+        data_movimento: date,
+        codice_conto: str,
+        descrizione: str,
+        tipo_movimento: str,
+        importo: float,
+        documento_riferimento: Optional[str] = None
+    ) -> Dict:
+        """
+        Movimento e saldo del conto in un solo statement
+
+        Il saldo del conto è incrementato in SQL (niente lettura/scrittura
+        concorrente), i mensili sono aggiornati dal trigger.
+
+        Raises:
+            ValueError: conto non trovato
+            RuntimeError: database non disponibile
+        """
+        importo = Decimal(str(importo))
+        delta = importo if tipo_movimento == 'dare' else -importo
+
+        async with db.transaction() as tx:
+            row = await tx.fetch_one(QUERY_REGISTRA, {
+                'id_utente': id_utente,
+                'data_movimento': data_movimento,
+                'codice_conto': codice_conto,
+                'descrizione': descrizione,
+                'tipo_movimento': tipo_movimento,
+                'importo': importo,
+                'documento_riferimento': documento_riferimento,
+                'delta': delta
+            })
+
+        if row is None:
+            raise ValueError("Conto non trovato")
+        return dict(row)
+
+    @staticmethod
+    async def stato_patrimoniale(
+        id_utente: int,
+        data_riferimento: Optional[date] = None,
+        anni_confronto: int = 0
+    ) -> Optional[Dict]:
+        """
+        Stato patrimoniale a una data, con la stessa data degli anni precedenti
+
+        Returns:
+            {'data_riferimento', 'attivo', 'passivo', 'risultato_esercizio',
+             'pareggio', 'confronto': [...]} o None senza piano dei conti
+        """
+        data_riferimento = data_riferimento or date.today()
+        date_rif = [data_riferimento] + [
+            _stesso_giorno(data_riferimento, data_riferimento.year - n)
+            for n in range(1, anni_confronto + 1)
+        ]
+
+        async with db.transaction(isolation='repeatable_read') as tx:
+            rows = await tx.fetch_all(QUERY_STATO_PATRIMONIALE, {'id_utente': id_utente, 'date': date_rif})
+        if not rows:
+            return None
+
+        per_data: Dict[date, List] = {d: [] for d in date_rif}
+        for r in rows:
+            per_data[r['data']].append(r)
+
+        bilanci = []
+        for data in date_rif:
+            conti = {'attivo': [], 'passivo': [], 'costo': [], 'ricavo': []}
+            for r in per_data[data]:
+                if r['tipo'] in conti:
+                    conti[r['tipo']].append({
+                        'codice_conto': r['codice_conto'],
+                        'descrizione': r['descrizione'],
+                        'categoria': r['categoria'],
+                        'saldo': round(float(r['saldo']), 2)
+                    })
+
+            attivo = _sezione(conti['attivo'])
+            passivo = _sezione(conti['passivo'])
+            risultato = round(
+                sum(c['saldo'] for c in conti['ricavo']) - sum(c['saldo'] for c in conti['costo']), 2
+            )
+            bilanci.append({
+                'data_riferimento': data.isoformat(),
+                'attivo': attivo,
+                'passivo': passivo,
+                'risultato_esercizio': risultato,
+                'pareggio': round(attivo['totale'] - passivo['totale'] - risultato, 2)
+            })
+
+        return {**bilanci[0], 'confronto': bilanci[1:]}
+
+    @staticmethod
+    async def conto_economico(
+        id_utente: int,
+        anno: int,
+        anni_confronto: int = 0,
+        periodicita: str = 'mensile'
+    ) -> Dict:
+        """
+        Conto economico dell'anno con totali per periodo e anni di confronto
+
+        Returns:
+            {'anno', 'ricavi', 'costi', 'utile_perdita', 'periodi': [...],
+             'confronto': [...]}
+
+        Raises:
+            ValueError: periodicità non valida
+        """
+        if periodicita not in PERIODICITA:
+            raise ValueError(f"Periodicità non valida: {periodicita} (ammesse: {', '.join(PERIODICITA)})")
+
+        anni = [anno - n for n in range(anni_confronto + 1)]
+        rows = await db.fetch_all(QUERY_CONTO_ECONOMICO, {
+            'id_utente': id_utente,
+            'anni': anni,
+            'anno_inizio': min(anni),
+            'anno_fine': max(anni),
+            'mesi': PERIODICITA[periodicita]
+        })
+
+        numero_periodi = 12 // PERIODICITA[periodicita]
+        esercizi = []
+        for a in anni:
+            conti: Dict[str, Dict] = {}
+            periodi = {
+                p: {'periodo': p, 'ricavi': Decimal('0'), 'costi': Decimal('0')}
+                for p in range(1, numero_periodi + 1)
+            }
+            for r in rows:
+                if r['anno'] != a:
+                    continue
+                voce = 'ricavi' if r['tipo'] == 'ricavo' else 'costi'
+                periodi[r['periodo']][voce] += r['saldo']
+                conto = conti.setdefault(r['codice_conto'], {
+                    'codice_conto': r['codice_conto'],
+                    'descrizione': r['descrizione'],
+                    'tipo': r['tipo'],
+                    'categoria': r['categoria'],
+                    'saldo': Decimal('0')
+                })
+                conto['saldo'] += r['saldo']
+
+            dettaglio = {'ricavo': [], 'costo': []}
+            for conto in conti.values():
+                dettaglio[conto['tipo']].append({**conto, 'saldo': round(float(conto['saldo']), 2)})
+
+            ricavi = _sezione(dettaglio['ricavo'])
+            costi = _sezione(dettaglio['costo'])
+            esercizi.append({
+                'anno': a,
+                'ricavi': ricavi,
+                'costi': costi,
+                'utile_perdita': round(ricavi['totale'] - costi['totale'], 2),
+                'periodi': [
+                    {
+                        'periodo': p['periodo'],
+                        'ricavi': round(float(p['ricavi']), 2),
+                        'costi': round(float(p['costi']), 2),
+                        'utile_perdita': round(float(p['ricavi'] - p['costi']), 2)
+                    }
+                    for p in periodi.values()
+                ]
+            })
+
+        return {**esercizi[0], 'periodicita': periodicita, 'confronto': esercizi[1:]}
+
+    @staticmethod
+    async def ricostruisci(id_utente: Optional[int] = None) -> Dict:
+        """
+        Ricalcolo dei mensili dai movimenti (None = tutti gli utenti) e
+        riallineamento del saldo sul piano dei conti
+
+        Returns:
+            {'mensili', 'conti_riallineati', 'seconds'}
+        """
+        start = time.perf_counter()
+        async with db.transaction() as tx:
+            await tx.execute("LOCK TABLE movimenti_contabili IN SHARE MODE")
+            await tx.execute(QUERY_CANCELLA_MENSILI, {'id_utente': id_utente})
+            status = await tx.execute(QUERY_RICOSTRUISCI, {'id_utente': id_utente})
+            riallineati = await tx.execute(QUERY_RIALLINEA_PIANO, {'id_utente': id_utente})
+
+        conti_riallineati = rowcount(riallineati)
+        if conti_riallineati:
+            logger.warning(f"Saldi piano dei conti riallineati: {conti_riallineati}")
+
+        return {
+            'mensili': rowcount(status),
+            'conti_riallineati': conti_riallineati,
+            'seconds': round(time.perf_counter() - start, 4)
+        }
+
+
+# ============================================================================
+# JOB
+# ============================================================================
+
+async def run_balance_rebuild_job():
+    """Job schedulato di ricostruzione saldi mensili (es. ogni notte)"""
+    print(f"📒 [Contabilità] Ricostruzione saldi mensili - {datetime.now()}")
+
+    result = await BalanceEngine.ricostruisci()
+
+    print(f"  ✅ Mensili: {result['mensili']} in {result['seconds']}s")
+    print(f"  ⚠️  Conti riallineati: {result['conti_riallineati']}")
+
+    return result
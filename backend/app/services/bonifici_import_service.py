@@ -0,0 +1,201 @@
+"""
+Servizio Import Bonifici - Import vettoriale estratti conto XLS
+1. Normalizzazione colonne in blocco (pandas)
+2. Chiavi esistenti caricate con una sola query
+3. Match beneficiario -> dipendente/fornitore con indice nomi in memoria
+4. Insert di tutte le righe con un unico COPY
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import pandas as pd
+
+from app.services.name_index import name_index
+
+logger = logging.getLogger(__name__)
+
+# Similarità minima per assegnare il bonifico a dipendente/fornitore
+SOGLIA_MATCH_NOME = 0.85
+
+BONIFICI_COLUMNS = [
+    'data_bonifico', 'beneficiario', 'iban_beneficiario',
+    'importo', 'causale', 'tipo', 'riferimento_id',
+    'file_import_path', 'riconciliato'
+]
+
+
+class BonificiImportService:
+    """Servizio per import massivo bonifici da estratto conto"""
+    
+    @staticmethod
+    def identifica_colonne(df: pd.DataFrame) -> Dict[str, Optional[str]]:
+        """
+        Colonne estratto conto (Unicredit/Intesa)
+        
+        Returns:
+            {'data', 'beneficiario', 'iban', 'importo', 'causale'} -> nome colonna o None
+        """
+        cols = dict.fromkeys(['data', 'beneficiario', 'iban', 'importo', 'causale'])
+        
+        for col in df.columns:
+            col_lower = str(col).lower()
+            
+            if 'data' in col_lower and not cols['data']:
+                cols['data'] = col
+            elif 'beneficiario' in col_lower or 'destinatario' in col_lower:
+                cols['beneficiario'] = col
+            elif 'iban' in col_lower or 'conto' in col_lower:
+                cols['iban'] = col
+            elif 'importo' in col_lower or 'dare' in col_lower or 'avere' in col_lower:
+                cols['importo'] = col
+            elif 'causale' in col_lower or 'descrizione' in col_lower:
+                cols['causale'] = col
+        
+        return cols
+    
+    @staticmethod
+    def _parse_importi(serie: pd.Series) -> pd.Series:
+        """Importi in formato italiano (1.234,56) o numerico -> float"""
+        if pd.api.types.is_numeric_dtype(serie):
+            return serie.astype(float)
+        
+        testo = serie.astype(str).str.strip().str.replace('€', '', regex=False).str.replace(' ', '', regex=False)
+        con_virgola = testo.str.contains(',', regex=False)
+        testo = testo.where(
+            ~con_virgola,
+            testo.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        )
+        return pd.to_numeric(testo, errors='coerce')
+    
+    @staticmethod
+    def normalizza(df: pd.DataFrame, cols: Dict[str, Optional[str]]) -> Tuple[pd.DataFrame, List[str], int]:
+        """
+        Normalizza l'estratto conto in blocco
+        
+        Returns:
+            (DataFrame uscite valide, errori per riga, righe saltate)
+            Il DataFrame ha colonne: riga, data_bonifico, beneficiario,
+            iban_beneficiario, importo, causale
+        """
+        out = pd.DataFrame({
+            'riga': df.index + 2,
+            'data_bonifico': pd.to_datetime(df[cols['data']], errors='coerce', dayfirst=True).dt.date,
+            'beneficiario': df[cols['beneficiario']].astype(str),
+            'importo': BonificiImportService._parse_importi(df[cols['importo']]).round(2)
+        })
+        if cols['iban']:
+            iban = df[cols['iban']]
+            out['iban_beneficiario'] = iban.astype(str).where(iban.notna(), None)
+        else:
+            out['iban_beneficiario'] = None
+        out['causale'] = df[cols['causale']].fillna('').astype(str) if cols['causale'] else ''
+        
+        # Righe non valide
+        invalide = out['data_bonifico'].isna() | out['importo'].isna()
+        errori = [f"Riga {r}: data o importo non validi" for r in out.loc[invalide, 'riga']]
+        out = out[~invalide]
+        
+        # Solo uscite (bonifici)
+        uscite = out['importo'] < 0
+        skipped = int((~uscite).sum()) + len(errori)
+        out = out[uscite].copy()
+        out['importo'] = out['importo'].abs()
+        
+        return out, errori, skipped
+    
+    @staticmethod
+    async def _carica_chiavi_esistenti(db, data_da, data_a) -> pd.DataFrame:
+        rows = await db.fetch_all("""
+            SELECT data_bonifico, beneficiario, importo
+            FROM bonifici
+            WHERE data_bonifico BETWEEN $1 AND $2
+        """, data_da, data_a)
+        
+        return pd.DataFrame(
+            [(r['data_bonifico'], r['beneficiario'], round(float(r['importo']), 2)) for r in rows],
+            columns=['data_bonifico', 'beneficiario', 'importo']
+        )
+    
+    @staticmethod
+    def risolvi_beneficiari(bonifici: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+        """
+        Tipo e riferimento per ogni bonifico tramite indice nomi/IBAN
+        
+        Ogni coppia (beneficiario, IBAN) distinta viene risolta una volta sola.
+        """
+        coppie = bonifici[['beneficiario', 'iban_beneficiario']].drop_duplicates()
+        
+        risolti = {}
+        for benef, iban in coppie.itertuples(index=False):
+            match = name_index.best(benef, iban, min_score=SOGLIA_MATCH_NOME)
+            risolti[(benef, iban)] = (match['tipo'], match['id']) if match else ('altro', None)
+        
+        esiti = [risolti[k] for k in zip(bonifici['beneficiario'], bonifici['iban_beneficiario'])]
+        tipo = pd.Series([e[0] for e in esiti], index=bonifici.index)
+        riferimento = pd.Series([e[1] for e in esiti], index=bonifici.index, dtype=object)
+        return tipo, riferimento
+    
+    @staticmethod
+    async def import_estratto(db, df: pd.DataFrame, file_path: str) -> Dict:
+        """
+        Importa estratto conto già letto in DataFrame
+        
+        Returns:
+            {'success', 'imported', 'skipped', 'errors'}
+        """
+        cols = BonificiImportService.identifica_colonne(df)
+        if not all([cols['data'], cols['beneficiario'], cols['importo']]):
+            raise ValueError("Colonne obbligatorie non trovate (Data, Beneficiario, Importo)")
+        
+        bonifici, errors, skipped = BonificiImportService.normalizza(df, cols)
+        
+        if bonifici.empty:
+            return {'success': True, 'imported': 0, 'skipped': skipped, 'errors': errors}
+        
+        # Duplicati: già in database o ripetuti nel file
+        esistenti = await BonificiImportService._carica_chiavi_esistenti(
+            db, bonifici['data_bonifico'].min(), bonifici['data_bonifico'].max()
+        )
+        chiave = ['data_bonifico', 'beneficiario', 'importo']
+        merged = bonifici.merge(esistenti.drop_duplicates(), on=chiave, how='left', indicator=True)
+        nuovi = merged[merged['_merge'] == 'left_only'].drop(columns='_merge')
+        nuovi = nuovi.drop_duplicates(subset=chiave)
+        skipped += len(bonifici) - len(nuovi)
+        
+        # Tipo e riferimento da indice nomi (dipendenti e fornitori)
+        await name_index.ensure_loaded()
+        nuovi['tipo'], nuovi['riferimento_id'] = BonificiImportService.risolvi_beneficiari(nuovi)
+        nuovi['file_import_path'] = file_path
+        nuovi['riconciliato'] = False
+        
+        records = [
+            (
+                r.data_bonifico, r.beneficiario, r.iban_beneficiario,
+                Decimal(str(r.importo)), r.causale, r.tipo,
+                r.riferimento_id,
+                r.file_import_path, r.riconciliato
+            )
+            for r in nuovi.itertuples(index=False)
+        ]
+        
+        result = await db.copy_records_to_table('bonifici', records=records, columns=BONIFICI_COLUMNS)
+        if result is None:
+            return {
+                'success': False,
+                'imported': 0,
+                'skipped': skipped,
+                'errors': errors + ["Database non disponibile"]
+            }
+        
+        for chunk in result['failed_chunks']:
+            errors.append(f"Errore inserimento {chunk['rows']} bonifici: {chunk['error']}")
+        
+        logger.info(f"Import bonifici {file_path}: {result['rows']} importati, {skipped} saltati")
+        
+        return {
+            'success': not result['failed_chunks'],
+            'imported': result['rows'],
+            'skipped': skipped,
+            'errors': errors
+        }
@@ -0,0 +1,221 @@
+"""
+Servizio Riconciliazione Bonifici - Match set-based
+1. Bonifici non riconciliati e documenti aperti (buste paga, fatture) in 2 query
+2. Documenti indicizzati per soggetto e ordinati per importo
+3. Finestra importo ± tolleranza con ricerca binaria
+4. Punteggio su differenza importo e vicinanza date, candidati ordinati
+   (documenti lontani più di FINESTRA_GIORNI restano candidati, con
+   punteggio data nullo; l'esclusione per età è solo su richiesta)
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Soggetto: ('dipendente', employee_id) o ('fornitore', fornitore_id)
+Soggetto = Tuple[str, int]
+
+TOLLERANZA_IMPORTO = 10.0
+# Giorni in cui il punteggio data scende da 1 a 0 (non esclude i documenti)
+FINESTRA_GIORNI = 90
+PESO_IMPORTO = 0.7
+PESO_DATA = 0.3
+
+QUERY_BONIFICI = """
+    SELECT * FROM bonifici
+    WHERE riconciliato = false
+    ORDER BY data_bonifico DESC
+"""
+
+QUERY_DOCUMENTI_APERTI = """
+    SELECT 'payslip' AS tipo_documento,
+           p.id,
+           p.netto_in_busta AS importo,
+           make_date(p.anno, p.mese, 1) AS data_documento,
+           'dipendente' AS soggetto_tipo,
+           p.employee_id AS soggetto_id,
+           'Busta paga ' || p.periodo || ' - ' || e.nome || ' ' || e.cognome AS descrizione
+    FROM payslips p
+    JOIN employees e ON p.employee_id = e.id
+    WHERE p.stato_pagamento = 'da_pagare'
+    AND p.netto_in_busta IS NOT NULL
+
+    UNION ALL
+
+    SELECT 'fattura' AS tipo_documento,
+           f.id,
+           f.totale AS importo,
+           COALESCE(f.data_scadenza, f.data_fattura) AS data_documento,
+           'fornitore' AS soggetto_tipo,
+           fo.id AS soggetto_id,
+           'Fattura ' || f.numero_fattura || ' - ' || f.ragione_sociale_fornitore AS descrizione
+    FROM fatture f
+    JOIN fornitori fo
+      ON fo.id_utente = f.id_utente
+     AND fo.partita_iva = f.partita_iva_fornitore
+    WHERE f.pagata = false
+"""
+
+
+class _Finestra:
+    """Documenti ordinati per importo (ricerca binaria sulla finestra)"""
+
+    __slots__ = ('importi', 'documenti')
+
+    def __init__(self, documenti: List[Dict]):
+        self.documenti = sorted(documenti, key=lambda d: d['importo'])
+        self.importi = [d['importo'] for d in self.documenti]
+
+    def range(self, importo: float, tolleranza: float) -> List[Dict]:
+        lo = bisect_left(self.importi, importo - tolleranza)
+        hi = bisect_right(self.importi, importo + tolleranza)
+        return self.documenti[lo:hi]
+
+
+class ReconciliationEngine:
+    """
+    Motore di match bonifici ↔ documenti aperti, tutto in memoria
+
+    Usage:
+        engine = ReconciliationEngine(documenti)
+        risultati = engine.riconcilia(bonifici)
+    """
+
+    def __init__(
+        self,
+        documenti: Iterable[Dict],
+        tolleranza_importo: float = TOLLERANZA_IMPORTO,
+        finestra_giorni: int = FINESTRA_GIORNI,
+        giorni_massimi: Optional[int] = None
+    ):
+        """
+        Args:
+            giorni_massimi: esclude i documenti più distanti dal bonifico
+                            (default None: nessuna esclusione per data)
+        """
+        self.tolleranza_importo = tolleranza_importo
+        self.finestra_giorni = finestra_giorni
+        self.giorni_massimi = giorni_massimi
+
+        per_soggetto: Dict[Soggetto, List[Dict]] = defaultdict(list)
+        tutti = []
+        for doc in documenti:
+            doc = self._normalizza_documento(doc)
+            tutti.append(doc)
+            if doc['soggetto_id'] is not None:
+                per_soggetto[(doc['soggetto_tipo'], doc['soggetto_id'])].append(doc)
+
+        self._per_soggetto = {k: _Finestra(v) for k, v in per_soggetto.items()}
+        self._tutti = _Finestra(tutti)
+
+    @staticmethod
+    def _normalizza_documento(doc: Dict) -> Dict:
+        return {
+            'tipo': doc['tipo_documento'],
+            'id': doc['id'],
+            'importo': float(doc['importo']),
+            'data': doc['data_documento'],
+            'soggetto_tipo': doc['soggetto_tipo'],
+            'soggetto_id': doc['soggetto_id'],
+            'descrizione': doc['descrizione']
+        }
+
+    def _score(self, differenza: float, giorni: Optional[int]) -> float:
+        score_importo = 1.0 - differenza / self.tolleranza_importo if self.tolleranza_importo else 1.0
+        score_data = max(0.0, 1.0 - giorni / self.finestra_giorni) if giorni is not None else 0.0
+        return PESO_IMPORTO * score_importo + PESO_DATA * score_data
+
+    def candidati(self, bonifico: Dict, limit: int = 3) -> List[Dict]:
+        """
+        Documenti compatibili con un bonifico, ordinati per punteggio
+
+        Con beneficiario risolto (dipendente/fornitore) si cerca solo tra i
+        documenti di quel soggetto; altrimenti tra tutti, a parità di importo.
+        """
+        importo = float(bonifico['importo'])
+        data_bonifico: Optional[date] = bonifico.get('data_bonifico')
+
+        tipo = bonifico.get('tipo')
+        riferimento = bonifico.get('riferimento_id')
+        if tipo in ('dipendente', 'fornitore') and riferimento:
+            finestra = self._per_soggetto.get((tipo, riferimento))
+            if finestra is None:
+                return []
+            documenti = finestra.range(importo, self.tolleranza_importo)
+        else:
+            # Beneficiario sconosciuto: solo importi quasi identici
+            documenti = self._tutti.range(importo, 0.01)
+
+        matches = []
+        for doc in documenti:
+            differenza = abs(doc['importo'] - importo)
+            giorni = abs((data_bonifico - doc['data']).days) if data_bonifico and doc['data'] else None
+            if self.giorni_massimi is not None and giorni is not None and giorni > self.giorni_massimi:
+                continue
+            matches.append({
+                'tipo': doc['tipo'],
+                'id': doc['id'],
+                'descrizione': doc['descrizione'],
+                'importo': doc['importo'],
+                'differenza': round(differenza, 2),
+                'giorni': giorni,
+                'score': round(self._score(differenza, giorni), 4)
+            })
+
+        matches.sort(key=lambda m: (-m['score'], m['differenza']))
+        return matches[:limit]
+
+    def riconcilia(self, bonifici: Iterable[Dict], limit: int = 3) -> List[Dict]:
+        """Candidati per tutto l'arretrato in un solo passaggio"""
+        return [
+            {
+                'bonifico': dict(bonifico),
+                'possibili_match': self.candidati(bonifico, limit)
+            }
+            for bonifico in bonifici
+        ]
+
+
+class BonificiReconciliationService:
+    """Servizio per riconciliazione massiva bonifici"""
+
+    @staticmethod
+    async def load_backlog(db) -> Tuple[List[Dict], List[Dict]]:
+        """Bonifici non riconciliati e documenti aperti (2 query)"""
+        bonifici = await db.fetch_all(QUERY_BONIFICI)
+        documenti = await db.fetch_all(QUERY_DOCUMENTI_APERTI)
+        return [dict(b) for b in bonifici], [dict(d) for d in documenti]
+
+    @staticmethod
+    async def suggerisci(
+        db,
+        limit: int = 3,
+        tolleranza_importo: float = TOLLERANZA_IMPORTO,
+        giorni_massimi: Optional[int] = None
+    ) -> Dict:
+        """
+        Candidati di riconciliazione per tutti i bonifici aperti
+
+        Args:
+            giorni_massimi: esclude i documenti più distanti dal bonifico (opzionale)
+
+        Returns:
+            {'success', 'bonifici_da_riconciliare', 'risultati'}
+        """
+        bonifici, documenti = await BonificiReconciliationService.load_backlog(db)
+
+        engine = ReconciliationEngine(
+            documenti, tolleranza_importo=tolleranza_importo, giorni_massimi=giorni_massimi
+        )
+        risultati = engine.riconcilia(bonifici, limit)
+
+        logger.info(f"Riconciliazione: {len(bonifici)} bonifici, {len(documenti)} documenti aperti")
+
+        return {
+            'success': True,
+            'bonifici_da_riconciliare': len(bonifici),
+            'risultati': risultati
+        }
@@ -0,0 +1,259 @@
+"""
+Libro Saldi Cassa - Saldo progressivo per snapshot giornalieri
+1. Snapshot del saldo di chiusura per giorno (cassa_saldi_giornalieri)
+2. Saldo a una data = ultimo snapshot <= data + movimenti successivi
+3. Movimenti retrodatati aggiornano gli snapshot (trigger, migration 010)
+4. Verifica di coerenza: snapshot ricalcolati da zero, deriva riportata
+"""
+from datetime import date, datetime
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+from app.database import db
+
+logger = logging.getLogger(__name__)
+
+# Intervallo verifica in background (secondi, 0 = disattivata)
+CASH_LEDGER_CHECK_INTERVAL = int(os.getenv("CASH_LEDGER_CHECK_INTERVAL", "0"))
+
+QUERY_SALDO = """
+    WITH snap AS (
+        SELECT data, saldo_chiusura
+        FROM cassa_saldi_giornalieri
+        WHERE id_utente = :id_utente AND data <= :data
+        ORDER BY data DESC
+        LIMIT 1
+    )
+    SELECT
+        (SELECT data FROM snap) AS data_snapshot,
+        COALESCE((SELECT saldo_chiusura FROM snap), 0) AS saldo_snapshot,
+        COALESCE(sum(m.importo), 0) AS movimenti_successivi,
+        count(m.*) AS numero_movimenti
+    FROM movimenti_cassa m
+    WHERE m.id_utente = :id_utente
+      AND m.data_operazione <= :data
+      AND m.data_operazione > COALESCE((SELECT data FROM snap), '-infinity'::date)
+"""
+
+# Snapshot precedente (strettamente prima) + movimenti fino a data inclusa
+QUERY_CHIUSURA = """
+    WITH prec AS (
+        SELECT data, saldo_chiusura
+        FROM cassa_saldi_giornalieri
+        WHERE id_utente = :id_utente AND data < :data
+        ORDER BY data DESC
+        LIMIT 1
+    )
+    INSERT INTO cassa_saldi_giornalieri AS s (id_utente, data, saldo_chiusura)
+    SELECT :id_utente::int, :data::date,
+           COALESCE((SELECT saldo_chiusura FROM prec), 0) + COALESCE(sum(m.importo), 0)
+    FROM movimenti_cassa m
+    WHERE m.id_utente = :id_utente
+      AND m.data_operazione <= :data
+      AND m.data_operazione > COALESCE((SELECT data FROM prec), '-infinity'::date)
+    ON CONFLICT (id_utente, data) DO UPDATE SET
+        saldo_chiusura = EXCLUDED.saldo_chiusura,
+        aggiornato_at = NOW()
+    RETURNING saldo_chiusura
+"""
+
+# Progressivo per giorno con window function; a parità di data il totale
+# del giorno precede lo snapshot, che quindi lo include
+QUERY_VERIFICA = """
+    WITH giorni AS (
+        SELECT id_utente, data_operazione AS data, sum(importo) AS totale, NULL::numeric AS saldo_snapshot
+        FROM movimenti_cassa
+        WHERE (:id_utente::int IS NULL OR id_utente = :id_utente::int)
+          AND data_operazione IS NOT NULL
+        GROUP BY 1, 2
+    ),
+    eventi AS (
+        SELECT * FROM giorni
+        UNION ALL
+        SELECT id_utente, data, 0, saldo_chiusura
+        FROM cassa_saldi_giornalieri
+        WHERE (:id_utente::int IS NULL OR id_utente = :id_utente::int)
+    ),
+    progressivi AS (
+        SELECT id_utente, data, saldo_snapshot,
+               sum(COALESCE(totale, 0)) OVER (
+                   PARTITION BY id_utente
+                   ORDER BY data, saldo_snapshot IS NOT NULL
+                   ROWS UNBOUNDED PRECEDING
+               ) AS saldo_ricalcolato
+        FROM eventi
+    )
+    SELECT id_utente, data, saldo_snapshot AS saldo_registrato, saldo_ricalcolato
+    FROM progressivi
+    WHERE saldo_snapshot IS NOT NULL
+"""
+
+
+class CashLedger:
+    """Saldo cassa da snapshot giornalieri"""
+
+    @staticmethod
+    async def saldo(id_utente: int, data: Optional[date] = None) -> Optional[Dict]:
+        """
+        Saldo cassa a fine giornata di `data` (default oggi)
+
+        Returns:
+            {'saldo', 'data_snapshot', 'movimenti_successivi'} o None senza database
+        """
+        if not db.pool:
+            return None
+
+        data = data or date.today()
+        row = await db.fetch_one(QUERY_SALDO, {'id_utente': id_utente, 'data': data})
+        if row is None:
+            return None
+
+        return {
+            'saldo': round(float(row['saldo_snapshot'] + row['movimenti_successivi']), 2),
+            'data_snapshot': row['data_snapshot'],
+            'movimenti_successivi': row['numero_movimenti']
+        }
+
+    @staticmethod
+    async def chiudi_giornata(id_utente: int, data: date) -> Optional[float]:
+        """
+        Registra (o ricalcola) lo snapshot di chiusura di una giornata
+
+        movimenti_cassa è bloccata in SHARE MODE per la durata dello statement:
+        un movimento concorrente non committato finirebbe fuori dallo snapshot
+        senza passare dal trigger di aggiornamento.
+        """
+        if not db.pool:
+            return None
+
+        async with db.transaction() as tx:
+            await tx.execute("LOCK TABLE movimenti_cassa IN SHARE MODE")
+            saldo = await tx.fetch_val(QUERY_CHIUSURA, {'id_utente': id_utente, 'data': data})
+
+        return round(float(saldo), 2)
+
+    @staticmethod
+    async def verifica(id_utente: Optional[int] = None, correggi: bool = False) -> Dict:
+        """
+        Ricalcola tutti gli snapshot dai movimenti e riporta le derive
+
+        Il ricalcolo è un solo statement senza lock: movimenti e snapshot
+        aggiornati dal trigger sono nello stesso snapshot MVCC. Solo con
+        correggi gli utenti con derive sono ricalcolati e riallineati uno
+        alla volta, con i loro snapshot bloccati (FOR UPDATE): i movimenti
+        concorrenti dello stesso utente attendono nel trigger, gli altri no.
+
+        Args:
+            correggi: riallinea gli snapshot disallineati al valore ricalcolato
+
+        Returns:
+            {'snapshot', 'derive': [{id_utente, data, saldo_registrato, saldo_ricalcolato, differenza}],
+             'corretti', 'seconds'}
+        """
+        if not db.pool:
+            raise RuntimeError("Database non disponibile")
+
+        start = time.perf_counter()
+        rows = await db.fetch_all(QUERY_VERIFICA, {'id_utente': id_utente})
+        derive = CashLedger._derive(rows)
+
+        await db.execute("""
+            UPDATE cassa_saldi_giornalieri SET verificato_at = NOW()
+            WHERE :id_utente::int IS NULL OR id_utente = :id_utente::int
+        """, {'id_utente': id_utente})
+
+        if derive:
+            logger.warning(
+                f"Saldi cassa: {len(derive)} snapshot disallineati su {len(rows)} "
+                f"(utenti {sorted({d['id_utente'] for d in derive})[:20]})"
+            )
+
+        corretti = 0
+        if correggi:
+            for utente in sorted({d['id_utente'] for d in derive}):
+                corretti += await CashLedger._correggi_utente(utente)
+
+        return {
+            'snapshot': len(rows),
+            'derive': derive,
+            'corretti': corretti,
+            'seconds': round(time.perf_counter() - start, 4)
+        }
+
+    @staticmethod
+    def _derive(rows) -> List[Dict]:
+        """Snapshot con saldo registrato diverso dal ricalcolato"""
+        return [
+            {
+                'id_utente': r['id_utente'],
+                'data': r['data'],
+                'saldo_registrato': float(r['saldo_registrato']),
+                'saldo_ricalcolato': float(r['saldo_ricalcolato']),
+                'differenza': float(r['saldo_registrato'] - r['saldo_ricalcolato'])
+            }
+            for r in rows
+            if r['saldo_registrato'] != r['saldo_ricalcolato']
+        ]
+
+    @staticmethod
+    async def _correggi_utente(id_utente: int) -> int:
+        """Ricalcolo e riallineamento degli snapshot di un utente, sotto lock"""
+        async with db.transaction() as tx:
+            # Un movimento retrodatato non committato ha già bloccato questi
+            # snapshot nel trigger: si attende il suo commit, poi lo si vede
+            await tx.execute("""
+                SELECT 1 FROM cassa_saldi_giornalieri
+                WHERE id_utente = :id_utente
+                FOR UPDATE
+            """, {'id_utente': id_utente})
+            rows = await tx.fetch_all(QUERY_VERIFICA, {'id_utente': id_utente})
+            derive = [r for r in rows if r['saldo_registrato'] != r['saldo_ricalcolato']]
+
+            if derive:
+                await tx.execute("""
+                    UPDATE cassa_saldi_giornalieri s SET
+                        saldo_chiusura = d.saldo,
+                        aggiornato_at = NOW()
+                    FROM unnest(:date::date[], :saldi::numeric[]) AS d(data, saldo)
+                    WHERE s.id_utente = :id_utente AND s.data = d.data
+                """, {
+                    'id_utente': id_utente,
+                    'date': [r['data'] for r in derive],
+                    'saldi': [r['saldo_ricalcolato'] for r in derive]
+                })
+
+        return len(derive)
+
+
+# ============================================================================
+# JOB
+# ============================================================================
+
+async def run_cash_ledger_check_job(correggi: bool = False):
+    """
+    Job schedulato di verifica snapshot saldi cassa
+
+    Di default solo report: le derive vanno indagate, non nascoste;
+    la correzione resta esplicita (correggi=True o /saldo/verifica).
+    """
+    print(f"💰 [Cassa] Verifica saldi giornalieri - {datetime.now()}")
+
+    result = await CashLedger.verifica(correggi=correggi)
+
+    print(f"  ✅ Snapshot verificati: {result['snapshot']} in {result['seconds']}s")
+    print(f"  ⚠️  Disallineati: {len(result['derive'])} (corretti: {result['corretti']})")
+
+    return result
+
+
+async def cash_ledger_check_loop(interval: int = CASH_LEDGER_CHECK_INTERVAL):
+    """Verifica periodica in background (avviata allo startup se interval > 0)"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_cash_ledger_check_job()
+        except Exception as e:
+            logger.error(f"Errore verifica saldi cassa: {e}")
@@ -0,0 +1,113 @@
+"""
+Aggregati Dashboard - Statistiche per utente in O(1)
+1. Contatori in dashboard_aggregati / dashboard_fatture_mese (migration 009)
+2. Aggiornati dai trigger su fatture, fornitori e movimenti_cassa per
+   qualunque scrittura (servizi, router, PostgREST)
+3. Ricostruzione completa come fallback (job o endpoint), con conteggio
+   degli utenti disallineati
+"""
+from datetime import datetime
+from typing import Dict, Optional
+import logging
+import time
+
+from app.database import db
+
+logger = logging.getLogger(__name__)
+
+QUERY_STATS = """
+    SELECT a.fatture_da_pagare_numero,
+           a.fatture_da_pagare_importo,
+           a.fornitori_attivi,
+           a.saldo_cassa,
+           a.ricostruito_at,
+           m.numero AS fatture_mese_numero,
+           m.totale AS fatture_mese_totale
+    FROM (SELECT :id_utente::int AS id_utente) u
+    LEFT JOIN dashboard_aggregati a ON a.id_utente = u.id_utente
+    LEFT JOIN dashboard_fatture_mese m ON m.id_utente = u.id_utente AND m.mese = :mese
+"""
+
+
+class DashboardAggregates:
+    """Lettura e ricostruzione degli aggregati dashboard"""
+
+    @staticmethod
+    async def get_stats(id_utente: int, mese: Optional[str] = None) -> Optional[Dict]:
+        """
+        Statistiche dashboard da una sola riga per utente
+
+        Returns:
+            Dict nel formato di /dashboard/stats, None se il database non è disponibile
+        """
+        if not db.pool:
+            return None
+
+        mese = mese or datetime.now().strftime('%Y-%m')
+        row = await db.fetch_one(QUERY_STATS, {'id_utente': id_utente, 'mese': mese})
+        if row is None:
+            return None
+
+        return {
+            "fatture_mese": {
+                "totale": round(float(row['fatture_mese_totale'] or 0), 2),
+                "numero": row['fatture_mese_numero'] or 0,
+                "mese": mese
+            },
+            "fornitori": {
+                "totale": row['fornitori_attivi'] or 0
+            },
+            "fatture_da_pagare": {
+                "numero": row['fatture_da_pagare_numero'] or 0,
+                "importo": round(float(row['fatture_da_pagare_importo'] or 0), 2)
+            },
+            "saldo_cassa": round(float(row['saldo_cassa'] or 0), 2),
+            "ricostruito_at": row['ricostruito_at']
+        }
+
+    @staticmethod
+    async def ricostruisci(id_utente: Optional[int] = None) -> Dict:
+        """
+        Ricalcolo completo dalle tabelle sorgente (None = tutti gli utenti)
+
+        Returns:
+            {'utenti', 'disallineati', 'seconds'}
+        """
+        start = time.perf_counter()
+        async with db.transaction() as tx:
+            rows = await tx.fetch_all(
+                "SELECT id_utente, disallineato FROM dashboard_ricostruisci(:id_utente::int)",
+                {'id_utente': id_utente}
+            )
+
+        disallineati = [r['id_utente'] for r in rows if r['disallineato']]
+        elapsed = round(time.perf_counter() - start, 4)
+        if disallineati:
+            logger.warning(f"Aggregati dashboard disallineati per {len(disallineati)} utenti: {disallineati[:20]}")
+
+        return {
+            'utenti': len(rows),
+            'disallineati': disallineati,
+            'seconds': elapsed
+        }
+
+
+# ============================================================================
+# JOB
+# ============================================================================
+
+async def run_dashboard_rebuild_job():
+    """
+    Job schedulato di ricostruzione aggregati (es. ogni notte)
+
+    I trigger mantengono i contatori; il job corregge eventuali derive
+    (modifiche con trigger disattivati, restore parziali, ecc.)
+    """
+    print(f"📊 [Dashboard] Ricostruzione aggregati - {datetime.now()}")
+
+    result = await DashboardAggregates.ricostruisci()
+
+    print(f"  ✅ Utenti: {result['utenti']} in {result['seconds']}s")
+    print(f"  ⚠️  Disallineati: {len(result['disallineati'])}")
+
+    return result
@@ -41,6 +41,7 @@ class EmailBotPayslips:
                 'success': bool,
                 'imported': int,
                 'skipped': int,
+                'duplicates': int,  # PDF già importati (stesso contenuto)
                 'errors': list
             }
         """
@@ -49,6 +50,7 @@ class EmailBotPayslips:
             'success': True,
             'imported': 0,
             'skipped': 0,
+            'duplicates': 0,
             'errors': []
         }
         
@@ -77,6 +79,7 @@ class EmailBotPayslips:
                 try:
                     result = await self._process_email(mail, email_id)
                     
+                    results['duplicates'] += result.get('duplicates', 0)
                     if result['success']:
                         results['imported'] += 1
                     else:
@@ -136,47 +139,49 @@ class EmailBotPayslips:
             )
             return {'success': False, 'error': 'Nessun PDF allegato'}
         
-        # Processa ogni PDF
+        # Processa tutti i PDF in parallelo
+        batch = await self.hr_service.import_payslips_batch(
+            pdf_attachments,
+            data_disponibilita=date.today()
+        )
+        
         imported_count = 0
+        duplicate_count = 0
         
-        for filename, pdf_data in pdf_attachments:
-            try:
-                # Import busta paga
-                result = await self.hr_service.import_payslip_from_pdf(
-                    pdf_data, 
-                    filename,
-                    data_disponibilita=date.today()
+        for result in batch['results']:
+            filename = result['filename']
+            if result['success'] and result.get('action') == 'duplicate':
+                # Mail reinviata o allegato ripetuto: già importato, nessun parse
+                await self._log_import(
+                    from_email, subject, date_email,
+                    filename, result.get('employee'), result.get('payslip_id'),
+                    'duplicato', None
                 )
-                
-                if result['success']:
-                    await self._log_import(
-                        from_email, subject, date_email,
-                        filename, result.get('employee'), result.get('payslip_id'),
-                        'successo', None
-                    )
-                    imported_count += 1
-                    print(f"✅ Importata: {filename} - {result['employee']['nome']} {result['employee']['cognome']}")
-                else:
-                    await self._log_import(
-                        from_email, subject, date_email,
-                        filename, None, None,
-                        'errore', result.get('error')
-                    )
-                
-            except Exception as e:
+                duplicate_count += 1
+                print(f"♻️  Già importata: {filename}")
+            elif result['success']:
+                await self._log_import(
+                    from_email, subject, date_email,
+                    filename, result.get('employee'), result.get('payslip_id'),
+                    'successo', None
+                )
+                imported_count += 1
+                print(f"✅ Importata: {filename} - {result['employee']['nome']} {result['employee']['cognome']}")
+            else:
                 await self._log_import(
                     from_email, subject, date_email,
                     filename, None, None,
-                    'errore', str(e)
+                    'errore', result.get('error')
                 )
         
-        # Marca email come letta
-        if imported_count > 0:
+        # Marca email come letta (anche se conteneva solo PDF già importati)
+        if imported_count > 0 or duplicate_count > 0:
             mail.store(email_id, '+FLAGS', '\\Seen')
         
         return {
             'success': imported_count > 0,
-            'imported': imported_count
+            'imported': imported_count,
+            'duplicates': duplicate_count
         }
     
     def _decode_subject(self, subject: str) -> str:
@@ -278,6 +283,7 @@ async def run_email_import_job(db):
     print(f"📊 [Email Bot] Risultati:")
     print(f"  ✅ Importate: {results['imported']}")
     print(f"  ⏭️  Skippate: {results['skipped']}")
+    print(f"  ♻️  Duplicati: {results['duplicates']}")
     print(f"  ❌ Errori: {len(results['errors'])}")
     
     if results['errors']:
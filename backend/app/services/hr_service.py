@@ -1,14 +1,22 @@
 """
 HR Service - Business Logic per gestione dipendenti, buste paga, contratti
 """
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func
+import asyncio
 import os
 from .payslip_parser import PayslipParser
+from .payslip_pool import process_payslip_async, split_payslips_async
+from .pdf_store import pdf_store
+from .pdf_text import hash_pdf
 from .pdf_utils import PDFUtils
+from .name_index import name_index
+
+# Buste paga importate in parallelo in un batch
+PAYSLIP_IMPORT_CONCURRENCY = int(os.getenv('PAYSLIP_IMPORT_CONCURRENCY', '8'))
 
 
 class HRService:
@@ -46,7 +54,10 @@ class HRService:
             ) RETURNING id
         """
         
-        employee_id = await self.db.execute(query, employee_data)
+        employee_id = await self.db.fetch_val(query, employee_data)
+        
+        if isinstance(employee_id, int):
+            name_index.add_employee({**employee_data, 'id': employee_id})
         
         return employee_id
     
@@ -109,6 +120,7 @@ class HRService:
         """
         Importa busta paga da PDF
         
+        0. Contenuto già importato (hash del PDF): nessun parse, action 'duplicate'
         1. Parse PDF ed estrai dati
         2. Trova dipendente per CF
         3. Genera PDF senza password per dipendente
@@ -116,11 +128,34 @@ class HRService:
         5. Calcola scadenza contestazione
         """
         
-        # 1. PARSE PDF
-        parsed_data = self.parser.parse_pdf(pdf_data)
+        # 0. DEDUPLICA PER CONTENUTO
+        sha256, duplicato = await pdf_store.cerca(self.db, pdf_data)
+        if duplicato:
+            return await self._payslip_duplicata(duplicato, sha256)
+        
+        # 1. PARSE PDF (e rimozione password) sul pool di processi
+        parsed_data, pdf_unlocked, error = await process_payslip_async(pdf_data)
         
         if not parsed_data:
-            return {'success': False, 'error': 'Impossibile parsare PDF'}
+            return {'success': False, 'error': error or 'Impossibile parsare PDF'}
+        
+        return await self._salva_payslip(pdf_data, pdf_unlocked, parsed_data, sha256, data_disponibilita)
+    
+    async def _salva_payslip(
+        self,
+        pdf_data: bytes,
+        pdf_unlocked: Optional[bytes],
+        parsed_data: Dict,
+        sha256: str,
+        data_disponibilita: Optional[date] = None,
+        parte: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Passi 2-6 dell'import: dipendente, file, payslip (dati già estratti)
+        
+        Args:
+            parte: PDF da split di un file multiplo, {'sha256_file', 'pagine', 'parti_file'}
+        """
         
         if not parsed_data.get('codice_fiscale'):
             return {'success': False, 'error': 'Codice fiscale non trovato nel PDF'}
@@ -135,25 +170,9 @@ class HRService:
             }
         
         # 3. SALVA PDF
-        upload_dir = '/home/claude/azienda-cloud/backend/uploads/payslips'
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # PDF originale (con password)
-        original_filename = f"payslip_{employee['id']}_{parsed_data['periodo']}_original.pdf"
-        original_path = os.path.join(upload_dir, original_filename)
-        
-        with open(original_path, 'wb') as f:
-            f.write(pdf_data)
-        
-        # PDF per dipendente (senza password)
-        view_filename = f"payslip_{employee['id']}_{parsed_data['periodo']}_view.pdf"
-        view_path = os.path.join(upload_dir, view_filename)
-        
-        # Rimuovi password se presente
-        pdf_unlocked = self.pdf_utils.remove_pdf_password(pdf_data)
-        
-        with open(view_path, 'wb') as f:
-            f.write(pdf_unlocked if pdf_unlocked else pdf_data)
+        # Originale (con password) e copia per il dipendente sotto l'hash
+        # del contenuto: scritti una volta, mai sovrascritti
+        original_path, view_path = await pdf_store.salva(sha256, pdf_data, pdf_unlocked)
         
         # 4. CALCOLA DATE CONTESTAZIONE
         if not data_disponibilita:
@@ -192,33 +211,11 @@ class HRService:
             'data_scadenza_contestazione': data_scadenza_contestazione
         }
         
-        # Controlla se esiste già
-        existing = await self.db.fetch_one("""
-            SELECT id FROM payslips
-            WHERE employee_id = :emp_id AND periodo = :periodo
-        """, {'emp_id': employee['id'], 'periodo': parsed_data['periodo']})
-        
-        if existing:
-            # Aggiorna
-            await self.db.execute("""
-                UPDATE payslips SET
-                    retribuzione_lorda = :retribuzione_lorda,
-                    netto_in_busta = :netto_in_busta,
-                    inps_dipendente = :inps_dipendente,
-                    inps_azienda = :inps_azienda,
-                    irpef = :irpef,
-                    ore_ordinarie = :ore_ordinarie,
-                    pdf_original_path = :pdf_original_path,
-                    pdf_view_path = :pdf_view_path,
-                    updated_at = NOW()
-                WHERE id = :id
-            """, {**payslip_data, 'id': existing['id']})
-            
-            payslip_id = existing['id']
-            action = 'updated'
-        else:
-            # Inserisci
-            payslip_id = await self.db.execute("""
+        # Payslip e dati dipendente nella stessa transazione
+        async with self.db.transaction() as tx:
+            # Insert o aggiornamento in un solo statement: due PDF dello stesso
+            # dipendente e periodo importati in parallelo non collidono
+            row = await tx.fetch_one("""
                 INSERT INTO payslips (
                     employee_id, periodo, anno, mese,
                     retribuzione_lorda, netto_in_busta,
@@ -243,21 +240,39 @@ class HRService:
                     :pdf_original_path, :pdf_view_path,
                     :data_disponibilita, :data_scadenza_contestazione,
                     'da_pagare'
-                ) RETURNING id
+                )
+                ON CONFLICT (employee_id, periodo) DO UPDATE SET
+                    retribuzione_lorda = EXCLUDED.retribuzione_lorda,
+                    netto_in_busta = EXCLUDED.netto_in_busta,
+                    inps_dipendente = EXCLUDED.inps_dipendente,
+                    inps_azienda = EXCLUDED.inps_azienda,
+                    irpef = EXCLUDED.irpef,
+                    ore_ordinarie = EXCLUDED.ore_ordinarie,
+                    pdf_original_path = EXCLUDED.pdf_original_path,
+                    pdf_view_path = EXCLUDED.pdf_view_path,
+                    updated_at = NOW()
+                RETURNING id, (xmax = 0) AS inserted
             """, payslip_data)
             
-            action = 'created'
-        
-        # 6. AGGIORNA DATI DIPENDENTE SE NECESSARIO
+            payslip_id = row['id']
+            action = 'created' if row['inserted'] else 'updated'
+            
+            await pdf_store.registra(tx, sha256, len(pdf_data), original_path, view_path, payslip_id, parte)
+            
+            # 6. AGGIORNA DATI DIPENDENTE SE NECESSARIO
+            if parsed_data.get('iban') and not employee.get('iban'):
+                await tx.execute("""
+                    UPDATE employees SET iban = :iban, banca = :banca
+                    WHERE id = :id
+                """, {
+                    'id': employee['id'],
+                    'iban': parsed_data['iban'],
+                    'banca': parsed_data.get('banca')
+                })
+            
+        # Indice nomi aggiornato solo dopo il commit
         if parsed_data.get('iban') and not employee.get('iban'):
-            await self.db.execute("""
-                UPDATE employees SET iban = :iban, banca = :banca
-                WHERE id = :id
-            """, {
-                'id': employee['id'],
-                'iban': parsed_data['iban'],
-                'banca': parsed_data.get('banca')
-            })
+            name_index.add_employee({**employee, 'iban': parsed_data['iban']})
         
         return {
             'success': True,
@@ -267,7 +282,173 @@ class HRService:
             'periodo': parsed_data['periodo'],
             'netto': parsed_data.get('netto_in_busta'),
             'data_disponibilita': data_disponibilita,
-            'data_scadenza_contestazione': data_scadenza_contestazione
+            'data_scadenza_contestazione': data_scadenza_contestazione,
+            'sha256': sha256
+        }
+    
+    async def _payslip_duplicata(self, duplicato: Dict, sha256: str) -> Dict:
+        """Esito di un PDF già importato (stesso contenuto): nessun parse né scrittura"""
+        
+        employee = await self.db.fetch_one("""
+            SELECT * FROM employees WHERE id = :id
+        """, {'id': duplicato['employee_id']})
+        
+        return {
+            'success': True,
+            'action': 'duplicate',
+            'payslip_id': duplicato['payslip_id'],
+            'employee': dict(employee) if employee else None,
+            'periodo': duplicato['periodo'],
+            'netto': duplicato['netto_in_busta'],
+            'sha256': sha256
+        }
+    
+    async def import_payslips_batch(
+        self,
+        files: List[Tuple[str, bytes]],
+        data_disponibilita: Optional[date] = None,
+        max_concurrency: int = PAYSLIP_IMPORT_CONCURRENCY
+    ) -> Dict:
+        """
+        Importa più buste paga in parallelo (al massimo max_concurrency alla volta)
+        
+        Un file fallito non interrompe gli altri. Lo stesso PDF allegato più
+        volte viene importato una volta sola; le copie risultano 'duplicate'.
+        
+        Returns:
+            {'total', 'imported', 'duplicates', 'failed', 'results': [{'filename', 'success', ...}]}
+            con results nello stesso ordine di files
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def import_one(filename: str, pdf_data: bytes) -> Dict:
+            async with semaphore:
+                try:
+                    result = await self.import_payslip_from_pdf(pdf_data, filename, data_disponibilita)
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+            return {'filename': filename, **result}
+        
+        async def import_copy(filename: str, primo: asyncio.Task) -> Dict:
+            result = await primo
+            if not result['success']:
+                return {'filename': filename, 'success': False, 'error': result.get('error')}
+            return {
+                'filename': filename,
+                'success': True,
+                'action': 'duplicate',
+                **{k: result.get(k) for k in ('payslip_id', 'employee', 'periodo', 'netto', 'sha256')}
+            }
+        
+        # Copie dello stesso contenuto nel batch: attendono l'import della prima
+        primi: Dict[str, asyncio.Task] = {}
+        tasks = []
+        for filename, pdf_data in files:
+            sha256 = hash_pdf(pdf_data)
+            if sha256 in primi:
+                pdf_store.conta_duplicato(len(pdf_data))
+                tasks.append(import_copy(filename, primi[sha256]))
+            else:
+                primi[sha256] = asyncio.ensure_future(import_one(filename, pdf_data))
+                tasks.append(primi[sha256])
+        
+        results = await asyncio.gather(*tasks)
+        duplicates = sum(1 for r in results if r['success'] and r.get('action') == 'duplicate')
+        imported = sum(1 for r in results if r['success']) - duplicates
+        
+        return {
+            'total': len(results),
+            'imported': imported,
+            'duplicates': duplicates,
+            'failed': len(results) - imported - duplicates,
+            'results': list(results)
+        }
+    
+    async def import_payslips_from_multi_pdf(
+        self,
+        pdf_data: bytes,
+        pdf_filename: str,
+        data_disponibilita: Optional[date] = None,
+        max_concurrency: int = PAYSLIP_IMPORT_CONCURRENCY
+    ) -> Dict:
+        """
+        Importa un PDF con le buste paga di più dipendenti (file mensile del consulente)
+        
+        0. File già importato per intero (hash del file, tutte le parti
+           registrate): nessuno sblocco, split o parse
+        1. Split per codice fiscale sul pool di processi: pagine lette una
+           volta, un PDF e i dati estratti per dipendente (le pagine dello
+           stesso dipendente sparse nel file sono unite in una parte)
+        2. Import delle parti in parallelo (al massimo max_concurrency alla volta);
+           ogni parte è deduplicata con chiave hash del file + pagine
+        
+        Returns:
+            {'total', 'imported', 'duplicates', 'failed', 'results': [{'filename',
+             'codice_fiscale', 'pagine', 'success', ...}]} nell'ordine delle pagine
+        """
+        # 0. DEDUPLICA PER FILE
+        sha256_file = hash_pdf(pdf_data)
+        registrate = await pdf_store.cerca_file(self.db, pdf_data, sha256_file)
+        if registrate:
+            results = []
+            for duplicato in registrate:
+                result = await self._payslip_duplicata(duplicato, duplicato['sha256'])
+                results.append({
+                    'filename': f"{pdf_filename} (pag. {duplicato['pagine']})",
+                    'codice_fiscale': (result['employee'] or {}).get('codice_fiscale'),
+                    'pagine': duplicato['pagine'],
+                    **result
+                })
+            return {
+                'success': True,
+                'total': len(results),
+                'imported': 0,
+                'duplicates': len(results),
+                'failed': 0,
+                'results': results
+            }
+        
+        parti, error = await split_payslips_async(pdf_data)
+        
+        if not parti:
+            return {'success': False, 'error': error or 'Impossibile dividere il PDF'}
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def import_parte(parte: Dict) -> Dict:
+            pagine = parte['pagine']
+            async with semaphore:
+                try:
+                    sha256, duplicato = await pdf_store.cerca(
+                        self.db, parte['pdf'], pdf_store.chiave_parte(sha256_file, pagine)
+                    )
+                    if duplicato:
+                        result = await self._payslip_duplicata(duplicato, sha256)
+                    else:
+                        result = await self._salva_payslip(
+                            parte['pdf'], None, parte['dati'], sha256, data_disponibilita,
+                            {'sha256_file': sha256_file, 'pagine': pagine, 'parti_file': len(parti)}
+                        )
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+            return {
+                'filename': f"{pdf_filename} (pag. {pagine})",
+                'codice_fiscale': parte['codice_fiscale'],
+                'pagine': pagine,
+                **result
+            }
+        
+        results = await asyncio.gather(*(import_parte(parte) for parte in parti))
+        duplicates = sum(1 for r in results if r['success'] and r.get('action') == 'duplicate')
+        imported = sum(1 for r in results if r['success']) - duplicates
+        
+        return {
+            'success': True,
+            'total': len(results),
+            'imported': imported,
+            'duplicates': duplicates,
+            'failed': len(results) - imported - duplicates,
+            'results': list(results)
         }
     
     async def get_employee_payslips(
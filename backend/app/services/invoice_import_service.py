@@ -0,0 +1,406 @@
+"""
+Servizio Import Fatture - Pipeline batch per upload massivo FatturaPA
+1. Parse di tutti i file (in parallelo sul pool di processi)
+2. Deduplica fornitori in memoria
+3. Insert set-based di fornitori, fatture, righe e riepilogo IVA (pochi statement per batch)
+
+I file molto grandi (lotti con molti corpi/righe) sono letti in
+streaming con iterparse e importati un batch di fatture alla volta.
+Gli upload (anche ZIP/p7m) sono consumati a gruppi di GROUP_SIZE file.
+"""
+
+import asyncio
+from datetime import datetime
+from io import BytesIO
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+from postgrest.exceptions import APIError
+
+from app.database import get_async_table
+from app.parsers.fatturapa_parser import iter_fatture_xml
+from app.parsers.fatturapa_pool import parse_files_parallel
+from app.services.name_index import name_index
+
+logger = logging.getLogger(__name__)
+
+class InvoiceImportService:
+    """Servizio per import massivo fatture passive"""
+    
+    # Fatture per batch (1 select + 4 insert set-based per batch)
+    BATCH_SIZE = 200
+    # Righe fattura per singola INSERT
+    RIGHE_CHUNK_SIZE = 1000
+    # Oltre questa dimensione il file è letto in streaming (iterparse)
+    STREAMING_THRESHOLD = 2 * 1024 * 1024
+    # File letti dall'upload (es. membri ZIP) per ogni giro della pipeline
+    GROUP_SIZE = 500
+    
+    @staticmethod
+    async def import_fatture(
+        id_utente: int,
+        payloads: Iterable[Tuple[str, Optional[bytes], Optional[str]]]
+    ) -> Dict:
+        """
+        Importa fatture XML in batch
+        
+        Args:
+            payloads: (filename, contenuto XML o None, errore estrazione o None),
+                      es. da iter_upload_payloads; letti a gruppi fuori dall'event loop
+        
+        Returns:
+            Dict con esito per fattura (uploaded, errors, results, error_details):
+            ogni esito porta filename e corpo (posizione da 1 nel lotto), gli
+            errori di lettura/parsing dell'intero file solo filename
+        """
+        payloads = iter(payloads)
+        results = []
+        errors = []
+        
+        while True:
+            group = await asyncio.to_thread(
+                InvoiceImportService._next_items, payloads, InvoiceImportService.GROUP_SIZE
+            )
+            if not group:
+                break
+            
+            files = []
+            for filename, content, error in group:
+                if error:
+                    errors.append({"filename": filename, "error": error})
+                else:
+                    files.append((filename, content))
+            
+            group_results, group_errors = await InvoiceImportService._import_group(id_utente, files)
+            results.extend(group_results)
+            errors.extend(group_errors)
+        
+        logger.info(f"Import fatture utente {id_utente}: {len(results)} ok, {len(errors)} errori")
+        
+        return {
+            "success": len(errors) == 0,
+            "uploaded": len(results),
+            "errors": len(errors),
+            "results": results,
+            "error_details": errors
+        }
+    
+    @staticmethod
+    async def _import_group(id_utente: int, files: List[Tuple[str, bytes]]) -> Tuple[List[Dict], List[Dict]]:
+        """Parse in parallelo + insert batch; streaming per i file grandi"""
+        threshold = InvoiceImportService.STREAMING_THRESHOLD
+        piccoli = [f for f in files if len(f[1]) <= threshold]
+        grandi = [f for f in files if len(f[1]) > threshold]
+        
+        parsed, errors = await InvoiceImportService.parse_files(piccoli)
+        results = []
+        
+        batch_size = InvoiceImportService.BATCH_SIZE
+        for start in range(0, len(parsed), batch_size):
+            batch = parsed[start:start + batch_size]
+            batch_results, batch_errors = await InvoiceImportService._import_batch(id_utente, batch)
+            results.extend(batch_results)
+            errors.extend(batch_errors)
+        
+        for filename, content in grandi:
+            file_results, file_errors = await InvoiceImportService._import_streaming(id_utente, filename, content)
+            results.extend(file_results)
+            errors.extend(file_errors)
+        
+        return results, errors
+    
+    @staticmethod
+    async def parse_files(files: List[Tuple[str, bytes]]) -> Tuple[List[Dict], List[Dict]]:
+        """Parse di tutti i file prima di toccare il database"""
+        parsed = []
+        errors = []
+        
+        async for filename, fatture, error in parse_files_parallel(files):
+            if error:
+                logger.error(f"Errore parsing {filename}: {error}")
+                errors.append({"filename": filename, "error": error})
+            else:
+                parsed.extend(
+                    {'filename': filename, 'corpo': corpo, 'fattura': fattura}
+                    for corpo, fattura in enumerate(fatture, start=1)
+                )
+        
+        return parsed, errors
+    
+    @staticmethod
+    def _next_items(items: Iterator, n: int) -> List:
+        return list(islice(items, n))
+    
+    @staticmethod
+    async def _import_streaming(id_utente: int, filename: str, content: bytes) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Importa un file grande consumando iter_fatture_xml a batch
+        
+        Il parsing di ogni batch gira in un thread, così l'event loop
+        resta libero e in memoria c'è al massimo un batch di fatture.
+        """
+        fatture = enumerate(iter_fatture_xml(BytesIO(content)), start=1)
+        batch_size = InvoiceImportService.BATCH_SIZE
+        results = []
+        errors = []
+        
+        while True:
+            try:
+                chunk = await asyncio.to_thread(InvoiceImportService._next_items, fatture, batch_size)
+            except Exception as e:
+                logger.error(f"Errore parsing {filename}: {str(e)}")
+                errors.append({"filename": filename, "error": str(e)})
+                break
+            
+            if not chunk:
+                break
+            
+            batch = [{'filename': filename, 'corpo': corpo, 'fattura': fattura} for corpo, fattura in chunk]
+            batch_results, batch_errors = await InvoiceImportService._import_batch(id_utente, batch)
+            results.extend(batch_results)
+            errors.extend(batch_errors)
+        
+        return results, errors
+    
+    @staticmethod
+    async def _import_batch(id_utente: int, batch: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Importa un batch: fornitori, fatture, righe, riepilogo IVA
+        
+        Una fattura le cui righe o il cui riepilogo non vengono inseriti è
+        cancellata: mai fatture importate senza righe.
+        """
+        await InvoiceImportService._sync_fornitori(id_utente, batch)
+        
+        inserted, errors = await InvoiceImportService._insert_fatture(id_utente, batch)
+        falliti = await InvoiceImportService._insert_righe(inserted)
+        completi = [(item, id_fattura) for item, id_fattura in inserted if id_fattura not in falliti]
+        falliti.update(await InvoiceImportService._insert_riepilogo(completi))
+        
+        if falliti:
+            await InvoiceImportService._annulla_fatture(list(falliti))
+            errors.extend(
+                {"filename": item['filename'], "corpo": item['corpo'], "error": falliti[id_fattura]}
+                for item, id_fattura in inserted
+                if id_fattura in falliti
+            )
+        
+        results = [
+            {
+                "filename": item['filename'],
+                "corpo": item['corpo'],
+                "success": True,
+                "numero_fattura": item['fattura'].get('numero_fattura'),
+                "fornitore": item['fattura'].get('ragione_sociale_fornitore')
+            }
+            for item, id_fattura in inserted
+            if id_fattura not in falliti
+        ]
+        
+        return results, errors
+    
+    @staticmethod
+    async def _sync_fornitori(id_utente: int, batch: List[Dict]):
+        """Crea in un'unica INSERT i fornitori non ancora presenti"""
+        fornitori = {}
+        for item in batch:
+            fattura = item['fattura']
+            partita_iva = fattura.get('partita_iva_fornitore')
+            ragione_sociale = fattura.get('ragione_sociale_fornitore')
+            if partita_iva and ragione_sociale and partita_iva not in fornitori:
+                fornitori[partita_iva] = {
+                    'id_utente': id_utente,
+                    'partita_iva': partita_iva,
+                    'ragione_sociale': ragione_sociale,
+                    'indirizzo': fattura.get('indirizzo_fornitore'),
+                    'cap': fattura.get('cap_fornitore'),
+                    'citta': fattura.get('comune_fornitore'),
+                    'provincia': fattura.get('provincia_fornitore')
+                }
+        
+        if not fornitori:
+            return
+        
+        fornitori_table = get_async_table('fornitori')
+        
+        try:
+            existing = await fornitori_table.select('partita_iva')\
+                .eq('id_utente', id_utente)\
+                .in_('partita_iva', list(fornitori.keys()))\
+                .execute()
+            
+            for row in existing.data or []:
+                fornitori.pop(row['partita_iva'], None)
+            
+            if fornitori:
+                inserted = await fornitori_table.insert(list(fornitori.values())).execute()
+                for row in inserted.data or []:
+                    name_index.add_fornitore(row)
+        except Exception as e:
+            # Il fornitore non blocca l'import della fattura
+            logger.error(f"Errore creazione fornitori: {str(e)}")
+    
+    @staticmethod
+    def _build_fattura_record(id_utente: int, item: Dict) -> Dict:
+        """Record tabella fatture da dati parsati"""
+        fattura = item['fattura']
+        
+        record = {
+            'id_utente': id_utente,
+            'numero_fattura': fattura.get('numero_fattura') or '',
+            'data_fattura': fattura.get('data_fattura') or datetime.now().date().isoformat(),
+            'partita_iva_fornitore': fattura.get('partita_iva_fornitore') or '',
+            'ragione_sociale_fornitore': fattura.get('ragione_sociale_fornitore') or '',
+            'imponibile': float(fattura.get('imponibile', 0)),
+            'iva': float(fattura.get('iva', 0)),
+            'totale': float(fattura.get('totale', 0)),
+            'stato': 'active',
+            'pagata': False,
+            'file_path': item['filename']
+        }
+        
+        if fattura.get('data_scadenza'):
+            record['data_scadenza'] = fattura['data_scadenza']
+        
+        return record
+    
+    @staticmethod
+    async def _insert_fatture(id_utente: int, batch: List[Dict]) -> Tuple[List[Tuple[Dict, int]], List[Dict]]:
+        """
+        Inserisce tutte le fatture del batch con una sola INSERT
+        
+        Se PostgREST rifiuta la INSERT di batch (APIError: nessuna riga
+        scritta), ripiega su insert per singola fattura per isolare gli
+        errori. Un numero di righe restituite diverso dal batch o un esito
+        incerto (timeout, errore di rete: la richiesta può essere ancora in
+        corso e committare) sono errori dell'intero batch: nessun nuovo
+        inserimento, che duplicherebbe le fatture già scritte.
+        """
+        fatture_table = get_async_table('fatture')
+        records = [InvoiceImportService._build_fattura_record(id_utente, item) for item in batch]
+        
+        try:
+            result = await fatture_table.insert(records).execute()
+            rows = result.data or []
+            if len(rows) == len(batch):
+                return [(item, row['id']) for item, row in zip(batch, rows)], []
+            
+            error = f"Insert batch fatture: attese {len(batch)} righe, ricevute {len(rows)}"
+            logger.error(error)
+            return [], [{"filename": item['filename'], "corpo": item['corpo'], "error": error} for item in batch]
+        except APIError as e:
+            logger.warning(f"Insert batch fatture rifiutata, fallback per file: {str(e)}")
+        except Exception as e:
+            error = f"Insert batch fatture con esito incerto, verificare prima di reimportare: {str(e)}"
+            logger.error(error)
+            return [], [{"filename": item['filename'], "corpo": item['corpo'], "error": error} for item in batch]
+        
+        inserted = []
+        errors = []
+        for item, record in zip(batch, records):
+            try:
+                result = await fatture_table.insert(record).execute()
+                inserted.append((item, result.data[0]['id']))
+            except Exception as e:
+                logger.error(f"Errore upload {item['filename']} (corpo {item['corpo']}): {str(e)}")
+                errors.append({"filename": item['filename'], "corpo": item['corpo'], "error": str(e)})
+        
+        return inserted, errors
+    
+    @staticmethod
+    async def _insert_righe(inserted: List[Tuple[Dict, int]]) -> Dict[int, str]:
+        """
+        Inserisce le righe di tutte le fatture a blocchi di RIGHE_CHUNK_SIZE
+        
+        Returns:
+            {id_fattura: errore} delle fatture con un blocco di righe fallito
+        """
+        righe_table = get_async_table('righe_fattura')
+        
+        rows = [
+            {
+                'id_fattura': id_fattura,
+                'descrizione': riga.get('descrizione', ''),
+                'quantita': float(riga.get('quantita', 1)),
+                'prezzo_unitario': float(riga.get('prezzo_unitario', 0)),
+                'importo': float(riga.get('totale_riga', 0)),
+                'aliquota_iva': float(riga.get('aliquota_iva', 22))
+            }
+            for item, id_fattura in inserted
+            for riga in item['fattura'].get('righe', [])
+        ]
+        
+        return await InvoiceImportService._insert_chunks(righe_table, rows, "righe")
+    
+    @staticmethod
+    async def _insert_riepilogo(inserted: List[Tuple[Dict, int]]) -> Dict[int, str]:
+        """
+        Riepilogo IVA per aliquota/natura di tutte le fatture (liquidazioni IVA)
+        
+        Returns:
+            {id_fattura: errore} delle fatture con un blocco di riepilogo fallito
+        """
+        rows = [
+            {
+                'id_fattura': id_fattura,
+                'aliquota_iva': float(voce.get('aliquota_iva') or 0),
+                'natura': voce.get('natura'),
+                'esigibilita_iva': voce.get('esigibilita_iva'),
+                'imponibile': float(voce.get('imponibile') or 0),
+                'imposta': float(voce.get('imposta') or 0)
+            }
+            for item, id_fattura in inserted
+            for voce in item['fattura'].get('riepilogo', [])
+        ]
+        
+        riepilogo_table = get_async_table('fatture_riepilogo_iva')
+        return await InvoiceImportService._insert_chunks(riepilogo_table, rows, "riepilogo IVA")
+    
+    @staticmethod
+    async def _insert_chunks(table, rows: List[Dict], descrizione: str) -> Dict[int, str]:
+        """
+        INSERT a blocchi di RIGHE_CHUNK_SIZE; fatture con righe non scritte
+        
+        Un blocco rifiutato da PostgREST (APIError, nessuna riga scritta) è
+        ripetuto con una INSERT per fattura: falliscono solo le fatture con
+        una riga non valida. Con esito incerto (timeout) il blocco non è
+        ripetuto e tutte le sue fatture risultano fallite.
+        """
+        falliti = {}
+        chunk_size = InvoiceImportService.RIGHE_CHUNK_SIZE
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                await table.insert(chunk).execute()
+                continue
+            except APIError as e:
+                logger.warning(f"Insert {descrizione} rifiutata, ripetuta per fattura: {str(e)}")
+            except Exception as e:
+                logger.error(f"Errore insert {descrizione}: {str(e)}")
+                for row in chunk:
+                    falliti.setdefault(row['id_fattura'], f"Errore {descrizione}, fattura non importata: {str(e)}")
+                continue
+            
+            per_fattura: Dict[int, List[Dict]] = {}
+            for row in chunk:
+                per_fattura.setdefault(row['id_fattura'], []).append(row)
+            
+            for id_fattura, righe in per_fattura.items():
+                try:
+                    await table.insert(righe).execute()
+                except Exception as e:
+                    logger.error(f"Errore insert {descrizione} fattura {id_fattura}: {str(e)}")
+                    falliti[id_fattura] = f"Errore {descrizione}, fattura non importata: {str(e)}"
+        
+        return falliti
+    
+    @staticmethod
+    async def _annulla_fatture(ids: List[int]):
+        """Cancella fatture incomplete con le righe e il riepilogo già scritti"""
+        try:
+            for tabella in ('righe_fattura', 'fatture_riepilogo_iva'):
+                await get_async_table(tabella).delete().in_('id_fattura', ids).execute()
+            await get_async_table('fatture').delete().in_('id', ids).execute()
+        except Exception as e:
+            logger.error(f"Errore cancellazione fatture incomplete {ids}: {str(e)}")
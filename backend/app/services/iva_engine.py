@@ -0,0 +1,407 @@
+"""
+Motore Liquidazioni IVA - Aggregazione in SQL per periodo e aliquota
+1. Una query per anno: totali IVA acquisti/vendite per periodo, aliquota,
+   natura ed esigibilità (riepilogo FatturaPA, migration 011)
+2. Liquidazione mensile, trimestrale o annuale con riporto del credito
+   (e dei debiti sotto soglia) da un periodo al successivo
+3. Periodi chiusi salvati in iva_liquidazioni: un ricalcolo dell'anno
+   riparte dall'ultimo periodo in cache. I trigger invalidano la cache
+   quando cambiano i documenti di un periodo già calcolato; la cache di un
+   anno vale solo con lo stesso riporto dall'anno precedente, e non è
+   scritta se i documenti sono cambiati durante il calcolo
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import os
+
+from app.database import Transaction, db
+
+logger = logging.getLogger(__name__)
+
+# Mesi per periodo di liquidazione
+PERIODICITA = {'mensile': 1, 'trimestrale': 3, 'annuale': 12}
+
+# Versamento minimo: importi inferiori si sommano al periodo successivo
+SOGLIA_VERSAMENTO = Decimal('25.82')
+# Maggiorazione sui versamenti dei contribuenti trimestrali
+INTERESSI_TRIMESTRALI = Decimal('0.01')
+
+# Giorni dopo la fine del periodo oltre i quali è considerato chiuso (scadenza F24)
+IVA_GIORNI_CHIUSURA = int(os.getenv("IVA_GIORNI_CHIUSURA", "16"))
+
+CENTESIMO = Decimal('0.01')
+
+# Fatture passive con riepilogo per aliquota; senza riepilogo (import
+# precedenti) i totali del documento finiscono in una voce non ripartita
+QUERY_AGGREGATI = """
+    WITH acquisti AS (
+        SELECT f.id, f.data_fattura, f.imponibile, f.iva
+        FROM fatture f
+        WHERE f.id_utente = :id_utente
+          AND f.data_fattura >= :data_inizio AND f.data_fattura < :data_fine
+    ),
+    voci AS (
+        SELECT 'acquisti' AS registro, a.data_fattura, r.aliquota_iva, r.natura,
+               r.esigibilita_iva, r.imponibile, r.imposta
+        FROM acquisti a
+        JOIN fatture_riepilogo_iva r ON r.id_fattura = a.id
+        UNION ALL
+        SELECT 'acquisti', a.data_fattura, NULL, NULL, NULL, a.imponibile, a.iva
+        FROM acquisti a
+        WHERE NOT EXISTS (SELECT 1 FROM fatture_riepilogo_iva r WHERE r.id_fattura = a.id)
+        UNION ALL
+        SELECT 'vendite', e.data_fattura, NULL, NULL, NULL, NULL, e.iva
+        FROM fatture_emesse e
+        WHERE e.id_utente = :id_utente
+          AND e.data_fattura >= :data_inizio AND e.data_fattura < :data_fine
+    )
+    SELECT registro,
+           (extract(month FROM data_fattura)::int - 1) / :mesi::int + 1 AS periodo,
+           aliquota_iva, natura, esigibilita_iva,
+           COALESCE(sum(imponibile), 0) AS imponibile,
+           COALESCE(sum(imposta), 0) AS imposta,
+           count(*) AS voci
+    FROM voci
+    GROUP BY 1, 2, 3, 4, 5
+    ORDER BY 2, 1, 3 NULLS LAST, 4 NULLS FIRST, 5
+"""
+
+QUERY_CACHE = """
+    SELECT periodo, data_inizio, data_fine, iva_vendite, iva_acquisti,
+           riporto_precedente, interessi, da_versare, riporto, dettaglio
+    FROM iva_liquidazioni
+    WHERE id_utente = :id_utente AND periodicita = :periodicita AND anno = :anno
+    ORDER BY periodo
+"""
+
+# Riporto finale dell'anno precedente: solo dall'ultimo periodo
+QUERY_RIPORTO_ANNO_PRECEDENTE = """
+    SELECT riporto
+    FROM iva_liquidazioni
+    WHERE id_utente = :id_utente AND periodicita = :periodicita AND anno = :anno - 1
+      AND periodo = :ultimo_periodo
+"""
+
+QUERY_VERSIONE = """
+    SELECT versione FROM iva_liquidazioni_versioni WHERE id_utente = :id_utente
+"""
+
+# Versione attuale con la riga bloccata fino al commit: i trigger la
+# incrementano prima di invalidare, quindi attendono la scrittura della cache
+QUERY_BLOCCA_VERSIONE = """
+    INSERT INTO iva_liquidazioni_versioni AS v (id_utente)
+    VALUES (:id_utente)
+    ON CONFLICT (id_utente) DO UPDATE SET versione = v.versione
+    RETURNING versione
+"""
+
+# Anno successivo calcolato con un riporto iniziale diverso da quello finale
+QUERY_INVALIDA_ANNO_SUCCESSIVO = """
+    DELETE FROM iva_liquidazioni
+    WHERE id_utente = :id_utente AND periodicita = :periodicita AND anno = :anno + 1
+      AND EXISTS (
+          SELECT 1 FROM iva_liquidazioni p
+          WHERE p.id_utente = :id_utente AND p.periodicita = :periodicita
+            AND p.anno = :anno + 1 AND p.periodo = 1
+            AND p.riporto_precedente <> :riporto
+      )
+"""
+
+QUERY_SALVA = """
+    INSERT INTO iva_liquidazioni AS l (
+        id_utente, periodicita, anno, periodo, data_inizio, data_fine,
+        iva_vendite, iva_acquisti, riporto_precedente, interessi, da_versare, riporto, dettaglio
+    ) VALUES (
+        :id_utente, :periodicita, :anno, :periodo, :data_inizio, :data_fine,
+        :iva_vendite, :iva_acquisti, :riporto_precedente, :interessi, :da_versare, :riporto, :dettaglio::jsonb
+    )
+    ON CONFLICT (id_utente, periodicita, anno, periodo) DO UPDATE SET
+        data_inizio = EXCLUDED.data_inizio,
+        data_fine = EXCLUDED.data_fine,
+        iva_vendite = EXCLUDED.iva_vendite,
+        iva_acquisti = EXCLUDED.iva_acquisti,
+        riporto_precedente = EXCLUDED.riporto_precedente,
+        interessi = EXCLUDED.interessi,
+        da_versare = EXCLUDED.da_versare,
+        riporto = EXCLUDED.riporto,
+        dettaglio = EXCLUDED.dettaglio,
+        calcolato_at = NOW()
+"""
+
+
+def periodi_anno(anno: int, periodicita: str) -> List[Tuple[int, date, date]]:
+    """(periodo, data_inizio, data_fine esclusa) dei periodi dell'anno"""
+    mesi = PERIODICITA[periodicita]
+    periodi = []
+    for periodo in range(1, 12 // mesi + 1):
+        mese_inizio = (periodo - 1) * mesi + 1
+        mese_fine = mese_inizio + mesi
+        data_inizio = date(anno, mese_inizio, 1)
+        data_fine = date(anno + 1, 1, 1) if mese_fine > 12 else date(anno, mese_fine, 1)
+        periodi.append((periodo, data_inizio, data_fine))
+    return periodi
+
+
+def periodo_chiuso(data_fine: date, oggi: Optional[date] = None) -> bool:
+    """Periodo chiuso: superata la scadenza di versamento"""
+    oggi = oggi or date.today()
+    return data_fine + timedelta(days=IVA_GIORNI_CHIUSURA) <= oggi
+
+
+def liquida_periodo(
+    periodicita: str,
+    iva_vendite: Decimal,
+    iva_acquisti: Decimal,
+    riporto_precedente: Decimal
+) -> Dict[str, Decimal]:
+    """
+    Saldo di un periodo con il riporto del precedente
+
+    riporto_precedente < 0 è un credito, > 0 un debito rimasto sotto soglia.
+
+    Returns:
+        {'saldo', 'interessi', 'da_versare', 'riporto'}
+    """
+    saldo = iva_vendite - iva_acquisti + riporto_precedente
+    interessi = Decimal('0')
+    da_versare = Decimal('0')
+    riporto = Decimal('0')
+
+    if saldo < 0:
+        riporto = saldo
+    elif saldo < SOGLIA_VERSAMENTO:
+        riporto = saldo
+    else:
+        if periodicita == 'trimestrale':
+            interessi = (saldo * INTERESSI_TRIMESTRALI).quantize(CENTESIMO)
+        da_versare = saldo + interessi
+
+    return {
+        'saldo': saldo,
+        'interessi': interessi,
+        'da_versare': da_versare,
+        'riporto': riporto
+    }
+
+
+class IvaEngine:
+    """Liquidazioni IVA per periodo con cache dei periodi chiusi"""
+
+    @staticmethod
+    async def liquida(
+        id_utente: int,
+        anno: int,
+        periodicita: str = 'mensile',
+        credito_iniziale: Optional[float] = None,
+        usa_cache: bool = True
+    ) -> Dict:
+        """
+        Liquidazioni di tutti i periodi dell'anno in una chiamata
+
+        Args:
+            periodicita: 'mensile', 'trimestrale' o 'annuale'
+            credito_iniziale: credito di inizio anno (default: riporto dell'ultimo
+                              periodo dell'anno precedente in cache, altrimenti 0);
+                              se indicato la cache non è né letta né scritta
+            usa_cache: False ricalcola tutti i periodi e riscrive la cache
+
+        Returns:
+            {'anno', 'periodicita', 'periodi': [...], 'totali': {...}, 'periodi_da_cache'}
+
+        Raises:
+            ValueError: periodicità non valida
+            RuntimeError: database non disponibile
+        """
+        if periodicita not in PERIODICITA:
+            raise ValueError(f"Periodicità non valida: {periodicita} (ammesse: {', '.join(PERIODICITA)})")
+
+        periodi = periodi_anno(anno, periodicita)
+        chiave = {'id_utente': id_utente, 'periodicita': periodicita, 'anno': anno}
+        # Un credito indicato a mano non viene dai documenti: niente cache
+        scrivi_cache = credito_iniziale is None
+        usa_cache = usa_cache and scrivi_cache
+
+        # Snapshot unico: cache, riporto e aggregati vedono gli stessi documenti
+        async with db.transaction(isolation='repeatable_read') as tx:
+            versione = await tx.fetch_val(QUERY_VERSIONE, {'id_utente': id_utente}) or 0
+
+            if credito_iniziale is not None:
+                riporto_iniziale = -Decimal(str(credito_iniziale))
+            else:
+                riporto_iniziale = await tx.fetch_val(
+                    QUERY_RIPORTO_ANNO_PRECEDENTE, {**chiave, 'ultimo_periodo': periodi[-1][0]}
+                ) or Decimal('0')
+
+            cache = {}
+            if usa_cache:
+                cache = {r['periodo']: r for r in await tx.fetch_all(QUERY_CACHE, chiave)}
+                # Anno calcolato con un altro riporto (anno precedente ricalcolato dopo)
+                if 1 in cache and cache[1]['riporto_precedente'] != riporto_iniziale:
+                    cache = {}
+
+            # Si riparte dal primo periodo non in cache
+            risultati = []
+            for periodo, _, _ in periodi:
+                if periodo not in cache:
+                    break
+                risultati.append(IvaEngine._da_cache(cache[periodo]))
+
+            riporto = Decimal(str(risultati[-1]['riporto'])) if risultati else riporto_iniziale
+
+            da_calcolare = periodi[len(risultati):]
+            nuovi = []
+            if da_calcolare:
+                nuovi = await IvaEngine._calcola(tx, id_utente, periodicita, da_calcolare, riporto)
+                risultati.extend(nuovi)
+
+        if scrivi_cache:
+            await IvaEngine._salva(chiave, versione, [r for r in nuovi if r['chiuso']], periodi[-1][0])
+
+        return {
+            'anno': anno,
+            'periodicita': periodicita,
+            'periodi': risultati,
+            'totali': IvaEngine._totali(risultati),
+            'periodi_da_cache': len(periodi) - len(da_calcolare)
+        }
+
+    @staticmethod
+    async def _calcola(
+        tx: Transaction,
+        id_utente: int,
+        periodicita: str,
+        periodi: List[Tuple[int, date, date]],
+        riporto: Decimal
+    ) -> List[Dict]:
+        """Aggregati SQL dei periodi richiesti e liquidazione in sequenza"""
+        rows = await tx.fetch_all(QUERY_AGGREGATI, {
+            'id_utente': id_utente,
+            'data_inizio': periodi[0][1],
+            'data_fine': periodi[-1][2],
+            'mesi': PERIODICITA[periodicita]
+        })
+
+        voci: Dict[int, List] = {}
+        for r in rows:
+            voci.setdefault(r['periodo'], []).append(r)
+
+        oggi = date.today()
+        risultati = []
+        for periodo, data_inizio, data_fine in periodi:
+            totali = {'acquisti': Decimal('0'), 'vendite': Decimal('0')}
+            dettaglio = []
+            for r in voci.get(periodo, []):
+                # IVA in scissione dei pagamenti: versata dal cessionario, fuori liquidazione
+                if r['esigibilita_iva'] != 'S':
+                    totali[r['registro']] += r['imposta']
+                dettaglio.append({
+                    'registro': r['registro'],
+                    'aliquota_iva': float(r['aliquota_iva']) if r['aliquota_iva'] is not None else None,
+                    'natura': r['natura'],
+                    'esigibilita_iva': r['esigibilita_iva'],
+                    'imponibile': float(r['imponibile']),
+                    'imposta': float(r['imposta']),
+                    'voci': r['voci']
+                })
+
+            esito = liquida_periodo(periodicita, totali['vendite'], totali['acquisti'], riporto)
+            risultati.append({
+                'periodo': periodo,
+                'data_inizio': data_inizio,
+                'data_fine': data_fine,
+                'iva_vendite': totali['vendite'],
+                'iva_acquisti': totali['acquisti'],
+                'riporto_precedente': riporto,
+                **esito,
+                'dettaglio': dettaglio,
+                'chiuso': periodo_chiuso(data_fine, oggi),
+                'da_cache': False
+            })
+            riporto = esito['riporto']
+
+        return [IvaEngine._formatta(r) for r in risultati]
+
+    @staticmethod
+    async def _salva(chiave: Dict, versione: int, risultati: List[Dict], ultimo_periodo: int):
+        """
+        Scrive in cache i periodi chiusi appena calcolati
+
+        Solo se nessun documento è cambiato dallo snapshot del calcolo
+        (versione invariata). Un riporto finale dell'anno diverso da quello
+        con cui è stato calcolato l'anno successivo ne invalida la cache.
+        """
+        if not risultati:
+            return
+
+        async with db.transaction() as tx:
+            attuale = await tx.fetch_val(QUERY_BLOCCA_VERSIONE, {'id_utente': chiave['id_utente']})
+            if attuale != versione:
+                logger.info(
+                    f"Liquidazione IVA utente {chiave['id_utente']} {chiave['anno']}: "
+                    f"documenti modificati durante il calcolo, cache non scritta"
+                )
+                return
+
+            await tx.executemany(QUERY_SALVA, [
+                {
+                    **chiave,
+                    'periodo': r['periodo'],
+                    'data_inizio': r['data_inizio'],
+                    'data_fine': r['data_fine'],
+                    'iva_vendite': Decimal(str(r['iva_vendite'])),
+                    'iva_acquisti': Decimal(str(r['iva_acquisti'])),
+                    'riporto_precedente': Decimal(str(r['riporto_precedente'])),
+                    'interessi': Decimal(str(r['interessi'])),
+                    'da_versare': Decimal(str(r['da_versare'])),
+                    'riporto': Decimal(str(r['riporto'])),
+                    'dettaglio': json.dumps(r['dettaglio'])
+                }
+                for r in risultati
+            ])
+
+            finale = next((r for r in risultati if r['periodo'] == ultimo_periodo), None)
+            if finale:
+                await tx.execute(QUERY_INVALIDA_ANNO_SUCCESSIVO, {**chiave, 'riporto': Decimal(str(finale['riporto']))})
+
+    @staticmethod
+    def _da_cache(row) -> Dict:
+        """Periodo dalla cache nel formato dei periodi calcolati"""
+        saldo = row['iva_vendite'] - row['iva_acquisti'] + row['riporto_precedente']
+        dettaglio = row['dettaglio']
+        return IvaEngine._formatta({
+            'periodo': row['periodo'],
+            'data_inizio': row['data_inizio'],
+            'data_fine': row['data_fine'],
+            'iva_vendite': row['iva_vendite'],
+            'iva_acquisti': row['iva_acquisti'],
+            'riporto_precedente': row['riporto_precedente'],
+            'saldo': saldo,
+            'interessi': row['interessi'],
+            'da_versare': row['da_versare'],
+            'riporto': row['riporto'],
+            'dettaglio': json.loads(dettaglio) if isinstance(dettaglio, str) else (dettaglio or []),
+            'chiuso': True,
+            'da_cache': True
+        })
+
+    @staticmethod
+    def _formatta(r: Dict) -> Dict:
+        """Importi in float a 2 decimali e tipo (debito/credito)"""
+        importi = ('iva_vendite', 'iva_acquisti', 'riporto_precedente', 'saldo', 'interessi', 'da_versare', 'riporto')
+        out = {**r, **{k: round(float(r[k]), 2) for k in importi}}
+        out['tipo'] = 'credito' if r['saldo'] < 0 else 'debito'
+        return out
+
+    @staticmethod
+    def _totali(risultati: List[Dict]) -> Dict:
+        """Totali dell'anno e riporto finale"""
+        return {
+            'iva_vendite': round(sum(r['iva_vendite'] for r in risultati), 2),
+            'iva_acquisti': round(sum(r['iva_acquisti'] for r in risultati), 2),
+            'interessi': round(sum(r['interessi'] for r in risultati), 2),
+            'da_versare': round(sum(r['da_versare'] for r in risultati), 2),
+            'riporto_finale': risultati[-1]['riporto'] if risultati else 0.0
+        }
@@ -1,18 +1,13 @@
 """
 Parser LibroUnico Zucchetti - Import presenze
 """
-try:
-    import PyPDF2
-    from io import BytesIO
-except ImportError:
-    PyPDF2 = None
-    BytesIO = None
-    
 import re
 from datetime import datetime, date
 from typing import List, Dict
 from decimal import Decimal
 
+from .pdf_text import estrai_testo
+
 
 class LibroUnicoParser:
     """Parser per file LibroUnico Zucchetti"""
@@ -51,11 +46,8 @@ class LibroUnicoParser:
         """
         
         try:
-            pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_data))
-            
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
+            # Testo dalla cache per contenuto (PDF già letto dal registro formati)
+            text = estrai_testo(pdf_data)
             
             presenze = self._extract_attendances(text)
             
@@ -222,79 +214,76 @@ async def import_libro_unico(pdf_data: bytes, db) -> Dict:
             'error': 'Nessuna presenza trovata nel PDF'
         }
     
-    imported = 0
-    updated = 0
     errors = []
     
+    # Dipendenti per CF: una sola query
+    codici_fiscali = sorted({p['codice_fiscale'] for p in presenze})
+    employees = await db.fetch_all("""
+        SELECT id, codice_fiscale FROM employees
+        WHERE codice_fiscale = ANY(:cfs)
+    """, {'cfs': codici_fiscali})
+    employee_ids = {e['codice_fiscale']: e['id'] for e in employees}
+    
+    rows = {}
     for presenza in presenze:
-        try:
-            # Trova dipendente
-            employee = await db.fetch_one("""
-                SELECT id FROM employees
-                WHERE codice_fiscale = :cf
-            """, {'cf': presenza['codice_fiscale']})
-            
-            if not employee:
-                errors.append(f"Dipendente non trovato: {presenza['codice_fiscale']}")
-                continue
-            
-            # Inserisci/Aggiorna presenza
-            existing = await db.fetch_one("""
-                SELECT id FROM attendances
-                WHERE employee_id = :emp_id AND data = :data
-            """, {
-                'emp_id': employee['id'],
-                'data': presenza['data']
-            })
-            
-            if existing:
-                # Aggiorna
-                await db.execute("""
-                    UPDATE attendances
-                    SET tipo = :tipo,
-                        ore_lavorate = :ore,
-                        ore_straordinarie = :ore_str,
-                        codice_giustificativo = :cod_giust,
-                        descrizione_giustificativo = :desc_giust
-                    WHERE id = :id
-                """, {
-                    'id': existing['id'],
-                    'tipo': presenza['tipo'],
-                    'ore': presenza['ore_lavorate'],
-                    'ore_str': presenza['ore_straordinarie'],
-                    'cod_giust': presenza['codice_giustificativo'],
-                    'desc_giust': presenza['descrizione_giustificativo']
-                })
-                updated += 1
-            else:
-                # Inserisci
-                await db.execute("""
-                    INSERT INTO attendances (
-                        employee_id, data, tipo,
-                        ore_lavorate, ore_straordinarie,
-                        codice_giustificativo, descrizione_giustificativo
-                    ) VALUES (
-                        :emp_id, :data, :tipo,
-                        :ore, :ore_str,
-                        :cod_giust, :desc_giust
-                    )
-                """, {
-                    'emp_id': employee['id'],
-                    'data': presenza['data'],
-                    'tipo': presenza['tipo'],
-                    'ore': presenza['ore_lavorate'],
-                    'ore_str': presenza['ore_straordinarie'],
-                    'cod_giust': presenza['codice_giustificativo'],
-                    'desc_giust': presenza['descrizione_giustificativo']
-                })
-                imported += 1
+        emp_id = employee_ids.get(presenza['codice_fiscale'])
+        if not emp_id:
+            errors.append(f"Dipendente non trovato: {presenza['codice_fiscale']}")
+            continue
         
-        except Exception as e:
-            errors.append(f"Errore presenza {presenza['data']}: {str(e)}")
+        # Stessa coppia dipendente/giorno ripetuta nel PDF: vale l'ultima
+        rows[(emp_id, presenza['data'])] = {
+            'employee_id': emp_id,
+            'data': presenza['data'],
+            'tipo': presenza['tipo'],
+            'ore_lavorate': presenza['ore_lavorate'],
+            'ore_straordinarie': presenza['ore_straordinarie'],
+            'codice_giustificativo': presenza['codice_giustificativo'],
+            'descrizione_giustificativo': presenza['descrizione_giustificativo']
+        }
+    
+    if not rows:
+        return {
+            'success': True,
+            'imported': 0,
+            'updated': 0,
+            'total': len(presenze),
+            'errors': errors
+        }
+    
+    # Presenze già registrate (per distinguere inserite/aggiornate)
+    date_presenze = [data for _, data in rows]
+    existing = await db.fetch_all("""
+        SELECT employee_id, data FROM attendances
+        WHERE employee_id = ANY(:emp_ids)
+        AND data BETWEEN :data_da AND :data_a
+    """, {
+        'emp_ids': sorted(set(employee_ids.values())),
+        'data_da': min(date_presenze),
+        'data_a': max(date_presenze)
+    })
+    esistenti = {(e['employee_id'], e['data']) for e in existing} & rows.keys()
+    
+    # Inserisci/Aggiorna presenze: INSERT ... ON CONFLICT a chunk
+    chiavi = list(rows.keys())
+    result = await db.upsert_many('attendances', list(rows.values()), ['employee_id', 'data'])
+    if result is None:
+        return {
+            'success': False,
+            'error': 'Database non disponibile'
+        }
+    
+    fallite = set()
+    for chunk in result['failed_chunks']:
+        fallite.update(chiavi[chunk['offset']:chunk['offset'] + chunk['rows']])
+        errors.append(f"Errore su {chunk['rows']} presenze: {chunk['error']}")
+    
+    scritte = [k for k in chiavi if k not in fallite]
+    updated = sum(1 for k in scritte if k in esistenti)
     
     return {
         'success': True,
-        'imported': imported,
+        'imported': len(scritte) - updated,
         'updated': updated,
         'total': len(presenze),
         'errors': errors
@@ -0,0 +1,307 @@
+"""
+Indice Nomi - Risoluzione beneficiario → dipendente/fornitore
+1. Nomi normalizzati (casefold, accenti, punteggiatura, forme societarie)
+2. Token ordinati: "ROSSI MARIO" = "Mario Rossi"
+3. Lookup esatto, per IBAN e per trigrammi (similarità di Dice)
+4. Aggiornamento incrementale su insert/update anagrafiche
+"""
+import asyncio
+import logging
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from app.database import get_async_table
+
+logger = logging.getLogger(__name__)
+
+# Forme societarie (dopo rimozione di punti e casefold)
+FORME_SOCIETARIE = {
+    'srl', 'srls', 'spa', 'snc', 'sas', 'sapa', 'scarl', 'scrl', 'sc', 'scpa',
+    'ss', 'scoop', 'coop', 'societa', 'soc', 'cooperativa', 'consortile',
+    'semplificata', 'responsabilita', 'limitata', 'unipersonale', 'arl',
+    'ltd', 'gmbh', 'sarl', 'sl', 'inc', 'llc', 'bv', 'ag'
+}
+
+# Abbreviazione puntata: "s.r.l.", "s.a.s.", "c." (lettere singole seguite da punto)
+_ABBREVIAZIONE = re.compile(r'\b[a-z]\.(?:[a-z]\b\.?)*')
+# "a r.l." (società cooperativa a responsabilità limitata)
+_A_RL = re.compile(r'\ba\s+r\.\s*l\b\.?')
+_NON_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+# Righe per richiesta nel caricamento (limite PostgREST)
+PAGINA_CARICAMENTO = 1000
+
+
+def _unisci_abbreviazione(m: 're.Match') -> str:
+    # "s.r.l." → "srl" (poi scartata come forma societaria); "c." → scartata
+    lettere = ''.join(c for c in m.group() if c.isalpha())
+    return f" {lettere} " if len(lettere) > 1 else ' '
+
+Chiave = Tuple[str, int]
+
+
+def normalizza_nome(nome: Optional[str]) -> str:
+    """
+    Nome in forma canonica per il confronto
+
+    "Rossi Mario S.r.l." → "mario rossi"
+    """
+    if not nome:
+        return ''
+
+    testo = unicodedata.normalize('NFKD', str(nome)).casefold()
+    testo = ''.join(c for c in testo if not unicodedata.combining(c))
+    # S.R.L. → srl prima della tokenizzazione; le lettere singole sono
+    # scartate solo se puntate (& C.), mai "e"/"di" tra due nomi
+    testo = _A_RL.sub(' arl ', testo)
+    testo = _ABBREVIAZIONE.sub(_unisci_abbreviazione, testo).replace('.', '')
+
+    tokens = [t for t in _NON_ALFANUMERICO.split(testo) if t and t not in FORME_SOCIETARIE]
+    return ' '.join(sorted(tokens))
+
+
+def normalizza_iban(iban: Optional[str]) -> str:
+    return re.sub(r'\s+', '', str(iban)).upper() if iban else ''
+
+
+def trigrammi(chiave: str) -> Set[str]:
+    padded = f"  {chiave} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Indice in memoria di dipendenti e fornitori
+
+    Le voci sono identificate da (tipo, id) con tipo 'dipendente' o
+    'fornitore'; i fornitori portano id_utente per filtrare per utente.
+    I trigrammi sono indicizzati per nome normalizzato distinto, quindi
+    omonimi e duplicati costano una sola verifica.
+    """
+
+    def __init__(self):
+        self._voci: Dict[Chiave, Dict] = {}
+        self._nomi: Dict[str, Set[Chiave]] = {}
+        self._nomi_trigrammi: Dict[str, FrozenSet[str]] = {}
+        self._iban: Dict[str, Set[Chiave]] = defaultdict(set)
+        self._trigrammi: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = asyncio.Lock()
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._voci)
+
+    # ========================================================================
+    # AGGIORNAMENTO
+    # ========================================================================
+
+    def add(self, tipo: str, id: int, nome: str, iban: Optional[str] = None, id_utente: Optional[int] = None):
+        """Inserisce o aggiorna una voce"""
+        chiave = (tipo, id)
+        self.remove(tipo, id)
+
+        voce = {
+            'tipo': tipo,
+            'id': id,
+            'nome': nome,
+            'iban': normalizza_iban(iban),
+            'id_utente': id_utente,
+            'norm': normalizza_nome(nome)
+        }
+        self._voci[chiave] = voce
+
+        norm = voce['norm']
+        if norm:
+            if norm not in self._nomi:
+                self._nomi[norm] = set()
+                self._nomi_trigrammi[norm] = frozenset(trigrammi(norm))
+                for t in self._nomi_trigrammi[norm]:
+                    self._trigrammi[t].add(norm)
+            self._nomi[norm].add(chiave)
+        if voce['iban']:
+            self._iban[voce['iban']].add(chiave)
+
+    def remove(self, tipo: str, id: int):
+        chiave = (tipo, id)
+        voce = self._voci.pop(chiave, None)
+        if voce is None:
+            return
+
+        norm = voce['norm']
+        if norm in self._nomi:
+            self._nomi[norm].discard(chiave)
+            if not self._nomi[norm]:
+                del self._nomi[norm]
+                for t in self._nomi_trigrammi.pop(norm):
+                    self._trigrammi[t].discard(norm)
+                    if not self._trigrammi[t]:
+                        del self._trigrammi[t]
+
+        if voce['iban'] in self._iban:
+            self._iban[voce['iban']].discard(chiave)
+            if not self._iban[voce['iban']]:
+                del self._iban[voce['iban']]
+
+    def add_employee(self, row: Dict):
+        """Voce da riga employees"""
+        self.add('dipendente', row['id'], f"{row.get('nome') or ''} {row.get('cognome') or ''}", row.get('iban'))
+
+    def add_fornitore(self, row: Dict):
+        """Voce da riga fornitori"""
+        self.add('fornitore', row['id'], row.get('ragione_sociale'), row.get('iban'), row.get('id_utente'))
+
+    def clear(self):
+        self._voci.clear()
+        self._nomi.clear()
+        self._nomi_trigrammi.clear()
+        self._iban.clear()
+        self._trigrammi.clear()
+        self.loaded = False
+
+    # ========================================================================
+    # RICERCA
+    # ========================================================================
+
+    def _ammessa(self, chiave: Chiave, tipo: Optional[str], id_utente: Optional[int]) -> bool:
+        voce = self._voci[chiave]
+        if tipo and voce['tipo'] != tipo:
+            return False
+        if id_utente is not None and voce['id_utente'] not in (None, id_utente):
+            return False
+        return True
+
+    def _simili(self, norm: str, min_score: float) -> List[Tuple[str, float]]:
+        """Nomi indicizzati con similarità di Dice >= min_score"""
+        query = trigrammi(norm)
+        n_query = len(query)
+
+        # Prefix filtering: con Dice >= min_score un nome condivide almeno
+        # `minimo` trigrammi, quindi almeno uno dei più rari della query
+        minimo = max(1, math.ceil(min_score * n_query / (2 - min_score)))
+        rari = sorted(query, key=lambda t: len(self._trigrammi.get(t, ())))
+        candidati = set()
+        for t in rari[:n_query - minimo + 1]:
+            candidati.update(self._trigrammi.get(t, ()))
+
+        # Filtro su lunghezza: Dice >= s implica |c| in [s/(2-s), (2-s)/s] * |q|
+        min_len = min_score / (2 - min_score) * n_query
+        max_len = (2 - min_score) / min_score * n_query
+
+        simili = []
+        for nome in candidati:
+            tri = self._nomi_trigrammi[nome]
+            n_tri = len(tri)
+            if n_tri < min_len or n_tri > max_len:
+                continue
+            score = 2.0 * len(query & tri) / (n_query + n_tri)
+            if score >= min_score:
+                simili.append((nome, score))
+        return simili
+
+    def search(
+        self,
+        nome: Optional[str],
+        iban: Optional[str] = None,
+        tipo: Optional[str] = None,
+        id_utente: Optional[int] = None,
+        limit: int = 5,
+        min_score: float = 0.5
+    ) -> List[Dict]:
+        """
+        Candidati ordinati per punteggio (1.0 = IBAN o nome identico)
+
+        Returns:
+            [{'tipo', 'id', 'nome', 'score', 'match'}]
+        """
+        punteggi: Dict[Chiave, Tuple[float, str]] = {}
+
+        iban_norm = normalizza_iban(iban)
+        for chiave in self._iban.get(iban_norm, ()) if iban_norm else ():
+            if self._ammessa(chiave, tipo, id_utente):
+                punteggi[chiave] = (1.0, 'iban')
+
+        norm = normalizza_nome(nome)
+        if norm:
+            for chiave in self._nomi.get(norm, ()):
+                if chiave not in punteggi and self._ammessa(chiave, tipo, id_utente):
+                    punteggi[chiave] = (1.0, 'nome')
+
+        # Match esatti sufficienti: niente ricerca per similarità
+        if norm and len(punteggi) < limit:
+            for simile, score in self._simili(norm, min_score):
+                if simile == norm:
+                    continue
+                for chiave in self._nomi[simile]:
+                    if chiave not in punteggi and self._ammessa(chiave, tipo, id_utente):
+                        punteggi[chiave] = (score, 'trigrammi')
+
+        # A parità di punteggio prima i dipendenti
+        ordinati = sorted(
+            punteggi.items(),
+            key=lambda kv: (-kv[1][0], kv[0][0] != 'dipendente')
+        )[:limit]
+        return [
+            {
+                'tipo': chiave[0],
+                'id': chiave[1],
+                'nome': self._voci[chiave]['nome'],
+                'score': round(score, 4),
+                'match': match
+            }
+            for chiave, (score, match) in ordinati
+        ]
+
+    def best(self, nome: Optional[str], iban: Optional[str] = None, **kwargs) -> Optional[Dict]:
+        """Miglior candidato o None"""
+        risultati = self.search(nome, iban, limit=1, **kwargs)
+        return risultati[0] if risultati else None
+
+    # ========================================================================
+    # CARICAMENTO
+    # ========================================================================
+
+    def load(self, employees: Iterable[Dict], fornitori: Iterable[Dict]):
+        """Ricostruzione completa da righe anagrafiche"""
+        self.clear()
+        for row in employees:
+            self.add_employee(row)
+        for row in fornitori:
+            self.add_fornitore(row)
+        self.loaded = True
+
+    async def ensure_loaded(self) -> 'NameIndex':
+        """Carica l'indice alla prima richiesta (una sola volta)"""
+        if self.loaded:
+            return self
+
+        async with self._lock:
+            if not self.loaded:
+                employees = await self._carica_tabella('employees', 'id, nome, cognome, iban')
+                fornitori = await self._carica_tabella('fornitori', 'id, id_utente, ragione_sociale, iban')
+
+                self.load(employees, fornitori)
+                logger.info(f"Indice nomi caricato: {len(self)} voci")
+
+        return self
+
+    @staticmethod
+    async def _carica_tabella(tabella: str, colonne: str) -> List[Dict]:
+        """Tutte le righe, a pagine: una select singola è troncata a 1000 righe"""
+        righe: List[Dict] = []
+        while True:
+            result = await get_async_table(tabella)\
+                .select(colonne)\
+                .order('id')\
+                .range(len(righe), len(righe) + PAGINA_CARICAMENTO - 1)\
+                .execute()
+            pagina = result.data or []
+            righe.extend(pagina)
+            if len(pagina) < PAGINA_CARICAMENTO:
+                return righe
+
+
+# Istanza globale (per processo)
+name_index = NameIndex()
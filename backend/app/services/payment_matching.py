@@ -0,0 +1,367 @@
+"""
+Abbinamento Massivo Bonifici ↔ Fatture
+1. Punteggi vettoriali (NumPy): scostamento importo, distanza date, similarità nomi
+2. Assegnazione globale uno-a-uno (algoritmo ungherese per componente connessa)
+3. Pagamenti cumulativi: un bonifico che salda più fatture dello stesso fornitore
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from app.services.name_index import normalizza_nome, trigrammi
+
+logger = logging.getLogger(__name__)
+
+PESO_IMPORTO = 0.5
+PESO_NOME = 0.35
+PESO_DATA = 0.15
+
+# Costo delle coppie non ammesse: l'ungherese massimizza prima il numero
+# di abbinamenti validi, poi il punteggio
+COSTO_NON_AMMESSO = 1e6
+
+# Celle massime della matrice bonifici × fatture calcolate per blocco
+MAX_CELLE_BLOCCO = 2_000_000
+
+
+def _giorno(value) -> float:
+    """Data (date, datetime o ISO) → ordinale, NaN se assente"""
+    if not value:
+        return np.nan
+    if isinstance(value, datetime):
+        return float(value.date().toordinal())
+    if isinstance(value, date):
+        return float(value.toordinal())
+    try:
+        return float(date.fromisoformat(str(value)[:10]).toordinal())
+    except ValueError:
+        return np.nan
+
+
+def similarita_nomi(nomi_a: Sequence[str], nomi_b: Sequence[str]) -> np.ndarray:
+    """
+    Matrice di similarità di Dice sui trigrammi (len(nomi_a) × len(nomi_b))
+
+    I nomi devono essere già normalizzati (normalizza_nome).
+    """
+    vocabolario: Dict[str, int] = {}
+    insiemi_a = [trigrammi(n) if n else set() for n in nomi_a]
+    insiemi_b = [trigrammi(n) if n else set() for n in nomi_b]
+    for insieme in insiemi_a + insiemi_b:
+        for t in insieme:
+            vocabolario.setdefault(t, len(vocabolario))
+
+    def matrice(insiemi):
+        m = np.zeros((len(insiemi), max(len(vocabolario), 1)), dtype=np.float32)
+        for i, insieme in enumerate(insiemi):
+            m[i, [vocabolario[t] for t in insieme]] = 1.0
+        return m
+
+    a = matrice(insiemi_a)
+    b = matrice(insiemi_b)
+    intersezioni = a @ b.T
+    somme = a.sum(axis=1)[:, None] + b.sum(axis=1)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sim = np.where(somme > 0, 2.0 * intersezioni / somme, 0.0)
+    return sim.astype(np.float32)
+
+
+def hungarian(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Assegnazione a costo minimo (righe ≤ colonne), O(n² m)
+
+    Returns:
+        coppie (riga, colonna)
+    """
+    n, m = cost.shape
+    if n > m:
+        return [(i, j) for j, i in hungarian(cost.T)]
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            ridotti = cost[i0 - 1] - u[i0] - v[1:]
+
+            migliori = free & (ridotti < minv[1:])
+            minv[1:][migliori] = ridotti[migliori]
+            way[1:][migliori] = j0
+
+            candidati = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidati)) + 1
+            delta = candidati[j1 - 1]
+
+            usate = np.nonzero(used)[0]
+            u[p[usate]] += delta
+            v[usate] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    return [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
+
+
+class BatchMatcher:
+    """
+    Abbinamento globale bonifici ↔ fatture non pagate
+
+    Usage:
+        matcher = BatchMatcher()
+        risultato = matcher.match(bonifici, fatture)
+    """
+
+    def __init__(
+        self,
+        tolleranza_relativa: float = 0.02,
+        finestra_giorni: int = 120,
+        min_score_nome: float = 0.5,
+        max_fatture_split: int = 12,
+        max_parti_split: int = 5
+    ):
+        self.tolleranza_relativa = tolleranza_relativa
+        self.finestra_giorni = finestra_giorni
+        self.min_score_nome = min_score_nome
+        self.max_fatture_split = max_fatture_split
+        self.max_parti_split = max_parti_split
+
+    # ========================================================================
+    # PUNTEGGI
+    # ========================================================================
+
+    def _tolleranza(self, importi: np.ndarray) -> np.ndarray:
+        return np.maximum(importi * self.tolleranza_relativa, 0.01)
+
+    def _score_date(self, giorni_bonifici: np.ndarray, giorni_fatture: np.ndarray) -> np.ndarray:
+        delta = np.abs(giorni_bonifici[:, None] - giorni_fatture[None, :])
+        score = np.clip(1.0 - delta / self.finestra_giorni, 0.0, 1.0)
+        # Data mancante: punteggio neutro
+        return np.where(np.isnan(delta), 0.5, score)
+
+    def _archi(
+        self,
+        t_importi, t_giorni, t_nome, f_importi, f_giorni, f_nome, sim
+    ) -> List[Tuple[int, int, float]]:
+        """Coppie ammesse (bonifico, fattura, punteggio), calcolate per blocchi di righe"""
+        n_fatture = len(f_importi)
+        blocco = max(1, MAX_CELLE_BLOCCO // max(n_fatture, 1))
+        archi = []
+
+        for start in range(0, len(t_importi), blocco):
+            stop = start + blocco
+            importi = t_importi[start:stop]
+
+            delta = np.abs(importi[:, None] - f_importi[None, :])
+            tolleranza = self._tolleranza(importi)[:, None]
+            score_importo = np.clip(1.0 - delta / tolleranza, 0.0, 1.0)
+            score_nome = sim[t_nome[start:stop]][:, f_nome]
+            score_data = self._score_date(t_giorni[start:stop], f_giorni)
+
+            # Ammesse: importo in tolleranza e nome compatibile; beneficiari
+            # senza alcun fornitore simile solo con importo al centesimo
+            senza_nome = (sim[t_nome[start:stop]].max(axis=1) < self.min_score_nome)[:, None]
+            ammesse = (delta <= tolleranza) & (
+                (score_nome >= self.min_score_nome) | (senza_nome & (delta < 0.005))
+            )
+            score = PESO_IMPORTO * score_importo + PESO_NOME * score_nome + PESO_DATA * score_data
+
+            righe, colonne = np.nonzero(ammesse)
+            archi.extend(zip((righe + start).tolist(), colonne.tolist(), score[righe, colonne].tolist()))
+
+        return archi
+
+    # ========================================================================
+    # ASSEGNAZIONE
+    # ========================================================================
+
+    @staticmethod
+    def _componenti(archi: List[Tuple[int, int, float]]) -> List[List[Tuple[int, int, float]]]:
+        """Componenti connesse del grafo bipartito (union-find)"""
+        padre: Dict[Tuple[str, int], Tuple[str, int]] = {}
+
+        def trova(x):
+            padre.setdefault(x, x)
+            while padre[x] != x:
+                padre[x] = padre[padre[x]]
+                x = padre[x]
+            return x
+
+        for i, j, _ in archi:
+            a, b = trova(('b', i)), trova(('f', j))
+            if a != b:
+                padre[a] = b
+
+        gruppi = defaultdict(list)
+        for arco in archi:
+            gruppi[trova(('b', arco[0]))].append(arco)
+        return list(gruppi.values())
+
+    @staticmethod
+    def _assegna(componente: List[Tuple[int, int, float]]) -> List[Tuple[int, int, float]]:
+        if len(componente) == 1:
+            return componente
+
+        righe = sorted({i for i, _, _ in componente})
+        colonne = sorted({j for _, j, _ in componente})
+        pos_r = {r: k for k, r in enumerate(righe)}
+        pos_c = {c: k for k, c in enumerate(colonne)}
+
+        cost = np.full((len(righe), len(colonne)), COSTO_NON_AMMESSO)
+        score = {}
+        for i, j, s in componente:
+            cost[pos_r[i], pos_c[j]] = -s
+            score[(i, j)] = s
+
+        return [
+            (righe[r], colonne[c], score[(righe[r], colonne[c])])
+            for r, c in hungarian(cost)
+            if (righe[r], colonne[c]) in score
+        ]
+
+    def _split(
+        self,
+        importo: float,
+        giorno: float,
+        candidate: List[int],
+        f_importi: np.ndarray,
+        f_giorni: np.ndarray
+    ) -> Optional[Tuple[List[int], float]]:
+        """Sottoinsieme di fatture (2..max_parti) la cui somma copre il bonifico"""
+        candidate = [j for j in candidate if f_importi[j] < importo]
+        if len(candidate) < 2:
+            return None
+
+        # Fatture più vicine alla data del bonifico
+        if not np.isnan(giorno):
+            candidate.sort(key=lambda j: abs(giorno - f_giorni[j]) if not np.isnan(f_giorni[j]) else np.inf)
+        candidate = candidate[:self.max_fatture_split]
+
+        k = len(candidate)
+        maschere = (np.arange(1 << k)[:, None] >> np.arange(k)[None, :]) & 1
+        parti = maschere.sum(axis=1)
+        somme = maschere @ f_importi[candidate]
+        delta = np.abs(somme - importo)
+
+        ammesse = (parti >= 2) & (parti <= self.max_parti_split) & (delta <= max(importo * self.tolleranza_relativa, 0.01))
+        if not ammesse.any():
+            return None
+
+        # Scostamento minimo, poi meno fatture
+        idx = np.nonzero(ammesse)[0]
+        migliore = idx[np.lexsort((parti[idx], delta[idx]))[0]]
+        scelte = [candidate[b] for b in range(k) if maschere[migliore, b]]
+        return scelte, float(1.0 - delta[migliore] / max(importo, 0.01))
+
+    # ========================================================================
+    # API
+    # ========================================================================
+
+    def match(self, bonifici: List[Dict], fatture: List[Dict]) -> Dict:
+        """
+        Abbina bonifici e fatture
+
+        Args:
+            bonifici: dict con id, importo, data_bonifico, beneficiario
+            fatture: dict con id, totale, data_fattura, data_scadenza,
+                     ragione_sociale_fornitore
+
+        Returns:
+            {
+                'assegnazioni': [{'id_bonifico', 'id_fatture', 'tipo', 'score', 'differenza'}],
+                'bonifici_non_assegnati': [id],
+                'fatture_non_assegnate': [id]
+            }
+        """
+        if not bonifici or not fatture:
+            return {
+                'assegnazioni': [],
+                'bonifici_non_assegnati': [b['id'] for b in bonifici],
+                'fatture_non_assegnate': [f['id'] for f in fatture]
+            }
+
+        t_importi = np.array([abs(float(b['importo'])) for b in bonifici])
+        t_giorni = np.array([_giorno(b.get('data_bonifico')) for b in bonifici])
+        f_importi = np.array([float(f['totale'] or 0) for f in fatture])
+        f_giorni = np.array([_giorno(f.get('data_scadenza') or f.get('data_fattura')) for f in fatture])
+
+        # Nomi distinti: la similarità si calcola una volta per coppia di nomi
+        nomi_b = [normalizza_nome(b.get('beneficiario')) for b in bonifici]
+        nomi_f = [normalizza_nome(f.get('ragione_sociale_fornitore')) for f in fatture]
+        distinti_b = sorted(set(nomi_b))
+        distinti_f = sorted(set(nomi_f))
+        pos_b = {n: k for k, n in enumerate(distinti_b)}
+        pos_f = {n: k for k, n in enumerate(distinti_f)}
+        t_nome = np.array([pos_b[n] for n in nomi_b])
+        f_nome = np.array([pos_f[n] for n in nomi_f])
+        sim = similarita_nomi(distinti_b, distinti_f)
+
+        # 1. Uno-a-uno globale
+        archi = self._archi(t_importi, t_giorni, t_nome, f_importi, f_giorni, f_nome, sim)
+        coppie = []
+        for componente in self._componenti(archi):
+            coppie.extend(self._assegna(componente))
+
+        assegnazioni = []
+        bonifici_liberi = set(range(len(bonifici)))
+        fatture_libere = set(range(len(fatture)))
+        for i, j, score in coppie:
+            bonifici_liberi.discard(i)
+            fatture_libere.discard(j)
+            assegnazioni.append({
+                'id_bonifico': bonifici[i]['id'],
+                'id_fatture': [fatture[j]['id']],
+                'tipo': 'singola',
+                'score': round(score, 4),
+                'differenza': round(abs(t_importi[i] - f_importi[j]), 2)
+            })
+
+        # 2. Pagamenti cumulativi sul residuo, per fornitore, in ordine di data
+        fatture_per_nome = defaultdict(list)
+        for j in fatture_libere:
+            fatture_per_nome[int(f_nome[j])].append(j)
+
+        for i in sorted(bonifici_liberi, key=lambda i: (np.isnan(t_giorni[i]), t_giorni[i])):
+            nomi_compatibili = np.nonzero(sim[t_nome[i]] >= self.min_score_nome)[0]
+            for s in sorted(nomi_compatibili, key=lambda s: -sim[t_nome[i], s]):
+                libere = [j for j in fatture_per_nome.get(int(s), []) if j in fatture_libere]
+                trovato = self._split(t_importi[i], t_giorni[i], libere, f_importi, f_giorni)
+                if not trovato:
+                    continue
+
+                scelte, score_importo = trovato
+                fatture_libere.difference_update(scelte)
+                bonifici_liberi.discard(i)
+                assegnazioni.append({
+                    'id_bonifico': bonifici[i]['id'],
+                    'id_fatture': [fatture[j]['id'] for j in scelte],
+                    'tipo': 'multipla',
+                    'score': round(PESO_IMPORTO * score_importo + PESO_NOME * float(sim[t_nome[i], s]), 4),
+                    'differenza': round(abs(t_importi[i] - f_importi[scelte].sum()), 2)
+                })
+                break
+
+        return {
+            'assegnazioni': assegnazioni,
+            'bonifici_non_assegnati': [bonifici[i]['id'] for i in sorted(bonifici_liberi)],
+            'fatture_non_assegnate': [fatture[j]['id'] for j in sorted(fatture_libere)]
+        }
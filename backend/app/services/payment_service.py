@@ -3,12 +3,15 @@ Servizio Gestione Pagamenti Relazionali
 Collega fatture a: Prima Nota Cassa, Prima Nota Banca, Bonifici, Assegni
 """
 
+import asyncio
 from datetime import datetime
 from decimal import Decimal
 from typing import Dict, Optional, List
 import logging
 
-from app.database import get_table
+from app.database import Transaction, db, get_async_table
+from app.services.name_index import PAGINA_CARICAMENTO, name_index, normalizza_nome
+from app.services.payment_matching import BatchMatcher
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +32,10 @@ class PaymentService:
         """
         Registra pagamento fattura e crea movimento contabile
         
+        Tutti gli statement girano in una transazione sulla stessa
+        connessione: fattura, movimenti e collegamenti vengono confermati
+        insieme o annullati insieme.
+        
         Args:
             metodo: 'cassa', 'banca_bonifico', 'banca_rid', 'assegno', 'misto'
             id_assegno: Se metodo='assegno', ID assegno da collegare
@@ -38,49 +45,64 @@ class PaymentService:
             Dict con risultati operazione
         """
         try:
-            fatture_table = get_table('fatture')
-            
-            # Verifica fattura esiste
-            fattura = fatture_table.select('*')\
-                .eq('id', id_fattura)\
-                .eq('id_utente', id_utente)\
-                .execute()
-            
-            if not fattura.data:
-                raise ValueError("Fattura non trovata")
+            if metodo == 'assegno' and not id_assegno:
+                raise ValueError("ID assegno richiesto per pagamento con assegno")
             
-            fattura_data = fattura.data[0]
-            
-            # Aggiorna fattura
-            fatture_table.update({
-                'pagata': True,
-                'metodo_pagamento': metodo,
-                'data_pagamento': data_pagamento.isoformat(),
-                'updated_at': datetime.now().isoformat()
-            }).eq('id', id_fattura).execute()
-            
-            # Crea movimento in base al metodo
-            if metodo == 'cassa':
-                await PaymentService._registra_prima_nota_cassa(
-                    id_utente, id_fattura, fattura_data, importo, data_pagamento, note
+            if not db.pool:
+                # Senza DATABASE_URL: stessi passi via Supabase, non atomici
+                await PaymentService._registra_pagamento_supabase(
+                    id_utente, id_fattura, metodo, importo, data_pagamento,
+                    id_assegno, id_bonifico, note
                 )
+                return {
+                    "success": True,
+                    "message": f"Pagamento registrato: {metodo}",
+                    "id_fattura": id_fattura,
+                    "metodo": metodo
+                }
             
-            elif metodo in ['banca_bonifico', 'banca_rid']:
-                await PaymentService._registra_prima_nota_banca(
-                    id_utente, id_fattura, fattura_data, importo, data_pagamento, 
-                    metodo, id_bonifico, note
-                )
-            
-            elif metodo == 'assegno':
-                if not id_assegno:
-                    raise ValueError("ID assegno richiesto per pagamento con assegno")
-                await PaymentService._collega_assegno(
-                    id_utente, id_fattura, id_assegno, importo, data_pagamento, note
-                )
-            
-            elif metodo == 'misto':
-                # Per misto, gestione separata con split importi
-                pass
+            async with db.transaction() as tx:
+                # Verifica fattura esiste (bloccata fino al commit)
+                fattura_data = await tx.fetch_one("""
+                    SELECT id, numero_fattura, ragione_sociale_fornitore
+                    FROM fatture
+                    WHERE id = :id_fattura AND id_utente = :id_utente
+                    FOR UPDATE
+                """, {'id_fattura': id_fattura, 'id_utente': id_utente})
+                
+                if not fattura_data:
+                    raise ValueError("Fattura non trovata")
+                
+                # Aggiorna fattura
+                await tx.execute("""
+                    UPDATE fatture SET
+                        pagata = true,
+                        metodo_pagamento = :metodo,
+                        data_pagamento = :data_pagamento,
+                        updated_at = NOW()
+                    WHERE id = :id_fattura
+                """, {'metodo': metodo, 'data_pagamento': data_pagamento, 'id_fattura': id_fattura})
+                
+                # Crea movimento in base al metodo
+                if metodo == 'cassa':
+                    await PaymentService._registra_prima_nota_cassa(
+                        tx, id_utente, id_fattura, fattura_data, importo, data_pagamento, note
+                    )
+                
+                elif metodo in ['banca_bonifico', 'banca_rid']:
+                    await PaymentService._registra_prima_nota_banca(
+                        tx, id_utente, id_fattura, fattura_data, importo, data_pagamento,
+                        metodo, id_bonifico, note
+                    )
+                
+                elif metodo == 'assegno':
+                    await PaymentService._collega_assegno(
+                        tx, id_utente, id_fattura, id_assegno, importo, data_pagamento, note
+                    )
+                
+                elif metodo == 'misto':
+                    # Per misto, gestione separata con split importi
+                    pass
             
             return {
                 "success": True,
@@ -93,8 +115,108 @@ class PaymentService:
             logger.error(f"Errore registra_pagamento_fattura: {str(e)}")
             raise
     
+    @staticmethod
+    async def _registra_pagamento_supabase(
+        id_utente: int,
+        id_fattura: int,
+        metodo: str,
+        importo: Decimal,
+        data_pagamento: datetime,
+        id_assegno: Optional[int],
+        id_bonifico: Optional[int],
+        note: Optional[str]
+    ):
+        """
+        Registra pagamento via Supabase (database asyncpg non disponibile)
+        
+        Statement separati: un errore a metà lascia i passi già eseguiti.
+        L'assegno passa a emesso solo se ancora disponibile.
+        """
+        fatture_table = get_async_table('fatture')
+        banca_table = get_async_table('prima_nota_banca')
+        
+        fattura = await fatture_table.select('id, numero_fattura, ragione_sociale_fornitore')\
+            .eq('id', id_fattura)\
+            .eq('id_utente', id_utente)\
+            .execute()
+        
+        if not fattura.data:
+            raise ValueError("Fattura non trovata")
+        
+        fattura_data = fattura.data[0]
+        descrizione = f"Pagamento fattura {fattura_data['numero_fattura']} - {fattura_data['ragione_sociale_fornitore']}"
+        
+        # Assegno prima della fattura: se non è disponibile non si tocca nulla
+        if metodo == 'assegno':
+            assegno = await get_async_table('assegni').update({
+                'stato': 'emesso',
+                'data_emissione': data_pagamento.date().isoformat(),
+                'id_fattura': id_fattura,
+                'importo': float(importo),
+                'note': note or f"Pagamento fattura {id_fattura}"
+            }).eq('id', id_assegno)\
+                .eq('id_utente', id_utente)\
+                .eq('stato', 'disponibile')\
+                .execute()
+            
+            if not assegno.data:
+                raise ValueError("Assegno non disponibile")
+        
+        await fatture_table.update({
+            'pagata': True,
+            'metodo_pagamento': metodo,
+            'data_pagamento': data_pagamento.isoformat(),
+            'updated_at': datetime.now().isoformat()
+        }).eq('id', id_fattura).execute()
+        
+        if metodo == 'cassa':
+            await get_async_table('movimenti_cassa').insert({
+                'id_utente': id_utente,
+                'data_operazione': data_pagamento.date().isoformat(),
+                'tipo': 'pagamento_fattura',
+                'importo': -float(importo),  # Negativo perché è uscita
+                'descrizione': descrizione,
+                'note': note,
+                'id_fattura': id_fattura,
+                'created_at': datetime.now().isoformat()
+            }).execute()
+        
+        elif metodo in ['banca_bonifico', 'banca_rid']:
+            await banca_table.insert({
+                'id_utente': id_utente,
+                'data_operazione': data_pagamento.date().isoformat(),
+                'importo': -float(importo),  # Negativo perché è uscita
+                'tipo': 'pagamento_fattura_' + metodo,
+                'descrizione': descrizione,
+                'id_fattura': id_fattura,
+                'riconciliato': False,
+                'created_at': datetime.now().isoformat()
+            }).execute()
+            
+            if id_bonifico and metodo == 'banca_bonifico':
+                await get_async_table('bonifici').update({
+                    'id_fattura': id_fattura,
+                    'collegato': True
+                }).eq('id', id_bonifico).execute()
+        
+        elif metodo == 'assegno':
+            await banca_table.insert({
+                'id_utente': id_utente,
+                'data_operazione': data_pagamento.date().isoformat(),
+                'importo': -float(importo),
+                'tipo': 'pagamento_fattura_assegno',
+                'descrizione': f"Pagamento con assegno n.{assegno.data[0]['numero']}",
+                'id_fattura': id_fattura,
+                'id_assegno': id_assegno,
+                'riconciliato': False,
+                'created_at': datetime.now().isoformat()
+            }).execute()
+        
+        logger.info(f"Pagamento registrato via Supabase ({metodo}): Fattura {id_fattura}")
+    
     @staticmethod
     async def _registra_prima_nota_cassa(
+        tx: Transaction,
         id_utente: int,
         id_fattura: int,
         fattura_data: Dict,
@@ -103,23 +225,28 @@ class PaymentService:
         note: Optional[str]
     ):
         """Registra movimento in Prima Nota Cassa"""
-        cassa_table = get_table('movimenti_cassa')
-        
-        cassa_table.insert({
+        await tx.execute("""
+            INSERT INTO movimenti_cassa (
+                id_utente, data_operazione, tipo, importo,
+                descrizione, note, id_fattura, created_at
+            ) VALUES (
+                :id_utente, :data_operazione, 'pagamento_fattura', :importo,
+                :descrizione, :note, :id_fattura, NOW()
+            )
+        """, {
             'id_utente': id_utente,
-            'data_operazione': data_pagamento.date().isoformat(),
-            'tipo': 'pagamento_fattura',
-            'importo': -float(importo),  # Negativo perché è uscita
+            'data_operazione': data_pagamento.date(),
+            'importo': -importo,  # Negativo perché è uscita
             'descrizione': f"Pagamento fattura {fattura_data['numero_fattura']} - {fattura_data['ragione_sociale_fornitore']}",
             'note': note,
-            'id_fattura': id_fattura,
-            'created_at': datetime.now().isoformat()
-        }).execute()
+            'id_fattura': id_fattura
+        })
         
         logger.info(f"Registrato in Prima Nota Cassa: Fattura {id_fattura}")
     
     @staticmethod
     async def _registra_prima_nota_banca(
+        tx: Transaction,
         id_utente: int,
         id_fattura: int,
         fattura_data: Dict,
@@ -130,33 +257,35 @@ class PaymentService:
         note: Optional[str]
     ):
         """Registra movimento in Prima Nota Banca"""
-        banca_table = get_table('prima_nota_banca')
-        
-        movimento_data = {
+        await tx.execute("""
+            INSERT INTO prima_nota_banca (
+                id_utente, data_operazione, importo, tipo,
+                descrizione, id_fattura, riconciliato, created_at
+            ) VALUES (
+                :id_utente, :data_operazione, :importo, :tipo,
+                :descrizione, :id_fattura, false, NOW()
+            )
+        """, {
             'id_utente': id_utente,
-            'data_operazione': data_pagamento.date().isoformat(),
-            'importo': -float(importo),  # Negativo perché è uscita
+            'data_operazione': data_pagamento.date(),
+            'importo': -importo,  # Negativo perché è uscita
             'tipo': 'pagamento_fattura_' + tipo_banca,
             'descrizione': f"Pagamento fattura {fattura_data['numero_fattura']} - {fattura_data['ragione_sociale_fornitore']}",
-            'id_fattura': id_fattura,
-            'riconciliato': False,
-            'created_at': datetime.now().isoformat()
-        }
-        
-        banca_table.insert(movimento_data).execute()
+            'id_fattura': id_fattura
+        })
         
         # Se c'è bonifico, collega
-        if id_bonifico and tipo_banca == 'bonifico':
-            bonifici_table = get_table('bonifici')
-            bonifici_table.update({
-                'id_fattura': id_fattura,
-                'collegato': True
-            }).eq('id', id_bonifico).execute()
+        if id_bonifico and tipo_banca in ('bonifico', 'banca_bonifico'):
+            await tx.execute("""
+                UPDATE bonifici SET id_fattura = :id_fattura, collegato = true
+                WHERE id = :id_bonifico
+            """, {'id_fattura': id_fattura, 'id_bonifico': id_bonifico})
         
         logger.info(f"Registrato in Prima Nota Banca ({tipo_banca}): Fattura {id_fattura}")
     
     @staticmethod
     async def _collega_assegno(
+        tx: Transaction,
         id_utente: int,
         id_fattura: int,
         id_assegno: int,
@@ -165,49 +294,57 @@ class PaymentService:
         note: Optional[str]
     ):
         """Collega assegno a fattura"""
-        assegni_table = get_table('assegni')
-        
-        # Verifica assegno disponibile
-        assegno = assegni_table.select('*')\
-            .eq('id', id_assegno)\
-            .eq('id_utente', id_utente)\
-            .eq('stato', 'disponibile')\
-            .execute()
+        # Assegno disponibile → emesso in un solo statement: due pagamenti
+        # concorrenti non possono usare lo stesso assegno
+        assegno = await tx.fetch_one("""
+            UPDATE assegni SET
+                stato = 'emesso',
+                data_emissione = :data_emissione,
+                id_fattura = :id_fattura,
+                importo = :importo,
+                note = :note
+            WHERE id = :id_assegno
+              AND id_utente = :id_utente
+              AND stato = 'disponibile'
+            RETURNING numero
+        """, {
+            'data_emissione': data_pagamento.date(),
+            'id_fattura': id_fattura,
+            'importo': importo,
+            'note': note or f"Pagamento fattura {id_fattura}",
+            'id_assegno': id_assegno,
+            'id_utente': id_utente
+        })
         
-        if not assegno.data:
+        if not assegno:
             raise ValueError("Assegno non disponibile")
         
-        # Aggiorna assegno come emesso
-        assegni_table.update({
-            'stato': 'emesso',
-            'data_emissione': data_pagamento.date().isoformat(),
-            'id_fattura': id_fattura,
-            'importo': float(importo),
-            'note': note or f"Pagamento fattura {id_fattura}"
-        }).eq('id', id_assegno).execute()
-        
         # Registra anche in Prima Nota Banca
-        banca_table = get_table('prima_nota_banca')
-        banca_table.insert({
+        await tx.execute("""
+            INSERT INTO prima_nota_banca (
+                id_utente, data_operazione, importo, tipo,
+                descrizione, id_fattura, id_assegno, riconciliato, created_at
+            ) VALUES (
+                :id_utente, :data_operazione, :importo, 'pagamento_fattura_assegno',
+                :descrizione, :id_fattura, :id_assegno, false, NOW()
+            )
+        """, {
             'id_utente': id_utente,
-            'data_operazione': data_pagamento.date().isoformat(),
-            'importo': -float(importo),
-            'tipo': 'pagamento_fattura_assegno',
-            'descrizione': f"Pagamento con assegno n.{assegno.data[0]['numero']}",
+            'data_operazione': data_pagamento.date(),
+            'importo': -importo,
+            'descrizione': f"Pagamento con assegno n.{assegno['numero']}",
             'id_fattura': id_fattura,
-            'id_assegno': id_assegno,
-            'riconciliato': False,
-            'created_at': datetime.now().isoformat()
-        }).execute()
+            'id_assegno': id_assegno
+        })
         
         logger.info(f"Assegno {id_assegno} collegato a Fattura {id_fattura}")
     
     @staticmethod
     async def get_assegni_disponibili(id_utente: int) -> List[Dict]:
         """Ottieni lista assegni disponibili per pagamento"""
-        assegni_table = get_table('assegni')
+        assegni_table = get_async_table('assegni')
         
-        result = assegni_table.select('*')\
+        result = await assegni_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('stato', 'disponibile')\
             .order('numero')\
@@ -218,9 +355,9 @@ class PaymentService:
     @staticmethod
     async def get_bonifici_non_collegati(id_utente: int) -> List[Dict]:
         """Ottieni lista bonifici non ancora collegati a fatture"""
-        bonifici_table = get_table('bonifici')
+        bonifici_table = get_async_table('bonifici')
         
-        result = bonifici_table.select('*')\
+        result = await bonifici_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('collegato', False)\
             .order('data_bonifico', desc=True)\
@@ -236,14 +373,14 @@ class PaymentService:
         """
         Suggerisce fattura da collegare a bonifico basato su:
         - Importo simile
-        - Beneficiario corrispondente
+        - Beneficiario corrispondente (indice nomi: forme societarie, ordine, IBAN)
         - Data compatibile
         """
-        bonifici_table = get_table('bonifici')
-        fatture_table = get_table('fatture')
+        bonifici_table = get_async_table('bonifici')
+        fatture_table = get_async_table('fatture')
         
         # Ottieni bonifico
-        bonifico = bonifici_table.select('*')\
+        bonifico = await bonifici_table.select('*')\
             .eq('id', id_bonifico)\
             .eq('id_utente', id_utente)\
             .execute()
@@ -253,10 +390,23 @@ class PaymentService:
         
         bonifico_data = bonifico.data[0]
         importo = float(bonifico_data['importo'])
-        beneficiario = bonifico_data['beneficiario'].lower()
+        
+        # Fornitori candidati per nome/IBAN del beneficiario
+        await name_index.ensure_loaded()
+        candidati = name_index.search(
+            bonifico_data['beneficiario'],
+            bonifico_data.get('iban_beneficiario'),
+            tipo='fornitore',
+            id_utente=id_utente,
+            limit=10
+        )
+        score_nomi = {}
+        for c in candidati:
+            norm = normalizza_nome(c['nome'])
+            score_nomi[norm] = max(score_nomi.get(norm, 0), c['score'])
         
         # Cerca fatture non pagate con importo simile
-        fatture = fatture_table.select('*')\
+        fatture = await fatture_table.select('*')\
             .eq('id_utente', id_utente)\
             .eq('pagata', False)\
             .execute()
@@ -277,13 +427,67 @@ class PaymentService:
             if diff_percentuale <= 2:
                 score += 50
             
-            # Match beneficiario
-            fornitore = fattura['ragione_sociale_fornitore'].lower()
-            if beneficiario in fornitore or fornitore in beneficiario:
-                score += 50
+            # Match beneficiario (pesato sulla similarità)
+            fornitore = normalizza_nome(fattura['ragione_sociale_fornitore'])
+            score += 50 * score_nomi.get(fornitore, 0)
             
             if score > best_score:
                 best_score = score
                 best_match = fattura
         
         return best_match if best_score >= 60 else None
+    
+    @staticmethod
+    async def suggerisci_collegamenti_bonifici(id_utente: int) -> Dict:
+        """
+        Abbinamento massivo di tutti i bonifici non collegati
+        
+        Due query (bonifici e fatture non pagate), poi punteggi vettoriali e
+        assegnazione globale uno-a-uno: una fattura non viene mai proposta per
+        due bonifici. Un bonifico può saldare più fatture dello stesso fornitore.
+        
+        Returns:
+            Dict con assegnazioni e bonifici/fatture rimasti senza abbinamento
+        """
+        bonifici = await PaymentService._carica_tutte(
+            'bonifici',
+            'id, data_bonifico, beneficiario, iban_beneficiario, importo',
+            {'id_utente': id_utente, 'collegato': False}
+        )
+        
+        fatture = await PaymentService._carica_tutte(
+            'fatture',
+            'id, numero_fattura, data_fattura, data_scadenza, '
+            'partita_iva_fornitore, ragione_sociale_fornitore, totale',
+            {'id_utente': id_utente, 'pagata': False}
+        )
+        
+        # Punteggi NumPy e assegnazione ungherese fuori dall'event loop
+        risultato = await asyncio.to_thread(BatchMatcher().match, bonifici, fatture)
+        
+        logger.info(
+            f"Abbinamento bonifici utente {id_utente}: "
+            f"{len(risultato['assegnazioni'])} assegnazioni su {len(bonifici)} bonifici"
+        )
+        
+        return {
+            "success": True,
+            **risultato
+        }
+    
+    @staticmethod
+    async def _carica_tutte(tabella: str, colonne: str, filtri: Dict) -> List[Dict]:
+        """Righe filtrate, a pagine: una select singola è troncata a 1000 righe"""
+        righe: List[Dict] = []
+        while True:
+            query = get_async_table(tabella).select(colonne)
+            for colonna, valore in filtri.items():
+                query = query.eq(colonna, valore)
+            result = await query\
+                .order('id')\
+                .range(len(righe), len(righe) + PAGINA_CARICAMENTO - 1)\
+                .execute()
+            pagina = result.data or []
+            righe.extend(pagina)
+            if len(pagina) < PAGINA_CARICAMENTO:
+                return righe
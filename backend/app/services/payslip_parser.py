@@ -1,16 +1,133 @@
 """
 Parser Buste Paga PDF Zucchetti
 Estrae dati da PDF buste paga formato Zucchetti
+
+Estrazione campi in una sola scansione delle righe: il primo token
+(codici voce Z00001, F03020, F09110... o parole chiave) indica i campi
+da cercare sulla riga; ogni pattern è precompilato e limitato alla riga
+(e alla successiva, dove il valore va a capo). Vale il primo match di
+ogni campo; quelli non a inizio riga sono cercati per parola chiave.
 """
 import re
 from decimal import Decimal
-from typing import Dict, Optional
-try:
-    import PyPDF2
-    from io import BytesIO
-except ImportError:
-    PyPDF2 = None
-    BytesIO = None
+from typing import Callable, Dict, Optional, Tuple, TypedDict
+
+from .pdf_text import estrai_testo
+
+
+class PayslipData(TypedDict, total=False):
+    """Dati estratti da una busta paga (solo i campi trovati)"""
+    codice_fiscale: str
+    cognome: str
+    nome: str
+    periodo: str  # YYYY-MM
+    anno: int
+    mese: int
+    retribuzione_lorda: Decimal
+    netto_in_busta: Decimal
+    inps_dipendente: Decimal
+    irpef: Decimal
+    addizionale_regionale: Decimal
+    addizionale_comunale: Decimal
+    tfr_maturato: Decimal
+    tfr_progressivo: Decimal
+    ferie_residue_ap: Decimal
+    ferie_maturate: Decimal
+    ferie_godute: Decimal
+    ferie_residue: Decimal
+    permessi_residui_ap: Decimal
+    permessi_maturati: Decimal
+    permessi_residui: Decimal
+    ore_ordinarie: Decimal
+    iban: str
+    banca: str
+    livello: str
+    mansione: str
+    giorni_lavorati: int
+
+
+MESI = {
+    'Gennaio': 1, 'Febbraio': 2, 'Marzo': 3, 'Aprile': 4,
+    'Maggio': 5, 'Giugno': 6, 'Luglio': 7, 'Agosto': 8,
+    'Settembre': 9, 'Ottobre': 10, 'Novembre': 11, 'Dicembre': 12
+}
+
+NUM = r'([\d,\.]+)'
+
+# Pattern per campo, precompilati; cercati solo nella finestra della riga
+# indicizzata (riga + successiva dove il valore può andare a capo)
+_RE_CF = re.compile(r'\b([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])\b')
+_RE_PERIODO = re.compile(r'\b(' + '|'.join(MESI) + r')\s+(\d{4})')
+_RE_LAVORATORE = re.compile(r'(?:Lavoratore:|COGNOME.*NOME)[ \t]*\n?[ \t]*([A-Z][A-Z \t]*)')
+_RE_NETTO = re.compile(r'NETTO.*MESE\s+' + NUM + r'\s*€', re.IGNORECASE)
+_RE_TFR_MATURATO = re.compile(r'Quota anno\s+' + NUM)
+_RE_TFR_PROGRESSIVO = re.compile(r'F\.do 31/12\s+' + NUM)
+_RE_FERIE = re.compile(r'Ferie\s+' + NUM + r'\s+' + NUM + r'\s+' + NUM + r'\s+([-\d,\.]+)')
+_RE_PERMESSI = re.compile(r'Permessi\s+' + NUM + r'\s+' + NUM + r'\s+' + NUM + r'\s+ORE')
+_RE_IBAN = re.compile(r'IBAN\s+([A-Z]{2}\d{2}[A-Z0-9]+)')
+_RE_BANCA = re.compile(r'IBAN.*\n([A-Z \t\.]+?)[ \t]*\n')
+_RE_LIVELLO = re.compile(r"OPE\s+(\d['']?\s*Livello(?:\s+Super)?)")
+_RE_MANSIONE = re.compile(r'Livello(?:[ \t]+Super)?\n([A-Z \t]+?)[ \t]*\n')
+_RE_GIORNI = re.compile(r'Giorni\nLavorati\D*(\d+)')
+
+# Voci cedolino per codice
+_RE_Z00001 = re.compile(r'Z00001\s+Retribuzione\s+' + NUM + r'\s+' + NUM + r'\s+ORE(?:\s+' + NUM + r')?')
+_RE_Z00000 = re.compile(r'Z00000\s+Contributo IVS\s+[\d,\.]+\s+[\d,\.]+\s*%\s+' + NUM)
+_RE_F03020 = re.compile(r'F03020\s+Ritenute IRPEF\s+' + NUM)
+# Addizionali: importo a fine riga (prima ci sono anno e rata, es. "2020 rata 3 29,43")
+_RE_F09110 = re.compile(r'F09110[ \t]+Addizionale regionale[^\n]*[ \t]([\d.]+,\d{2})[ \t\r]*$', re.MULTILINE)
+_RE_F09130 = re.compile(r'F09130[ \t]+Addizionale comunale[^\n]*[ \t]([\d.]+,\d{2})[ \t\r]*$', re.MULTILINE)
+
+# Primo token di riga (codice voce o etichetta) -> campi da cercare sulla riga
+_CAMPI_RIGA = {
+    'Codice': ('cf',),
+    'Periodo': ('periodo',),
+    'Lavoratore:': ('lavoratore',),
+    'COGNOME': ('lavoratore',),
+    'NETTO': ('netto',),
+    'Netto': ('netto',),
+    'TFR': ('tfr_progressivo', 'tfr_maturato'),
+    'F.do': ('tfr_progressivo', 'tfr_maturato'),
+    'Quota': ('tfr_maturato',),
+    'Ferie': ('ferie',),
+    'Permessi': ('permessi',),
+    'IBAN': ('iban', 'banca'),
+    'OPE': ('livello', 'mansione'),
+    'Livello': ('mansione',),
+    'Giorni': ('giorni',),
+    'Z00001': ('Z00001',),
+    'Z00000': ('Z00000',),
+    'F03020': ('F03020',),
+    'F09110': ('F09110',),
+    'F09130': ('F09130',),
+}
+
+# Campi non trovati a inizio riga: ricerca della parola chiave nel testo
+_RICERCA = {
+    'cf': _RE_CF,
+    'periodo': _RE_PERIODO,
+    'lavoratore': re.compile(r'Lavoratore:|COGNOME'),
+    'netto': re.compile(r'NETTO', re.IGNORECASE),
+    'tfr_maturato': re.compile(r'Quota anno'),
+    'tfr_progressivo': re.compile(r'F\.do 31/12'),
+    'ferie': re.compile(r'Ferie'),
+    'permessi': re.compile(r'Permessi'),
+    'iban': re.compile(r'IBAN'),
+    'banca': re.compile(r'IBAN'),
+    'livello': re.compile(r'OPE\s'),
+    'mansione': re.compile(r'Livello'),
+    'giorni': re.compile(r'Giorni\nLavorati'),
+    'Z00001': re.compile(r'Z00001'),
+    'Z00000': re.compile(r'Z00000'),
+    'F03020': re.compile(r'F03020'),
+    'F09110': re.compile(r'F09110'),
+    'F09130': re.compile(r'F09130'),
+}
+
+
+def _fine_finestra(text: str, fine_riga: int) -> int:
+    """Fine della finestra di ricerca: riga corrente + successiva (valori a capo)"""
+    return text.find('\n', fine_riga) + 1 or len(text)
 
 
 class PayslipParser:
@@ -30,18 +147,9 @@ class PayslipParser:
         - ferie, permessi
         - iban
         """
-        if not PyPDF2:
-            print("❌ PyPDF2 non installato. Installa con: pip install PyPDF2")
-            return None
-            
         try:
-            # Leggi PDF
-            pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_data))
-            
-            # Estrai tutto il testo
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
+            # Testo di tutte le pagine (estratto una volta per contenuto)
+            text = estrai_testo(pdf_data)
             
             # Parse dati
             data = self._extract_data(text)
@@ -52,130 +160,143 @@ class PayslipParser:
             print(f"Errore parsing PDF: {e}")
             return None
     
-    def _extract_data(self, text: str) -> Dict:
-        """Estrae dati dal testo PDF"""
-        
-        data = {}
-        
-        # CODICE FISCALE (16 caratteri)
-        cf_match = re.search(r'\b([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])\b', text)
-        if cf_match:
-            data['codice_fiscale'] = cf_match.group(1)
-        
-        # NOME E COGNOME
-        # Cerca pattern "COGNOME NOME" o "Lavoratore: COGNOME NOME"
-        name_match = re.search(r'(?:Lavoratore:|COGNOME.*NOME)\s*([A-Z\s]+)', text)
-        if name_match:
-            full_name = name_match.group(1).strip()
-            parts = full_name.split()
-            if len(parts) >= 2:
-                data['cognome'] = parts[0]
-                data['nome'] = ' '.join(parts[1:])
-        
-        # PERIODO (Marzo 2025)
-        periodo_match = re.search(r'(Gennaio|Febbraio|Marzo|Aprile|Maggio|Giugno|Luglio|Agosto|Settembre|Ottobre|Novembre|Dicembre)\s+(\d{4})', text)
-        if periodo_match:
-            mese_nome = periodo_match.group(1)
-            anno = periodo_match.group(2)
-            
-            mesi = {
-                'Gennaio': '01', 'Febbraio': '02', 'Marzo': '03',
-                'Aprile': '04', 'Maggio': '05', 'Giugno': '06',
-                'Luglio': '07', 'Agosto': '08', 'Settembre': '09',
-                'Ottobre': '10', 'Novembre': '11', 'Dicembre': '12'
-            }
-            
-            mese = mesi.get(mese_nome, '01')
-            data['periodo'] = f"{anno}-{mese}"
-            data['anno'] = int(anno)
-            data['mese'] = int(mese)
-        
-        # RETRIBUZIONE LORDA (cerca "Retribuzione" e importo)
-        retr_match = re.search(r'Z00001\s+Retribuzione\s+[\d,\.]+\s+[\d,\.]+\s+ORE\s+([\d,\.]+)', text)
-        if retr_match:
-            data['retribuzione_lorda'] = self._parse_decimal(retr_match.group(1))
-        
-        # NETTO IN BUSTA (ultima riga con €)
-        netto_match = re.search(r'NETTO.*MESE\s+([\d,\.]+)\s*€', text, re.IGNORECASE)
-        if netto_match:
-            data['netto_in_busta'] = self._parse_decimal(netto_match.group(1))
-        
-        # CONTRIBUTI INPS
-        inps_match = re.search(r'Z00000\s+Contributo IVS\s+[\d,\.]+\s+[\d,\.]+\s*%\s+([\d,\.]+)', text)
-        if inps_match:
-            data['inps_dipendente'] = self._parse_decimal(inps_match.group(1))
-        
-        # IRPEF
-        irpef_match = re.search(r'F03020\s+Ritenute IRPEF\s+([\d,\.]+)', text)
-        if irpef_match:
-            data['irpef'] = self._parse_decimal(irpef_match.group(1))
-        
-        # ADDIZIONALE REGIONALE
-        add_reg_match = re.search(r'F09110\s+Addizionale regionale.*?\s+([\d,\.]+)', text)
-        if add_reg_match:
-            data['addizionale_regionale'] = self._parse_decimal(add_reg_match.group(1))
-        
-        # ADDIZIONALE COMUNALE
-        add_com_match = re.search(r'F09130\s+Addizionale comunale.*?\s+([\d,\.]+)', text)
-        if add_com_match:
-            data['addizionale_comunale'] = self._parse_decimal(add_com_match.group(1))
-        
-        # TFR MATURATO
-        tfr_match = re.search(r'Quota anno\s+([\d,\.]+)', text)
-        if tfr_match:
-            data['tfr_maturato'] = self._parse_decimal(tfr_match.group(1))
-        
-        # TFR PROGRESSIVO
-        tfr_prog_match = re.search(r'F\.do 31/12\s+([\d,\.]+)', text)
-        if tfr_prog_match:
-            data['tfr_progressivo'] = self._parse_decimal(tfr_prog_match.group(1))
-        
-        # FERIE
-        ferie_match = re.search(r'Ferie\s+([\d,\.]+)\s+([\d,\.]+)\s+([\d,\.]+)\s+([-\d,\.]+)', text)
-        if ferie_match:
-            data['ferie_residue_ap'] = self._parse_decimal(ferie_match.group(1))
-            data['ferie_maturate'] = self._parse_decimal(ferie_match.group(2))
-            data['ferie_godute'] = self._parse_decimal(ferie_match.group(3))
-            data['ferie_residue'] = self._parse_decimal(ferie_match.group(4))
-        
-        # PERMESSI
-        permessi_match = re.search(r'Permessi\s+([\d,\.]+)\s+([\d,\.]+)\s+([\d,\.]+)\s+ORE', text)
-        if permessi_match:
-            data['permessi_residui_ap'] = self._parse_decimal(permessi_match.group(1))
-            data['permessi_maturati'] = self._parse_decimal(permessi_match.group(2))
-            data['permessi_residui'] = self._parse_decimal(permessi_match.group(3))
-        
-        # ORE LAVORATE
-        ore_match = re.search(r'Z00001\s+Retribuzione\s+([\d,\.]+)\s+([\d,\.]+)\s+ORE', text)
-        if ore_match:
-            data['ore_ordinarie'] = self._parse_decimal(ore_match.group(2))
-        
-        # IBAN
-        iban_match = re.search(r'IBAN\s+([A-Z]{2}\d{2}[A-Z0-9]+)', text)
-        if iban_match:
-            data['iban'] = iban_match.group(1)
+    def _extract_data(self, text: str) -> PayslipData:
+        """
+        Estrae dati dal testo PDF
         
-        # BANCA
-        banca_match = re.search(r'IBAN.*?\n([A-Z\s\.]+?)\n', text)
-        if banca_match:
-            data['banca'] = banca_match.group(1).strip()
+        1. Una scansione delle righe: il primo token (codice voce o parola
+           chiave) indica quali campi cercare su quella riga
+        2. Per i campi ancora mancanti (valore a metà riga) ricerca della
+           parola chiave precompilata e stesso pattern sulla riga trovata
+        """
         
-        # LIVELLO E MANSIONE
-        livello_match = re.search(r"OPE\s+(\d['']?\s*Livello(?:\s+Super)?)", text)
-        if livello_match:
-            data['livello'] = livello_match.group(1)
+        data: PayslipData = {}
+        campi_def = self._campi
+        pending = set(campi_def)
         
-        mansione_match = re.search(r'Livello(?:\s+Super)?\n([A-Z\s]+?)\n', text)
-        if mansione_match:
-            data['mansione'] = mansione_match.group(1).strip()
+        pos = 0
+        for line in text.split('\n'):
+            campi = _CAMPI_RIGA.get(line.partition(' ')[0])
+            fine_riga = pos + len(line) + 1
+            if campi:
+                fine = _fine_finestra(text, fine_riga)
+                for campo in campi:
+                    if campo in pending:
+                        pattern, assegna = campi_def[campo]
+                        match = pattern.search(text, pos, fine)
+                        if match and assegna(self, match, data) is not False:
+                            pending.discard(campo)
+            pos = fine_riga
         
-        # GIORNI LAVORATI
-        giorni_match = re.search(r'Giorni\nLavorati.*?(\d+)', text, re.DOTALL)
-        if giorni_match:
-            data['giorni_lavorati'] = int(giorni_match.group(1))
+        for campo in pending:
+            pattern, assegna = campi_def[campo]
+            for trovato in _RICERCA[campo].finditer(text):
+                inizio = text.rfind('\n', 0, trovato.start()) + 1
+                fine = _fine_finestra(text, text.find('\n', trovato.end()) + 1 or len(text))
+                match = pattern.search(text, inizio, fine)
+                if match and assegna(self, match, data) is not False:
+                    break
         
         return data
     
+    # ------------------------------------------------------------------------
+    # Assegnazione campi dal match (False = match non utilizzabile)
+    # ------------------------------------------------------------------------
+    
+    def _set_cf(self, m, data: PayslipData):
+        data['codice_fiscale'] = m.group(1)
+    
+    def _set_periodo(self, m, data: PayslipData):
+        anno, mese = int(m.group(2)), MESI[m.group(1)]
+        data['periodo'] = f"{anno}-{mese:02d}"
+        data['anno'] = anno
+        data['mese'] = mese
+    
+    def _set_lavoratore(self, m, data: PayslipData):
+        parts = m.group(1).split()
+        if len(parts) < 2:
+            return False
+        data['cognome'] = parts[0]
+        data['nome'] = ' '.join(parts[1:])
+    
+    def _set_netto(self, m, data: PayslipData):
+        data['netto_in_busta'] = self._parse_decimal(m.group(1))
+    
+    def _set_tfr_maturato(self, m, data: PayslipData):
+        data['tfr_maturato'] = self._parse_decimal(m.group(1))
+    
+    def _set_tfr_progressivo(self, m, data: PayslipData):
+        data['tfr_progressivo'] = self._parse_decimal(m.group(1))
+    
+    def _set_ferie(self, m, data: PayslipData):
+        data['ferie_residue_ap'] = self._parse_decimal(m.group(1))
+        data['ferie_maturate'] = self._parse_decimal(m.group(2))
+        data['ferie_godute'] = self._parse_decimal(m.group(3))
+        data['ferie_residue'] = self._parse_decimal(m.group(4))
+    
+    def _set_permessi(self, m, data: PayslipData):
+        data['permessi_residui_ap'] = self._parse_decimal(m.group(1))
+        data['permessi_maturati'] = self._parse_decimal(m.group(2))
+        data['permessi_residui'] = self._parse_decimal(m.group(3))
+    
+    def _set_iban(self, m, data: PayslipData):
+        data['iban'] = m.group(1)
+    
+    def _set_banca(self, m, data: PayslipData):
+        data['banca'] = m.group(1).strip()
+    
+    def _set_livello(self, m, data: PayslipData):
+        data['livello'] = m.group(1)
+    
+    def _set_mansione(self, m, data: PayslipData):
+        if not m.group(1).strip():
+            return False
+        data['mansione'] = m.group(1).strip()
+    
+    def _set_giorni(self, m, data: PayslipData):
+        data['giorni_lavorati'] = int(m.group(1))
+    
+    def _set_z00001(self, m, data: PayslipData):
+        # Ore dalla prima riga Z00001, retribuzione dalla prima che ha l'importo
+        data.setdefault('ore_ordinarie', self._parse_decimal(m.group(2)))
+        if not m.group(3):
+            return False
+        data['retribuzione_lorda'] = self._parse_decimal(m.group(3))
+    
+    def _set_z00000(self, m, data: PayslipData):
+        data['inps_dipendente'] = self._parse_decimal(m.group(1))
+    
+    def _set_f03020(self, m, data: PayslipData):
+        data['irpef'] = self._parse_decimal(m.group(1))
+    
+    def _set_f09110(self, m, data: PayslipData):
+        data['addizionale_regionale'] = self._parse_decimal(m.group(1))
+    
+    def _set_f09130(self, m, data: PayslipData):
+        data['addizionale_comunale'] = self._parse_decimal(m.group(1))
+    
+    # campo -> (pattern, assegnazione)
+    _campi: Dict[str, Tuple[re.Pattern, Callable]] = {
+        'cf': (_RE_CF, _set_cf),
+        'periodo': (_RE_PERIODO, _set_periodo),
+        'lavoratore': (_RE_LAVORATORE, _set_lavoratore),
+        'netto': (_RE_NETTO, _set_netto),
+        'tfr_maturato': (_RE_TFR_MATURATO, _set_tfr_maturato),
+        'tfr_progressivo': (_RE_TFR_PROGRESSIVO, _set_tfr_progressivo),
+        'ferie': (_RE_FERIE, _set_ferie),
+        'permessi': (_RE_PERMESSI, _set_permessi),
+        'iban': (_RE_IBAN, _set_iban),
+        'banca': (_RE_BANCA, _set_banca),
+        'livello': (_RE_LIVELLO, _set_livello),
+        'mansione': (_RE_MANSIONE, _set_mansione),
+        'giorni': (_RE_GIORNI, _set_giorni),
+        'Z00001': (_RE_Z00001, _set_z00001),
+        'Z00000': (_RE_Z00000, _set_z00000),
+        'F03020': (_RE_F03020, _set_f03020),
+        'F09110': (_RE_F09110, _set_f09110),
+        'F09130': (_RE_F09130, _set_f09130),
+    }
+    
     def _parse_decimal(self, value: str) -> Decimal:
         """Converte stringa in Decimal (gestisce . e ,)"""
         if not value:
@@ -0,0 +1,120 @@
+"""
+Elaborazione buste paga PDF su ProcessPoolExecutor
+Estrazione testo PyPDF2, regex e rimozione password sono lavoro CPU:
+girano nei processi worker, fuori dall'event loop (richieste API e bot email).
+Il parse passa dal registro formati: layout riconosciuto dalla prima
+pagina, testo estratto una volta (cache per contenuto del worker).
+Le scritture su disco passano dal thread pool di default.
+"""
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .payslip_registry import estrai_busta_paga
+from .payslip_splitter import split_per_dipendente
+from .pdf_utils import PDFUtils
+
+# Numero processi (default: tutti i core)
+PAYSLIP_PARSER_WORKERS = int(os.getenv("PAYSLIP_PARSER_WORKERS", str(os.cpu_count() or 1)))
+
+# Cartella PDF buste paga (originale e copia senza password)
+PAYSLIP_UPLOAD_DIR = os.getenv('PAYSLIP_UPLOAD_DIR', '/home/claude/azienda-cloud/backend/uploads/payslips')
+
+_payslip_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_payslip_pool() -> ProcessPoolExecutor:
+    """Pool di processi condiviso, creato al primo utilizzo"""
+    global _payslip_pool
+    if _payslip_pool is None:
+        _payslip_pool = ProcessPoolExecutor(max_workers=PAYSLIP_PARSER_WORKERS)
+    return _payslip_pool
+
+
+def shutdown_payslip_pool():
+    """Chiude il pool (da chiamare allo shutdown dell'app)"""
+    global _payslip_pool
+    if _payslip_pool is not None:
+        _payslip_pool.shutdown(wait=False, cancel_futures=True)
+        _payslip_pool = None
+
+
+def process_payslip(pdf_data: bytes) -> Tuple[Optional[Dict], Optional[bytes], Optional[str]]:
+    """
+    Sblocco e parse di una busta paga (eseguito nel processo worker)
+
+    Il parse lavora sul PDF già sbloccato: un PDF cifrato non espone il testo.
+
+    Returns:
+        (dati estratti o None, PDF senza password o None, errore o None)
+    """
+    try:
+        pdf_unlocked = PDFUtils().remove_pdf_password(pdf_data)
+        parsed_data = estrai_busta_paga(pdf_unlocked or pdf_data)
+        return parsed_data, pdf_unlocked, None
+    except Exception as e:
+        return None, None, str(e)
+
+
+async def process_payslip_async(
+    pdf_data: bytes,
+    pool: Optional[ProcessPoolExecutor] = None
+) -> Tuple[Optional[Dict], Optional[bytes], Optional[str]]:
+    """process_payslip sul pool di processi"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool or get_payslip_pool(), process_payslip, pdf_data)
+
+
+def split_payslips(pdf_data: bytes) -> Tuple[Optional[List[Dict]], Optional[str]]:
+    """
+    Sblocco e split per dipendente di un PDF multiplo (eseguito nel processo worker)
+
+    Returns:
+        (parti [{'codice_fiscale', 'intervalli', 'pagine', 'pdf', 'dati'}]
+         o None, errore o None)
+    """
+    try:
+        pdf_unlocked = PDFUtils().remove_pdf_password(pdf_data)
+        return split_per_dipendente(pdf_unlocked or pdf_data), None
+    except Exception as e:
+        return None, str(e)
+
+
+async def split_payslips_async(
+    pdf_data: bytes,
+    pool: Optional[ProcessPoolExecutor] = None
+) -> Tuple[Optional[List[Dict]], Optional[str]]:
+    """split_payslips sul pool di processi"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool or get_payslip_pool(), split_payslips, pdf_data)
+
+
+def _write_file_once(path: str, data: bytes) -> bool:
+    if os.path.exists(path):
+        return False
+    # File temporaneo unico (mkstemp) + rename: mai un file a metà sotto il
+    # nome definitivo, né due thread sullo stesso temporaneo
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+async def write_file_once_async(path: str, data: bytes) -> bool:
+    """
+    Scrittura di un file per contenuto (path derivato dall'hash), solo se manca
+
+    Returns:
+        True se il file è stato scritto, False se esisteva già
+    """
+    return await asyncio.to_thread(_write_file_once, path, data)
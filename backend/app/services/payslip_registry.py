@@ -0,0 +1,165 @@
+"""
+Registro Formati Buste Paga - Riconoscimento layout e dispatch ai parser
+1. Testo estratto una volta per PDF (pdf_text: cache per hash contenuto)
+2. Impronta del layout dalla prima pagina: regex precompilate
+   sull'intestazione, nessun parse completo per riconoscere il formato
+3. Dispatch all'estrattore del formato; le buste paga escono sempre
+   come PayslipData, qualunque sia il layout
+"""
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from app.parsers.busta_paga_parser import BustaPagaParser
+from .payslip_parser import PayslipData, PayslipParser
+from .pdf_text import Pagine, estrai_pagine, pdf_text_cache
+
+# Caratteri della prima pagina usati per l'impronta (intestazione)
+IMPRONTA_CARATTERI = 3000
+# Formato usato se nessuna impronta riconosce il PDF
+FORMATO_DEFAULT = 'zucchetti'
+
+TIPO_BUSTA_PAGA = 'busta_paga'
+TIPO_PRESENZE = 'presenze'
+
+
+class FormatoPdf(NamedTuple):
+    nome: str
+    tipo: str
+    impronta: 're.Pattern'
+    estrattore: Callable[[Pagine], object]
+
+
+def _estrai_zucchetti(pagine: Pagine) -> PayslipData:
+    # Pagine unite senza separatore, come PayslipParser.parse_pdf
+    return PayslipParser()._extract_data(''.join(pagine))
+
+
+def _estrai_etichette(pagine: Pagine) -> PayslipData:
+    """Cedolino a etichette (C.F.:, Netto:, Periodo: MM/AAAA) in forma PayslipData"""
+    dati = BustaPagaParser()._extract_data('\n'.join(pagine))
+
+    data: PayslipData = {}
+    for campo, campo_busta in (
+        ('codice_fiscale', 'codice_fiscale'), ('nome', 'nome'), ('cognome', 'cognome'),
+        ('lordo', 'retribuzione_lorda'), ('netto', 'netto_in_busta'),
+        ('inps_dipendente', 'inps_dipendente'), ('irpef', 'irpef'), ('mansione', 'mansione'),
+    ):
+        if dati.get(campo) is not None:
+            data[campo_busta] = dati[campo]
+    if dati.get('mese') and dati.get('anno'):
+        data['anno'] = dati['anno']
+        data['mese'] = dati['mese']
+        data['periodo'] = f"{dati['anno']}-{dati['mese']:02d}"
+    return data
+
+
+def _estrai_libro_unico(pagine: Pagine) -> List[Dict]:
+    # Import locale: il modulo definisce anche il router presenze
+    from .libro_unico_parser import LibroUnicoParser
+    return LibroUnicoParser()._extract_attendances(''.join(pagine))
+
+
+# In ordine di priorità: vale la prima impronta trovata.
+# Le buste Zucchetti sono stampate nel "Libro Unico del Lavoro": i codici
+# voce (non il nome del gestionale, stampato anche sulle presenze) le
+# riconoscono prima delle presenze, che si riconoscono dalle righe
+# della tabella giornaliera (giorno + ore o giustificativo), non dal titolo.
+_FORMATI: List[FormatoPdf] = [
+    FormatoPdf(
+        'zucchetti', TIPO_BUSTA_PAGA,
+        re.compile(r'\b(?:Z0000[01]|F03020|F091[13]0)\b|Periodo di retribuzione'),
+        _estrai_zucchetti
+    ),
+    FormatoPdf(
+        'libro_unico', TIPO_PRESENZE,
+        re.compile(r'^[ \t]*\d{1,2}[ \t]+(?:\d{1,2}:\d{2}|(?:FE|MA|AI|AH|PE|FP|RP|ROL)\b)', re.MULTILINE),
+        _estrai_libro_unico
+    ),
+    FormatoPdf(
+        'etichette', TIPO_BUSTA_PAGA,
+        re.compile(r'C\.F\.\s*:|\b(?:NETTO|Netto)\s*:|\b(?:Periodo|Competenza)\s*:?\s*\d{1,2}[/-]\d{4}'),
+        _estrai_etichette
+    ),
+]
+
+# Riconoscimenti per formato (monitoraggio)
+_riconosciuti: Dict[str, int] = {}
+
+
+def registra_formato(formato: FormatoPdf, prima_di: Optional[str] = None):
+    """Aggiunge (o sostituisce) un formato; `prima_di` ne fissa la priorità"""
+    _FORMATI[:] = [f for f in _FORMATI if f.nome != formato.nome]
+    posizione = next((i for i, f in enumerate(_FORMATI) if f.nome == prima_di), len(_FORMATI))
+    _FORMATI.insert(posizione, formato)
+
+
+def get_formato(nome: str) -> FormatoPdf:
+    for formato in _FORMATI:
+        if formato.nome == nome:
+            return formato
+    raise ValueError(f"Formato PDF sconosciuto: {nome}")
+
+
+def riconosci_formato(pagine: Pagine) -> Optional[str]:
+    """Formato dall'intestazione della prima pagina (None se sconosciuto)"""
+    if not pagine:
+        return None
+    intestazione = pagine[0][:IMPRONTA_CARATTERI]
+    for formato in _FORMATI:
+        if formato.impronta.search(intestazione):
+            return formato.nome
+    return None
+
+
+def analizza_pdf(pdf_data: bytes, formato: Optional[str] = None) -> Dict:
+    """
+    Estrazione testo (una volta), riconoscimento formato e parse
+
+    Args:
+        formato: forza il formato invece di riconoscerlo
+
+    Returns:
+        {'formato', 'tipo', 'pagine', 'dati'}: dati = PayslipData per le
+        buste paga, lista presenze per il libro unico
+    """
+    pagine = estrai_pagine(pdf_data)
+    scelto = get_formato(formato or riconosci_formato(pagine) or FORMATO_DEFAULT)
+    _riconosciuti[scelto.nome] = _riconosciuti.get(scelto.nome, 0) + 1
+
+    return {
+        'formato': scelto.nome,
+        'tipo': scelto.tipo,
+        'pagine': len(pagine),
+        'dati': scelto.estrattore(pagine)
+    }
+
+
+def estrai_busta_paga(pdf_data: bytes) -> PayslipData:
+    """
+    Dati busta paga in forma PayslipData, qualunque sia il layout
+
+    Raises:
+        ValueError: il PDF è riconosciuto come un documento diverso (es. libro unico)
+    """
+    return dati_busta_paga(estrai_pagine(pdf_data))
+
+
+def dati_busta_paga(pagine: Pagine, formato: Optional[str] = None) -> PayslipData:
+    """
+    Come estrai_busta_paga, su pagine già estratte (es. le pagine di un
+    dipendente in un PDF multiplo, con il formato riconosciuto sul file)
+    """
+    scelto = get_formato(formato or riconosci_formato(pagine) or FORMATO_DEFAULT)
+    if scelto.tipo != TIPO_BUSTA_PAGA:
+        raise ValueError(f"Il PDF non è una busta paga (formato {scelto.nome})")
+    _riconosciuti[scelto.nome] = _riconosciuti.get(scelto.nome, 0) + 1
+
+    return scelto.estrattore(pagine)
+
+
+def statistiche_registro() -> Dict:
+    """Cache testo (per processo) e formati riconosciuti"""
+    return {
+        'cache_testo': pdf_text_cache.stats(),
+        'formati': dict(_riconosciuti)
+    }
@@ -0,0 +1,103 @@
+"""
+Split Buste Paga Multiple - Un PDF per dipendente
+Il consulente invia spesso un unico PDF con le buste paga di tutti i
+dipendenti del mese.
+1. Testo delle pagine estratto una volta (pdf_text), codice fiscale per pagina
+2. Nuovo dipendente = pagina con un CF diverso dal precedente; le pagine
+   senza CF (seguiti, riepiloghi) restano al dipendente in corso
+3. Pagine dello stesso CF in punti diversi del file unite in una parte:
+   un solo PDF e un solo import per dipendente
+4. Un PDF per dipendente con PDFUtils (sorgente letto una volta) e parse
+   delle sue pagine già estratte, nel formato riconosciuto sul file
+"""
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from .payslip_registry import dati_busta_paga, riconosci_formato
+from .pdf_text import Pagine, estrai_pagine
+from .pdf_utils import PDFUtils
+
+_RE_CODICE_FISCALE = re.compile(r'\b([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])\b')
+
+# (codice fiscale, [(prima pagina, ultima pagina), ...]), pagine da 1
+Intervallo = Tuple[str, List[Tuple[int, int]]]
+
+
+def descrivi_pagine(intervalli: List[Tuple[int, int]]) -> str:
+    """Intervalli di pagine in forma testuale, es. 1-2,5-5"""
+    return ','.join(f"{inizio}-{fine}" for inizio, fine in intervalli)
+
+
+def intervalli_dipendenti(pagine: Pagine) -> List[Intervallo]:
+    """
+    Pagine di ogni dipendente, nell'ordine di prima comparsa nel file
+
+    Un CF che ricompare dopo pagine di altri dipendenti (A, B, A) aggiunge
+    un intervallo al suo dipendente invece di una nuova parte.
+
+    Un CF presente su tutte le pagine con CF accanto ad altri (es. titolare di
+    ditta individuale in intestazione) non separa i dipendenti ed è ignorato.
+    """
+    cf_pagine: List[List[str]] = [_RE_CODICE_FISCALE.findall(testo) for testo in pagine]
+
+    comuni: Set[str] = set()
+    con_cf = [set(cfs) for cfs in cf_pagine if cfs]
+    if len(con_cf) > 1:
+        comuni = set.intersection(*con_cf)
+        # Un solo dipendente su più pagine: il CF comune è il suo
+        if not any(cfs - comuni for cfs in con_cf):
+            comuni = set()
+
+    intervalli: List[List] = []
+    for numero, cfs in enumerate(cf_pagine, start=1):
+        cf = next((c for c in cfs if c not in comuni), None)
+        if intervalli and (cf is None or cf == intervalli[-1][0]):
+            intervalli[-1][2] = numero
+        elif cf is not None:
+            intervalli.append([cf, numero, numero])
+        # Pagine iniziali senza CF (copertina): vanno al primo dipendente
+    if intervalli:
+        intervalli[0][1] = 1
+
+    per_cf: Dict[str, List[Tuple[int, int]]] = {}
+    for cf, inizio, fine in intervalli:
+        per_cf.setdefault(cf, []).append((inizio, fine))
+    return list(per_cf.items())
+
+
+def split_per_dipendente(pdf_data: bytes) -> List[Dict]:
+    """
+    PDF multiplo -> un PDF e i dati busta paga per dipendente
+
+    Returns:
+        [{'codice_fiscale', 'intervalli', 'pagine', 'pdf', 'dati'}], con
+        pagine = descrivi_pagine(intervalli); un solo elemento se il PDF è
+        di un solo dipendente
+
+    Raises:
+        ValueError: nessun codice fiscale nel PDF o PDF non di buste paga
+    """
+    pagine = estrai_pagine(pdf_data)
+    intervalli = intervalli_dipendenti(pagine)
+    if not intervalli:
+        raise ValueError("Nessun codice fiscale trovato nel PDF")
+
+    formato: Optional[str] = riconosci_formato(pagine)
+    pdf_parti = PDFUtils().split_pages(pdf_data, [intervalli_cf for _, intervalli_cf in intervalli])
+
+    parti = []
+    for (cf, intervalli_cf), pdf_parte in zip(intervalli, pdf_parti):
+        dati = dati_busta_paga(
+            tuple(pagina for inizio, fine in intervalli_cf for pagina in pagine[inizio - 1:fine]),
+            formato
+        )
+        # CF del dipendente dell'intervallo (il parse potrebbe trovare prima quello del titolare)
+        dati['codice_fiscale'] = cf
+        parti.append({
+            'codice_fiscale': cf,
+            'intervalli': intervalli_cf,
+            'pagine': descrivi_pagine(intervalli_cf),
+            'pdf': pdf_parte,
+            'dati': dati
+        })
+    return parti
@@ -0,0 +1,228 @@
+"""
+Archivio PDF per Contenuto - Deduplica import buste paga
+1. Hash SHA-256 del PDF in arrivo: se il contenuto è già stato importato
+   (mail reinviata, upload ripetuto) parse e scritture vengono saltati
+2. Originale salvato una volta sotto il suo hash (ab/abcdef....pdf),
+   copia senza password solo se diversa dall'originale
+3. PDF multipli (split per dipendente): parti registrate con l'hash del
+   file, un file reinviato con tutte le parti importate è saltato prima
+   di sblocco, split e parse
+4. Contatori hit/miss del processo e totali persistiti in pdf_contenuti
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .payslip_pool import PAYSLIP_UPLOAD_DIR, write_file_once_async
+from .pdf_text import hash_pdf
+
+# Cartella archivio (default: sottocartella della cartella buste paga)
+PDF_STORE_DIR = os.getenv('PDF_STORE_DIR', os.path.join(PAYSLIP_UPLOAD_DIR, 'archivio'))
+
+
+class PdfStore:
+    """Archivio content-addressed dei PDF importati"""
+
+    def __init__(self, base_dir: str = PDF_STORE_DIR):
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saltati = 0
+        self.file_scritti = 0
+
+    @staticmethod
+    def chiave_parte(sha256_file: str, pagine: str) -> str:
+        """
+        Chiave di una parte di un PDF multiplo: hash del file e pagine
+
+        Args:
+            pagine: intervalli della parte da descrivi_pagine, es. 1-2,5-5
+                    (un solo intervallo dà la stessa chiave del formato inizio-fine)
+
+        I byte di un PDF riscritto (split) non sono riproducibili tra due
+        esecuzioni, la chiave sì: lo stesso file reinviato dà le stesse chiavi.
+        """
+        return hashlib.sha256(f"{sha256_file}:{pagine}".encode()).hexdigest()
+
+    def percorso(self, sha256: str, suffisso: str = '') -> str:
+        """Path per hash (prime due cifre come sottocartella)"""
+        return os.path.join(self.base_dir, sha256[:2], f"{sha256}{suffisso}.pdf")
+
+    async def cerca(self, db, pdf_data: bytes, sha256: Optional[str] = None) -> Tuple[str, Optional[Dict]]:
+        """
+        Hash del PDF e import precedente dello stesso contenuto
+
+        Args:
+            sha256: chiave già calcolata (es. chiave_parte per i PDF da split)
+
+        Returns:
+            (sha256, record o None): il record ha payslip_id, employee_id,
+            periodo, netto_in_busta, path, view_path
+        """
+        sha256 = sha256 or hash_pdf(pdf_data)
+        row = await db.fetch_one("""
+            UPDATE pdf_contenuti c SET
+                import_count = c.import_count + 1,
+                ultimo_import = NOW()
+            FROM payslips p
+            WHERE c.sha256 = :sha256 AND p.id = c.payslip_id
+            RETURNING c.payslip_id, p.employee_id, p.periodo, p.netto_in_busta, c.path, c.view_path
+        """, {'sha256': sha256})
+
+        with self._lock:
+            if row:
+                self.hits += 1
+                self.bytes_saltati += len(pdf_data)
+            else:
+                self.misses += 1
+
+        return sha256, dict(row) if row else None
+
+    async def cerca_file(self, db, pdf_data: bytes, sha256_file: str) -> Optional[List[Dict]]:
+        """
+        Parti già importate di un PDF multiplo, solo se lo sono tutte
+        
+        Returns:
+            [record come cerca, con sha256 e pagine] nell'ordine delle pagine,
+            o None se almeno una parte manca (il file va diviso e importato)
+        """
+        rows = await db.fetch_all("""
+            UPDATE pdf_contenuti c SET
+                import_count = c.import_count + 1,
+                ultimo_import = NOW()
+            FROM payslips p
+            WHERE c.sha256_file = :sha256_file AND p.id = c.payslip_id
+              AND c.parti_file = (
+                  SELECT count(*)
+                  FROM pdf_contenuti x
+                  JOIN payslips y ON y.id = x.payslip_id
+                  WHERE x.sha256_file = :sha256_file
+              )
+            RETURNING c.sha256, c.pagine, c.payslip_id, p.employee_id, p.periodo,
+                      p.netto_in_busta, c.path, c.view_path
+        """, {'sha256_file': sha256_file})
+        
+        with self._lock:
+            if rows:
+                self.hits += len(rows)
+                self.bytes_saltati += len(pdf_data)
+        
+        if not rows:
+            return None
+        return sorted((dict(r) for r in rows), key=lambda r: int(r['pagine'].split('-')[0]))
+    
+    def conta_duplicato(self, dimensione: int):
+        """Hit senza lookup (copia dello stesso PDF nello stesso batch)"""
+        with self._lock:
+            self.hits += 1
+            self.bytes_saltati += dimensione
+
+    async def salva(
+        self,
+        sha256: str,
+        pdf_data: bytes,
+        pdf_unlocked: Optional[bytes] = None
+    ) -> Tuple[str, str]:
+        """
+        Scrive originale e copia senza password (solo i file mancanti)
+
+        Returns:
+            (path originale, path copia senza password)
+        """
+        path = self.percorso(sha256)
+        scritti = await write_file_once_async(path, pdf_data)
+
+        view_path = path
+        if pdf_unlocked and pdf_unlocked != pdf_data:
+            view_path = self.percorso(sha256, '_view')
+            scritti += await write_file_once_async(view_path, pdf_unlocked)
+
+        with self._lock:
+            self.file_scritti += scritti
+
+        return path, view_path
+
+    @staticmethod
+    async def registra(
+        tx,
+        sha256: str,
+        dimensione: int,
+        path: str,
+        view_path: str,
+        payslip_id: int,
+        parte: Optional[Dict] = None
+    ):
+        """
+        Collega il contenuto al documento importato (nella transazione dell'import)
+        
+        Args:
+            parte: per le parti di un PDF multiplo {'sha256_file', 'pagine', 'parti_file'}
+        """
+        parte = parte or {}
+        await tx.execute("""
+            INSERT INTO pdf_contenuti (
+                sha256, dimensione, path, view_path, payslip_id,
+                sha256_file, pagine, parti_file
+            )
+            VALUES (
+                :sha256, :dimensione, :path, :view_path, :payslip_id,
+                :sha256_file, :pagine, :parti_file
+            )
+            ON CONFLICT (sha256) DO UPDATE SET
+                payslip_id = EXCLUDED.payslip_id,
+                path = EXCLUDED.path,
+                view_path = EXCLUDED.view_path,
+                sha256_file = EXCLUDED.sha256_file,
+                pagine = EXCLUDED.pagine,
+                parti_file = EXCLUDED.parti_file,
+                import_count = pdf_contenuti.import_count + 1,
+                ultimo_import = NOW()
+        """, {
+            'sha256': sha256,
+            'dimensione': dimensione,
+            'path': path,
+            'view_path': view_path,
+            'payslip_id': payslip_id,
+            'sha256_file': parte.get('sha256_file'),
+            'pagine': parte.get('pagine'),
+            'parti_file': parte.get('parti_file')
+        })
+
+    def stats(self) -> Dict:
+        """Contatori del processo dall'avvio"""
+        with self._lock:
+            totale = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / totale, 4) if totale else 0.0,
+                'bytes_saltati': self.bytes_saltati,
+                'file_scritti': self.file_scritti
+            }
+
+    @staticmethod
+    async def stats_archivio(db) -> Dict:
+        """Totali persistiti: contenuti, import e duplicati evitati"""
+        row = await db.fetch_one("""
+            SELECT count(*) AS contenuti,
+                   COALESCE(sum(import_count), 0) AS import_totali,
+                   COALESCE(sum(dimensione), 0) AS bytes_archiviati
+            FROM pdf_contenuti
+        """)
+        if not row:
+            return {'contenuti': 0, 'import_totali': 0, 'duplicati': 0, 'hit_rate': 0.0, 'bytes_archiviati': 0}
+
+        import_totali = row['import_totali']
+        duplicati = import_totali - row['contenuti']
+        return {
+            'contenuti': row['contenuti'],
+            'import_totali': import_totali,
+            'duplicati': duplicati,
+            'hit_rate': round(duplicati / import_totali, 4) if import_totali else 0.0,
+            'bytes_archiviati': row['bytes_archiviati']
+        }
+
+
+pdf_store = PdfStore()
@@ -0,0 +1,104 @@
+"""
+Testo PDF - Estrazione pagine con cache per contenuto
+1. Testo estratto una volta per PDF (PyPDF2), pagina per pagina
+2. Cache LRU per hash SHA-256 del contenuto: lo stesso PDF letto da più
+   parser (busta paga, libro unico, riconoscimento formato) non viene
+   riaperto
+3. Contatori hit/miss per il monitoraggio
+"""
+try:
+    import PyPDF2
+    from io import BytesIO
+except ImportError:
+    PyPDF2 = None
+    BytesIO = None
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+# PDF (testo per pagina) tenuti in cache per processo
+PDF_TEXT_CACHE_SIZE = int(os.getenv("PDF_TEXT_CACHE_SIZE", "64"))
+
+Pagine = Tuple[str, ...]
+
+
+def hash_pdf(pdf_data: bytes) -> str:
+    """Hash del contenuto (chiave di cache)"""
+    return hashlib.sha256(pdf_data).hexdigest()
+
+
+class PdfTextCache:
+    """Cache LRU hash contenuto -> testo delle pagine"""
+
+    def __init__(self, max_size: int = PDF_TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self._pagine: 'OrderedDict[str, Pagine]' = OrderedDict()
+        # Estrazioni anche da thread (asyncio.to_thread)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chiave: str):
+        with self._lock:
+            pagine = self._pagine.get(chiave)
+            if pagine is None:
+                self.misses += 1
+                return None
+            self._pagine.move_to_end(chiave)
+            self.hits += 1
+            return pagine
+
+    def put(self, chiave: str, pagine: Pagine):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._pagine[chiave] = pagine
+            self._pagine.move_to_end(chiave)
+            while len(self._pagine) > self.max_size:
+                self._pagine.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pagine.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            totale = self.hits + self.misses
+            return {
+                'size': len(self._pagine),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / totale, 4) if totale else 0.0
+            }
+
+
+pdf_text_cache = PdfTextCache()
+
+
+def estrai_pagine(pdf_data: bytes) -> Pagine:
+    """
+    Testo di ogni pagina del PDF (dalla cache se già estratto)
+
+    Raises:
+        RuntimeError: PyPDF2 non installato
+        Eccezioni PyPDF2 per PDF illeggibili o cifrati
+    """
+    if not PyPDF2:
+        raise RuntimeError("PyPDF2 non installato. Installa con: pip install PyPDF2")
+
+    chiave = hash_pdf(pdf_data)
+    pagine = pdf_text_cache.get(chiave)
+    if pagine is None:
+        pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_data))
+        pagine = tuple(page.extract_text() or '' for page in pdf_reader.pages)
+        pdf_text_cache.put(chiave, pagine)
+    return pagine
+
+
+def estrai_testo(pdf_data: bytes, separatore: str = '') -> str:
+    """Testo completo del PDF (pagine unite con `separatore`)"""
+    return separatore.join(estrai_pagine(pdf_data))
@@ -60,7 +60,7 @@ class PDFUtils:
             print(f"Errore rimozione password PDF: {e}")
             return None
     
-    def _save_unlocked_pdf(self, pdf_reader: PyPDF2.PdfReader) -> bytes:
+    def _save_unlocked_pdf(self, pdf_reader: 'PyPDF2.PdfReader') -> bytes:
         """Salva PDF senza password"""
         
         pdf_writer = PyPDF2.PdfWriter()
@@ -99,18 +99,38 @@ class PDFUtils:
     ) -> bytes:
         """Estrae pagine da PDF"""
         
-        pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_data))
-        pdf_writer = PyPDF2.PdfWriter()
+        return self.split_pages(pdf_data, [[(start_page, end_page)]])[0]
+    
+    def split_pages(
+        self,
+        pdf_data: bytes,
+        parts_ranges: list[list[tuple[int, int]]]
+    ) -> list[bytes]:
+        """
+        Un PDF per ogni parte: le pagine degli intervalli (start_page, end_page)
+        della parte, nell'ordine dato, pagine da 1 e estremi inclusi
         
-        for i in range(start_page - 1, end_page):
-            if i < len(pdf_reader.pages):
-                pdf_writer.add_page(pdf_reader.pages[i])
+        Il PDF sorgente è letto una volta sola per tutte le parti.
+        """
         
-        output = BytesIO()
-        pdf_writer.write(output)
-        output.seek(0)
+        pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_data))
+        parts = []
         
-        return output.read()
+        for ranges in parts_ranges:
+            pdf_writer = PyPDF2.PdfWriter()
+            
+            for start_page, end_page in ranges:
+                for i in range(start_page - 1, end_page):
+                    if i < len(pdf_reader.pages):
+                        pdf_writer.add_page(pdf_reader.pages[i])
+            
+            output = BytesIO()
+            pdf_writer.write(output)
+            output.seek(0)
+            
+            parts.append(output.read())
+        
+        return parts
     
     def add_watermark(
         self, 
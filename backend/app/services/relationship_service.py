@@ -6,11 +6,92 @@ Gestisce tutte le operazioni che impattano relazioni tra entità
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import logging
+import re
 
-from app.database import get_table
+from app.database import Transaction, db, get_async_table
+from app.services.name_index import name_index
 
 logger = logging.getLogger(__name__)
 
+MAX_FATTURE_BATCH = 1000
+
+# Colonne aggiornabili da update_fornitore_propagate
+CAMPI_FORNITORE = {
+    'ragione_sociale', 'codice_fiscale', 'indirizzo', 'cap', 'citta', 'provincia',
+    'email', 'telefono', 'pec', 'codice_sdi', 'metodo_pagamento', 'iban', 'banca',
+    'note', 'attivo'
+}
+
+# Riferimenti per ID a fornitori.id: (tabella, colonna, filtro)
+RIFERIMENTI_FORNITORE = [
+    ('bonifici', 'fornitore_id', ''),
+    ('bonifici', 'riferimento_id', "AND t.tipo = 'fornitore'"),
+    ('ordini', 'fornitore_id', ''),
+]
+
+CONTEGGI_CASCADE = (
+    'righe_fattura', 'movimenti_cassa', 'movimenti_banca',
+    'bonifici_scollegati', 'assegni_scollegati'
+)
+
+QUERY_CASCADE_FATTURE = """
+    WITH f AS (
+        SELECT id FROM fatture
+        WHERE id = ANY(:id_fatture) AND id_utente = :id_utente
+        FOR UPDATE
+    ),
+    righe AS (
+        DELETE FROM righe_fattura
+        WHERE id_fattura IN (SELECT id FROM f)
+        RETURNING 1
+    ),
+    cassa AS (
+        DELETE FROM movimenti_cassa
+        WHERE id_utente = :id_utente AND id_fattura IN (SELECT id FROM f)
+        RETURNING 1
+    ),
+    banca AS (
+        DELETE FROM prima_nota_banca
+        WHERE id_utente = :id_utente AND id_fattura IN (SELECT id FROM f)
+        RETURNING 1
+    ),
+    bonifici_upd AS (
+        UPDATE bonifici SET id_fattura = NULL, collegato = false
+        WHERE id_utente = :id_utente AND id_fattura IN (SELECT id FROM f)
+        RETURNING 1
+    ),
+    assegni_upd AS (
+        UPDATE assegni SET
+            id_fattura = NULL,
+            stato = CASE WHEN stato = 'emesso' THEN 'disponibile' ELSE stato END,
+            importo = NULL,
+            beneficiario = NULL,
+            data_emissione = NULL
+        WHERE id_utente = :id_utente AND id_fattura IN (SELECT id FROM f)
+        RETURNING 1
+    ),
+    eliminate AS (
+        DELETE FROM fatture
+        WHERE id IN (SELECT id FROM f)
+        RETURNING id
+    )
+    SELECT
+        (SELECT array_agg(id) FROM eliminate) AS fatture,
+        (SELECT count(*) FROM righe) AS righe_fattura,
+        (SELECT count(*) FROM cassa) AS movimenti_cassa,
+        (SELECT count(*) FROM banca) AS movimenti_banca,
+        (SELECT count(*) FROM bonifici_upd) AS bonifici_scollegati,
+        (SELECT count(*) FROM assegni_upd) AS assegni_scollegati
+"""
+
+def normalizza_partita_iva(partita_iva: Optional[str]) -> str:
+    """'IT 01234567890' → '01234567890'"""
+    piva = re.sub(r'\s+', '', partita_iva or '').upper()
+    if re.fullmatch(r'IT\d{11}', piva):
+        piva = piva[2:]
+    return piva
+
+
 class RelationshipService:
     """Servizio per gestione relazioni tra entità"""
     
@@ -29,110 +110,146 @@ class RelationshipService:
         5. Collegamenti Assegni
         """
         try:
-            fatture_table = get_table('fatture')
-            righe_table = get_table('righe_fattura')
-            cassa_table = get_table('movimenti_cassa')
-            banca_table = get_table('prima_nota_banca')
-            bonifici_table = get_table('bonifici')
-            assegni_table = get_table('assegni')
-            
-            # Verifica fattura esiste
-            fattura = fatture_table.select('*')\
-                .eq('id', id_fattura)\
-                .eq('id_utente', id_utente)\
-                .execute()
+            result = await RelationshipService._cascade_fatture(id_utente, [id_fattura])
             
-            if not fattura.data:
+            if not result['fatture']:
                 raise ValueError("Fattura non trovata")
             
-            deleted_items = {
-                'righe_fattura': 0,
-                'movimenti_cassa': 0,
-                'movimenti_banca': 0,
-                'bonifici_scollegati': 0,
-                'assegni_scollegati': 0
-            }
+            logger.info(f"Fattura {id_fattura} eliminata con cascata: {result['deleted']}")
             
-            # 1. Elimina righe fattura
-            righe = righe_table.select('*').eq('id_fattura', id_fattura).execute()
-            if righe.data:
-                righe_table.delete().eq('id_fattura', id_fattura).execute()
-                deleted_items['righe_fattura'] = len(righe.data)
-            
-            # 2. Elimina movimenti cassa collegati
-            mov_cassa = cassa_table.select('*')\
-                .eq('id_utente', id_utente)\
-                .eq('id_fattura', id_fattura)\
-                .execute()
-            if mov_cassa.data:
-                cassa_table.delete()\
-                    .eq('id_utente', id_utente)\
-                    .eq('id_fattura', id_fattura)\
-                    .execute()
-                deleted_items['movimenti_cassa'] = len(mov_cassa.data)
+            return {
+                "success": True,
+                "message": "Fattura eliminata con tutti i collegamenti",
+                "deleted": result['deleted']
+            }
             
-            # 3. Elimina movimenti banca collegati
-            mov_banca = banca_table.select('*')\
-                .eq('id_utente', id_utente)\
-                .eq('id_fattura', id_fattura)\
-                .execute()
-            if mov_banca.data:
-                banca_table.delete()\
-                    .eq('id_utente', id_utente)\
-                    .eq('id_fattura', id_fattura)\
-                    .execute()
-                deleted_items['movimenti_banca'] = len(mov_banca.data)
+        except Exception as e:
+            logger.error(f"Errore delete_fattura_with_cascade: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def delete_fatture_batch(id_utente: int, id_fatture: List[int]) -> Dict:
+        """
+        Elimina molte fatture con cascata (es. pulizia di fine anno)
+        
+        Stessa cascata di delete_fattura_with_cascade, un solo statement
+        per l'intero lotto: o vengono eliminate tutte o nessuna.
+        
+        Returns:
+            Dict con conteggi totali e ID non trovati
+        """
+        try:
+            id_fatture = list(dict.fromkeys(int(i) for i in id_fatture))
+            if not id_fatture:
+                raise ValueError("Nessuna fattura indicata")
+            if len(id_fatture) > MAX_FATTURE_BATCH:
+                raise ValueError(f"Massimo {MAX_FATTURE_BATCH} fatture per richiesta")
             
-            # 4. Scollega bonifici (non elimina il bonifico)
-            bonifici = bonifici_table.select('*')\
-                .eq('id_utente', id_utente)\
-                .eq('id_fattura', id_fattura)\
-                .execute()
-            if bonifici.data:
-                bonifici_table.update({
-                    'id_fattura': None,
-                    'collegato': False
-                })\
-                .eq('id_utente', id_utente)\
-                .eq('id_fattura', id_fattura)\
-                .execute()
-                deleted_items['bonifici_scollegati'] = len(bonifici.data)
+            result = await RelationshipService._cascade_fatture(id_utente, id_fatture)
             
-            # 5. Scollega assegni (riporta a disponibile se non incassato)
-            assegni = assegni_table.select('*')\
-                .eq('id_utente', id_utente)\
-                .eq('id_fattura', id_fattura)\
-                .execute()
-            if assegni.data:
-                for assegno in assegni.data:
-                    new_stato = 'disponibile' if assegno['stato'] == 'emesso' else assegno['stato']
-                    assegni_table.update({
-                        'id_fattura': None,
-                        'stato': new_stato,
-                        'importo': None,
-                        'beneficiario': None,
-                        'data_emissione': None
-                    }).eq('id', assegno['id']).execute()
-                deleted_items['assegni_scollegati'] = len(assegni.data)
-            
-            # 6. Elimina fattura
-            fatture_table.delete()\
-                .eq('id', id_fattura)\
-                .eq('id_utente', id_utente)\
-                .execute()
+            eliminate = set(result['fatture'])
+            non_trovate = [i for i in id_fatture if i not in eliminate]
             
-            logger.info(f"Fattura {id_fattura} eliminata con cascata: {deleted_items}")
+            logger.info(f"Eliminate {len(eliminate)} fatture con cascata: {result['deleted']}")
             
             return {
                 "success": True,
-                "message": "Fattura eliminata con tutti i collegamenti",
-                "deleted": deleted_items
+                "message": f"{len(eliminate)} fatture eliminate con tutti i collegamenti",
+                "fatture_eliminate": len(eliminate),
+                "non_trovate": non_trovate,
+                "deleted": result['deleted']
             }
             
         except Exception as e:
-            logger.error(f"Errore delete_fattura_with_cascade: {str(e)}")
+            logger.error(f"Errore delete_fatture_batch: {str(e)}")
             raise
     
+    @staticmethod
+    async def _cascade_fatture(id_utente: int, id_fatture: List[int]) -> Dict:
+        """
+        Cascata lato server: un solo statement (CTE con DELETE/UPDATE)
+        
+        Le fatture sono bloccate FOR UPDATE, i conteggi arrivano dalle
+        RETURNING; i vincoli FK sono verificati a fine statement.
+        Senza DATABASE_URL la cascata passa da Supabase.
+        """
+        if not db.pool:
+            return await RelationshipService._cascade_fatture_supabase(id_utente, id_fatture)
+        
+        async with db.transaction() as tx:
+            row = await tx.fetch_one(QUERY_CASCADE_FATTURE, {
+                'id_utente': id_utente,
+                'id_fatture': id_fatture
+            })
+        
+        return {
+            'fatture': list(row['fatture'] or []),
+            'deleted': {k: row[k] for k in CONTEGGI_CASCADE}
+        }
+    
+    @staticmethod
+    async def _cascade_fatture_supabase(id_utente: int, id_fatture: List[int]) -> Dict:
+        """
+        Cascata via Supabase (database asyncpg non disponibile)
+        
+        Stessi passi di QUERY_CASCADE_FATTURE con una richiesta per tabella,
+        non atomici: la fattura è eliminata per ultima, un errore a metà
+        lascia la fattura e i collegamenti non ancora toccati.
+        """
+        fatture_table = get_async_table('fatture')
+        assegni_table = get_async_table('assegni')
+        
+        trovate = await fatture_table.select('id')\
+            .in_('id', id_fatture)\
+            .eq('id_utente', id_utente)\
+            .execute()
+        ids = [f['id'] for f in trovate.data or []]
+        if not ids:
+            return {'fatture': [], 'deleted': {k: 0 for k in CONTEGGI_CASCADE}}
+        
+        deleted = {}
+        
+        righe = await get_async_table('righe_fattura').delete()\
+            .in_('id_fattura', ids)\
+            .execute()
+        deleted['righe_fattura'] = len(righe.data or [])
+        
+        for chiave, tabella in (('movimenti_cassa', 'movimenti_cassa'), ('movimenti_banca', 'prima_nota_banca')):
+            eliminati = await get_async_table(tabella).delete()\
+                .eq('id_utente', id_utente)\
+                .in_('id_fattura', ids)\
+                .execute()
+            deleted[chiave] = len(eliminati.data or [])
+        
+        bonifici = await get_async_table('bonifici').update({
+            'id_fattura': None,
+            'collegato': False
+        }).eq('id_utente', id_utente).in_('id_fattura', ids).execute()
+        deleted['bonifici_scollegati'] = len(bonifici.data or [])
+        
+        # Assegni emessi tornano disponibili, gli altri mantengono lo stato
+        scollega = {'id_fattura': None, 'importo': None, 'beneficiario': None, 'data_emissione': None}
+        emessi = await assegni_table.update({**scollega, 'stato': 'disponibile'})\
+            .eq('id_utente', id_utente)\
+            .in_('id_fattura', ids)\
+            .eq('stato', 'emesso')\
+            .execute()
+        altri = await assegni_table.update(scollega)\
+            .eq('id_utente', id_utente)\
+            .in_('id_fattura', ids)\
+            .execute()
+        deleted['assegni_scollegati'] = len(emessi.data or []) + len(altri.data or [])
+        
+        eliminate = await fatture_table.delete()\
+            .in_('id', ids)\
+            .eq('id_utente', id_utente)\
+            .execute()
+        
+        return {
+            'fatture': [f['id'] for f in eliminate.data or []],
+            'deleted': deleted
+        }
+    
     @staticmethod
     async def delete_fornitore_safe(id_utente: int, partita_iva: str, force: bool = False) -> Dict:
         """
@@ -143,11 +260,11 @@ class RelationshipService:
         - force=True → SOFT DELETE (disattiva)
         """
         try:
-            fornitori_table = get_table('fornitori')
-            fatture_table = get_table('fatture')
+            fornitori_table = get_async_table('fornitori')
+            fatture_table = get_async_table('fatture')
             
             # Verifica fornitore esiste
-            fornitore = fornitori_table.select('*')\
+            fornitore = await fornitori_table.select('*')\
                 .eq('id_utente', id_utente)\
                 .eq('partita_iva', partita_iva)\
                 .execute()
@@ -156,7 +273,7 @@ class RelationshipService:
                 raise ValueError("Fornitore non trovato")
             
             # Controlla fatture collegate
-            fatture = fatture_table.select('id')\
+            fatture = await fatture_table.select('id')\
                 .eq('id_utente', id_utente)\
                 .eq('partita_iva_fornitore', partita_iva)\
                 .execute()
@@ -169,7 +286,7 @@ class RelationshipService:
                     )
                 else:
                     # SOFT DELETE
-                    fornitori_table.update({
+                    await fornitori_table.update({
                         'attivo': False,
                         'updated_at': datetime.now().isoformat()
                     })\
@@ -184,11 +301,14 @@ class RelationshipService:
                     }
             else:
                 # HARD DELETE (nessuna fattura collegata)
-                fornitori_table.delete()\
+                await fornitori_table.delete()\
                     .eq('id_utente', id_utente)\
                     .eq('partita_iva', partita_iva)\
                     .execute()
                 
+                for row in fornitore.data:
+                    name_index.remove('fornitore', row['id'])
+                
                 return {
                     "success": True,
                     "message": "Fornitore eliminato definitivamente",
@@ -209,12 +329,12 @@ class RelationshipService:
         - force=True → SOFT DELETE
         """
         try:
-            dipendenti_table = get_table('dipendenti')
-            paghe_table = get_table('paghe_dipendenti')
-            turni_table = get_table('turni')
+            dipendenti_table = get_async_table('dipendenti')
+            paghe_table = get_async_table('paghe_dipendenti')
+            turni_table = get_async_table('turni')
             
             # Verifica dipendente esiste
-            dipendente = dipendenti_table.select('*')\
+            dipendente = await dipendenti_table.select('*')\
                 .eq('id', id_dipendente)\
                 .eq('id_utente', id_utente)\
                 .execute()
@@ -223,13 +343,13 @@ class RelationshipService:
                 raise ValueError("Dipendente non trovato")
             
             # Controlla paghe
-            paghe = paghe_table.select('id')\
+            paghe = await paghe_table.select('id')\
                 .eq('id_utente', id_utente)\
                 .eq('id_dipendente', id_dipendente)\
                 .execute()
             
             # Controlla turni
-            turni = turni_table.select('id')\
+            turni = await turni_table.select('id')\
                 .eq('id_utente', id_utente)\
                 .eq('id_dipendente', id_dipendente)\
                 .execute()
@@ -244,7 +364,7 @@ class RelationshipService:
                     )
                 else:
                     # SOFT DELETE
-                    dipendenti_table.update({
+                    await dipendenti_table.update({
                         'attivo': False,
                         'updated_at': datetime.now().isoformat()
                     })\
@@ -259,7 +379,7 @@ class RelationshipService:
                     }
             else:
                 # HARD DELETE
-                dipendenti_table.delete()\
+                await dipendenti_table.delete()\
                     .eq('id', id_dipendente)\
                     .eq('id_utente', id_utente)\
                     .execute()
@@ -282,9 +402,9 @@ class RelationshipService:
         Può eliminare solo se stato = 'disponibile'
         """
         try:
-            assegni_table = get_table('assegni')
+            assegni_table = get_async_table('assegni')
             
-            assegno = assegni_table.select('*')\
+            assegno = await assegni_table.select('*')\
                 .eq('id', id_assegno)\
                 .eq('id_utente', id_utente)\
                 .execute()
@@ -300,7 +420,7 @@ class RelationshipService:
                     f"Solo assegni 'disponibili' possono essere eliminati."
                 )
             
-            assegni_table.delete()\
+            await assegni_table.delete()\
                 .eq('id', id_assegno)\
                 .eq('id_utente', id_utente)\
                 .execute()
@@ -327,37 +447,61 @@ class RelationshipService:
         
         Campi propagati:
         - ragione_sociale → fatture.ragione_sociale_fornitore
+        
+        Fornitore, fatture e giornale modifiche in una transazione; la
+        propagazione è un solo UPDATE set-based sulle fatture.
         """
         try:
-            fornitori_table = get_table('fornitori')
-            fatture_table = get_table('fatture')
-            
-            # Aggiorna fornitore
-            fornitori_table.update(update_data)\
-                .eq('id_utente', id_utente)\
-                .eq('partita_iva', partita_iva)\
-                .execute()
-            
-            # Propaga ragione sociale a fatture
-            if 'ragione_sociale' in update_data:
-                fatture_table.update({
-                    'ragione_sociale_fornitore': update_data['ragione_sociale']
-                })\
-                .eq('id_utente', id_utente)\
-                .eq('partita_iva_fornitore', partita_iva)\
-                .execute()
+            campi = {k: v for k, v in update_data.items() if k != 'updated_at'}
+            non_validi = set(campi) - CAMPI_FORNITORE
+            if non_validi:
+                raise ValueError(f"Campi fornitore non validi: {', '.join(sorted(non_validi))}")
+            if not campi:
+                raise ValueError("Nessun campo da aggiornare")
+            
+            assegnazioni = ", ".join(f"{c} = :{c}" for c in campi)
+            params = {**campi, 'id_utente': id_utente, 'partita_iva': partita_iva}
+            
+            async with db.transaction() as tx:
+                updated = await tx.fetch_all(f"""
+                    WITH vecchi AS (
+                        SELECT id, ragione_sociale FROM fornitori
+                        WHERE id_utente = :id_utente AND partita_iva = :partita_iva
+                        FOR UPDATE
+                    )
+                    UPDATE fornitori f SET {assegnazioni}, updated_at = NOW()
+                    FROM vecchi
+                    WHERE f.id = vecchi.id
+                    RETURNING f.*, vecchi.ragione_sociale AS ragione_sociale_precedente
+                """, params)
                 
-                # Conta fatture aggiornate
-                fatture = fatture_table.select('id')\
-                    .eq('id_utente', id_utente)\
-                    .eq('partita_iva_fornitore', partita_iva)\
-                    .execute()
+                if not updated:
+                    raise ValueError("Fornitore non trovato")
                 
+                rinominati = [
+                    dict(row) for row in updated
+                    if 'ragione_sociale' in campi and row['ragione_sociale'] != row['ragione_sociale_precedente']
+                ]
+                fatture_aggiornate = 0
+                if 'ragione_sociale' in campi:
+                    propagate = await RelationshipService._propaga_fatture(
+                        tx, id_utente, [(partita_iva, partita_iva, campi['ragione_sociale'])]
+                    )
+                    fatture_aggiornate = propagate.get(partita_iva, 0)
+                    await RelationshipService._registra_modifiche(tx, [
+                        RelationshipService._voce_rinomina(id_utente, row, fatture_aggiornate)
+                        for row in rinominati[:1]
+                    ])
+            
+            for row in updated:
+                name_index.add_fornitore(row)
+            
+            if 'ragione_sociale' in campi:
                 return {
                     "success": True,
                     "message": "Fornitore aggiornato",
                     "propagated": {
-                        "fatture_updated": len(fatture.data) if fatture.data else 0
+                        "fatture_updated": fatture_aggiornate
                     }
                 }
             
@@ -370,6 +514,307 @@ class RelationshipService:
             logger.error(f"Errore update_fornitore_propagate: {str(e)}")
             raise
     
+    @staticmethod
+    async def rinomina_fornitori(id_utente: int, rinomine: List[Dict]) -> Dict:
+        """
+        Rinomina massiva: [{'partita_iva', 'ragione_sociale'}, ...]
+        
+        Un UPDATE per i fornitori e uno per le fatture, qualunque sia il
+        numero di rinomine; tutto o niente.
+        """
+        try:
+            mappa = {}
+            for r in rinomine:
+                if not r.get('partita_iva') or not r.get('ragione_sociale'):
+                    raise ValueError("Ogni rinomina richiede partita_iva e ragione_sociale")
+                mappa[r['partita_iva']] = r['ragione_sociale']
+            if not mappa:
+                raise ValueError("Nessuna rinomina indicata")
+            
+            async with db.transaction() as tx:
+                updated = await tx.fetch_all("""
+                    WITH m AS (
+                        SELECT * FROM unnest(:pive::text[], :nomi::text[]) AS m(partita_iva, ragione_sociale)
+                    ),
+                    vecchi AS (
+                        SELECT f.id, f.ragione_sociale FROM fornitori f
+                        JOIN m ON m.partita_iva = f.partita_iva
+                        WHERE f.id_utente = :id_utente
+                        FOR UPDATE OF f
+                    )
+                    UPDATE fornitori f SET ragione_sociale = m.ragione_sociale, updated_at = NOW()
+                    FROM vecchi, m
+                    WHERE f.id = vecchi.id AND m.partita_iva = f.partita_iva
+                    RETURNING f.*, vecchi.ragione_sociale AS ragione_sociale_precedente
+                """, {
+                    'pive': list(mappa.keys()),
+                    'nomi': list(mappa.values()),
+                    'id_utente': id_utente
+                })
+                
+                trovate = {row['partita_iva'] for row in updated}
+                propagate = await RelationshipService._propaga_fatture(
+                    tx, id_utente, [(piva, piva, mappa[piva]) for piva in trovate]
+                )
+                
+                # Una voce per P.IVA rinominata (il conteggio fatture è per P.IVA)
+                voci, registrate = [], set()
+                for row in updated:
+                    if row['ragione_sociale'] != row['ragione_sociale_precedente'] and row['partita_iva'] not in registrate:
+                        registrate.add(row['partita_iva'])
+                        voci.append(RelationshipService._voce_rinomina(
+                            id_utente, row, propagate.get(row['partita_iva'], 0)
+                        ))
+                await RelationshipService._registra_modifiche(tx, voci)
+            
+            for row in updated:
+                name_index.add_fornitore(row)
+            
+            logger.info(f"Rinomina fornitori utente {id_utente}: {len(voci)} rinominati, {sum(propagate.values())} fatture")
+            
+            return {
+                "success": True,
+                "fornitori_rinominati": len(voci),
+                "fatture_aggiornate": sum(propagate.values()),
+                "non_trovati": [piva for piva in mappa if piva not in trovate]
+            }
+            
+        except Exception as e:
+            logger.error(f"Errore rinomina_fornitori: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def trova_fornitori_duplicati(id_utente: int) -> List[Dict]:
+        """
+        Gruppi di fornitori con la stessa P.IVA normalizzata
+        
+        "IT 01234567890", "01234567890" e righe ripetute con la stessa P.IVA
+        sono lo stesso fornitore. Principale: la riga con la P.IVA già in forma
+        normalizzata, altrimenti la più vecchia.
+        """
+        rows = await db.fetch_all("""
+            SELECT id, partita_iva, ragione_sociale FROM fornitori
+            WHERE id_utente = :id_utente
+            ORDER BY id
+        """, {'id_utente': id_utente})
+        
+        gruppi: Dict[str, List[Dict]] = {}
+        for row in rows:
+            chiave = normalizza_partita_iva(row['partita_iva'])
+            if chiave:
+                gruppi.setdefault(chiave, []).append(dict(row))
+        
+        duplicati = []
+        for chiave, righe in gruppi.items():
+            if len(righe) < 2:
+                continue
+            principale = next((r for r in righe if r['partita_iva'] == chiave), righe[0])
+            duplicati.append({
+                'partita_iva': principale['partita_iva'],
+                'principale': principale,
+                'duplicati': [r for r in righe if r['id'] != principale['id']]
+            })
+        return duplicati
+    
+    @staticmethod
+    async def unisci_fornitori(id_utente: int, gruppi: Optional[List[Dict]] = None) -> Dict:
+        """
+        Unisce fornitori duplicati nel principale di ogni gruppo
+        
+        Args:
+            gruppi: [{'partita_iva': principale, 'duplicati': [P.IVA, ...]}];
+                    None = tutti i gruppi di trova_fornitori_duplicati
+        
+        Fatture, bonifici e ordini passano al principale (P.IVA e ragione
+        sociale), i duplicati vengono eliminati. Set-based: pochi statement
+        per qualunque numero di gruppi, in una transazione.
+        """
+        try:
+            if gruppi is None:
+                gruppi = [
+                    {'partita_iva': g['partita_iva'], 'duplicati': [d['partita_iva'] for d in g['duplicati']]}
+                    for g in await RelationshipService.trova_fornitori_duplicati(id_utente)
+                ]
+            
+            # P.IVA duplicata → P.IVA principale
+            destinazione: Dict[str, str] = {}
+            for g in gruppi:
+                principale = g['partita_iva']
+                for piva in [principale, *g.get('duplicati', [])]:
+                    if destinazione.get(piva, principale) != principale:
+                        raise ValueError(f"P.IVA {piva} presente in più gruppi")
+                    destinazione[piva] = principale
+            
+            if not destinazione:
+                return {"success": True, "gruppi": 0, "fornitori_eliminati": 0, "fatture_aggiornate": 0}
+            
+            async with db.transaction() as tx:
+                rows = await tx.fetch_all("""
+                    SELECT id, partita_iva, ragione_sociale FROM fornitori
+                    WHERE id_utente = :id_utente AND partita_iva = ANY(:pive)
+                    ORDER BY id
+                    FOR UPDATE
+                """, {'id_utente': id_utente, 'pive': list(destinazione.keys())})
+                
+                principali: Dict[str, Dict] = {}
+                for row in rows:
+                    if row['partita_iva'] in destinazione.values() and row['partita_iva'] not in principali:
+                        principali[row['partita_iva']] = dict(row)
+                mancanti = set(destinazione.values()) - set(principali)
+                if mancanti:
+                    raise ValueError(f"Fornitore principale non trovato: {', '.join(sorted(mancanti))}")
+                
+                eliminati = [
+                    (dict(row), principali[destinazione[row['partita_iva']]])
+                    for row in rows
+                    if row['id'] != principali[destinazione[row['partita_iva']]]['id']
+                ]
+                
+                # Riferimenti per ID al fornitore eliminato
+                if eliminati:
+                    await RelationshipService._sposta_riferimenti(
+                        tx, [d['id'] for d, _ in eliminati], [p['id'] for _, p in eliminati]
+                    )
+                
+                # Fatture: P.IVA e ragione sociale del principale
+                propagate = await RelationshipService._propaga_fatture(tx, id_utente, [
+                    (piva, principale, principali[principale]['ragione_sociale'])
+                    for piva, principale in destinazione.items()
+                ])
+                
+                if eliminati:
+                    await tx.execute(
+                        "DELETE FROM fornitori WHERE id = ANY(:ids)",
+                        {'ids': [d['id'] for d, _ in eliminati]}
+                    )
+                
+                # Il conteggio fatture va sulla prima voce di ogni P.IVA assorbita
+                conteggiate = set()
+                voci = []
+                for duplicato, principale in eliminati:
+                    piva = duplicato['partita_iva']
+                    voci.append({
+                        'id_utente': id_utente,
+                        'operazione': 'unione',
+                        'partita_iva': principale['partita_iva'],
+                        'partita_iva_origine': piva,
+                        'ragione_sociale': principale['ragione_sociale'],
+                        'ragione_sociale_precedente': duplicato['ragione_sociale'],
+                        'fornitore_id': principale['id'],
+                        'fornitore_id_origine': duplicato['id'],
+                        'fatture_aggiornate': 0 if piva in conteggiate else propagate.get(piva, 0)
+                    })
+                    conteggiate.add(piva)
+                await RelationshipService._registra_modifiche(tx, voci)
+            
+            for duplicato, _ in eliminati:
+                name_index.remove('fornitore', duplicato['id'])
+            
+            logger.info(f"Unione fornitori utente {id_utente}: {len(eliminati)} duplicati in {len(principali)} fornitori")
+            
+            return {
+                "success": True,
+                "gruppi": len(principali),
+                "fornitori_eliminati": len(eliminati),
+                "fatture_aggiornate": sum(propagate.values())
+            }
+            
+        except Exception as e:
+            logger.error(f"Errore unisci_fornitori: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def get_modifiche_fornitori(id_utente: int, dopo_id: int = 0, limit: int = 500) -> List[Dict]:
+        """Voci del giornale successive a dopo_id (lettura incrementale per le cache)"""
+        rows = await db.fetch_all("""
+            SELECT * FROM fornitori_modifiche
+            WHERE id_utente = :id_utente AND id > :dopo_id
+            ORDER BY id
+            LIMIT :limit
+        """, {'id_utente': id_utente, 'dopo_id': dopo_id, 'limit': limit})
+        return [dict(r) for r in rows]
+    
+    @staticmethod
+    async def _propaga_fatture(tx: Transaction, id_utente: int, mappa: List[Tuple[str, str, str]]) -> Dict[str, int]:
+        """
+        Un UPDATE per tutte le fatture: [(P.IVA attuale, P.IVA nuova, ragione sociale)]
+        
+        Returns:
+            {P.IVA attuale: fatture aggiornate}
+        """
+        if not mappa:
+            return {}
+        
+        da, pive, nomi = (list(col) for col in zip(*mappa))
+        rows = await tx.fetch_all("""
+            WITH m AS (
+                SELECT * FROM unnest(:da::text[], :pive::text[], :nomi::text[])
+                    AS m(da, partita_iva, ragione_sociale)
+            ),
+            upd AS (
+                UPDATE fatture f SET
+                    partita_iva_fornitore = m.partita_iva,
+                    ragione_sociale_fornitore = m.ragione_sociale,
+                    updated_at = NOW()
+                FROM m
+                WHERE f.id_utente = :id_utente
+                  AND f.partita_iva_fornitore = m.da
+                  AND (f.partita_iva_fornitore <> m.partita_iva
+                       OR f.ragione_sociale_fornitore IS DISTINCT FROM m.ragione_sociale)
+                RETURNING m.da
+            )
+            SELECT da, count(*) AS fatture FROM upd GROUP BY da
+        """, {'da': da, 'pive': pive, 'nomi': nomi, 'id_utente': id_utente})
+        return {row['da']: row['fatture'] for row in rows}
+    
+    @staticmethod
+    async def _sposta_riferimenti(tx: Transaction, da: List[int], a: List[int]):
+        """Riferimenti per ID (bonifici, ordini) dai fornitori eliminati al principale"""
+        presenti = {
+            row['tabella'] for row in await tx.fetch_all(
+                "SELECT t AS tabella FROM unnest(:tabelle::text[]) AS t WHERE to_regclass(t) IS NOT NULL",
+                {'tabelle': list({t for t, _, _ in RIFERIMENTI_FORNITORE})}
+            )
+        }
+        for tabella, colonna, filtro in RIFERIMENTI_FORNITORE:
+            if tabella not in presenti:
+                continue
+            await tx.execute(f"""
+                UPDATE {tabella} t SET {colonna} = m.a
+                FROM unnest(:da::int[], :a::int[]) AS m(da, a)
+                WHERE t.{colonna} = m.da {filtro}
+            """, {'da': da, 'a': a})
+    
+    @staticmethod
+    def _voce_rinomina(id_utente: int, row, fatture_aggiornate: int) -> Dict:
+        return {
+            'id_utente': id_utente,
+            'operazione': 'rinomina',
+            'partita_iva': row['partita_iva'],
+            'partita_iva_origine': None,
+            'ragione_sociale': row['ragione_sociale'],
+            'ragione_sociale_precedente': row['ragione_sociale_precedente'],
+            'fornitore_id': row['id'],
+            'fornitore_id_origine': None,
+            'fatture_aggiornate': fatture_aggiornate
+        }
+    
+    @staticmethod
+    async def _registra_modifiche(tx: Transaction, voci: List[Dict]):
+        """Voci nel giornale fornitori_modifiche (stessa transazione della modifica)"""
+        if voci:
+            await tx.executemany("""
+                INSERT INTO fornitori_modifiche (
+                    id_utente, operazione, partita_iva, partita_iva_origine,
+                    ragione_sociale, ragione_sociale_precedente,
+                    fornitore_id, fornitore_id_origine, fatture_aggiornate
+                ) VALUES (
+                    :id_utente, :operazione, :partita_iva, :partita_iva_origine,
+                    :ragione_sociale, :ragione_sociale_precedente,
+                    :fornitore_id, :fornitore_id_origine, :fatture_aggiornate
+                )
+            """, voci)
+    
     @staticmethod
     async def update_dipendente_propagate(
         id_utente: int,
@@ -384,10 +829,10 @@ class RelationshipService:
         - Note: le paghe usano id_dipendente, quindi nessuna propagazione diretta
         """
         try:
-            dipendenti_table = get_table('dipendenti')
+            dipendenti_table = get_async_table('dipendenti')
             
             # Aggiorna dipendente
-            dipendenti_table.update(update_data)\
+            await dipendenti_table.update(update_data)\
                 .eq('id', id_dipendente)\
                 .eq('id_utente', id_utente)\
                 .execute()
@@ -407,9 +852,9 @@ class RelationshipService:
     async def check_can_delete_bonifico(id_utente: int, id_bonifico: int) -> Tuple[bool, str]:
         """Verifica se bonifico può essere eliminato"""
         try:
-            bonifici_table = get_table('bonifici')
+            bonifici_table = get_async_table('bonifici')
             
-            bonifico = bonifici_table.select('*')\
+            bonifico = await bonifici_table.select('*')\
                 .eq('id', id_bonifico)\
                 .eq('id_utente', id_utente)\
                 .execute()
@@ -429,9 +874,9 @@ class RelationshipService:
     async def check_can_modify_fattura_pagata(id_utente: int, id_fattura: int) -> Tuple[bool, str]:
         """Verifica se fattura pagata può essere modificata"""
         try:
-            fatture_table = get_table('fatture')
+            fatture_table = get_async_table('fatture')
             
-            fattura = fatture_table.select('*')\
+            fattura = await fatture_table.select('*')\
                 .eq('id', id_fattura)\
                 .eq('id_utente', id_utente)\
                 .execute()
@@ -451,9 +896,9 @@ class RelationshipService:
     async def get_fornitore_dependencies(id_utente: int, partita_iva: str) -> Dict:
         """Ottieni tutte le dipendenze di un fornitore"""
         try:
-            fatture_table = get_table('fatture')
+            fatture_table = get_async_table('fatture')
             
-            fatture = fatture_table.select('*')\
+            fatture = await fatture_table.select('*')\
                 .eq('id_utente', id_utente)\
                 .eq('partita_iva_fornitore', partita_iva)\
                 .execute()
@@ -0,0 +1,249 @@
+"""
+Provisioning Tenant - Dati di default per nuovi utenti (aziende)
+1. Piano dei conti base HORECA e riga aggregati dashboard per molti
+   utenti con un solo statement (unnest x unnest, ON CONFLICT DO NOTHING)
+2. Idempotente: rilanciarlo completa solo i conti mancanti
+3. Job batch per centinaia di utenti a blocchi di TENANT_BATCH_SIZE
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+import os
+import time
+
+from app.database import db, get_async_table
+
+logger = logging.getLogger(__name__)
+
+# Utenti per statement nel job batch (conti inseriti = utenti x len(PIANO_CONTI_BASE))
+TENANT_BATCH_SIZE = int(os.getenv("TENANT_BATCH_SIZE", "500"))
+
+# (codice, descrizione, tipo, categoria)
+PIANO_CONTI_BASE = [
+    # ATTIVO - IMMOBILIZZAZIONI
+    ('1001', 'Immobili', 'attivo', 'immobilizzazioni'),
+    ('1002', 'Impianti e macchinari', 'attivo', 'immobilizzazioni'),
+    ('1003', 'Attrezzature', 'attivo', 'immobilizzazioni'),
+    ('1004', 'Mobili e arredi', 'attivo', 'immobilizzazioni'),
+    ('1005', 'Automezzi', 'attivo', 'immobilizzazioni'),
+    # ATTIVO - CIRCOLANTE
+    ('2001', 'Cassa contanti', 'attivo', 'liquidita'),
+    ('2002', 'Banca c/c', 'attivo', 'liquidita'),
+    ('2003', 'POS da incassare', 'attivo', 'liquidita'),
+    ('2010', 'Crediti clienti', 'attivo', 'crediti'),
+    ('2020', 'Rimanenze materie prime', 'attivo', 'rimanenze'),
+    ('2021', 'Rimanenze prodotti finiti', 'attivo', 'rimanenze'),
+    ('2030', 'IVA a credito', 'attivo', 'crediti_tributari'),
+    # PASSIVO
+    ('3001', 'Capitale sociale', 'passivo', 'patrimonio_netto'),
+    ('3002', 'Utili esercizi precedenti', 'passivo', 'patrimonio_netto'),
+    ('3003', 'Utile/Perdita esercizio', 'passivo', 'patrimonio_netto'),
+    ('4001', 'Debiti fornitori', 'passivo', 'debiti'),
+    ('4002', 'Debiti banche', 'passivo', 'debiti'),
+    ('4010', 'Debiti dipendenti', 'passivo', 'debiti'),
+    ('4020', 'Debiti tributari', 'passivo', 'debiti_tributari'),
+    ('4021', 'IVA a debito', 'passivo', 'debiti_tributari'),
+    ('4030', 'TFR', 'passivo', 'debiti'),
+    # COSTI
+    ('5001', 'Materie prime', 'costo', 'costi_acquisti'),
+    ('5002', 'Ingredienti freschi', 'costo', 'costi_acquisti'),
+    ('5003', 'Packaging', 'costo', 'costi_acquisti'),
+    ('5101', 'Energia elettrica', 'costo', 'costi_servizi'),
+    ('5102', 'Gas', 'costo', 'costi_servizi'),
+    ('5103', 'Acqua', 'costo', 'costi_servizi'),
+    ('5105', 'Manutenzioni', 'costo', 'costi_servizi'),
+    ('5106', 'Consulenze', 'costo', 'costi_servizi'),
+    ('5107', 'Pubblicità', 'costo', 'costi_servizi'),
+    ('5108', 'Spese bancarie', 'costo', 'costi_servizi'),
+    ('5109', 'Affitto', 'costo', 'costi_servizi'),
+    ('5110', 'Assicurazioni', 'costo', 'costi_servizi'),
+    ('5111', 'Telefono internet', 'costo', 'costi_servizi'),
+    ('5201', 'Stipendi salari', 'costo', 'costi_personale'),
+    ('5202', 'INPS', 'costo', 'costi_personale'),
+    ('5203', 'INAIL', 'costo', 'costi_personale'),
+    ('5204', 'TFR maturato', 'costo', 'costi_personale'),
+    ('5301', 'Ammortamenti', 'costo', 'ammortamenti'),
+    ('5401', 'Imposte tasse', 'costo', 'altri_costi'),
+    ('5404', 'Interessi passivi', 'costo', 'altri_costi'),
+    # RICAVI
+    ('7001', 'Vendite pasticceria', 'ricavo', 'ricavi_vendite'),
+    ('7002', 'Vendite torte', 'ricavo', 'ricavi_vendite'),
+    ('7003', 'Vendite caffetteria', 'ricavo', 'ricavi_vendite'),
+]
+
+# Piano dei conti e aggregati dashboard in un solo statement; il conteggio
+# per utente distingue utenti nuovi, completati e già provisionati
+QUERY_PROVISIONING = """
+    WITH utenti AS (
+        SELECT DISTINCT unnest(:utenti::int[]) AS id_utente
+    ),
+    conti AS (
+        SELECT *
+        FROM unnest(:codici::text[], :descrizioni::text[], :tipi::text[], :categorie::text[])
+             AS c(codice_conto, descrizione, tipo, categoria)
+    ),
+    piano AS (
+        INSERT INTO piano_dei_conti (id_utente, codice_conto, descrizione, tipo, categoria, saldo, attivo, created_at)
+        SELECT u.id_utente, c.codice_conto, c.descrizione, c.tipo, c.categoria, 0, TRUE, NOW()
+        FROM utenti u
+        CROSS JOIN conti c
+        ON CONFLICT (id_utente, codice_conto) DO NOTHING
+        RETURNING id_utente
+    ),
+    aggregati AS (
+        INSERT INTO dashboard_aggregati (id_utente)
+        SELECT id_utente FROM utenti
+        ON CONFLICT (id_utente) DO NOTHING
+        RETURNING id_utente
+    )
+    SELECT u.id_utente,
+           (SELECT count(*) FROM piano p WHERE p.id_utente = u.id_utente) AS conti_creati,
+           EXISTS (SELECT 1 FROM aggregati a WHERE a.id_utente = u.id_utente) AS aggregati_creati
+    FROM utenti u
+    ORDER BY u.id_utente
+"""
+
+# Utenti senza piano dei conti (default del job batch)
+QUERY_UTENTI_DA_PROVISIONARE = """
+    SELECT u.id
+    FROM users u
+    WHERE NOT EXISTS (SELECT 1 FROM piano_dei_conti c WHERE c.id_utente = u.id)
+    ORDER BY u.id
+"""
+
+
+def _colonne_piano() -> Dict[str, List[str]]:
+    """PIANO_CONTI_BASE per colonna (parametri array di unnest)"""
+    codici, descrizioni, tipi, categorie = (list(col) for col in zip(*PIANO_CONTI_BASE))
+    return {'codici': codici, 'descrizioni': descrizioni, 'tipi': tipi, 'categorie': categorie}
+
+
+class TenantProvisioning:
+    """Popolamento dati di default per uno o molti utenti"""
+
+    @staticmethod
+    async def provisiona(id_utenti: List[int]) -> List[Dict]:
+        """
+        Piano dei conti base e aggregati dashboard per gli utenti indicati
+
+        Returns:
+            [{'id_utente', 'conti_creati', 'aggregati_creati'}]; conti_creati = 0
+            per gli utenti che avevano già tutti i conti
+
+        Raises:
+            RuntimeError: database non disponibile
+        """
+        if not id_utenti:
+            return []
+
+        async with db.transaction() as tx:
+            rows = await tx.fetch_all(QUERY_PROVISIONING, {'utenti': list(id_utenti), **_colonne_piano()})
+
+        return [
+            {
+                'id_utente': r['id_utente'],
+                'conti_creati': r['conti_creati'],
+                'aggregati_creati': r['aggregati_creati']
+            }
+            for r in rows
+        ]
+
+    @staticmethod
+    async def provisiona_supabase(id_utente: int) -> int:
+        """
+        Fallback senza connessione diretta: conti mancanti con una sola INSERT
+
+        Returns:
+            Numero di conti creati
+        """
+        piano_table = get_async_table('piano_dei_conti')
+
+        existing = await piano_table.select('codice_conto').eq('id_utente', id_utente).execute()
+        presenti = {r['codice_conto'] for r in existing.data or []}
+
+        now = datetime.now().isoformat()
+        records = [
+            {
+                'id_utente': id_utente,
+                'codice_conto': codice,
+                'descrizione': descrizione,
+                'tipo': tipo,
+                'categoria': categoria,
+                'saldo': 0,
+                'attivo': True,
+                'created_at': now
+            }
+            for codice, descrizione, tipo, categoria in PIANO_CONTI_BASE
+            if codice not in presenti
+        ]
+        if records:
+            await piano_table.insert(records).execute()
+
+        return len(records)
+
+    @staticmethod
+    async def provisiona_batch(
+        id_utenti: Optional[List[int]] = None,
+        batch_size: int = TENANT_BATCH_SIZE
+    ) -> Dict:
+        """
+        Provisioning di molti utenti, una transazione per blocco
+
+        Un blocco fallito è registrato e il job prosegue con i successivi.
+
+        Args:
+            id_utenti: None = tutti gli utenti senza piano dei conti
+
+        Returns:
+            {'utenti', 'nuovi', 'completati', 'gia_provisionati', 'conti_creati',
+             'errori': [{'id_utenti', 'error'}], 'seconds'}
+        """
+        start = time.perf_counter()
+        if id_utenti is None:
+            id_utenti = [r['id'] for r in await db.fetch_all(QUERY_UTENTI_DA_PROVISIONARE)]
+
+        totale_conti = len(PIANO_CONTI_BASE)
+        stats = {'nuovi': 0, 'completati': 0, 'gia_provisionati': 0, 'conti_creati': 0}
+        errori = []
+        for i in range(0, len(id_utenti), batch_size):
+            blocco = id_utenti[i:i + batch_size]
+            try:
+                risultati = await TenantProvisioning.provisiona(blocco)
+            except Exception as e:
+                logger.error(f"Errore provisioning utenti {blocco[0]}..{blocco[-1]}: {e}")
+                errori.append({'id_utenti': blocco, 'error': str(e)})
+                continue
+
+            for r in risultati:
+                stats['conti_creati'] += r['conti_creati']
+                if r['conti_creati'] == totale_conti:
+                    stats['nuovi'] += 1
+                elif r['conti_creati']:
+                    stats['completati'] += 1
+                else:
+                    stats['gia_provisionati'] += 1
+
+        return {
+            'utenti': len(id_utenti),
+            **stats,
+            'errori': errori,
+            'seconds': round(time.perf_counter() - start, 4)
+        }
+
+
+# ============================================================================
+# JOB
+# ============================================================================
+
+async def run_tenant_provisioning_job(id_utenti: Optional[List[int]] = None):
+    """Job di provisioning (onboarding massivo o riallineamento utenti esistenti)"""
+    print(f"🏢 [Provisioning] Dati di default utenti - {datetime.now()}")
+
+    result = await TenantProvisioning.provisiona_batch(id_utenti)
+
+    print(f"  ✅ Utenti: {result['utenti']} (nuovi {result['nuovi']}, completati {result['completati']}) in {result['seconds']}s")
+    print(f"  📒 Conti creati: {result['conti_creati']}")
+    if result['errori']:
+        print(f"  ❌ Blocchi falliti: {len(result['errori'])}")
+
+    return result
@@ -0,0 +1,97 @@
+"""
+Benchmark - Import vettoriale bonifici da estratto conto
+
+Estratto sintetico (uscite/entrate, beneficiari dipendenti/fornitori/altri,
+duplicati già presenti) su database in memoria: misura normalizzazione,
+match con indice nomi e preparazione COPY.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_bonifici_import --righe 10000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from app.services.bonifici_import_service import BonificiImportService
+from app.services.name_index import name_index
+
+
+class MemoryDB:
+    """Database finto: bonifici esistenti in memoria"""
+    
+    def __init__(self, bonifici):
+        self.bonifici = bonifici
+        self.copied = []
+    
+    async def fetch_all(self, query: str, *args):
+        return self.bonifici
+    
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.extend(records)
+        return {'rows': len(records), 'chunks': 1, 'failed_chunks': []}
+
+
+def genera_estratto(n_righe: int, seed: int = 0):
+    rnd = random.Random(seed)
+    employees = [{'id': i, 'nome': f"Nome{i}", 'cognome': f"Cognome{i}"} for i in range(500)]
+    fornitori = [{'id': i, 'ragione_sociale': f"Fornitore {i} SRL"} for i in range(2000)]
+    
+    inizio = date(2024, 1, 1)
+    righe = []
+    for i in range(n_righe):
+        scelta = rnd.random()
+        if scelta < 0.3:
+            e = rnd.choice(employees)
+            benef = f"{e['cognome']} {e['nome']}"
+        elif scelta < 0.8:
+            benef = rnd.choice(fornitori)['ragione_sociale'].upper()
+        else:
+            benef = f"Beneficiario {i}"
+        importo = round(rnd.uniform(10, 5000), 2) * (-1 if rnd.random() < 0.9 else 1)
+        righe.append({
+            'Data Valuta': (inizio + timedelta(days=rnd.randrange(365))).strftime('%d/%m/%Y'),
+            'Beneficiario': benef,
+            'IBAN': f"IT60X0542811101000000{i:06d}",
+            'Importo': f"{importo:.2f}".replace('.', ','),
+            'Causale': f"Pagamento {i}"
+        })
+    
+    df = pd.DataFrame(righe)
+    
+    # 5% delle uscite già importate
+    esistenti = [
+        {
+            'data_bonifico': pd.to_datetime(r['Data Valuta'], dayfirst=True).date(),
+            'beneficiario': r['Beneficiario'],
+            'importo': abs(float(r['Importo'].replace(',', '.')))
+        }
+        for r in righe[::20] if r['Importo'].startswith('-')
+    ]
+    
+    return df, employees, fornitori, MemoryDB(esistenti)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--righe', type=int, default=10000)
+    args = parser.parse_args()
+    
+    df, employees, fornitori, db = genera_estratto(args.righe)
+    name_index.load(employees, fornitori)
+    
+    start = time.perf_counter()
+    result = asyncio.run(BonificiImportService.import_estratto(db, df, 'bench.xlsx'))
+    elapsed = time.perf_counter() - start
+    
+    tipi = pd.Series([r[5] for r in db.copied]).value_counts().to_dict()
+    print(f"Righe: {args.righe}  importati: {result['imported']}  saltati: {result['skipped']}  errori: {len(result['errors'])}")
+    print(f"Tipi: {tipi}")
+    print(f"Tempo: {elapsed:.3f}s  ({args.righe / elapsed:.0f} righe/s)")
+
+
+if __name__ == '__main__':
+    main()
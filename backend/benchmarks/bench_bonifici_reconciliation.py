@@ -0,0 +1,98 @@
+"""
+Benchmark - Riconciliazione set-based bonifici ↔ documenti aperti
+
+Arretrato sintetico (bonifici verso dipendenti, fornitori e beneficiari
+non risolti; buste paga e fatture aperte) confrontato con la scansione
+per bonifico (equivalente in memoria della vecchia query N+1).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_bonifici_reconciliation --bonifici 20000 --documenti 50000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from app.services.bonifici_reconciliation_service import ReconciliationEngine
+
+
+def genera_arretrato(n_bonifici: int, n_documenti: int, seed: int = 0):
+    rnd = random.Random(seed)
+    inizio = date(2024, 1, 1)
+    n_dipendenti, n_fornitori = 200, 3000
+    
+    documenti = []
+    for i in range(n_documenti):
+        if rnd.random() < 0.3:
+            documenti.append({
+                'tipo_documento': 'payslip', 'id': i,
+                'importo': round(rnd.uniform(900, 2500), 2),
+                'data_documento': inizio + timedelta(days=30 * rnd.randrange(12)),
+                'soggetto_tipo': 'dipendente', 'soggetto_id': rnd.randrange(n_dipendenti),
+                'descrizione': f"Busta paga {i}"
+            })
+        else:
+            documenti.append({
+                'tipo_documento': 'fattura', 'id': i,
+                'importo': round(rnd.uniform(20, 8000), 2),
+                'data_documento': inizio + timedelta(days=rnd.randrange(365)),
+                'soggetto_tipo': 'fornitore', 'soggetto_id': rnd.randrange(n_fornitori),
+                'descrizione': f"Fattura {i}"
+            })
+    
+    bonifici = []
+    for i in range(n_bonifici):
+        doc = rnd.choice(documenti)
+        scelta = rnd.random()
+        bonifici.append({
+            'id': i,
+            'importo': round(doc['importo'] + rnd.uniform(-2, 2), 2),
+            'data_bonifico': doc['data_documento'] + timedelta(days=rnd.randrange(-5, 40)),
+            'tipo': doc['soggetto_tipo'] if scelta < 0.85 else 'altro',
+            'riferimento_id': doc['soggetto_id'] if scelta < 0.85 else None
+        })
+    
+    return bonifici, documenti
+
+
+def scansione(bonifico, documenti, tolleranza: float):
+    """Un passaggio su tutti i documenti per bonifico (stile N+1)"""
+    return [
+        d for d in documenti
+        if d['soggetto_tipo'] == bonifico['tipo']
+        and d['soggetto_id'] == bonifico['riferimento_id']
+        and abs(d['importo'] - bonifico['importo']) < tolleranza
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bonifici', type=int, default=20000)
+    parser.add_argument('--documenti', type=int, default=50000)
+    parser.add_argument('--campione-scansione', type=int, default=500)
+    args = parser.parse_args()
+    
+    bonifici, documenti = genera_arretrato(args.bonifici, args.documenti)
+    
+    start = time.perf_counter()
+    engine = ReconciliationEngine(documenti)
+    build = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    risultati = engine.riconcilia(bonifici)
+    match = time.perf_counter() - start
+    
+    con_match = sum(1 for r in risultati if r['possibili_match'])
+    print(f"Bonifici: {len(bonifici)}  documenti: {len(documenti)}  con candidati: {con_match}")
+    print(f"Set-based: indice {build:.3f}s + match {match:.3f}s")
+    
+    campione = bonifici[:args.campione_scansione]
+    start = time.perf_counter()
+    for b in campione:
+        scansione(b, documenti, engine.tolleranza_importo)
+    per_bonifico = (time.perf_counter() - start) / len(campione)
+    print(f"Scansione per bonifico: {per_bonifico * 1000:.2f} ms → stimato {per_bonifico * len(bonifici):.1f}s sull'arretrato")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark - Scritture bulk su Database (richiede DATABASE_URL)
+
+Inserimento di N righe in una tabella temporanea: riga per riga,
+executemany, COPY binario e upsert_many (metà righe in conflitto).
+
+Uso (dalla cartella backend):
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_bulk_writes --righe 50000
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import date, timedelta
+
+from app.database import Database
+
+TABELLA = 'bench_bulk_writes'
+
+
+def genera_righe(n: int):
+    inizio = date(2024, 1, 1)
+    return [
+        {'id': i, 'data': inizio + timedelta(days=i % 365), 'descrizione': f"Movimento {i}", 'importo': i % 1000 + 0.5}
+        for i in range(n)
+    ]
+
+
+async def run(n: int, chunk_size: int):
+    db = Database()
+    await db.connect()
+    if not db.pool:
+        print("DATABASE_URL non impostato o non raggiungibile")
+        return
+    
+    righe = genera_righe(n)
+    colonne = ['id', 'data', 'descrizione', 'importo']
+    tuple_righe = [tuple(r[c] for c in colonne) for r in righe]
+    
+    async def reset():
+        await db.execute(f"DROP TABLE IF EXISTS {TABELLA}")
+        await db.execute(f"""
+            CREATE TABLE {TABELLA} (
+                id INTEGER PRIMARY KEY, data DATE, descrizione TEXT, importo NUMERIC(12,2)
+            )
+        """)
+    
+    try:
+        await reset()
+        campione = righe[:min(n, 2000)]
+        start = time.perf_counter()
+        for r in campione:
+            await db.execute(f"INSERT INTO {TABELLA} VALUES (:id, :data, :descrizione, :importo)", r)
+        per_riga = (time.perf_counter() - start) / len(campione)
+        print(f"Riga per riga: {1 / per_riga:.0f} righe/s (su {len(campione)} righe)")
+        
+        await reset()
+        result = await db.executemany(f"INSERT INTO {TABELLA} VALUES (:id, :data, :descrizione, :importo)", righe, chunk_size)
+        print(f"executemany:   {result['rows_per_sec']:.0f} righe/s ({result['chunks']} chunk)")
+        
+        await reset()
+        result = await db.copy_records_to_table(TABELLA, tuple_righe, colonne, chunk_size)
+        print(f"COPY binario:  {result['rows_per_sec']:.0f} righe/s ({result['chunks']} chunk)")
+        
+        # Metà righe già presenti (aggiornate), metà nuove
+        aggiornate = [dict(r, id=r['id'] + n // 2, importo=1.0) for r in righe]
+        result = await db.upsert_many(TABELLA, aggiornate, ['id'], chunk_size=chunk_size)
+        print(f"upsert_many:   {result['rows_per_sec']:.0f} righe/s ({result['chunks']} chunk)")
+    finally:
+        await db.execute(f"DROP TABLE IF EXISTS {TABELLA}")
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--righe', type=int, default=50000)
+    parser.add_argument('--chunk', type=int, default=5000)
+    args = parser.parse_args()
+    
+    if not os.getenv('DATABASE_URL'):
+        print("DATABASE_URL non impostato: benchmark saltato")
+        return
+    asyncio.run(run(args.righe, args.chunk))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark - Estrazione FatturaPA da ZIP con file .xml e .xml.p7m
+
+Crea in memoria uno ZIP di N fatture (metà firmate p7m, con eContent
+BER a blocchi come prodotto da molti software di firma) e misura
+estrazione + parsing membro per membro.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_fatturapa_archive --fatture 500
+"""
+import argparse
+import io
+import time
+import zipfile
+
+from app.parsers.fatturapa_archive import decode_xml, iter_upload_payloads
+from app.parsers.fatturapa_parser import parse_fattura_lotto
+from benchmarks.fatturapa_corpus import genera_corpus
+
+OID_SIGNED_DATA = bytes.fromhex('06092a864886f70d010702')
+OID_DATA = bytes.fromhex('06092a864886f70d010701')
+
+
+def der(tag: int, content: bytes) -> bytes:
+    length = len(content)
+    if length < 0x80:
+        return bytes([tag, length]) + content
+    size = (length.bit_length() + 7) // 8
+    return bytes([tag, 0x80 | size]) + length.to_bytes(size, 'big') + content
+
+
+def ber_indefinite(tag: int, content: bytes) -> bytes:
+    return bytes([tag, 0x80]) + content + b'\x00\x00'
+
+
+def firma_p7m(xml: bytes) -> bytes:
+    """Busta PKCS#7 SignedData minima (senza firmatari) attorno a xml"""
+    chunks = b''.join(der(0x04, xml[i:i + 1000]) for i in range(0, len(xml), 1000))
+    econtent = ber_indefinite(0xa0, ber_indefinite(0x24, chunks))
+    encap = der(0x30, OID_DATA + econtent)
+    signed_data = der(0x30, der(0x02, b'\x01') + der(0x31, b'') + encap + der(0x31, b''))
+    return der(0x30, OID_SIGNED_DATA + der(0xa0, signed_data))
+
+
+def crea_zip(n_fatture: int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i, (filename, content) in enumerate(genera_corpus(n_fatture)):
+            if i % 2:
+                archive.writestr(filename + '.p7m', firma_p7m(content))
+            else:
+                archive.writestr(filename, content)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fatture', type=int, default=500)
+    args = parser.parse_args()
+    
+    zip_bytes = crea_zip(args.fatture)
+    
+    print("=" * 60)
+    print(f"🧪 BENCHMARK ZIP - {args.fatture} fatture, {len(zip_bytes) / 1024:.0f} KB")
+    print("=" * 60)
+    
+    start = time.perf_counter()
+    payloads = list(iter_upload_payloads('fatture.zip', io.BytesIO(zip_bytes)))
+    estrazione = time.perf_counter() - start
+    
+    errori = [p for p in payloads if p[2]]
+    assert not errori, errori[:3]
+    
+    start = time.perf_counter()
+    fatture = [f for _, content, _ in payloads for f in parse_fattura_lotto(decode_xml(content))]
+    parsing = time.perf_counter() - start
+    
+    print(f"{'estrazione':<12} {estrazione:8.3f}s  {len(payloads) / estrazione:10.1f} file/s")
+    print(f"{'parsing':<12} {parsing:8.3f}s  {len(fatture) / parsing:10.1f} fatture/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark - Parsing FatturaPA su ProcessPoolExecutor
+
+Throughput (fatture/s) e throughput per core al variare dei worker.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_fatturapa_pool --fatture 2000 --righe 20
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.parsers.fatturapa_parser import parse_fattura_xml
+from app.parsers.fatturapa_pool import parse_files_parallel
+from benchmarks.fatturapa_corpus import genera_corpus
+
+
+async def run_pool(files, workers: int) -> float:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Warm-up: avvio processi fuori dalla misura
+        async for _ in parse_files_parallel(files[:workers], pool=pool, chunk_size=1):
+            pass
+        
+        start = time.perf_counter()
+        async for _ in parse_files_parallel(files, pool=pool):
+            pass
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fatture', type=int, default=2000)
+    parser.add_argument('--righe', type=int, default=20)
+    args = parser.parse_args()
+    
+    files = genera_corpus(args.fatture, args.righe)
+    n = len(files)
+    
+    print("=" * 60)
+    print(f"🧪 BENCHMARK PARSING - {n} fatture x {args.righe} righe")
+    print("=" * 60)
+    
+    start = time.perf_counter()
+    for _, content in files:
+        parse_fattura_xml(content.decode('utf-8'))
+    elapsed = time.perf_counter() - start
+    print(f"{'seriale':<12} {n / elapsed:10.1f} fatture/s")
+    
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        elapsed = asyncio.run(run_pool(files, workers))
+        print(f"{workers:>2} worker    {n / elapsed:10.1f} fatture/s  {n / elapsed / workers:10.1f} /s per core")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
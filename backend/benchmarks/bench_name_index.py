@@ -0,0 +1,82 @@
+"""
+Benchmark - Indice nomi dipendenti/fornitori
+
+Latenza di ricerca per nomi esatti (varianti di forma societaria e
+maiuscole) e con refusi, al variare della soglia di similarità.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_name_index --fornitori 5000 --query 2000
+"""
+import argparse
+import random
+import time
+
+from app.services.name_index import NameIndex
+
+COGNOMI = (
+    "rossi russo ferrari esposito bianchi romano colombo ricci marino greco bruno gallo conti "
+    "deluca mancini costa giordano rizzo lombardi moretti barbieri fontana santoro mariani rinaldi "
+    "caruso ferrara galli martini leone longo gentile martinelli vitale lombardo serra coppola "
+    "desantis damico marchetti parisi villa conte ferraro ferri fabbri bianco marini grasso "
+    "valentini messina sala derosa gatti pellegrini palumbo sanna farina rizzi monti cattaneo"
+).split()
+ATTIVITA = (
+    "alimentari trasporti costruzioni servizi impianti forniture commerciale edilizia "
+    "distribuzione logistica tecnologie consulting bevande carni ortofrutta pulizie elettrica "
+    "idraulica sistemi group italia nord sud centro"
+).split()
+NOMI = "Anna Luca Marco Giulia Paolo Sara Francesca Andrea Giuseppe Maria".split()
+FORME = ['S.r.l.', 'SPA', 'snc', '& C. sas', 'S.R.L.S.', '']
+
+
+def genera_anagrafiche(n_fornitori: int, n_dipendenti: int = 300, seed: int = 0):
+    rnd = random.Random(seed)
+    fornitori = [
+        {
+            'id': i,
+            'id_utente': 1,
+            'ragione_sociale': f"{rnd.choice(COGNOMI).title()} {rnd.choice(ATTIVITA).title()} {i % 97} {rnd.choice(FORME)}"
+        }
+        for i in range(n_fornitori)
+    ]
+    employees = [
+        {'id': i, 'nome': rnd.choice(NOMI), 'cognome': rnd.choice(COGNOMI).title()}
+        for i in range(n_dipendenti)
+    ]
+    return employees, fornitori
+
+
+def misura(index: NameIndex, query, min_score: float) -> float:
+    start = time.perf_counter()
+    for q in query:
+        index.search(q, min_score=min_score)
+    return (time.perf_counter() - start) / len(query) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fornitori', type=int, default=5000)
+    parser.add_argument('--query', type=int, default=2000)
+    args = parser.parse_args()
+    
+    employees, fornitori = genera_anagrafiche(args.fornitori)
+    
+    index = NameIndex()
+    start = time.perf_counter()
+    index.load(employees, fornitori)
+    print(f"Caricamento {len(index)} voci: {time.perf_counter() - start:.3f}s")
+    
+    rnd = random.Random(1)
+    campione = [f['ragione_sociale'] for f in rnd.sample(fornitori, min(args.query, len(fornitori)))]
+    esatte = [nome.upper().replace('S.R.L.', 'SRL') for nome in campione]
+    refusi = [nome[:3] + nome[4:] for nome in campione]
+    
+    for soglia in (0.5, 0.7, 0.85):
+        print(
+            f"Soglia {soglia}: esatte {misura(index, esatte, soglia):.3f} ms/query, "
+            f"con refusi {misura(index, refusi, soglia):.3f} ms/query"
+        )
+
+
+if __name__ == '__main__':
+    main()
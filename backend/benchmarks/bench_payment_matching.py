@@ -0,0 +1,109 @@
+"""
+Benchmark - Abbinamento massivo bonifici ↔ fatture
+
+Un mese di bonifici (singoli e cumulativi) contro le fatture non pagate:
+confronto tra assegnazione globale e scelta greedy per bonifico (la
+stessa fattura può essere proposta a più bonifici).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_payment_matching --bonifici 1000 --fatture 5000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from app.services.payment_matching import BatchMatcher
+from benchmarks.bench_name_index import genera_anagrafiche
+
+
+def genera_mese(n_bonifici: int, n_fatture: int, seed: int = 0):
+    rnd = random.Random(seed)
+    _, fornitori = genera_anagrafiche(max(n_fatture // 10, 10), seed=seed)
+    inizio = date(2024, 1, 1)
+    
+    fatture = []
+    for i in range(n_fatture):
+        fornitore = rnd.choice(fornitori)
+        fatture.append({
+            'id': i,
+            'totale': round(rnd.choice([rnd.uniform(50, 3000), 500.0, 1200.0]), 2),
+            'data_fattura': (inizio + timedelta(days=rnd.randrange(60))).isoformat(),
+            'data_scadenza': None,
+            'ragione_sociale_fornitore': fornitore['ragione_sociale']
+        })
+    
+    bonifici = []
+    libere = list(range(n_fatture))
+    rnd.shuffle(libere)
+    for i in range(n_bonifici):
+        if rnd.random() < 0.15 and len(libere) > 3:
+            # Cumulativo: 2-3 fatture dello stesso fornitore
+            prima = fatture[libere.pop()]
+            gruppo = [prima] + [
+                f for f in fatture
+                if f['ragione_sociale_fornitore'] == prima['ragione_sociale_fornitore'] and f is not prima
+            ][:rnd.randint(1, 2)]
+        else:
+            gruppo = [fatture[libere.pop()]]
+        bonifici.append({
+            'id': i,
+            'importo': -round(sum(f['totale'] for f in gruppo), 2),
+            'data_bonifico': (date.fromisoformat(gruppo[0]['data_fattura']) + timedelta(days=rnd.randrange(30))).isoformat(),
+            'beneficiario': gruppo[0]['ragione_sociale_fornitore'].upper()
+        })
+    
+    return bonifici, fatture
+
+
+def greedy(bonifici, fatture):
+    """Scelta indipendente per bonifico (logica di suggerisci_collegamento_bonifico)"""
+    scelte = []
+    for b in bonifici:
+        importo = abs(b['importo'])
+        beneficiario = b['beneficiario'].lower()
+        best, best_score = None, 0
+        for f in fatture:
+            score = 50 if abs(f['totale'] - importo) / importo * 100 <= 2 else 0
+            fornitore = f['ragione_sociale_fornitore'].lower()
+            if beneficiario in fornitore or fornitore in beneficiario:
+                score += 50
+            if score > best_score:
+                best, best_score = f, score
+        if best_score >= 60:
+            scelte.append(best['id'])
+    return scelte
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bonifici', type=int, default=1000)
+    parser.add_argument('--fatture', type=int, default=5000)
+    args = parser.parse_args()
+    
+    bonifici, fatture = genera_mese(args.bonifici, args.fatture)
+    
+    start = time.perf_counter()
+    risultato = BatchMatcher().match(bonifici, fatture)
+    elapsed = time.perf_counter() - start
+    
+    assegnazioni = risultato['assegnazioni']
+    usate = [j for a in assegnazioni for j in a['id_fatture']]
+    multiple = sum(1 for a in assegnazioni if a['tipo'] == 'multipla')
+    print(f"Bonifici: {len(bonifici)}  fatture: {len(fatture)}")
+    print(f"Assegnati: {len(assegnazioni)} ({multiple} cumulativi)  fatture usate: {len(usate)}  duplicate: {len(usate) - len(set(usate))}")
+    print(f"Globale: {elapsed:.3f}s")
+    
+    campione = bonifici[:200]
+    start = time.perf_counter()
+    scelte = greedy(campione, fatture)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Greedy ({len(campione)} bonifici): {len(scelte)} suggeriti, "
+        f"fatture duplicate: {len(scelte) - len(set(scelte))}, "
+        f"{elapsed:.3f}s → stimato {elapsed / len(campione) * len(bonifici):.1f}s"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark - Estrazione campi buste paga: regex originali vs scansione unica
+
+Corpus sintetico di testi estratti (benchmarks/payslip_corpus.py), con una
+quota di documenti "rumorosi" (righe lunghe con parole chiave senza valori).
+Riporta documenti/s, latenza p50/p99/massima per documento, i campi in cui
+le due implementazioni differiscono e gli errori rispetto ai valori attesi
+del corpus (uscita con errore se la scansione unica ne ha).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_payslip_parser --buste 2000 --rumore 0.1
+"""
+import argparse
+import re
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from app.services.payslip_parser import PayslipParser
+from benchmarks.payslip_corpus import genera_corpus_atteso
+
+_parse_decimal = PayslipParser()._parse_decimal
+
+
+# ============================================================================
+# IMPLEMENTAZIONE ORIGINALE (riferimento)
+# ============================================================================
+
+def extract_data_legacy(text: str) -> Dict:
+    """Estrae dati dal testo PDF"""
+    
+    data = {}
+    
+    # CODICE FISCALE (16 caratteri)
+    cf_match = re.search(r'\b([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])\b', text)
+    if cf_match:
+        data['codice_fiscale'] = cf_match.group(1)
+    
+    # NOME E COGNOME
+    # Cerca pattern "COGNOME NOME" o "Lavoratore: COGNOME NOME"
+    name_match = re.search(r'(?:Lavoratore:|COGNOME.*NOME)\s*([A-Z\s]+)', text)
+    if name_match:
+        full_name = name_match.group(1).strip()
+        parts = full_name.split()
+        if len(parts) >= 2:
+            data['cognome'] = parts[0]
+            data['nome'] = ' '.join(parts[1:])
+    
+    # PERIODO (Marzo 2025)
+    periodo_match = re.search(r'(Gennaio|Febbraio|Marzo|Aprile|Maggio|Giugno|Luglio|Agosto|Settembre|Ottobre|Novembre|Dicembre)\s+(\d{4})', text)
+    if periodo_match:
+        mese_nome = periodo_match.group(1)
+        anno = periodo_match.group(2)
+        
+        mesi = {
+            'Gennaio': '01', 'Febbraio': '02', 'Marzo': '03',
+            'Aprile': '04', 'Maggio': '05', 'Giugno': '06',
+            'Luglio': '07', 'Agosto': '08', 'Settembre': '09',
+            'Ottobre': '10', 'Novembre': '11', 'Dicembre': '12'
+        }
+        
+        mese = mesi.get(mese_nome, '01')
+        data['periodo'] = f"{anno}-{mese}"
+        data['anno'] = int(anno)
+        data['mese'] = int(mese)
+    
+    # RETRIBUZIONE LORDA (cerca "Retribuzione" e importo)
+    retr_match = re.search(r'Z00001\s+Retribuzione\s+[\d,\.]+\s+[\d,\.]+\s+ORE\s+([\d,\.]+)', text)
+    if retr_match:
+        data['retribuzione_lorda'] = _parse_decimal(retr_match.group(1))
+    
+    # NETTO IN BUSTA (ultima riga con €)
+    netto_match = re.search(r'NETTO.*MESE\s+([\d,\.]+)\s*€', text, re.IGNORECASE)
+    if netto_match:
+        data['netto_in_busta'] = _parse_decimal(netto_match.group(1))
+    
+    # CONTRIBUTI INPS
+    inps_match = re.search(r'Z00000\s+Contributo IVS\s+[\d,\.]+\s+[\d,\.]+\s*%\s+([\d,\.]+)', text)
+    if inps_match:
+        data['inps_dipendente'] = _parse_decimal(inps_match.group(1))
+    
+    # IRPEF
+    irpef_match = re.search(r'F03020\s+Ritenute IRPEF\s+([\d,\.]+)', text)
+    if irpef_match:
+        data['irpef'] = _parse_decimal(irpef_match.group(1))
+    
+    # ADDIZIONALE REGIONALE
+    add_reg_match = re.search(r'F09110\s+Addizionale regionale.*?\s+([\d,\.]+)', text)
+    if add_reg_match:
+        data['addizionale_regionale'] = _parse_decimal(add_reg_match.group(1))
+    
+    # ADDIZIONALE COMUNALE
+    add_com_match = re.search(r'F09130\s+Addizionale comunale.*?\s+([\d,\.]+)', text)
+    if add_com_match:
+        data['addizionale_comunale'] = _parse_decimal(add_com_match.group(1))
+    
+    # TFR MATURATO
+    tfr_match = re.search(r'Quota anno\s+([\d,\.]+)', text)
+    if tfr_match:
+        data['tfr_maturato'] = _parse_decimal(tfr_match.group(1))
+    
+    # TFR PROGRESSIVO
+    tfr_prog_match = re.search(r'F\.do 31/12\s+([\d,\.]+)', text)
+    if tfr_prog_match:
+        data['tfr_progressivo'] = _parse_decimal(tfr_prog_match.group(1))
+    
+    # FERIE
+    ferie_match = re.search(r'Ferie\s+([\d,\.]+)\s+([\d,\.]+)\s+([\d,\.]+)\s+([-\d,\.]+)', text)
+    if ferie_match:
+        data['ferie_residue_ap'] = _parse_decimal(ferie_match.group(1))
+        data['ferie_maturate'] = _parse_decimal(ferie_match.group(2))
+        data['ferie_godute'] = _parse_decimal(ferie_match.group(3))
+        data['ferie_residue'] = _parse_decimal(ferie_match.group(4))
+    
+    # PERMESSI
+    permessi_match = re.search(r'Permessi\s+([\d,\.]+)\s+([\d,\.]+)\s+([\d,\.]+)\s+ORE', text)
+    if permessi_match:
+        data['permessi_residui_ap'] = _parse_decimal(permessi_match.group(1))
+        data['permessi_maturati'] = _parse_decimal(permessi_match.group(2))
+        data['permessi_residui'] = _parse_decimal(permessi_match.group(3))
+    
+    # ORE LAVORATE
+    ore_match = re.search(r'Z00001\s+Retribuzione\s+([\d,\.]+)\s+([\d,\.]+)\s+ORE', text)
+    if ore_match:
+        data['ore_ordinarie'] = _parse_decimal(ore_match.group(2))
+    
+    # IBAN
+    iban_match = re.search(r'IBAN\s+([A-Z]{2}\d{2}[A-Z0-9]+)', text)
+    if iban_match:
+        data['iban'] = iban_match.group(1)
+    
+    # BANCA
+    banca_match = re.search(r'IBAN.*?\n([A-Z\s\.]+?)\n', text)
+    if banca_match:
+        data['banca'] = banca_match.group(1).strip()
+    
+    # LIVELLO E MANSIONE
+    livello_match = re.search(r"OPE\s+(\d['']?\s*Livello(?:\s+Super)?)", text)
+    if livello_match:
+        data['livello'] = livello_match.group(1)
+    
+    mansione_match = re.search(r'Livello(?:\s+Super)?\n([A-Z\s]+?)\n', text)
+    if mansione_match:
+        data['mansione'] = mansione_match.group(1).strip()
+    
+    # GIORNI LAVORATI
+    giorni_match = re.search(r'Giorni\nLavorati.*?(\d+)', text, re.DOTALL)
+    if giorni_match:
+        data['giorni_lavorati'] = int(giorni_match.group(1))
+    
+    return data
+
+
+def misura(nome: str, estrai: Callable[[str], Dict], corpus: List[str]) -> List[Dict]:
+    tempi = []
+    risultati = []
+    start = time.perf_counter()
+    for testo in corpus:
+        t0 = time.perf_counter()
+        risultati.append(estrai(testo))
+        tempi.append(time.perf_counter() - t0)
+    totale = time.perf_counter() - start
+
+    tempi.sort()
+    p99 = tempi[min(len(tempi) - 1, int(len(tempi) * 0.99))]
+    print(
+        f"  {nome:<16} {len(corpus) / totale:9.0f} doc/s   "
+        f"p50 {statistics.median(tempi) * 1e6:7.1f} µs   "
+        f"p99 {p99 * 1e6:7.1f} µs   max {tempi[-1] * 1e6:8.1f} µs"
+    )
+    return risultati
+
+
+def errori_attesi(risultati: List[Dict], attesi: List[Dict]) -> Dict[str, int]:
+    """Buste con valore estratto diverso dall'atteso, per campo"""
+    errori: Dict[str, int] = {}
+    for data, valori in zip(risultati, attesi):
+        for campo, valore in valori.items():
+            if data.get(campo) != valore:
+                errori[campo] = errori.get(campo, 0) + 1
+    return dict(sorted(errori.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--buste', type=int, default=2000)
+    parser.add_argument('--rumore', type=float, default=0.1, help="quota documenti con righe di rumore")
+    args = parser.parse_args()
+
+    corpus_atteso = genera_corpus_atteso(args.buste, args.rumore)
+    corpus = [testo for testo, _ in corpus_atteso]
+    attesi = [valori for _, valori in corpus_atteso]
+    print(f"Corpus: {len(corpus)} buste, {sum(len(t) for t in corpus) / 1024:.0f} KB di testo")
+
+    legacy = misura('originale', extract_data_legacy, corpus)
+    nuovo = misura('scansione unica', PayslipParser()._extract_data, corpus)
+
+    differenze: Dict[str, int] = {}
+    for a, b in zip(legacy, nuovo):
+        for campo in set(a) | set(b):
+            if a.get(campo) != b.get(campo):
+                differenze[campo] = differenze.get(campo, 0) + 1
+    if differenze:
+        print(f"  Campi diversi (buste): {dict(sorted(differenze.items()))}")
+    else:
+        print("  Campi estratti identici")
+
+    errori_legacy = errori_attesi(legacy, attesi)
+    if errori_legacy:
+        print(f"  Originale, campi errati (buste): {errori_legacy}")
+    errori = errori_attesi(nuovo, attesi)
+    if errori:
+        raise SystemExit(f"  Scansione unica, campi errati (buste): {errori}")
+    print("  Scansione unica: valori attesi corretti")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark - Query con parametri nominali e statement preparati
+
+1. Costo di compilazione :nome → $n con e senza cache (query della dashboard
+   di controllo mensile)
+2. Con DATABASE_URL impostato: latenza delle stesse query ripetute con
+   statement cache AsyncPG attiva e disattivata
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_query_compiler --ripetizioni 10000
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_query_compiler --db
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.database import QueryCompiler
+
+DASHBOARD_QUERIES = [
+    """
+        SELECT
+            COALESCE(SUM(importo_totale), 0) as totale,
+            COALESCE(SUM(importo_contante), 0) as contante,
+            COALESCE(SUM(importo_elettronico), 0) as elettronico
+        FROM corrispettivi_telematici
+        WHERE EXTRACT(YEAR FROM data) = :anno
+        AND EXTRACT(MONTH FROM data) = :mese
+    """,
+    """
+        SELECT
+            COALESCE(SUM(importo), 0) as totale,
+            COUNT(*) as numero_transazioni
+        FROM movimenti_pos
+        WHERE EXTRACT(YEAR FROM data) = :anno
+        AND EXTRACT(MONTH FROM data) = :mese
+        AND tipo = 'incasso'
+    """,
+    """
+        SELECT
+            COALESCE(SUM(importo), 0) as totale
+        FROM prima_nota_cassa
+        WHERE EXTRACT(YEAR FROM data) = :anno
+        AND EXTRACT(MONTH FROM data) = :mese
+        AND tipo = 'entrata'
+    """,
+]
+
+# Stesse query su tabelle di sistema (eseguibili su qualsiasi database)
+DB_QUERIES = [
+    "SELECT COUNT(*) FROM pg_class WHERE relpages >= :soglia AND relkind = :tipo",
+    "SELECT COALESCE(SUM(relpages), 0) FROM pg_class WHERE relnamespace = :ns::oid",
+    "SELECT EXTRACT(YEAR FROM now()) = :anno AND EXTRACT(MONTH FROM now()) = :mese",
+]
+
+
+def bench_compile(ripetizioni: int):
+    params = {'anno': 2024, 'mese': 3}
+    
+    start = time.perf_counter()
+    for _ in range(ripetizioni):
+        for q in DASHBOARD_QUERIES:
+            QueryCompiler._compile(q)
+    senza_cache = (time.perf_counter() - start) / (ripetizioni * len(DASHBOARD_QUERIES))
+    
+    compiler = QueryCompiler()
+    start = time.perf_counter()
+    for _ in range(ripetizioni):
+        for q in DASHBOARD_QUERIES:
+            compiler.bind(q, (params,))
+    con_cache = (time.perf_counter() - start) / (ripetizioni * len(DASHBOARD_QUERIES))
+    
+    print(f"Compilazione senza cache: {senza_cache * 1e6:.1f} µs/query")
+    print(f"Bind con cache:           {con_cache * 1e6:.1f} µs/query  {compiler.stats()}")
+
+
+async def bench_db(dsn: str, ripetizioni: int):
+    import asyncpg
+    
+    params = [
+        {'soglia': 1, 'tipo': 'r'},
+        {'ns': 11},
+        {'anno': 2024, 'mese': 3},
+    ]
+    
+    for cache_size in (0, 256):
+        compiler = QueryCompiler()
+        conn = await asyncpg.connect(dsn, statement_cache_size=cache_size)
+        try:
+            start = time.perf_counter()
+            for _ in range(ripetizioni):
+                for q, p in zip(DB_QUERIES, params):
+                    sql, args = compiler.bind(q, (p,))
+                    await conn.fetchval(sql, *args)
+            elapsed = time.perf_counter() - start
+        finally:
+            await conn.close()
+        n = ripetizioni * len(DB_QUERIES)
+        print(f"statement_cache_size={cache_size}: {elapsed / n * 1000:.3f} ms/query ({n} query)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ripetizioni', type=int, default=10000)
+    parser.add_argument('--db', action='store_true', help="misura anche su DATABASE_URL")
+    args = parser.parse_args()
+    
+    bench_compile(args.ripetizioni)
+    
+    if args.db:
+        dsn = os.getenv('DATABASE_URL')
+        if not dsn:
+            print("DATABASE_URL non impostato: misura su database saltata")
+            return
+        asyncio.run(bench_db(dsn, max(args.ripetizioni // 10, 100)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark - Query Supabase bloccanti vs thread pool
+
+Avvia uno stand-in locale di PostgREST (HTTP, latenza configurabile)
+e misura il throughput di N richieste concorrenti:
+- PRIMA: .execute() sincrono dentro l'handler async (blocca l'event loop)
+- DOPO: AsyncQuery.execute() via run_in_supabase_pool
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_supabase_async --requests 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.database import AsyncQuery
+
+
+class FakePostgRESTHandler(BaseHTTPRequestHandler):
+    """Risponde come PostgREST dopo una latenza fissa"""
+    
+    latency = 0.05
+    
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = json.dumps([{'id': 1, 'totale': 100.0}]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeBuilder:
+    """Query builder sincrono, come quelli di postgrest-py"""
+    
+    def __init__(self, url: str):
+        self.url = url
+    
+    def select(self, *columns):
+        return self
+    
+    def eq(self, column, value):
+        return self
+    
+    def execute(self):
+        with urllib.request.urlopen(self.url) as response:
+            return FakeResponse(json.loads(response.read()))
+
+
+async def handler_sync(url: str):
+    return FakeBuilder(url).select('*').eq('id_utente', 1).execute()
+
+
+async def handler_async(url: str):
+    return await AsyncQuery(FakeBuilder(url)).select('*').eq('id_utente', 1).execute()
+
+
+async def run(handler, url: str, n_requests: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(url) for _ in range(n_requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+    
+    FakePostgRESTHandler.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakePostgRESTHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/fatture"
+    
+    print("=" * 60)
+    print(f"🧪 BENCHMARK SUPABASE - {args.requests} richieste, latenza {args.latency * 1000:.0f}ms")
+    print("=" * 60)
+    
+    for label, handler in [('PRIMA (sync)', handler_sync), ('DOPO (thread pool)', handler_async)]:
+        elapsed = asyncio.run(run(handler, url, args.requests))
+        print(f"{label:<20} {elapsed:8.2f}s  {args.requests / elapsed:8.1f} req/s")
+    
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
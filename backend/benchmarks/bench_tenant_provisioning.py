@@ -0,0 +1,98 @@
+"""
+Benchmark - Provisioning piano dei conti (richiede DATABASE_URL)
+
+Popolamento del piano dei conti base per N utenti su tabelle di prova:
+- una INSERT per conto (come il vecchio /popola-piano-conti)
+- QUERY_PROVISIONING a blocchi di TENANT_BATCH_SIZE utenti
+- secondo giro di QUERY_PROVISIONING (idempotenza: nessun conto creato)
+
+Uso (dalla cartella backend):
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_tenant_provisioning --utenti 300
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.database import Database
+from app.services.tenant_provisioning import (
+    PIANO_CONTI_BASE, QUERY_PROVISIONING, TENANT_BATCH_SIZE, _colonne_piano
+)
+
+PREFISSO = 'bench_prov'
+
+SCHEMA = [
+    f"CREATE TABLE {PREFISSO}_piano (id SERIAL PRIMARY KEY, id_utente INTEGER, codice_conto TEXT, "
+    f"descrizione TEXT, tipo TEXT, categoria TEXT, saldo NUMERIC(14,2), attivo BOOLEAN, created_at TIMESTAMP)",
+    f"CREATE UNIQUE INDEX ON {PREFISSO}_piano (id_utente, codice_conto)",
+    f"CREATE TABLE {PREFISSO}_aggregati (id_utente INTEGER PRIMARY KEY)",
+]
+
+QUERY = QUERY_PROVISIONING\
+    .replace('piano_dei_conti', f'{PREFISSO}_piano')\
+    .replace('dashboard_aggregati', f'{PREFISSO}_aggregati')
+
+
+async def run(n: int):
+    db = Database()
+    await db.connect()
+    if not db.pool:
+        print("DATABASE_URL non impostato o non raggiungibile")
+        return
+
+    async def reset():
+        await db.execute(f"DROP TABLE IF EXISTS {PREFISSO}_piano, {PREFISSO}_aggregati")
+        for statement in SCHEMA:
+            await db.execute(statement)
+
+    async def provisiona(utenti):
+        start = time.perf_counter()
+        creati = 0
+        for i in range(0, len(utenti), TENANT_BATCH_SIZE):
+            async with db.transaction() as tx:
+                rows = await tx.fetch_all(QUERY, {'utenti': utenti[i:i + TENANT_BATCH_SIZE], **_colonne_piano()})
+            creati += sum(r['conti_creati'] for r in rows)
+        return time.perf_counter() - start, creati
+
+    utenti = list(range(1, n + 1))
+    print(f"Utenti: {n}, conti per utente: {len(PIANO_CONTI_BASE)}")
+    try:
+        # Riga per riga su un campione (fino a 20 utenti)
+        await reset()
+        campione = utenti[:min(n, 20)]
+        start = time.perf_counter()
+        for id_utente in campione:
+            for codice, descrizione, tipo, categoria in PIANO_CONTI_BASE:
+                await db.execute(
+                    f"INSERT INTO {PREFISSO}_piano (id_utente, codice_conto, descrizione, tipo, categoria, "
+                    f"saldo, attivo, created_at) VALUES (:id_utente, :codice, :descrizione, :tipo, :categoria, 0, true, NOW())",
+                    {'id_utente': id_utente, 'codice': codice, 'descrizione': descrizione,
+                     'tipo': tipo, 'categoria': categoria}
+                )
+        per_utente = (time.perf_counter() - start) / len(campione)
+        print(f"  Una INSERT per conto     {per_utente * 1000:8.2f} ms per utente (stima totale {per_utente * n:.2f}s)")
+
+        await reset()
+        elapsed, creati = await provisiona(utenti)
+        print(f"  Statement unico a blocchi {elapsed / n * 1000:7.2f} ms per utente ({elapsed:.2f}s, {creati} conti)")
+
+        elapsed, creati = await provisiona(utenti)
+        print(f"  Secondo giro (idempotente) {elapsed:.2f}s, conti creati: {creati}")
+    finally:
+        await db.execute(f"DROP TABLE IF EXISTS {PREFISSO}_piano, {PREFISSO}_aggregati")
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--utenti', type=int, default=300)
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        print("DATABASE_URL non impostato: benchmark saltato")
+        return
+    asyncio.run(run(args.utenti))
+
+
+if __name__ == '__main__':
+    main()
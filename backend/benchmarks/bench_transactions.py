@@ -0,0 +1,175 @@
+"""
+Benchmark - Unità di lavoro con db.transaction() (richiede DATABASE_URL)
+
+Riproduce le sequenze di statement di pagamento fattura (4 statement) e
+delete a cascata (7 statement) su tabelle di prova, confrontando:
+- uno statement per acquire del pool, ciascuno in autocommit
+- tutti gli statement su una connessione fissa in una transazione
+- per la cascata: un solo statement CTE, per fattura e a lotti
+
+Uso (dalla cartella backend):
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_transactions --operazioni 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import date
+from decimal import Decimal
+
+from app.database import Database
+
+PREFISSO = 'bench_tx'
+
+SCHEMA = [
+    f"CREATE TABLE {PREFISSO}_fatture (id INTEGER PRIMARY KEY, id_utente INTEGER, numero_fattura TEXT, "
+    f"ragione_sociale_fornitore TEXT, pagata BOOLEAN DEFAULT false, metodo_pagamento TEXT, "
+    f"data_pagamento TIMESTAMP, updated_at TIMESTAMP)",
+    f"CREATE TABLE {PREFISSO}_righe (id SERIAL PRIMARY KEY, id_fattura INTEGER, descrizione TEXT)",
+    f"CREATE TABLE {PREFISSO}_cassa (id SERIAL PRIMARY KEY, id_utente INTEGER, id_fattura INTEGER, "
+    f"data_operazione DATE, importo NUMERIC(12,2), descrizione TEXT)",
+    f"CREATE TABLE {PREFISSO}_banca (id SERIAL PRIMARY KEY, id_utente INTEGER, id_fattura INTEGER, "
+    f"data_operazione DATE, importo NUMERIC(12,2))",
+    f"CREATE TABLE {PREFISSO}_bonifici (id SERIAL PRIMARY KEY, id_utente INTEGER, id_fattura INTEGER, collegato BOOLEAN)",
+    f"CREATE TABLE {PREFISSO}_assegni (id SERIAL PRIMARY KEY, id_utente INTEGER, id_fattura INTEGER, stato TEXT)",
+]
+TABELLE = ['fatture', 'righe', 'cassa', 'banca', 'bonifici', 'assegni']
+SCHEMA += [f"CREATE INDEX ON {PREFISSO}_{t} (id_fattura)" for t in TABELLE[1:]]
+
+
+def statement_pagamento(id_fattura: int):
+    params = {'id_fattura': id_fattura, 'id_utente': 1}
+    return [
+        (f"SELECT id, numero_fattura, ragione_sociale_fornitore FROM {PREFISSO}_fatture "
+         f"WHERE id = :id_fattura AND id_utente = :id_utente FOR UPDATE", params),
+        (f"UPDATE {PREFISSO}_fatture SET pagata = true, metodo_pagamento = 'banca_bonifico', "
+         f"data_pagamento = NOW(), updated_at = NOW() WHERE id = :id_fattura", {'id_fattura': id_fattura}),
+        (f"INSERT INTO {PREFISSO}_banca (id_utente, id_fattura, data_operazione, importo) "
+         f"VALUES (:id_utente, :id_fattura, :data, :importo)",
+         {**params, 'data': date.today(), 'importo': Decimal('-100.00')}),
+        (f"UPDATE {PREFISSO}_bonifici SET id_fattura = :id_fattura, collegato = true "
+         f"WHERE id = :id_fattura", {'id_fattura': id_fattura}),
+    ]
+
+
+def statement_cascata(id_fattura: int):
+    params = {'id_fattura': id_fattura, 'id_utente': 1}
+    return [
+        (f"SELECT id FROM {PREFISSO}_fatture WHERE id = :id_fattura AND id_utente = :id_utente FOR UPDATE", params),
+        (f"DELETE FROM {PREFISSO}_righe WHERE id_fattura = :id_fattura", {'id_fattura': id_fattura}),
+        (f"DELETE FROM {PREFISSO}_cassa WHERE id_utente = :id_utente AND id_fattura = :id_fattura", params),
+        (f"DELETE FROM {PREFISSO}_banca WHERE id_utente = :id_utente AND id_fattura = :id_fattura", params),
+        (f"UPDATE {PREFISSO}_bonifici SET id_fattura = NULL, collegato = false "
+         f"WHERE id_utente = :id_utente AND id_fattura = :id_fattura", params),
+        (f"UPDATE {PREFISSO}_assegni SET id_fattura = NULL, stato = 'disponibile' "
+         f"WHERE id_utente = :id_utente AND id_fattura = :id_fattura", params),
+        (f"DELETE FROM {PREFISSO}_fatture WHERE id = :id_fattura AND id_utente = :id_utente", params),
+    ]
+
+
+def statement_cascata_cte(id_fatture: list):
+    return (f"""
+        WITH f AS (SELECT id FROM {PREFISSO}_fatture WHERE id = ANY(:ids) AND id_utente = 1 FOR UPDATE),
+        r AS (DELETE FROM {PREFISSO}_righe WHERE id_fattura IN (SELECT id FROM f) RETURNING 1),
+        c AS (DELETE FROM {PREFISSO}_cassa WHERE id_utente = 1 AND id_fattura IN (SELECT id FROM f) RETURNING 1),
+        b AS (DELETE FROM {PREFISSO}_banca WHERE id_utente = 1 AND id_fattura IN (SELECT id FROM f) RETURNING 1),
+        bo AS (UPDATE {PREFISSO}_bonifici SET id_fattura = NULL, collegato = false
+               WHERE id_utente = 1 AND id_fattura IN (SELECT id FROM f) RETURNING 1),
+        a AS (UPDATE {PREFISSO}_assegni SET id_fattura = NULL, stato = 'disponibile'
+              WHERE id_utente = 1 AND id_fattura IN (SELECT id FROM f) RETURNING 1),
+        d AS (DELETE FROM {PREFISSO}_fatture WHERE id IN (SELECT id FROM f) RETURNING id)
+        SELECT (SELECT count(*) FROM d), (SELECT count(*) FROM r), (SELECT count(*) FROM c),
+               (SELECT count(*) FROM b), (SELECT count(*) FROM bo), (SELECT count(*) FROM a)
+    """, {'ids': id_fatture})
+
+
+async def prepara(db: Database, n: int):
+    for t in TABELLE:
+        await db.execute(f"DROP TABLE IF EXISTS {PREFISSO}_{t}")
+    for sql in SCHEMA:
+        await db.execute(sql)
+
+    await db.executemany(
+        f"INSERT INTO {PREFISSO}_fatture (id, id_utente, numero_fattura, ragione_sociale_fornitore) "
+        f"VALUES (:id, 1, :numero, 'Fornitore Prova')",
+        [{'id': i, 'numero': f"FT{i}"} for i in range(n)]
+    )
+    await db.executemany(
+        f"INSERT INTO {PREFISSO}_righe (id_fattura, descrizione) VALUES (:id_fattura, 'Riga')",
+        [{'id_fattura': i} for i in range(n) for _ in range(5)]
+    )
+    await db.executemany(
+        f"INSERT INTO {PREFISSO}_bonifici (id, id_utente, collegato) VALUES (:id, 1, false)",
+        [{'id': i} for i in range(n)]
+    )
+
+
+async def per_statement(db: Database, statements) -> float:
+    start = time.perf_counter()
+    for sql, params in statements:
+        await db.execute(sql, params)
+    return time.perf_counter() - start
+
+
+async def in_transazione(db: Database, statements) -> float:
+    start = time.perf_counter()
+    async with db.transaction() as tx:
+        for sql, params in statements:
+            await tx.execute(sql, params)
+    return time.perf_counter() - start
+
+
+def riepilogo(nome: str, tempi: list):
+    ms = sorted(t * 1000 for t in tempi)
+    p95 = ms[int(len(ms) * 0.95) - 1] if len(ms) >= 20 else ms[-1]
+    print(f"  {nome:<22} media {statistics.mean(ms):7.2f} ms   p50 {statistics.median(ms):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+async def run(n: int):
+    db = Database()
+    await db.connect()
+    if not db.pool:
+        print("DATABASE_URL non impostato o non raggiungibile")
+        return
+
+    try:
+        # Un blocco di n fatture per modalità, stesse sequenze di statement
+        await prepara(db, 4 * n)
+        for nome, genera in (('Pagamento fattura', statement_pagamento), ('Delete a cascata', statement_cascata)):
+            print(f"{nome} ({len(genera(0))} statement, {n} operazioni)")
+            tempi_singoli = [await per_statement(db, genera(i)) for i in range(n)]
+            tempi_tx = [await in_transazione(db, genera(n + i)) for i in range(n)]
+            riepilogo('statement singoli', tempi_singoli)
+            riepilogo('db.transaction()', tempi_tx)
+            print(f"  riduzione latenza media: {1 - statistics.mean(tempi_tx) / statistics.mean(tempi_singoli):.0%}")
+
+        # Cascata come singolo statement CTE, per fattura e a lotti da 100
+        base = 2 * n
+        tempi_cte = [await in_transazione(db, [statement_cascata_cte([base + i])]) for i in range(n)]
+        riepilogo('CTE singola fattura', tempi_cte)
+        lotti = [list(range(3 * n + i, min(3 * n + i + 100, 4 * n))) for i in range(0, n, 100)]
+        start = time.perf_counter()
+        for lotto in lotti:
+            await in_transazione(db, [statement_cascata_cte(lotto)])
+        print(f"  CTE a lotti da 100       {(time.perf_counter() - start) / n * 1000:7.2f} ms per fattura")
+        print(f"Statistiche transazioni: {db.transaction_stats()}")
+    finally:
+        for t in TABELLE:
+            await db.execute(f"DROP TABLE IF EXISTS {PREFISSO}_{t}")
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--operazioni', type=int, default=500)
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        print("DATABASE_URL non impostato: benchmark saltato")
+        return
+    asyncio.run(run(args.operazioni))
+
+
+if __name__ == '__main__':
+    main()
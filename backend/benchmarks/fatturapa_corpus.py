@@ -0,0 +1,93 @@
+"""
+Generatore corpus sintetico FatturaPA per i benchmark
+
+Struttura come le fatture reali: solo la root è nel namespace
+FatturaPA, gli elementi figli sono senza prefisso.
+"""
+import random
+from typing import List, Tuple
+
+NS = 'http://ivaservizi.agenziaentrate.gov.it/docs/xsd/fatture/v1.2'
+ALIQUOTE = ['22.00', '10.00', '4.00']
+
+
+def _dettaglio_linee(numero: int, rng: random.Random) -> str:
+    quantita = rng.randint(1, 20)
+    prezzo = round(rng.uniform(0.5, 200), 2)
+    return f"""
+      <DettaglioLinee>
+        <NumeroLinea>{numero}</NumeroLinea>
+        <Descrizione>Articolo {numero} - Prodotto di test</Descrizione>
+        <Quantita>{quantita}.00</Quantita>
+        <PrezzoUnitario>{prezzo:.2f}</PrezzoUnitario>
+        <PrezzoTotale>{quantita * prezzo:.2f}</PrezzoTotale>
+        <AliquotaIVA>{ALIQUOTE[numero % len(ALIQUOTE)]}</AliquotaIVA>
+      </DettaglioLinee>"""
+
+
+def _body(numero: str, n_righe: int, rng: random.Random) -> str:
+    righe = ''.join(_dettaglio_linee(i + 1, rng) for i in range(n_righe))
+    riepiloghi = ''.join(f"""
+      <DatiRiepilogo>
+        <AliquotaIVA>{aliquota}</AliquotaIVA>
+        <ImponibileImporto>{rng.uniform(100, 5000):.2f}</ImponibileImporto>
+        <Imposta>{rng.uniform(10, 1000):.2f}</Imposta>
+        <EsigibilitaIVA>I</EsigibilitaIVA>
+      </DatiRiepilogo>""" for aliquota in ALIQUOTE)
+    return f"""
+  <FatturaElettronicaBody>
+    <DatiGenerali>
+      <DatiGeneraliDocumento>
+        <TipoDocumento>TD01</TipoDocumento>
+        <Divisa>EUR</Divisa>
+        <Data>2025-03-{rng.randint(1, 28):02d}</Data>
+        <Numero>{numero}</Numero>
+      </DatiGeneraliDocumento>
+    </DatiGenerali>
+    <DatiBeniServizi>{righe}{riepiloghi}
+    </DatiBeniServizi>
+    <DatiPagamento>
+      <CondizioniPagamento>TP02</CondizioniPagamento>
+      <DettaglioPagamento>
+        <ModalitaPagamento>MP05</ModalitaPagamento>
+        <DataScadenzaPagamento>2025-04-30</DataScadenzaPagamento>
+        <ImportoPagamento>1000.00</ImportoPagamento>
+      </DettaglioPagamento>
+    </DatiPagamento>
+  </FatturaElettronicaBody>"""
+
+
+def genera_fattura(indice: int, n_righe: int = 20, n_body: int = 1, seed: int = 0) -> str:
+    """XML FatturaPA con n_body corpi (lotto) da n_righe righe ciascuno"""
+    rng = random.Random(seed + indice)
+    bodies = ''.join(_body(f"{indice}/{b + 1}", n_righe, rng) for b in range(n_body))
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<p:FatturaElettronica xmlns:p="{NS}" versione="FPR12">
+  <FatturaElettronicaHeader>
+    <CedentePrestatore>
+      <DatiAnagrafici>
+        <IdFiscaleIVA>
+          <IdPaese>IT</IdPaese>
+          <IdCodice>{10000000000 + indice % 500:011d}</IdCodice>
+        </IdFiscaleIVA>
+        <Anagrafica>
+          <Denominazione>Fornitore {indice % 500} S.r.l.</Denominazione>
+        </Anagrafica>
+      </DatiAnagrafici>
+      <Sede>
+        <Indirizzo>Via Roma {indice % 100}</Indirizzo>
+        <CAP>80100</CAP>
+        <Comune>Napoli</Comune>
+        <Provincia>NA</Provincia>
+      </Sede>
+    </CedentePrestatore>
+  </FatturaElettronicaHeader>{bodies}
+</p:FatturaElettronica>"""
+
+
+def genera_corpus(n_fatture: int, n_righe: int = 20) -> List[Tuple[str, bytes]]:
+    """Lista (filename, contenuto) pronta per la pipeline di import"""
+    return [
+        (f"IT{10000000000 + i % 500:011d}_{i:05d}.xml", genera_fattura(i, n_righe).encode('utf-8'))
+        for i in range(n_fatture)
+    ]
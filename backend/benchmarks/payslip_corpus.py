@@ -0,0 +1,133 @@
+"""
+Generatore corpus sintetico buste paga (testo estratto, layout Zucchetti)
+
+Il testo imita l'output di PyPDF2: righe di voci con codice (Z00001,
+F03020, ...), riquadri ferie/permessi/TFR, righe di riempimento. Con
+rumore=True aggiunge righe lunghe con parole chiave senza valori, il
+caso peggiore per i pattern con .*? dell'implementazione originale.
+Ogni busta ha anche i valori attesi dei campi principali, per verificare
+le estrazioni e non solo il confronto con l'implementazione originale.
+"""
+import random
+import string
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+MESI = ['Gennaio', 'Febbraio', 'Marzo', 'Aprile', 'Maggio', 'Giugno', 'Luglio',
+        'Agosto', 'Settembre', 'Ottobre', 'Novembre', 'Dicembre']
+COGNOMI = ['ROSSI', 'BIANCHI', 'ESPOSITO', 'RUSSO', 'ROMANO', 'COLOMBO', 'RICCI', 'MARINO']
+NOMI = ['MARIO', 'ANNA', 'GIUSEPPE', 'MARIA', 'LUCA', 'GIULIA', 'ANTONIO', 'FRANCESCA']
+MANSIONI = ['CAMERIERE', 'CUOCO', 'BARISTA', 'PASTICCIERE', 'COMMESSA']
+
+
+def _importo(rng: random.Random, minimo: float, massimo: float) -> str:
+    valore = f"{rng.uniform(minimo, massimo):,.2f}"
+    return valore.replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def _codice_fiscale(rng: random.Random) -> str:
+    lettere = string.ascii_uppercase
+    return (
+        ''.join(rng.choice(lettere) for _ in range(6)) + f"{rng.randint(50, 99)}"
+        + rng.choice('ABCDEHLMPRST') + f"{rng.randint(1, 71):02d}"
+        + rng.choice(lettere) + f"{rng.randint(100, 999)}" + rng.choice(lettere)
+    )
+
+
+def _rumore(rng: random.Random, righe: int) -> List[str]:
+    parole = ['Addizionale regionale', 'NETTO', 'Ferie', 'Permessi', 'IBAN', 'Quota anno',
+              'imponibile', 'progressivi', 'conguaglio', 'arrotondamento']
+    return [
+        ' '.join(rng.choice(parole) for _ in range(rng.randint(20, 60)))
+        for _ in range(righe)
+    ]
+
+
+def _decimale(importo: str) -> Decimal:
+    return Decimal(importo.replace('.', '').replace(',', '.'))
+
+
+def genera_busta_attesa(seed: int, rumore: bool = False) -> Tuple[str, Dict]:
+    """(testo, valori attesi dei campi principali in forma PayslipData)"""
+    rng = random.Random(seed)
+    cognome, nome = rng.choice(COGNOMI), rng.choice(NOMI)
+    ore = rng.choice(['168,00', '172,00', '84,00', '120,00'])
+    mese, anno = rng.randint(1, 12), rng.randint(2020, 2026)
+    codice_fiscale = _codice_fiscale(rng)
+    livello = f"OPE {rng.randint(1, 7)}' Livello{' Super' if rng.random() < 0.3 else ''}"
+    mansione = rng.choice(MANSIONI)
+    giorni = f"Lavorati Retribuiti {rng.randint(10, 26)} {rng.randint(20, 26)}"
+    paga_oraria, lordo = _importo(rng, 8, 15), _importo(rng, 1200, 2600)
+    imponibile_ivs, inps = _importo(rng, 1200, 2600), _importo(rng, 100, 250)
+    irpef = _importo(rng, 50, 500)
+    anno_reg, rata_reg, regionale = rng.randint(2020, 2025), rng.randint(1, 11), _importo(rng, 5, 40)
+    anno_com, rata_com, comunale = rng.randint(2020, 2025), rng.randint(1, 11), _importo(rng, 2, 20)
+    ferie = ' '.join([_importo(rng, 0, 40), _importo(rng, 10, 20), _importo(rng, 0, 16), _importo(rng, -10, 30)])
+    permessi = ' '.join([_importo(rng, 0, 40), _importo(rng, 5, 10), _importo(rng, 0, 50)])
+    tfr_progressivo, tfr_maturato = _importo(rng, 500, 9000), _importo(rng, 80, 200)
+    iban = f"IT{rng.randint(10, 99)}X0{rng.randint(100000000, 999999999)}{rng.randint(10000000000, 99999999999)}"
+    banca = rng.choice(['BANCA INTESA', 'UNICREDIT S.P.A.', 'BANCO BPM'])
+    netto = _importo(rng, 900, 2000)
+
+    righe = [
+        "ZUCCHETTI PAGHE - CEDOLINO",
+        f"Periodo di retribuzione {MESI[mese - 1]} {anno}",
+        f"Lavoratore: {cognome} {nome}",
+        f"Codice fiscale {codice_fiscale}",
+        livello,
+        mansione,
+        "Giorni",
+        giorni,
+        f"Z00001 Retribuzione {paga_oraria} {ore} ORE {lordo}",
+        f"Z00000 Contributo IVS {imponibile_ivs} 9,19 % {inps}",
+        f"F03020 Ritenute IRPEF {irpef}",
+        f"F09110 Addizionale regionale {anno_reg} rata {rata_reg} {regionale}",
+        f"F09130 Addizionale comunale {anno_com} rata {rata_com} {comunale}",
+        f"Ferie {ferie}",
+        f"Permessi {permessi} ORE",
+        f"TFR F.do 31/12 {tfr_progressivo} Quota anno {tfr_maturato}",
+        f"IBAN {iban}",
+        banca,
+        f"NETTO DEL MESE {netto} €",
+    ]
+
+    # Voci non estratte e righe di riempimento tra le sezioni
+    for _ in range(rng.randint(10, 40)):
+        righe.insert(
+            rng.randint(8, len(righe) - 1),
+            f"Z{rng.randint(10000, 99999)} Voce varia {_importo(rng, 0, 100)} {_importo(rng, 0, 100)}"
+        )
+    if rumore:
+        for riga in _rumore(rng, 20):
+            righe.insert(rng.randint(1, len(righe) - 1), riga)
+
+    attesi = {
+        'codice_fiscale': codice_fiscale,
+        'periodo': f"{anno}-{mese:02d}",
+        'cognome': cognome,
+        'nome': nome,
+        'ore_ordinarie': _decimale(ore),
+        'retribuzione_lorda': _decimale(lordo),
+        'inps_dipendente': _decimale(inps),
+        'irpef': _decimale(irpef),
+        'addizionale_regionale': _decimale(regionale),
+        'addizionale_comunale': _decimale(comunale),
+        'tfr_progressivo': _decimale(tfr_progressivo),
+        'tfr_maturato': _decimale(tfr_maturato),
+        'iban': iban,
+        'netto_in_busta': _decimale(netto),
+    }
+    return '\n'.join(righe) + '\n', attesi
+
+
+def genera_busta(seed: int, rumore: bool = False) -> str:
+    return genera_busta_attesa(seed, rumore)[0]
+
+
+def genera_corpus_atteso(n: int, quota_rumore: float = 0.1, seed: int = 42) -> List[Tuple[str, Dict]]:
+    rng = random.Random(seed)
+    return [genera_busta_attesa(seed + i, rumore=rng.random() < quota_rumore) for i in range(n)]
+
+
+def genera_corpus(n: int, quota_rumore: float = 0.1, seed: int = 42) -> List[str]:
+    return [testo for testo, _ in genera_corpus_atteso(n, quota_rumore, seed)]
@@ -0,0 +1,35 @@
+-- ============================================================================
+-- MIGRATION 008: GIORNALE MODIFICHE FORNITORI
+-- Data: 2026-10-18
+-- Descrizione: Rinomine e unioni fornitori propagate alle fatture in modo
+--              set-based, con giornale per invalidazione cache
+-- ============================================================================
+
+-- TABELLA: fornitori_modifiche (GIORNALE RINOMINE/UNIONI)
+CREATE TABLE IF NOT EXISTS fornitori_modifiche (
+    id BIGSERIAL PRIMARY KEY,
+    id_utente INTEGER NOT NULL,
+
+    operazione VARCHAR(20) NOT NULL, -- 'rinomina', 'unione'
+    partita_iva VARCHAR(20) NOT NULL, -- P.IVA risultante
+    partita_iva_origine VARCHAR(20), -- P.IVA assorbita (solo 'unione')
+    ragione_sociale VARCHAR(255),
+    ragione_sociale_precedente VARCHAR(255),
+    fornitore_id INTEGER, -- Fornitore risultante
+    fornitore_id_origine INTEGER, -- Fornitore eliminato (solo 'unione')
+    fatture_aggiornate INTEGER DEFAULT 0,
+
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Lettura incrementale del giornale: WHERE id_utente = ? AND id > ultimo_id
+CREATE INDEX IF NOT EXISTS idx_fornitori_modifiche_utente ON fornitori_modifiche(id_utente, id);
+
+-- Propagazione ragione sociale / P.IVA sulle fatture del fornitore
+CREATE INDEX IF NOT EXISTS idx_fatture_utente_piva ON fatture(id_utente, partita_iva_fornitore);
+
+COMMENT ON TABLE fornitori_modifiche IS 'Giornale rinomine e unioni fornitori (invalidazione cache)';
+
+-- ============================================================================
+-- FINE MIGRATION 008
+-- ============================================================================
@@ -0,0 +1,240 @@
+-- ============================================================================
+-- MIGRATION 009: AGGREGATI DASHBOARD
+-- Data: 2026-10-18
+-- Descrizione: Contatori per utente (fatture del mese, fatture da pagare,
+--              fornitori attivi, saldo cassa) mantenuti incrementalmente da
+--              trigger a livello di statement, con ricostruzione completa
+-- ============================================================================
+
+-- TABELLA: dashboard_aggregati (UNA RIGA PER UTENTE)
+CREATE TABLE IF NOT EXISTS dashboard_aggregati (
+    id_utente INTEGER PRIMARY KEY,
+
+    fatture_da_pagare_numero INTEGER NOT NULL DEFAULT 0,
+    fatture_da_pagare_importo DECIMAL(14,2) NOT NULL DEFAULT 0,
+    fornitori_attivi INTEGER NOT NULL DEFAULT 0,
+    saldo_cassa DECIMAL(14,2) NOT NULL DEFAULT 0,
+
+    ricostruito_at TIMESTAMP, -- Ultima ricostruzione completa
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- TABELLA: dashboard_fatture_mese (TOTALI FATTURE PER MESE)
+CREATE TABLE IF NOT EXISTS dashboard_fatture_mese (
+    id_utente INTEGER NOT NULL,
+    mese CHAR(7) NOT NULL, -- '2025-03'
+    numero INTEGER NOT NULL DEFAULT 0,
+    totale DECIMAL(14,2) NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (id_utente, mese)
+);
+
+-- ----------------------------------------------------------------------------
+-- Delta per statement: righe nuove con segno +1, righe vecchie con segno -1
+-- (un UPDATE produce entrambe), aggregate per utente prima dell'upsert.
+-- Un import di migliaia di righe aggiorna ogni contatore una sola volta.
+-- ----------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION dashboard_delta_sql(operazione TEXT, colonne TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE operazione
+        WHEN 'INSERT' THEN format('SELECT %s, 1 AS segno FROM nuove', colonne)
+        WHEN 'DELETE' THEN format('SELECT %s, -1 AS segno FROM vecchie', colonne)
+        ELSE format('SELECT %1$s, 1 AS segno FROM nuove UNION ALL SELECT %1$s, -1 AS segno FROM vecchie', colonne)
+    END
+$$;
+
+-- FATTURE: totali per mese e fatture da pagare
+CREATE OR REPLACE FUNCTION dashboard_fatture_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s),
+        mesi AS (
+            INSERT INTO dashboard_fatture_mese AS t (id_utente, mese, numero, totale)
+            SELECT id_utente, to_char(data_fattura, 'YYYY-MM'),
+                   sum(segno), sum(segno * COALESCE(totale, 0))
+            FROM delta
+            WHERE id_utente IS NOT NULL AND data_fattura IS NOT NULL
+            GROUP BY 1, 2
+            HAVING sum(segno) <> 0 OR sum(segno * COALESCE(totale, 0)) <> 0
+            ON CONFLICT (id_utente, mese) DO UPDATE SET
+                numero = t.numero + EXCLUDED.numero,
+                totale = t.totale + EXCLUDED.totale
+            RETURNING 1
+        )
+        INSERT INTO dashboard_aggregati AS t (id_utente, fatture_da_pagare_numero, fatture_da_pagare_importo)
+        SELECT id_utente,
+               COALESCE(sum(segno) FILTER (WHERE pagata IS FALSE), 0),
+               COALESCE(sum(segno * COALESCE(totale, 0)) FILTER (WHERE pagata IS FALSE), 0)
+        FROM delta
+        WHERE id_utente IS NOT NULL
+        GROUP BY 1
+        HAVING COALESCE(sum(segno) FILTER (WHERE pagata IS FALSE), 0) <> 0
+            OR COALESCE(sum(segno * COALESCE(totale, 0)) FILTER (WHERE pagata IS FALSE), 0) <> 0
+        ON CONFLICT (id_utente) DO UPDATE SET
+            fatture_da_pagare_numero = t.fatture_da_pagare_numero + EXCLUDED.fatture_da_pagare_numero,
+            fatture_da_pagare_importo = t.fatture_da_pagare_importo + EXCLUDED.fatture_da_pagare_importo,
+            updated_at = NOW()
+    $sql$, dashboard_delta_sql(TG_OP, 'id_utente, data_fattura, totale, pagata'));
+    RETURN NULL;
+END
+$$;
+
+-- FORNITORI: fornitori attivi
+CREATE OR REPLACE FUNCTION dashboard_fornitori_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO dashboard_aggregati AS t (id_utente, fornitori_attivi)
+        SELECT id_utente, sum(segno)
+        FROM delta
+        WHERE id_utente IS NOT NULL AND attivo IS TRUE
+        GROUP BY 1
+        HAVING sum(segno) <> 0
+        ON CONFLICT (id_utente) DO UPDATE SET
+            fornitori_attivi = t.fornitori_attivi + EXCLUDED.fornitori_attivi,
+            updated_at = NOW()
+    $sql$, dashboard_delta_sql(TG_OP, 'id_utente, attivo'));
+    RETURN NULL;
+END
+$$;
+
+-- MOVIMENTI CASSA: saldo (entrate corrispettivi/entrata, uscite pos/versamento/uscita)
+CREATE OR REPLACE FUNCTION dashboard_cassa_importo(tipo TEXT, importo DECIMAL) RETURNS DECIMAL
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN tipo IN ('corrispettivi', 'entrata') THEN COALESCE(importo, 0)
+        WHEN tipo IN ('pos', 'versamento', 'uscita') THEN -COALESCE(importo, 0)
+        ELSE 0
+    END
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_cassa_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO dashboard_aggregati AS t (id_utente, saldo_cassa)
+        SELECT id_utente, sum(segno * dashboard_cassa_importo(tipo, importo))
+        FROM delta
+        WHERE id_utente IS NOT NULL
+        GROUP BY 1
+        HAVING sum(segno * dashboard_cassa_importo(tipo, importo)) <> 0
+        ON CONFLICT (id_utente) DO UPDATE SET
+            saldo_cassa = t.saldo_cassa + EXCLUDED.saldo_cassa,
+            updated_at = NOW()
+    $sql$, dashboard_delta_sql(TG_OP, 'id_utente, tipo, importo'));
+    RETURN NULL;
+END
+$$;
+
+-- Un trigger per evento: le transition table non ammettono eventi multipli
+DROP TRIGGER IF EXISTS trg_dashboard_fatture_ins ON fatture;
+DROP TRIGGER IF EXISTS trg_dashboard_fatture_upd ON fatture;
+DROP TRIGGER IF EXISTS trg_dashboard_fatture_del ON fatture;
+CREATE TRIGGER trg_dashboard_fatture_ins AFTER INSERT ON fatture
+    REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION dashboard_fatture_trigger();
+CREATE TRIGGER trg_dashboard_fatture_upd AFTER UPDATE ON fatture
+    REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION dashboard_fatture_trigger();
+CREATE TRIGGER trg_dashboard_fatture_del AFTER DELETE ON fatture
+    REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION dashboard_fatture_trigger();
+
+DROP TRIGGER IF EXISTS trg_dashboard_fornitori_ins ON fornitori;
+DROP TRIGGER IF EXISTS trg_dashboard_fornitori_upd ON fornitori;
+DROP TRIGGER IF EXISTS trg_dashboard_fornitori_del ON fornitori;
+CREATE TRIGGER trg_dashboard_fornitori_ins AFTER INSERT ON fornitori
+    REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION dashboard_fornitori_trigger();
+CREATE TRIGGER trg_dashboard_fornitori_upd AFTER UPDATE ON fornitori
+    REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION dashboard_fornitori_trigger();
+CREATE TRIGGER trg_dashboard_fornitori_del AFTER DELETE ON fornitori
+    REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION dashboard_fornitori_trigger();
+
+DROP TRIGGER IF EXISTS trg_dashboard_cassa_ins ON movimenti_cassa;
+DROP TRIGGER IF EXISTS trg_dashboard_cassa_upd ON movimenti_cassa;
+DROP TRIGGER IF EXISTS trg_dashboard_cassa_del ON movimenti_cassa;
+CREATE TRIGGER trg_dashboard_cassa_ins AFTER INSERT ON movimenti_cassa
+    REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION dashboard_cassa_trigger();
+CREATE TRIGGER trg_dashboard_cassa_upd AFTER UPDATE ON movimenti_cassa
+    REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION dashboard_cassa_trigger();
+CREATE TRIGGER trg_dashboard_cassa_del AFTER DELETE ON movimenti_cassa
+    REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION dashboard_cassa_trigger();
+
+-- ----------------------------------------------------------------------------
+-- Ricostruzione completa (NULL = tutti gli utenti). Le tabelle sorgente sono
+-- bloccate in SHARE MODE fino al commit: nessun delta concorrente va perso.
+-- Restituisce gli utenti i cui contatori erano disallineati.
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION dashboard_ricostruisci(p_id_utente INTEGER DEFAULT NULL)
+RETURNS TABLE (id_utente INTEGER, disallineato BOOLEAN)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+    LOCK TABLE fatture, fornitori, movimenti_cassa IN SHARE MODE;
+
+    DROP TABLE IF EXISTS dashboard_nuovi;
+    CREATE TEMP TABLE dashboard_nuovi ON COMMIT DROP AS
+    WITH utenti AS (
+        SELECT f.id_utente FROM fatture f WHERE p_id_utente IS NULL OR f.id_utente = p_id_utente
+        UNION SELECT fo.id_utente FROM fornitori fo WHERE p_id_utente IS NULL OR fo.id_utente = p_id_utente
+        UNION SELECT c.id_utente FROM movimenti_cassa c WHERE p_id_utente IS NULL OR c.id_utente = p_id_utente
+        UNION SELECT p_id_utente WHERE p_id_utente IS NOT NULL
+    )
+    SELECT u.id_utente,
+           COALESCE(fa.numero, 0)::INTEGER AS fatture_da_pagare_numero,
+           COALESCE(fa.importo, 0) AS fatture_da_pagare_importo,
+           COALESCE(fo.numero, 0)::INTEGER AS fornitori_attivi,
+           COALESCE(ca.saldo, 0) AS saldo_cassa
+    FROM utenti u
+    LEFT JOIN (
+        SELECT f.id_utente, count(*) AS numero, sum(COALESCE(f.totale, 0)) AS importo
+        FROM fatture f WHERE f.pagata IS FALSE GROUP BY 1
+    ) fa ON fa.id_utente = u.id_utente
+    LEFT JOIN (
+        SELECT fo.id_utente, count(*) AS numero
+        FROM fornitori fo WHERE fo.attivo IS TRUE GROUP BY 1
+    ) fo ON fo.id_utente = u.id_utente
+    LEFT JOIN (
+        SELECT c.id_utente, sum(dashboard_cassa_importo(c.tipo, c.importo)) AS saldo
+        FROM movimenti_cassa c GROUP BY 1
+    ) ca ON ca.id_utente = u.id_utente
+    WHERE u.id_utente IS NOT NULL;
+
+    RETURN QUERY
+    SELECT n.id_utente,
+           a.id_utente IS NULL
+           OR (a.fatture_da_pagare_numero, a.fatture_da_pagare_importo, a.fornitori_attivi, a.saldo_cassa)
+              IS DISTINCT FROM
+              (n.fatture_da_pagare_numero, n.fatture_da_pagare_importo, n.fornitori_attivi, n.saldo_cassa)
+    FROM dashboard_nuovi n
+    LEFT JOIN dashboard_aggregati a ON a.id_utente = n.id_utente;
+
+    DELETE FROM dashboard_aggregati a WHERE p_id_utente IS NULL OR a.id_utente = p_id_utente;
+    INSERT INTO dashboard_aggregati (
+        id_utente, fatture_da_pagare_numero, fatture_da_pagare_importo,
+        fornitori_attivi, saldo_cassa, ricostruito_at, updated_at
+    )
+    SELECT n.id_utente, n.fatture_da_pagare_numero, n.fatture_da_pagare_importo,
+           n.fornitori_attivi, n.saldo_cassa, NOW(), NOW()
+    FROM dashboard_nuovi n;
+
+    DELETE FROM dashboard_fatture_mese m WHERE p_id_utente IS NULL OR m.id_utente = p_id_utente;
+    INSERT INTO dashboard_fatture_mese (id_utente, mese, numero, totale)
+    SELECT f.id_utente, to_char(f.data_fattura, 'YYYY-MM'), count(*), sum(COALESCE(f.totale, 0))
+    FROM fatture f
+    WHERE f.id_utente IS NOT NULL AND f.data_fattura IS NOT NULL
+      AND (p_id_utente IS NULL OR f.id_utente = p_id_utente)
+    GROUP BY 1, 2;
+END
+$$;
+
+-- Popolamento iniziale
+SELECT count(*) FROM dashboard_ricostruisci(NULL);
+
+COMMENT ON TABLE dashboard_aggregati IS 'Contatori dashboard per utente (mantenuti da trigger)';
+COMMENT ON TABLE dashboard_fatture_mese IS 'Totali fatture per utente e mese (mantenuti da trigger)';
+
+-- ============================================================================
+-- FINE MIGRATION 009
+-- ============================================================================
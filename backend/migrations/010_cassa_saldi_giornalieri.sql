@@ -0,0 +1,83 @@
+-- ============================================================================
+-- MIGRATION 010: SALDI GIORNALIERI CASSA
+-- Data: 2026-10-18
+-- Descrizione: Saldo di chiusura per giorno (snapshot). Saldo a una data =
+--              ultimo snapshot + movimenti successivi. Movimenti retrodatati
+--              aggiornano gli snapshot successivi via trigger.
+-- ============================================================================
+
+-- TABELLA: cassa_saldi_giornalieri (SNAPSHOT SALDO DI CHIUSURA)
+CREATE TABLE IF NOT EXISTS cassa_saldi_giornalieri (
+    id_utente INTEGER NOT NULL,
+    data DATE NOT NULL,
+
+    saldo_chiusura DECIMAL(14,2) NOT NULL, -- Somma importi fino a data inclusa
+
+    created_at TIMESTAMP DEFAULT NOW(),
+    aggiornato_at TIMESTAMP DEFAULT NOW(),
+    verificato_at TIMESTAMP, -- Ultimo controllo di coerenza
+
+    PRIMARY KEY (id_utente, data)
+);
+
+-- Movimenti dopo lo snapshot: range scan per utente e data
+CREATE INDEX IF NOT EXISTS idx_movimenti_cassa_utente_data ON movimenti_cassa(id_utente, data_operazione);
+
+-- ----------------------------------------------------------------------------
+-- Movimenti inseriti/modificati/eliminati con data <= di uno snapshot:
+-- il delta per giorno viene sommato a tutti gli snapshot da quel giorno in poi
+-- (stessa costruzione a segni di dashboard_delta_sql, migration 009)
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION cassa_saldi_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s),
+        giorni AS (
+            SELECT id_utente, data_operazione AS data, sum(segno * COALESCE(importo, 0)) AS delta
+            FROM delta
+            WHERE id_utente IS NOT NULL AND data_operazione IS NOT NULL
+            GROUP BY 1, 2
+            HAVING sum(segno * COALESCE(importo, 0)) <> 0
+        )
+        UPDATE cassa_saldi_giornalieri s SET
+            saldo_chiusura = s.saldo_chiusura + x.delta,
+            aggiornato_at = NOW()
+        FROM (
+            SELECT s2.id_utente, s2.data, sum(g.delta) AS delta
+            FROM cassa_saldi_giornalieri s2
+            JOIN giorni g ON g.id_utente = s2.id_utente AND g.data <= s2.data
+            GROUP BY 1, 2
+        ) x
+        WHERE s.id_utente = x.id_utente AND s.data = x.data
+    $sql$, dashboard_delta_sql(TG_OP, 'id_utente, data_operazione, importo'));
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_cassa_saldi_ins ON movimenti_cassa;
+DROP TRIGGER IF EXISTS trg_cassa_saldi_upd ON movimenti_cassa;
+DROP TRIGGER IF EXISTS trg_cassa_saldi_del ON movimenti_cassa;
+CREATE TRIGGER trg_cassa_saldi_ins AFTER INSERT ON movimenti_cassa
+    REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION cassa_saldi_trigger();
+CREATE TRIGGER trg_cassa_saldi_upd AFTER UPDATE ON movimenti_cassa
+    REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION cassa_saldi_trigger();
+CREATE TRIGGER trg_cassa_saldi_del AFTER DELETE ON movimenti_cassa
+    REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION cassa_saldi_trigger();
+
+-- ----------------------------------------------------------------------------
+-- Saldo cassa dashboard = somma importi con segno, come /cash-register/saldo
+-- (POS e versamenti sono già registrati in negativo)
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION dashboard_cassa_importo(tipo TEXT, importo DECIMAL) RETURNS DECIMAL
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT COALESCE(importo, 0)
+$$;
+
+SELECT count(*) FROM dashboard_ricostruisci(NULL);
+
+COMMENT ON TABLE cassa_saldi_giornalieri IS 'Saldo cassa di chiusura per utente e giorno';
+
+-- ============================================================================
+-- FINE MIGRATION 010
+-- ============================================================================
@@ -0,0 +1,168 @@
+-- ============================================================================
+-- MIGRATION 011: LIQUIDAZIONI IVA
+-- Data: 2026-10-18
+-- Descrizione: Riepilogo IVA per aliquota/natura delle fatture passive e
+--              cache delle liquidazioni dei periodi chiusi, invalidata dai
+--              trigger quando cambiano i documenti di un periodo già calcolato
+-- ============================================================================
+
+-- TABELLA: fatture_riepilogo_iva (BLOCCHI DatiRiepilogo FatturaPA)
+CREATE TABLE IF NOT EXISTS fatture_riepilogo_iva (
+    id BIGSERIAL PRIMARY KEY,
+    id_fattura INTEGER NOT NULL REFERENCES fatture(id) ON DELETE CASCADE,
+
+    aliquota_iva DECIMAL(5,2) NOT NULL DEFAULT 0,
+    natura VARCHAR(10), -- N1..N7 (operazioni senza imposta)
+    esigibilita_iva CHAR(1), -- I = immediata, D = differita, S = scissione pagamenti
+    imponibile DECIMAL(14,2) NOT NULL DEFAULT 0,
+    imposta DECIMAL(14,2) NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_fatture_riepilogo_iva_fattura ON fatture_riepilogo_iva(id_fattura);
+
+-- Aggregazione per periodo: range scan per utente e data documento
+CREATE INDEX IF NOT EXISTS idx_fatture_utente_data ON fatture(id_utente, data_fattura);
+
+-- TABELLA: iva_liquidazioni (CACHE PERIODI CHIUSI)
+CREATE TABLE IF NOT EXISTS iva_liquidazioni (
+    id_utente INTEGER NOT NULL,
+    periodicita VARCHAR(12) NOT NULL, -- 'mensile', 'trimestrale', 'annuale'
+    anno INTEGER NOT NULL,
+    periodo SMALLINT NOT NULL, -- mese, trimestre o 1
+
+    data_inizio DATE NOT NULL,
+    data_fine DATE NOT NULL, -- Esclusa
+
+    iva_vendite DECIMAL(14,2) NOT NULL DEFAULT 0,
+    iva_acquisti DECIMAL(14,2) NOT NULL DEFAULT 0,
+    riporto_precedente DECIMAL(14,2) NOT NULL DEFAULT 0, -- < 0 credito, > 0 debito sotto soglia
+    interessi DECIMAL(14,2) NOT NULL DEFAULT 0,
+    da_versare DECIMAL(14,2) NOT NULL DEFAULT 0,
+    riporto DECIMAL(14,2) NOT NULL DEFAULT 0, -- Riportato al periodo successivo
+    dettaglio JSONB, -- Totali per registro, aliquota, natura, esigibilità
+
+    calcolato_at TIMESTAMP DEFAULT NOW(),
+
+    PRIMARY KEY (id_utente, periodicita, anno, periodo)
+);
+
+-- Invalidazione: tutti i periodi che terminano dopo la data modificata
+CREATE INDEX IF NOT EXISTS idx_iva_liquidazioni_utente_fine ON iva_liquidazioni(id_utente, data_fine);
+
+-- TABELLA: iva_liquidazioni_versioni (DOCUMENTI IVA MODIFICATI PER UTENTE)
+-- Incrementata dai trigger prima dell'invalidazione: un calcolo scrive la
+-- cache solo se la versione letta nel suo snapshot è ancora quella attuale
+CREATE TABLE IF NOT EXISTS iva_liquidazioni_versioni (
+    id_utente INTEGER PRIMARY KEY,
+    versione BIGINT NOT NULL DEFAULT 0
+);
+
+-- ----------------------------------------------------------------------------
+-- Un documento inserito/modificato/eliminato in un periodo già in cache
+-- invalida quel periodo e i successivi (il riporto del credito li lega).
+-- Stessa costruzione a segni di dashboard_delta_sql (migration 009).
+-- La versione è incrementata prima della DELETE: un calcolo che sta
+-- scrivendo la cache (riga versione bloccata) la completa prima, e la
+-- DELETE successiva vede e cancella i suoi periodi.
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION iva_liquidazioni_invalida_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO iva_liquidazioni_versioni AS v (id_utente, versione)
+        SELECT DISTINCT id_utente, 1
+        FROM delta
+        WHERE id_utente IS NOT NULL AND data_fattura IS NOT NULL
+        ON CONFLICT (id_utente) DO UPDATE SET versione = v.versione + 1
+    $sql$, dashboard_delta_sql(TG_OP, 'id_utente, data_fattura'));
+
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        DELETE FROM iva_liquidazioni l
+        USING (
+            SELECT id_utente, min(data_fattura) AS data
+            FROM delta
+            WHERE id_utente IS NOT NULL AND data_fattura IS NOT NULL
+            GROUP BY 1
+        ) d
+        WHERE l.id_utente = d.id_utente AND l.data_fine > d.data
+    $sql$, dashboard_delta_sql(TG_OP, 'id_utente, data_fattura'));
+    RETURN NULL;
+END
+$$;
+
+-- Riepilogo: utente e data dalla fattura collegata
+CREATE OR REPLACE FUNCTION iva_riepilogo_invalida_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO iva_liquidazioni_versioni AS v (id_utente, versione)
+        SELECT DISTINCT f.id_utente, 1
+        FROM delta
+        JOIN fatture f ON f.id = delta.id_fattura
+        WHERE f.data_fattura IS NOT NULL
+        ON CONFLICT (id_utente) DO UPDATE SET versione = v.versione + 1
+    $sql$, dashboard_delta_sql(TG_OP, 'id_fattura'));
+
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        DELETE FROM iva_liquidazioni l
+        USING (
+            SELECT f.id_utente, min(f.data_fattura) AS data
+            FROM delta
+            JOIN fatture f ON f.id = delta.id_fattura
+            WHERE f.data_fattura IS NOT NULL
+            GROUP BY 1
+        ) d
+        WHERE l.id_utente = d.id_utente AND l.data_fine > d.data
+    $sql$, dashboard_delta_sql(TG_OP, 'id_fattura'));
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_iva_fatture_ins ON fatture;
+DROP TRIGGER IF EXISTS trg_iva_fatture_upd ON fatture;
+DROP TRIGGER IF EXISTS trg_iva_fatture_del ON fatture;
+CREATE TRIGGER trg_iva_fatture_ins AFTER INSERT ON fatture
+    REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION iva_liquidazioni_invalida_trigger();
+CREATE TRIGGER trg_iva_fatture_upd AFTER UPDATE ON fatture
+    REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION iva_liquidazioni_invalida_trigger();
+CREATE TRIGGER trg_iva_fatture_del AFTER DELETE ON fatture
+    REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION iva_liquidazioni_invalida_trigger();
+
+DROP TRIGGER IF EXISTS trg_iva_riepilogo_ins ON fatture_riepilogo_iva;
+DROP TRIGGER IF EXISTS trg_iva_riepilogo_upd ON fatture_riepilogo_iva;
+CREATE TRIGGER trg_iva_riepilogo_ins AFTER INSERT ON fatture_riepilogo_iva
+    REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION iva_riepilogo_invalida_trigger();
+CREATE TRIGGER trg_iva_riepilogo_upd AFTER UPDATE ON fatture_riepilogo_iva
+    REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION iva_riepilogo_invalida_trigger();
+-- DELETE sul riepilogo: arriva dalla cascata su fatture, già coperta
+
+-- Fatture emesse (IVA vendite), se la tabella è presente
+DO $$
+BEGIN
+    IF to_regclass('fatture_emesse') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_fatture_emesse_utente_data ON fatture_emesse(id_utente, data_fattura);
+
+        DROP TRIGGER IF EXISTS trg_iva_fatture_emesse_ins ON fatture_emesse;
+        DROP TRIGGER IF EXISTS trg_iva_fatture_emesse_upd ON fatture_emesse;
+        DROP TRIGGER IF EXISTS trg_iva_fatture_emesse_del ON fatture_emesse;
+        CREATE TRIGGER trg_iva_fatture_emesse_ins AFTER INSERT ON fatture_emesse
+            REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION iva_liquidazioni_invalida_trigger();
+        CREATE TRIGGER trg_iva_fatture_emesse_upd AFTER UPDATE ON fatture_emesse
+            REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION iva_liquidazioni_invalida_trigger();
+        CREATE TRIGGER trg_iva_fatture_emesse_del AFTER DELETE ON fatture_emesse
+            REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION iva_liquidazioni_invalida_trigger();
+    END IF;
+END
+$$;
+
+COMMENT ON TABLE fatture_riepilogo_iva IS 'Riepilogo IVA per aliquota/natura delle fatture passive';
+COMMENT ON TABLE iva_liquidazioni IS 'Liquidazioni IVA dei periodi chiusi (cache, invalidata da trigger)';
+COMMENT ON TABLE iva_liquidazioni_versioni IS 'Versione dei documenti IVA per utente (scrittura cache liquidazioni)';
+
+-- ============================================================================
+-- FINE MIGRATION 011
+-- ============================================================================
@@ -0,0 +1,124 @@
+-- ============================================================================
+-- MIGRATION 012: SALDI CONTI MENSILI
+-- Data: 2026-10-18
+-- Descrizione: Totali dare/avere per conto e mese, mantenuti dai trigger su
+--              movimenti_contabili. Stato patrimoniale e conto economico
+--              leggono i mensili invece di tutti i movimenti.
+-- ============================================================================
+
+-- TABELLA: saldi_conti_mensili (DARE/AVERE PER CONTO E MESE)
+CREATE TABLE IF NOT EXISTS saldi_conti_mensili (
+    id_utente INTEGER NOT NULL,
+    codice_conto VARCHAR(20) NOT NULL,
+    mese DATE NOT NULL, -- Primo giorno del mese
+
+    dare DECIMAL(14,2) NOT NULL DEFAULT 0,
+    avere DECIMAL(14,2) NOT NULL DEFAULT 0,
+    movimenti INTEGER NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (id_utente, codice_conto, mese)
+);
+
+-- Bilanci per data/anno: range scan per utente e mese
+CREATE INDEX IF NOT EXISTS idx_saldi_conti_mensili_utente_mese ON saldi_conti_mensili(id_utente, mese);
+
+-- Movimenti del mese in corso (stato patrimoniale a una data)
+CREATE INDEX IF NOT EXISTS idx_movimenti_contabili_utente_data ON movimenti_contabili(id_utente, data_movimento);
+
+-- ----------------------------------------------------------------------------
+-- Delta per statement come dashboard_delta_sql (migration 009): un UPDATE
+-- sposta importo e conteggio dal mese/conto vecchio a quello nuovo
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION saldi_conti_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH delta AS (%s)
+        INSERT INTO saldi_conti_mensili AS s (id_utente, codice_conto, mese, dare, avere, movimenti)
+        SELECT id_utente, codice_conto, date_trunc('month', data_movimento)::date,
+               COALESCE(sum(segno * COALESCE(importo, 0)) FILTER (WHERE tipo_movimento = 'dare'), 0),
+               COALESCE(sum(segno * COALESCE(importo, 0)) FILTER (WHERE tipo_movimento IS DISTINCT FROM 'dare'), 0),
+               sum(segno)
+        FROM delta
+        WHERE id_utente IS NOT NULL AND codice_conto IS NOT NULL AND data_movimento IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (id_utente, codice_conto, mese) DO UPDATE SET
+            dare = s.dare + EXCLUDED.dare,
+            avere = s.avere + EXCLUDED.avere,
+            movimenti = s.movimenti + EXCLUDED.movimenti
+    $sql$, dashboard_delta_sql(TG_OP, 'id_utente, codice_conto, data_movimento, tipo_movimento, importo'));
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_saldi_conti_ins ON movimenti_contabili;
+DROP TRIGGER IF EXISTS trg_saldi_conti_upd ON movimenti_contabili;
+DROP TRIGGER IF EXISTS trg_saldi_conti_del ON movimenti_contabili;
+CREATE TRIGGER trg_saldi_conti_ins AFTER INSERT ON movimenti_contabili
+    REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION saldi_conti_trigger();
+CREATE TRIGGER trg_saldi_conti_upd AFTER UPDATE ON movimenti_contabili
+    REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION saldi_conti_trigger();
+CREATE TRIGGER trg_saldi_conti_del AFTER DELETE ON movimenti_contabili
+    REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION saldi_conti_trigger();
+
+-- Popolamento iniziale dai movimenti esistenti
+INSERT INTO saldi_conti_mensili (id_utente, codice_conto, mese, dare, avere, movimenti)
+SELECT id_utente, codice_conto, date_trunc('month', data_movimento)::date,
+       COALESCE(sum(importo) FILTER (WHERE tipo_movimento = 'dare'), 0),
+       COALESCE(sum(importo) FILTER (WHERE tipo_movimento IS DISTINCT FROM 'dare'), 0),
+       count(*)
+FROM movimenti_contabili
+WHERE id_utente IS NOT NULL AND codice_conto IS NOT NULL AND data_movimento IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT (id_utente, codice_conto, mese) DO NOTHING;
+
+-- ----------------------------------------------------------------------------
+-- Verifica trigger: un movimento solo dare e uno solo avere (un INSERT
+-- ciascuno, come BalanceEngine.registra_movimento). Le righe di prova sono
+-- annullate sollevando un'eccezione nel blocco interno; un errore del
+-- trigger (es. NOT NULL su dare/avere) fa fallire la migration.
+-- ----------------------------------------------------------------------------
+DO $$
+DECLARE
+    utente INTEGER := -1;
+    conto VARCHAR(20) := '__verifica__';
+    saldo RECORD;
+BEGIN
+    -- Un conto esistente se c'è (movimenti_contabili può avere FK sul piano dei conti)
+    SELECT id_utente, codice_conto INTO utente, conto FROM piano_dei_conti LIMIT 1;
+    IF NOT FOUND THEN
+        utente := -1;
+        conto := '__verifica__';
+    END IF;
+
+    BEGIN
+        DELETE FROM saldi_conti_mensili
+        WHERE id_utente = utente AND codice_conto = conto AND mese = DATE '1900-01-01';
+
+        INSERT INTO movimenti_contabili (id_utente, data_movimento, codice_conto, descrizione, tipo_movimento, importo)
+        VALUES (utente, DATE '1900-01-15', conto, 'verifica migration 012', 'dare', 100);
+        INSERT INTO movimenti_contabili (id_utente, data_movimento, codice_conto, descrizione, tipo_movimento, importo)
+        VALUES (utente, DATE '1900-01-20', conto, 'verifica migration 012', 'avere', 40);
+
+        SELECT dare, avere, movimenti INTO saldo
+        FROM saldi_conti_mensili
+        WHERE id_utente = utente AND codice_conto = conto AND mese = DATE '1900-01-01';
+
+        IF NOT FOUND OR saldo.dare <> 100 OR saldo.avere <> 40 OR saldo.movimenti <> 2 THEN
+            RAISE EXCEPTION 'saldi_conti_trigger: saldo di verifica errato (%)', saldo;
+        END IF;
+
+        RAISE EXCEPTION USING ERRCODE = 'P0001', MESSAGE = 'verifica_012_ok';
+    EXCEPTION WHEN raise_exception THEN
+        IF SQLERRM <> 'verifica_012_ok' THEN
+            RAISE;
+        END IF;
+    END;
+END
+$$;
+
+COMMENT ON TABLE saldi_conti_mensili IS 'Totali dare/avere per conto e mese (bilanci)';
+
+-- ============================================================================
+-- FINE MIGRATION 012
+-- ============================================================================
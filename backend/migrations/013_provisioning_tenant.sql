@@ -0,0 +1,15 @@
+-- ============================================================================
+-- MIGRATION 013: PROVISIONING TENANT
+-- Data: 2026-10-18
+-- Descrizione: Vincolo univoco sul codice conto per utente, necessario al
+--              popolamento idempotente del piano dei conti (ON CONFLICT)
+-- ============================================================================
+
+-- Eventuali doppioni (stesso codice per lo stesso utente) vanno risolti prima:
+--   SELECT id_utente, codice_conto, count(*) FROM piano_dei_conti
+--   GROUP BY 1, 2 HAVING count(*) > 1;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_piano_dei_conti_utente_codice ON piano_dei_conti(id_utente, codice_conto);
+
+-- ============================================================================
+-- FINE MIGRATION 013
+-- ============================================================================
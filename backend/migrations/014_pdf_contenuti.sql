@@ -0,0 +1,42 @@
+-- ============================================================================
+-- MIGRATION 014: ARCHIVIO PDF PER CONTENUTO
+-- Data: 2026-10-18
+-- Descrizione: PDF importati indicizzati per hash SHA-256 del contenuto.
+--              Un PDF già importato (mail reinviata, upload ripetuto) non
+--              viene riparsato né riscritto; l'originale è salvato una volta
+--              sotto il suo hash.
+-- ============================================================================
+
+-- TABELLA: pdf_contenuti (UN RECORD PER CONTENUTO)
+CREATE TABLE IF NOT EXISTS pdf_contenuti (
+    sha256 CHAR(64) PRIMARY KEY,
+    dimensione INTEGER NOT NULL,
+    tipo_documento VARCHAR(30) NOT NULL DEFAULT 'busta_paga',
+
+    -- File su disco (view_path = path se il PDF non era protetto da password)
+    path TEXT NOT NULL,
+    view_path TEXT,
+
+    -- Parte di un PDF multiplo (split per dipendente): hash del file,
+    -- pagine della parte ("1-2,5-5") e numero di parti del file
+    sha256_file CHAR(64),
+    pagine VARCHAR(200),
+    parti_file SMALLINT,
+
+    -- Documento generato dall'import (NULL se cancellato: il PDF si reimporta)
+    payslip_id INTEGER REFERENCES payslips(id) ON DELETE SET NULL,
+
+    -- Import dello stesso contenuto (import_count - 1 = duplicati evitati)
+    import_count INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    ultimo_import TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_pdf_contenuti_payslip ON pdf_contenuti(payslip_id);
+
+-- PDF multiplo reinviato: tutte le sue parti in un solo lookup
+CREATE INDEX IF NOT EXISTS idx_pdf_contenuti_file ON pdf_contenuti(sha256_file) WHERE sha256_file IS NOT NULL;
+
+-- ============================================================================
+-- FINE MIGRATION 014
+-- ============================================================================